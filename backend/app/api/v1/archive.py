@@ -2,28 +2,45 @@
 案卷管理相关 API
 """
 import io
-import json
 import os
 import re
 import uuid
 from datetime import datetime
-from typing import Optional, List, Any
+from typing import Optional, List
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Request, UploadFile, File
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.responses import FileResponse
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel, Field
 from sqlalchemy import select, and_, or_, func
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer
 
 from app.core.config import settings
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db, BackgroundSessionLocal, read_router, client_key
 from app.core.response import ResponseModel
+from app.core.serialization import sse_frame
+from app.core.sse import sse_response
+from app.core.streaming import ndjson_response
 from app.core.security import get_current_user, decode_access_token
+from app.core.usage_context import tag_usage
 from app.models.archive import CaseFile
 from app.models.import_task import ImportTask
 from app.models.user import User
-from app.services.qwen_service import qwen_service
+from app.services.case_extraction import (
+    EXTRACT_FIELD_COUNT,
+    apply_extracted_fields,
+    case_field_extractor,
+    parse_incident_time,
+)
+from app.services.extraction_retry import (
+    EXTRACT_STATE_KEY,
+    clear_deferred,
+    extraction_retry_queue,
+    mark_deferred,
+    should_defer,
+)
+from app.services.graph_indexer import graph_indexer
 from loguru import logger
 
 router = APIRouter()
@@ -76,26 +93,6 @@ def _extract_text_from_file(content: bytes, filename: str) -> str:
     return ""
 
 
-def _parse_incident_time(value: Any) -> Optional[datetime]:
-    """将字符串或日期解析为 datetime。"""
-    if value is None:
-        return None
-    if isinstance(value, datetime):
-        return value
-    if not isinstance(value, str):
-        return None
-    value = value.strip()
-    if not value:
-        return None
-    try:
-        # 尝试 YYYY-MM-DD HH:mm 或 YYYY-MM-DD
-        if " " in value:
-            return datetime.strptime(value[:16], "%Y-%m-%d %H:%M")
-        return datetime.strptime(value[:10], "%Y-%m-%d")
-    except Exception:
-        return None
-
-
 def _generate_case_no() -> str:
     """生成唯一案卷编号。"""
     return f"CF{datetime.now().strftime('%Y%m%d%H%M%S')}{uuid.uuid4().hex[:8].upper()}"
@@ -175,10 +172,15 @@ async def import_case_files(
     db.add(task)
     await db.flush()
     task_id = task.id
+    # 先提交任务记录并归还连接，逐个文件调用 AI 期间不占用连接池
+    await db.commit()
+    tag_usage(import_task_id=task_id)
     logger.info(f"[案卷导入] 创建导入任务 task_id={task_id}, batch_name={batch_name}")
     total = 0
     success_count = 0
     failed_count = 0
+    created_cases: List[CaseFile] = []
+    deferred_cases: List[CaseFile] = []
     for idx, uf in enumerate(files):
         logger.info(f"[案卷导入] 处理第 {idx + 1}/{len(files)} 个文件: filename={uf.filename}")
         if not uf.filename:
@@ -219,18 +221,22 @@ async def import_case_files(
             failed_count += 1
             continue
         fields = {}
+        meta_data = {"import_task_id": task_id, "original_filename": uf.filename, "task_name": batch_name}
         try:
             logger.info(f"[案卷导入] 调用 AI 提取案卷字段，文本长度: {len(text)}")
-            result = qwen_service.extract_case_fields(text)
+            result = await case_field_extractor.extract(text)
             logger.info(f"[案卷导入] AI 提取结果: success={result.get('success')}, has_fields={bool(result.get('fields'))}")
-            if result.get("success") and isinstance(result.get("fields"), dict):
+            # 模型提取失败时 fields 可能仍含封面规则提取的字段，先行入库
+            if isinstance(result.get("fields"), dict):
                 fields = result["fields"]
-            else:
+            if not result.get("success"):
                 logger.warning(f"[案卷导入] AI 提取未返回有效 fields: {result.get('error', '')[:200]}")
+                if should_defer(result):
+                    meta_data = mark_deferred(meta_data, result.get("error", ""))
         except Exception as e:
             logger.warning(f"[案卷导入] AI 提取案卷字段异常: {e}", exc_info=True)
         case_no = _generate_case_no()
-        incident_time = _parse_incident_time(fields.get("incident_time"))
+        incident_time = parse_incident_time(fields.get("incident_time"))
         person_info = fields.get("person_info")
         if isinstance(person_info, dict):
             person_info = dict(person_info)
@@ -256,15 +262,19 @@ async def import_case_files(
             file_size=len(content),
             file_type=ext.lstrip("."),
             ocr_text=text,
-            meta_data={"import_task_id": task_id, "original_filename": uf.filename, "task_name": batch_name},
+            meta_data=meta_data,
             tags=[],
             classification_level1=fields.get("classification_level1"),
             classification_level2=fields.get("classification_level2"),
             classification_level3=fields.get("classification_level3"),
+            timeline=fields.get("timeline") or [],
             status="pending",
             created_by=current_user.id,
         )
         db.add(case_file)
+        created_cases.append(case_file)
+        if meta_data.get(EXTRACT_STATE_KEY):
+            deferred_cases.append(case_file)
         success_count += 1
         logger.info(f"[案卷导入] 已创建案卷 case_no={case_no}")
     task.total_files = total
@@ -273,6 +283,9 @@ async def import_case_files(
     task.status = "completed"
     logger.info(f"[案卷导入] 准备提交: total={total}, success={success_count}, failed={failed_count}")
     await db.commit()
+    for case_file in deferred_cases:
+        extraction_retry_queue.enqueue(case_file.id)
+    graph_indexer.enqueue_many(case_file.id for case_file in created_cases)
     logger.info("[案卷导入] 提交成功，返回响应")
     return ResponseModel.success(
         data={
@@ -286,11 +299,6 @@ async def import_case_files(
     )
 
 
-def _sse_message(data: dict) -> str:
-    """封装单条 SSE 数据行。"""
-    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
-
-
 @router.post(
     "/import/stream",
     summary="批量导入案卷（SSE 流式进度）",
@@ -298,6 +306,7 @@ def _sse_message(data: dict) -> str:
     tags=["案卷管理"]
 )
 async def import_case_files_stream(
+    request: Request,
     files: List[UploadFile] = File(...),
     task_name: Optional[str] = Query(None, description="任务名称/批次名称"),
     source_department: Optional[str] = Query(None, description="来源部门"),
@@ -329,18 +338,26 @@ async def import_case_files_stream(
     db.add(task)
     await db.flush()
     task_id = task.id
+    # 任务记录随请求会话提交；流式处理期间使用后台连接池，不占用请求连接
+    await db.commit()
+    # 流式处理在响应任务中执行，继承此处设置的用量标签
+    tag_usage(import_task_id=task_id)
     total = 0
     success_count = 0
     failed_count = 0
     file_count = len(files)
+    writer_key = client_key(request)
 
     async def _stream():
         nonlocal total, success_count, failed_count
+        bg_db = BackgroundSessionLocal()
+        created_cases: List[CaseFile] = []
+        deferred_cases: List[CaseFile] = []
         try:
             for idx, uf in enumerate(files):
                 if not uf.filename:
                     failed_count += 1
-                    yield _sse_message({
+                    yield sse_frame({
                         "stage": "complete", "fileIndex": idx, "fileName": uf.filename or "",
                         "success": False, "total": file_count, "reason": "无文件名"
                     })
@@ -348,35 +365,35 @@ async def import_case_files_stream(
                 ext = os.path.splitext(uf.filename)[1].lower()
                 if ext not in ALLOWED_IMPORT_EXTENSIONS:
                     failed_count += 1
-                    yield _sse_message({
+                    yield sse_frame({
                         "stage": "complete", "fileIndex": idx, "fileName": uf.filename,
                         "success": False, "total": file_count, "reason": f"不支持格式 {ext}"
                     })
                     continue
                 total += 1
                 # 阶段1：上传（读取文件）
-                yield _sse_message({
+                yield sse_frame({
                     "stage": "upload", "fileIndex": idx, "fileName": uf.filename,
                     "total": file_count
                 })
                 content = await uf.read()
-                yield _sse_message({
+                yield sse_frame({
                     "stage": "upload", "fileIndex": idx, "fileName": uf.filename,
                     "progress": 100, "total": file_count
                 })
                 if len(content) > MAX_FILE_SIZE or len(content) == 0:
                     failed_count += 1
-                    yield _sse_message({
+                    yield sse_frame({
                         "stage": "complete", "fileIndex": idx, "fileName": uf.filename,
                         "success": False, "total": file_count
                     })
                     continue
                 # 阶段2：解析内容
-                yield _sse_message({
+                yield sse_frame({
                     "stage": "parse", "fileIndex": idx, "fileName": uf.filename, "total": file_count
                 })
                 text = _extract_text_from_file(content, uf.filename)
-                yield _sse_message({
+                yield sse_frame({
                     "stage": "parse", "fileIndex": idx, "fileName": uf.filename,
                     "progress": 100, "total": file_count
                 })
@@ -391,29 +408,44 @@ async def import_case_files_stream(
                 except Exception as e:
                     logger.error(f"[案卷导入] 保存上传文件失败: {e}")
                     failed_count += 1
-                    yield _sse_message({
+                    yield sse_frame({
                         "stage": "complete", "fileIndex": idx, "fileName": uf.filename,
                         "success": False, "total": file_count
                     })
                     continue
                 # 阶段3：智能分析（AI 提取）
-                yield _sse_message({
+                yield sse_frame({
                     "stage": "analyze", "fileIndex": idx, "fileName": uf.filename, "total": file_count
                 })
                 fields = {}
+                meta_data = {"import_task_id": task_id, "original_filename": uf.filename, "task_name": batch_name}
                 try:
-                    result = qwen_service.extract_case_fields(text)
-                    if result.get("success") and isinstance(result.get("fields"), dict):
+                    # 流式提取：每个字段识别完成即推送，不必等待全部字段
+                    result = {}
+                    fields_done = 0
+                    async for event in case_field_extractor.extract_stream(text):
+                        if "result" in event:
+                            result = event["result"]
+                            continue
+                        fields_done += 1
+                        yield sse_frame({
+                            "stage": "analyze", "fileIndex": idx, "fileName": uf.filename, "total": file_count,
+                            "field": event["field"], "value": event["value"],
+                            "progress": min(99, fields_done * 100 // EXTRACT_FIELD_COUNT),
+                        })
+                    if isinstance(result.get("fields"), dict):
                         fields = result["fields"]
+                    if should_defer(result):
+                        meta_data = mark_deferred(meta_data, result.get("error", ""))
                 except Exception as e:
                     logger.warning(f"[案卷导入] AI 提取异常: {e}", exc_info=True)
-                yield _sse_message({
+                yield sse_frame({
                     "stage": "analyze", "fileIndex": idx, "fileName": uf.filename,
                     "progress": 100, "total": file_count
                 })
                 # 阶段4：完成（写入案卷）
                 case_no = _generate_case_no()
-                incident_time = _parse_incident_time(fields.get("incident_time"))
+                incident_time = parse_incident_time(fields.get("incident_time"))
                 person_info = fields.get("person_info")
                 if isinstance(person_info, dict):
                     person_info = dict(person_info)
@@ -439,26 +471,39 @@ async def import_case_files_stream(
                     file_size=len(content),
                     file_type=ext.lstrip("."),
                     ocr_text=text,
-                    meta_data={"import_task_id": task_id, "original_filename": uf.filename, "task_name": batch_name},
+                    meta_data=meta_data,
                     tags=[],
                     classification_level1=fields.get("classification_level1"),
                     classification_level2=fields.get("classification_level2"),
                     classification_level3=fields.get("classification_level3"),
+                    timeline=fields.get("timeline") or [],
                     status="pending",
                     created_by=current_user.id,
                 )
-                db.add(case_file)
+                # 仅加入会话，不产生 SQL；最后统一提交，AI 分析期间不持有连接
+                bg_db.add(case_file)
+                created_cases.append(case_file)
+                if meta_data.get(EXTRACT_STATE_KEY):
+                    deferred_cases.append(case_file)
                 success_count += 1
-                yield _sse_message({
+                yield sse_frame({
                     "stage": "complete", "fileIndex": idx, "fileName": uf.filename,
-                    "success": True, "total": file_count
+                    "success": True, "total": file_count,
+                    # AI 服务暂不可用时先入库，字段稍后在后台重新提取
+                    "deferred": bool(meta_data.get(EXTRACT_STATE_KEY)),
                 })
-            task.total_files = total
-            task.success_files = success_count
-            task.failed_files = failed_count
-            task.status = "completed"
-            await db.commit()
-            yield _sse_message({
+            bg_task = await bg_db.get(ImportTask, task_id)
+            bg_task.total_files = total
+            bg_task.success_files = success_count
+            bg_task.failed_files = failed_count
+            bg_task.status = "completed"
+            await bg_db.commit()
+            for case_file in deferred_cases:
+                extraction_retry_queue.enqueue(case_file.id)
+            graph_indexer.enqueue_many(case_file.id for case_file in created_cases)
+            # 案卷在后台会话中写入，需单独记录以保证随后的列表查询读到主库
+            read_router.mark_write(writer_key)
+            yield sse_frame({
                 "event": "task_done",
                 "task_id": task_id,
                 "total_files": total,
@@ -468,24 +513,41 @@ async def import_case_files_stream(
             })
         except Exception as e:
             logger.exception("[案卷导入] SSE 流处理异常")
-            yield _sse_message({"event": "error", "message": str(e)})
-            await db.rollback()
+            yield sse_frame({"event": "error", "message": str(e)})
+            await bg_db.rollback()
+        finally:
+            await bg_db.close()
+
+    return sse_response(_stream(), request)
 
-    return StreamingResponse(
-        _stream(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no",
-        },
-    )
+
+def _case_file_to_list_item(case_file: CaseFile) -> dict:
+    """将 CaseFile 转为案卷列表项。"""
+    return {
+        "id": case_file.id,
+        "caseNo": case_file.case_no,
+        "caseName": case_file.case_name or "",
+        "title": case_file.title or "",
+        "caseType": case_file.case_type or "",
+        "sourceDepartment": case_file.source_department or "",
+        "incidentTime": case_file.incident_time.isoformat() if case_file.incident_time else None,
+        "personName": case_file.person_name or "",
+        "status": case_file.status,
+        "createdAt": case_file.created_at.isoformat() if case_file.created_at else None,
+        "updatedAt": case_file.updated_at.isoformat() if case_file.updated_at else None,
+        "fileSize": case_file.file_size,
+        "fileType": case_file.file_type,
+        "classificationLevel1": case_file.classification_level1,
+        "classificationLevel2": case_file.classification_level2,
+        "classificationLevel3": case_file.classification_level3,
+        "tags": case_file.tags or []
+    }
 
 
 @router.get(
     "/list",
     summary="获取案卷列表",
-    description="分页查询案卷列表，支持关键词搜索、类型筛选、状态筛选",
+    description="分页查询案卷列表，支持关键词搜索、类型筛选、状态筛选；stream=true 时以 NDJSON 流式返回全部结果",
     tags=["案卷管理"]
 )
 async def get_case_file_list(
@@ -494,7 +556,8 @@ async def get_case_file_list(
     status: Optional[str] = Query(None, description="状态"),
     page: int = Query(1, ge=1, description="页码"),
     page_size: int = Query(20, ge=1, le=100, description="每页数量"),
-    db: AsyncSession = Depends(get_db),
+    stream: bool = Query(False, description="是否以 NDJSON 流式返回全部匹配结果（忽略分页）"),
+    db: AsyncSession = Depends(get_read_db),
     token: str = Depends(oauth2_scheme)
 ):
     """
@@ -505,6 +568,7 @@ async def get_case_file_list(
     - **status**: 状态筛选（pending/processing/completed/failed）
     - **page**: 页码，从1开始
     - **page_size**: 每页数量，最大100
+    - **stream**: 为 true 时按服务端游标逐批输出全部结果，每行一个 JSON 对象
     
     返回分页的案卷列表
     """
@@ -528,6 +592,16 @@ async def get_case_file_list(
         if status:
             conditions.append(CaseFile.status == status)
         
+        # 列表查询（列表项不含 OCR 文本，延迟加载该大字段）
+        query = select(CaseFile).options(defer(CaseFile.ocr_text))
+        if conditions:
+            query = query.where(and_(*conditions))
+        
+        query = query.order_by(CaseFile.created_at.desc())
+        
+        if stream:
+            return ndjson_response(query, _case_file_to_list_item)
+        
         # 总数查询
         count_query = select(func.count()).select_from(CaseFile)
         if conditions:
@@ -536,40 +610,13 @@ async def get_case_file_list(
         total_result = await db.execute(count_query)
         total = total_result.scalar() or 0
         
-        # 列表查询
-        query = select(CaseFile)
-        if conditions:
-            query = query.where(and_(*conditions))
-        
-        query = query.order_by(CaseFile.created_at.desc())
         query = query.offset((page - 1) * page_size).limit(page_size)
         
         result = await db.execute(query)
         case_files = result.scalars().all()
         
         # 转换为响应格式
-        case_file_list = []
-        for case_file in case_files:
-            case_file_dict = {
-                "id": case_file.id,
-                "caseNo": case_file.case_no,
-                "caseName": case_file.case_name or "",
-                "title": case_file.title or "",
-                "caseType": case_file.case_type or "",
-                "sourceDepartment": case_file.source_department or "",
-                "incidentTime": case_file.incident_time.isoformat() if case_file.incident_time else None,
-                "personName": case_file.person_name or "",
-                "status": case_file.status,
-                "createdAt": case_file.created_at.isoformat() if case_file.created_at else None,
-                "updatedAt": case_file.updated_at.isoformat() if case_file.updated_at else None,
-                "fileSize": case_file.file_size,
-                "fileType": case_file.file_type,
-                "classificationLevel1": case_file.classification_level1,
-                "classificationLevel2": case_file.classification_level2,
-                "classificationLevel3": case_file.classification_level3,
-                "tags": case_file.tags or []
-            }
-            case_file_list.append(case_file_dict)
+        case_file_list = [_case_file_to_list_item(case_file) for case_file in case_files]
         
         # 使用统一的响应封装
         return ResponseModel.paginated(
@@ -593,7 +640,7 @@ async def get_case_file_list(
 )
 async def get_case_file_detail(
     case_file_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     token: str = Depends(oauth2_scheme)
 ):
     """
@@ -669,39 +716,6 @@ async def get_case_file_detail(
         raise HTTPException(status_code=500, detail=str(e))
 
 
-def _apply_extracted_fields_to_case_file(case_file: CaseFile, fields: dict) -> None:
-    """将 AI 提取的 fields 写入 CaseFile 对象（不提交事务）。"""
-    incident_time = _parse_incident_time(fields.get("incident_time"))
-    person_info = fields.get("person_info")
-    if isinstance(person_info, dict):
-        person_info = dict(person_info)
-    else:
-        person_info = {}
-    case_file.case_name = fields.get("case_name") or case_file.case_name
-    case_file.title = fields.get("title") or case_file.title
-    case_file.case_type = fields.get("case_type") or case_file.case_type
-    case_file.source_department = fields.get("source_department") or case_file.source_department
-    if incident_time is not None:
-        case_file.incident_time = incident_time
-    case_file.person_name = fields.get("person_name") or case_file.person_name
-    case_file.person_info = person_info
-    case_file.charge = fields.get("charge") or case_file.charge
-    case_file.suicide_method = fields.get("suicide_method") or case_file.suicide_method
-    case_file.incident_process = fields.get("incident_process") or case_file.incident_process
-    case_file.investigation_process_and_conclusion = (
-        fields.get("investigation_process_and_conclusion") or case_file.investigation_process_and_conclusion
-    )
-    case_file.cause_and_lesson = fields.get("cause_and_lesson") or case_file.cause_and_lesson
-    case_file.case_filing = fields.get("case_filing") or case_file.case_filing
-    case_file.judgment = fields.get("judgment") or case_file.judgment
-    if fields.get("classification_level1") is not None:
-        case_file.classification_level1 = fields.get("classification_level1")
-    if fields.get("classification_level2") is not None:
-        case_file.classification_level2 = fields.get("classification_level2")
-    if fields.get("classification_level3") is not None:
-        case_file.classification_level3 = fields.get("classification_level3")
-
-
 @router.post(
     "/re-extract/{case_file_id}",
     summary="AI 重新生成案卷字段",
@@ -733,15 +747,21 @@ async def re_extract_case_file(
             if not (text and text.strip()):
                 raise HTTPException(status_code=400, detail="案卷无可用文本，无法重新提取")
         logger.info(f"[案卷重新提取] case_file_id={case_file_id}, 文本长度={len(text)}")
-        result = qwen_service.extract_case_fields(text)
+        # 结束读事务归还连接，等待 AI 提取期间不占用连接池
+        await db.commit()
+        result = await case_field_extractor.extract(text)
         if not result.get("success") or not isinstance(result.get("fields"), dict):
             raise HTTPException(
-                status_code=422,
+                # AI 服务熔断中返回 503，前端可稍后重试
+                status_code=503 if result.get("circuitOpen") else 422,
                 detail=result.get("error", "AI 提取失败，请稍后重试"),
             )
         fields = result["fields"]
-        _apply_extracted_fields_to_case_file(case_file, fields)
+        apply_extracted_fields(case_file, fields)
+        if (case_file.meta_data or {}).get(EXTRACT_STATE_KEY):
+            case_file.meta_data = clear_deferred(case_file.meta_data)
         await db.commit()
+        graph_indexer.enqueue(case_file_id)
         await db.refresh(case_file)
         # 返回与审核列表项一致的 extractedData 结构
         pi = case_file.person_info or {}
@@ -766,7 +786,7 @@ async def re_extract_case_file(
             "judgment": case_file.judgment or "",
         }
         return ResponseModel.success(
-            data={"extractedData": extracted_data},
+            data={"extractedData": extracted_data, "conflicts": result.get("conflicts") or {}},
             message="已根据文档重新生成字段",
         )
     except HTTPException:
@@ -818,6 +838,62 @@ async def get_case_file_file(
     return FileResponse(path, filename=filename)
 
 
+def _case_file_to_search_item(case_file: CaseFile, keyword: str) -> dict:
+    """将 CaseFile 转为检索结果项（含相关性与匹配片段）。"""
+    # 计算相关性（简单算法：关键词出现次数）
+    relevance = 0
+    fragments = []
+    
+    if case_file.case_name and keyword.lower() in case_file.case_name.lower():
+        relevance += 15
+        # 提取匹配片段
+        idx = case_file.case_name.lower().find(keyword.lower())
+        start = max(0, idx - 20)
+        end = min(len(case_file.case_name), idx + len(keyword) + 20)
+        fragments.append(case_file.case_name[start:end])
+    
+    if case_file.title and keyword.lower() in case_file.title.lower():
+        relevance += 10
+        # 提取匹配片段
+        idx = case_file.title.lower().find(keyword.lower())
+        start = max(0, idx - 20)
+        end = min(len(case_file.title), idx + len(keyword) + 20)
+        fragments.append(case_file.title[start:end])
+    
+    if case_file.ocr_text and keyword.lower() in case_file.ocr_text.lower():
+        relevance += 5
+        # 提取匹配片段（最多3个）
+        text_lower = case_file.ocr_text.lower()
+        keyword_lower = keyword.lower()
+        idx = 0
+        fragment_count = 0
+        while idx < len(text_lower) and fragment_count < 3:
+            idx = text_lower.find(keyword_lower, idx)
+            if idx == -1:
+                break
+            start = max(0, idx - 30)
+            end = min(len(case_file.ocr_text), idx + len(keyword) + 30)
+            fragments.append(case_file.ocr_text[start:end].strip())
+            idx += len(keyword_lower)
+            fragment_count += 1
+    
+    relevance_score = min(100, relevance * 10)
+    
+    return {
+        "id": case_file.id,
+        "caseNo": case_file.case_no,
+        "caseName": case_file.case_name or "",
+        "title": case_file.title or "",
+        "caseType": case_file.case_type or "",
+        "sourceDepartment": case_file.source_department or "",
+        "date": case_file.created_at.isoformat() if case_file.created_at else None,
+        "relevance": min(5, relevance // 2),  # 转换为1-5星
+        "relevanceScore": f"{relevance_score}%",
+        "fragments": fragments[:3],  # 最多返回3个片段
+        "tags": case_file.tags or []
+    }
+
+
 @router.post(
     "/search",
     summary="全文检索",
@@ -833,7 +909,8 @@ async def search_case_files(
     sort_by: Optional[str] = Query("relevance", description="排序: relevance/time/title"),
     page: int = Query(1, ge=1, description="页码"),
     page_size: int = Query(20, ge=1, le=100, description="每页数量"),
-    db: AsyncSession = Depends(get_db),
+    stream: bool = Query(False, description="是否以 NDJSON 流式返回全部匹配结果（忽略分页）"),
+    db: AsyncSession = Depends(get_read_db),
     token: str = Depends(oauth2_scheme)
 ):
     """
@@ -843,6 +920,7 @@ async def search_case_files(
     - **search_mode**: 搜索模式（模糊/精确）
     - **search_scope**: 搜索范围（title,content,metadata,tags）
     - **sort_by**: 排序方式（relevance/time/title）
+    - **stream**: 为 true 时按服务端游标逐批输出全部结果，每行一个 JSON 对象
     
     对案卷的卷宗名、标题、OCR文本、元数据进行全文检索，
     返回按相关性排序的结果
@@ -881,14 +959,6 @@ async def search_case_files(
         if department:
             conditions.append(CaseFile.source_department == department)
         
-        # 查询总数
-        count_query = select(func.count()).select_from(CaseFile)
-        if conditions:
-            count_query = count_query.where(and_(*conditions))
-        
-        total_result = await db.execute(count_query)
-        total = total_result.scalar() or 0
-        
         # 查询列表
         query = select(CaseFile)
         if conditions:
@@ -902,6 +972,18 @@ async def search_case_files(
         else:  # relevance - 默认按创建时间倒序
             query = query.order_by(CaseFile.created_at.desc())
         
+        if stream:
+            # 流式模式逐条输出，相关性只随结果返回，不做全局重排
+            return ndjson_response(query, lambda case_file: _case_file_to_search_item(case_file, keyword))
+        
+        # 查询总数
+        count_query = select(func.count()).select_from(CaseFile)
+        if conditions:
+            count_query = count_query.where(and_(*conditions))
+        
+        total_result = await db.execute(count_query)
+        total = total_result.scalar() or 0
+        
         # 分页
         query = query.offset((page - 1) * page_size).limit(page_size)
         
@@ -909,61 +991,7 @@ async def search_case_files(
         case_files = result.scalars().all()
         
         # 构建搜索结果（包含匹配片段）
-        results = []
-        for case_file in case_files:
-            # 计算相关性（简单算法：关键词出现次数）
-            relevance = 0
-            fragments = []
-            
-            if case_file.case_name and keyword.lower() in case_file.case_name.lower():
-                relevance += 15
-                # 提取匹配片段
-                idx = case_file.case_name.lower().find(keyword.lower())
-                start = max(0, idx - 20)
-                end = min(len(case_file.case_name), idx + len(keyword) + 20)
-                fragments.append(case_file.case_name[start:end])
-            
-            if case_file.title and keyword.lower() in case_file.title.lower():
-                relevance += 10
-                # 提取匹配片段
-                idx = case_file.title.lower().find(keyword.lower())
-                start = max(0, idx - 20)
-                end = min(len(case_file.title), idx + len(keyword) + 20)
-                fragments.append(case_file.title[start:end])
-            
-            if case_file.ocr_text and keyword.lower() in case_file.ocr_text.lower():
-                relevance += 5
-                # 提取匹配片段（最多3个）
-                text_lower = case_file.ocr_text.lower()
-                keyword_lower = keyword.lower()
-                idx = 0
-                fragment_count = 0
-                while idx < len(text_lower) and fragment_count < 3:
-                    idx = text_lower.find(keyword_lower, idx)
-                    if idx == -1:
-                        break
-                    start = max(0, idx - 30)
-                    end = min(len(case_file.ocr_text), idx + len(keyword) + 30)
-                    fragments.append(case_file.ocr_text[start:end].strip())
-                    idx += len(keyword_lower)
-                    fragment_count += 1
-            
-            relevance_score = min(100, relevance * 10)
-            
-            case_file_dict = {
-                "id": case_file.id,
-                "caseNo": case_file.case_no,
-                "caseName": case_file.case_name or "",
-                "title": case_file.title or "",
-                "caseType": case_file.case_type or "",
-                "sourceDepartment": case_file.source_department or "",
-                "date": case_file.created_at.isoformat() if case_file.created_at else None,
-                "relevance": min(5, relevance // 2),  # 转换为1-5星
-                "relevanceScore": f"{relevance_score}%",
-                "fragments": fragments[:3],  # 最多返回3个片段
-                "tags": case_file.tags or []
-            }
-            results.append(case_file_dict)
+        results = [_case_file_to_search_item(case_file, keyword) for case_file in case_files]
         
         # 按相关性排序
         if sort_by == "relevance":
@@ -1066,6 +1094,8 @@ async def delete_case_file(
         
         await db.delete(case_file)
         await db.commit()
+        # 从知识图谱移除该案件及其关系来源
+        graph_indexer.enqueue(case_file_id)
         
         # 使用统一的响应封装
         return ResponseModel.success(message="删除成功", data={})
@@ -8,7 +8,7 @@ from fastapi import APIRouter, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func, and_
 
-from app.core.database import get_db
+from app.core.database import get_read_db
 from app.core.response import ResponseModel
 from app.core.security import require_admin
 from app.models.user import User
@@ -43,7 +43,7 @@ async def get_audit_log_list(
     status: Optional[str] = Query(None, description="结果状态: success/failure"),
     page: int = Query(1, ge=1, description="页码"),
     page_size: int = Query(20, ge=1, le=100, alias="pageSize", description="每页条数"),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: User = Depends(require_admin),
 ):
     """
@@ -9,10 +9,14 @@ from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel
 from sqlalchemy import select, and_, or_, func
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import defer
 
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
 from app.core.response import ResponseModel
+from app.core.streaming import ndjson_response
 from app.models.archive import CaseFile
+from app.services.extraction_retry import EXTRACT_STATE_KEY, clear_deferred
+from app.services.graph_indexer import graph_indexer
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
@@ -71,7 +75,7 @@ async def get_pending_classifications(
     page_size: int = Query(20, ge=1, le=100, description="每页数量"),
     keyword: Optional[str] = Query(None, description="搜索卷宗名称/案卷编号"),
     status: Optional[str] = Query(None, description="状态：pending=待审核，failed=审核失败，archived=已入库，空=仅待审核+审核失败"),
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     token: str = Depends(oauth2_scheme)
 ):
     """获取卷宗审核列表。空=仅待审核与审核失败（不包含已入库）；pending=待审核；failed=审核失败；archived=已入库。"""
@@ -128,7 +132,7 @@ async def get_pending_classifications(
     tags=["智能分类"]
 )
 async def get_classification_tree(
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     token: str = Depends(oauth2_scheme)
 ):
     """获取分类树"""
@@ -232,6 +236,7 @@ async def confirm_classification(
         case_file.classification_level2 = classification.get("level2")
         case_file.classification_level3 = classification.get("level3")
         await db.commit()
+        graph_indexer.enqueue(case_file_id)
         return ResponseModel.success(message="分类已确认", data={})
     except HTTPException:
         raise
@@ -327,7 +332,11 @@ async def save_review(
             case_file.classification_level3 = body.classification.get("level3")
         if body.tags is not None:
             case_file.tags = body.tags
+        # 人工审核后不再后台重新提取，避免覆盖修改
+        if (case_file.meta_data or {}).get(EXTRACT_STATE_KEY):
+            case_file.meta_data = clear_deferred(case_file.meta_data)
         await db.commit()
+        graph_indexer.enqueue(case_file_id)
         return ResponseModel.success(message="审核已保存", data={})
     except HTTPException:
         raise
@@ -391,7 +400,10 @@ async def confirm_archive(
         if body.tags is not None:
             case_file.tags = body.tags
         case_file.status = "completed"
+        if (case_file.meta_data or {}).get(EXTRACT_STATE_KEY):
+            case_file.meta_data = clear_deferred(case_file.meta_data)
         await db.commit()
+        graph_indexer.enqueue(case_file_id)
         return ResponseModel.success(message="卷宗已入库", data={})
     except HTTPException:
         raise
@@ -426,6 +438,7 @@ async def batch_confirm_classification(
             updated_count += 1
         
         await db.commit()
+        graph_indexer.enqueue_many(case_file.id for case_file in case_files)
         
         return {
             "errorCode": 0,
@@ -437,17 +450,31 @@ async def batch_confirm_classification(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _case_file_to_category_item(case_file: CaseFile) -> dict:
+    """将 CaseFile 转为分类下案卷列表项。"""
+    return {
+        "id": case_file.id,
+        "caseNo": case_file.case_no,
+        "caseName": case_file.case_name or "",
+        "title": case_file.title or "",
+        "sourceDepartment": case_file.source_department or "",
+        "tags": case_file.tags or [],
+        "createdAt": case_file.created_at.isoformat() if case_file.created_at else None
+    }
+
+
 @router.get(
     "/case-files/{classification_id}",
     summary="获取指定分类下的案卷",
-    description="根据分类ID获取该分类下的所有案卷",
+    description="根据分类ID获取该分类下的所有案卷；stream=true 时以 NDJSON 流式返回整类案卷",
     tags=["智能分类"]
 )
 async def get_case_files_by_classification(
     classification_id: str,
     page: int = Query(1, ge=1, description="页码"),
     page_size: int = Query(20, ge=1, le=100, description="每页数量"),
-    db: AsyncSession = Depends(get_db),
+    stream: bool = Query(False, description="是否以 NDJSON 流式返回该分类下全部案卷（忽略分页）"),
+    db: AsyncSession = Depends(get_read_db),
     token: str = Depends(oauth2_scheme)
 ):
     """根据分类获取案卷列表"""
@@ -468,29 +495,23 @@ async def get_case_files_by_classification(
             conditions.append(CaseFile.classification_level2 == parts[2])
             conditions.append(CaseFile.classification_level3 == parts[3])
         
+        # 列表项不含 OCR 文本，延迟加载该大字段
+        query = select(CaseFile).options(defer(CaseFile.ocr_text)).where(and_(*conditions))
+        query = query.order_by(CaseFile.created_at.desc())
+        
+        if stream:
+            return ndjson_response(query, _case_file_to_category_item)
+        
         count_query = select(func.count()).select_from(CaseFile).where(and_(*conditions))
         total_result = await db.execute(count_query)
         total = total_result.scalar() or 0
         
-        query = select(CaseFile).where(and_(*conditions))
-        query = query.order_by(CaseFile.created_at.desc())
         query = query.offset((page - 1) * page_size).limit(page_size)
         
         result = await db.execute(query)
         case_files = result.scalars().all()
         
-        case_file_list = []
-        for case_file in case_files:
-            case_file_dict = {
-                "id": case_file.id,
-                "caseNo": case_file.case_no,
-                "caseName": case_file.case_name or "",
-                "title": case_file.title or "",
-                "sourceDepartment": case_file.source_department or "",
-                "tags": case_file.tags or [],
-                "createdAt": case_file.created_at.isoformat() if case_file.created_at else None
-            }
-            case_file_list.append(case_file_dict)
+        case_file_list = [_case_file_to_category_item(case_file) for case_file in case_files]
         
         return {
             "errorCode": 0,
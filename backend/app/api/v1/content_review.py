@@ -3,14 +3,14 @@
 上传公文 docx，由系统分析错别字、用词不当、不符合政府/部队公文写法等问题，并给出修改意见
 支持 SSE 流式输出，以 Markdown 格式返回修改建议
 """
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, File, Request, UploadFile
 from fastapi.security import OAuth2PasswordBearer
 from loguru import logger
 import io
-import json
 
-from app.services.qwen_service import qwen_service
+from app.core.serialization import sse_frame, SSE_DONE
+from app.core.sse import sse_response
+from app.services.content_review import content_reviewer
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
@@ -50,6 +50,7 @@ async def review_document(
 
     - 上传一份 .docx 格式的公文
     - 系统提取正文后，由审稿规则检查：错别字、用词不当、公文规范
+    - 长公文按段落分段并发审查，问题按原文顺序合并去重
     - 返回问题列表及修改建议，以及总体评价
     """
     if not file.filename or not file.filename.lower().endswith(".docx"):
@@ -71,7 +72,7 @@ async def review_document(
             }
         }
 
-    result = qwen_service.review_document_content(text)
+    result = await content_reviewer.review(text)
     if not result.get("success"):
         error_msg = result.get("error", "审查服务暂时不可用")
         raise HTTPException(status_code=500, detail=error_msg)
@@ -94,6 +95,7 @@ async def review_document(
     tags=["内容审查"]
 )
 async def review_document_stream(
+    request: Request,
     file: UploadFile = File(..., description="待审查的 .docx 公文文件"),
     token: str = Depends(oauth2_scheme)
 ):
@@ -102,6 +104,7 @@ async def review_document_stream(
 
     - 上传一份 .docx 格式的公文
     - 系统提取正文后，以 Markdown 格式流式输出：总体评价、问题与修改建议
+    - 长公文分段并发审查，按原文顺序逐段推送问题，最后输出总体评价
     - 客户端通过 EventSource 或 fetch + ReadableStream 接收
     """
     if not file.filename or not file.filename.lower().endswith(".docx"):
@@ -119,29 +122,13 @@ async def review_document_stream(
     if not text.strip():
         empty_msg = "文档中未提取到正文内容，请确认文件内是否有文字。\n\n"
         async def _empty_stream():
-            yield f"data: {json.dumps({'content': empty_msg})}\n\n"
-            yield f"data: {json.dumps({'done': True})}\n\n"
-
-        return StreamingResponse(
-            _empty_stream(),
-            media_type="text/event-stream",
-            headers={
-                "Cache-Control": "no-cache",
-                "Connection": "keep-alive",
-                "X-Accel-Buffering": "no"
-            }
-        )
+            yield sse_frame({'content': empty_msg})
+            yield SSE_DONE
+
+        return sse_response(_empty_stream(), request)
 
     async def _generate():
-        async for chunk in qwen_service.review_document_content_stream(text):
+        async for chunk in content_reviewer.review_stream(text):
             yield chunk
 
-    return StreamingResponse(
-        _generate(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no"
-        }
-    )
+    return sse_response(_generate(), request)
@@ -9,9 +9,12 @@ from typing import Optional, List, Dict, Any
 from datetime import datetime
 from loguru import logger
 import asyncio
-import json
+import hashlib
 
+from app.core.config import settings
 from app.core.security import decode_access_token
+from app.core.serialization import sse_frame
+from app.core.sse_sessions import resumable_sse_response, session_response, stream_sessions
 
 from app.services.qwen_service import qwen_service
 from app.services.official_doc import official_doc_service
@@ -36,6 +39,17 @@ class DocGenerateResponse(BaseModel):
     data: dict
 
 
+def _stream_owner(token: str) -> str:
+    """生成会话所属用户（只能续传自己发起的生成）；token 无法解析时按 token 摘要区分"""
+    try:
+        subject = decode_access_token(token).get("sub")
+        if subject:
+            return str(subject)
+    except HTTPException:
+        pass
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
 @router.post(
     "/generate",
     summary="生成文档",
@@ -224,6 +238,7 @@ class MeetingGenerateRequest(BaseModel):
 )
 async def generate_case_document(
     request: CaseDocumentGenerateRequest,
+    http_request: Request,
     token: str = Depends(oauth2_scheme)
 ):
     """
@@ -252,18 +267,9 @@ async def generate_case_document(
 
         except Exception as e:
             logger.error(f"生成案件卷宗时发生异常: {str(e)}")
-            import json
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+            yield sse_frame({'error': str(e)})
 
-    return StreamingResponse(
-        generate(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no"
-        }
-    )
+    return resumable_sse_response(http_request, _stream_owner(token), generate)
 
 
 @router.post(
@@ -274,6 +280,7 @@ async def generate_case_document(
 )
 async def generate_official_document(
     request: OfficialDocumentGenerateRequest,
+    http_request: Request,
     token: str = Depends(oauth2_scheme)
 ):
     """
@@ -302,18 +309,9 @@ async def generate_official_document(
 
         except Exception as e:
             logger.error(f"生成公文时发生异常: {str(e)}")
-            import json
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+            yield sse_frame({'error': str(e)})
 
-    return StreamingResponse(
-        generate(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no"
-        }
-    )
+    return resumable_sse_response(http_request, _stream_owner(token), generate)
 
 
 @router.post(
@@ -324,6 +322,7 @@ async def generate_official_document(
 )
 async def generate_report_document(
     request: ReportGenerateRequest,
+    http_request: Request,
     token: str = Depends(oauth2_scheme)
 ):
     """
@@ -354,18 +353,9 @@ async def generate_report_document(
 
         except Exception as e:
             logger.error(f"生成报告时发生异常: {str(e)}")
-            import json
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+            yield sse_frame({'error': str(e)})
 
-    return StreamingResponse(
-        generate(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no"
-        }
-    )
+    return resumable_sse_response(http_request, _stream_owner(token), generate)
 
 
 @router.post(
@@ -376,6 +366,7 @@ async def generate_report_document(
 )
 async def generate_story_document(
     request: StoryGenerateRequest,
+    http_request: Request,
     token: str = Depends(oauth2_scheme)
 ):
     """
@@ -400,18 +391,9 @@ async def generate_story_document(
                 yield chunk
         except Exception as e:
             logger.error(f"生成警示小故事时发生异常: {str(e)}")
-            import json
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+            yield sse_frame({'error': str(e)})
 
-    return StreamingResponse(
-        generate(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no"
-        }
-    )
+    return resumable_sse_response(http_request, _stream_owner(token), generate)
 
 
 @router.post(
@@ -422,6 +404,7 @@ async def generate_story_document(
 )
 async def generate_meeting_document(
     request: MeetingGenerateRequest,
+    http_request: Request,
     token: str = Depends(oauth2_scheme)
 ):
     """
@@ -454,18 +437,9 @@ async def generate_meeting_document(
                 yield chunk
         except Exception as e:
             logger.error(f"生成会议纪要时发生异常: {str(e)}")
-            import json
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+            yield sse_frame({'error': str(e)})
 
-    return StreamingResponse(
-        generate(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no"
-        }
-    )
+    return resumable_sse_response(http_request, _stream_owner(token), generate)
 
 
 # ========== 新增：国标公文格式相关 API ==========
@@ -483,6 +457,30 @@ class AssembleDocxRequest(BaseModel):
     sections: Dict[str, str] = Field(..., description="分段内容字典")
     form_data: Dict[str, Any] = Field(default_factory=dict, description="表单数据")
 
+    def to_content(self) -> Dict[str, Any]:
+        """合并 sections 和 form_data 为完整内容"""
+        return {
+            **self.form_data,
+            **self.sections
+        }
+
+
+class BatchAssembleDocxRequest(BaseModel):
+    """批量组装 docx 请求"""
+    items: List[AssembleDocxRequest] = Field(..., min_length=1, description="待组装公文列表")
+
+
+class MergeAssembleDocxRequest(BaseModel):
+    """批量套打请求：一份公共内容 + 每份的字段覆盖"""
+    doc_type: str = Field(..., description="公文类型：request/report/notice/memo/meeting_minutes")
+    sections: Dict[str, str] = Field(default_factory=dict, description="公共分段内容，可包含 {{字段名}} 占位符")
+    form_data: Dict[str, Any] = Field(default_factory=dict, description="表单数据")
+    recipients: List[Dict[str, Any]] = Field(
+        ..., min_length=1, description="每份公文的字段覆盖，如 {\"recipient\": \"一营\"}"
+    )
+    generate: bool = Field(True, description="是否用 AI 生成 sections 中缺少的段落（只生成一次，所有份数共用）")
+    filename_field: str = Field("recipient", description="用于命名 docx 文件的字段")
+
 
 @router.get(
     "/structure/{doc_type}",
@@ -517,6 +515,7 @@ async def get_document_structure(
 )
 async def generate_official_content(
     request: GenerateContentRequest,
+    http_request: Request,
     token: str = Depends(oauth2_scheme),
 ):
     """
@@ -536,18 +535,9 @@ async def generate_official_content(
                 yield chunk
         except Exception as e:
             logger.error(f"生成公文内容时发生异常: {str(e)}")
-            import json
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+            yield sse_frame({'error': str(e)})
 
-    return StreamingResponse(
-        generate(),
-        media_type="text/event-stream",
-        headers={
-            "Cache-Control": "no-cache",
-            "Connection": "keep-alive",
-            "X-Accel-Buffering": "no"
-        }
-    )
+    return resumable_sse_response(http_request, _stream_owner(token), generate)
 
 
 @router.post(
@@ -567,28 +557,128 @@ async def assemble_official_docx(
     - **sections**: 分段内容字典
     - **form_data**: 表单数据
 
-    返回任务 ID，可通过任务 ID 下载 docx
+    返回任务 ID 及耗时指标，可通过任务 ID 下载 docx
     """
     try:
-        # 合并 sections 和 form_data 为完整内容
-        content = {
-            **request.form_data,
-            **request.sections
-        }
-        result = official_doc_service.assemble_docx(
+        result = await official_doc_service.assemble_docx_async(
             doc_type=request.doc_type,
-            content=content,
+            content=request.to_content(),
         )
         return {
             "errorCode": 0,
             "message": "success",
             "data": result
         }
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"组装 docx 失败: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post(
+    "/official/assemble/batch",
+    summary="批量组装标准公文 docx",
+    description="一次提交多篇公文内容，在后台工作池中并行组装，返回每篇的任务 ID 与批次耗时",
+    tags=["国标公文"]
+)
+async def assemble_official_docx_batch(
+    request: BatchAssembleDocxRequest,
+    token: str = Depends(oauth2_scheme),
+):
+    """
+    批量组装 docx 接口
+
+    - **items**: 公文列表，每项与单篇组装请求结构相同
+
+    单篇失败不影响其他公文，失败项返回 error
+    """
+    if len(request.items) > settings.DOCX_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"单次最多组装 {settings.DOCX_BATCH_MAX} 篇公文")
+    try:
+        result = await official_doc_service.assemble_batch([
+            {"doc_type": item.doc_type, "content": item.to_content()}
+            for item in request.items
+        ])
+        return {
+            "errorCode": 0,
+            "message": "success",
+            "data": result
+        }
+    except Exception as e:
+        logger.error(f"批量组装 docx 失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post(
+    "/official/assemble/merge",
+    summary="批量套打标准公文（ZIP）",
+    description="同一通知/函发给多个单位：公共内容只生成一次，按每份的字段覆盖并行组装，以 ZIP 流式返回",
+    tags=["国标公文"]
+)
+async def merge_official_docx(
+    request: MergeAssembleDocxRequest,
+    token: str = Depends(oauth2_scheme),
+):
+    """
+    批量套打接口
+
+    - **doc_type**: 公文类型
+    - **sections**: 公共分段内容（缺少的段落按 generate 决定是否由 AI 生成）
+    - **form_data**: 表单数据
+    - **recipients**: 每份公文的字段覆盖，正文等字段中的 {{字段名}} 会被替换
+    - **filename_field**: 用于命名 docx 文件的字段
+
+    返回 ZIP 文件流，包含每份 docx 及 manifest.json（每份状态与耗时）
+    """
+    if len(request.recipients) > settings.DOCX_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"单次最多套打 {settings.DOCX_BATCH_MAX} 份公文")
+    try:
+        content = await official_doc_service.prepare_merge_content(
+            doc_type=request.doc_type,
+            sections=request.sections,
+            form_data=request.form_data,
+            overrides=request.recipients,
+            generate=request.generate,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"准备批量套打内容失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    filename = f"MERGE-{datetime.now().strftime('%Y%m%d%H%M%S')}.zip"
+    return StreamingResponse(
+        official_doc_service.stream_merge_zip(
+            doc_type=request.doc_type,
+            content=content,
+            overrides=request.recipients,
+            filename_field=request.filename_field,
+        ),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+
+@router.get(
+    "/official/assemble/stats",
+    summary="公文组装统计",
+    description="查看组装工作池的排队、完成、拒绝数量及平均耗时",
+    tags=["国标公文"]
+)
+async def get_assemble_stats(
+    token: str = Depends(oauth2_scheme),
+):
+    """公文组装统计接口"""
+    return {
+        "errorCode": 0,
+        "message": "success",
+        "data": official_doc_service.get_assembly_stats()
+    }
+
+
 async def get_token_from_header_or_query(
     request: Request,
     token: Optional[str] = Query(None, alias="token"),
@@ -626,6 +716,35 @@ async def get_token_from_header_or_query(
     return found_token
 
 
+@router.get(
+    "/stream/{session_id}",
+    summary="续传生成会话（流式）",
+    description="断线重连：按 Last-Event-ID 重放缺失的事件后继续接收，不重新调用模型",
+    tags=["文档生成"]
+)
+async def resume_generate_stream(
+    session_id: str,
+    http_request: Request,
+    last_event_id: Optional[str] = Query(None, alias="lastEventId", description="已收到的最后一个事件 id"),
+    token: str = Depends(get_token_from_header_or_query),
+):
+    """
+    续传生成会话接口（SSE 流式输出）
+
+    - **session_id**: 会话 ID（响应头 X-Stream-Session 或事件 id 中 “-” 之前的部分）
+    - 已收到的最后事件 id 通过 Last-Event-ID 请求头（EventSource 自动携带）或 lastEventId 参数传入
+
+    会话已结束并过期时返回 404，客户端需重新生成
+    """
+    session = stream_sessions.get(_stream_owner(token), session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="生成会话不存在或已过期，请重新生成")
+    event_id = http_request.headers.get("last-event-id") or last_event_id
+    resumed = stream_sessions.resume(session.owner, event_id) if event_id else None
+    after = resumed[1] if resumed is not None and resumed[0] is session else 0
+    return session_response(session, after, http_request)
+
+
 @router.get(
     "/download/{task_id}.docx",
     summary="下载生成的 docx",
@@ -1,13 +1,19 @@
 """
 知识图谱相关 API
 """
-from fastapi import APIRouter, Depends, Query
-from fastapi.security import OAuth2PasswordBearer
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel, Field
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 
+from app.core.config import settings
+from app.core.database import get_db
+from app.core.security import get_current_user, require_admin
+from app.models.user import User
+from app.services.graph_indexer import graph_indexer
+from app.services.knowledge_graph import ENTITY_TYPES, RELATION_TYPES, knowledge_graph_service
+
 router = APIRouter()
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
 
 # 请求模型
@@ -19,6 +25,19 @@ class KnowledgeGraphQuery(BaseModel):
     hop_count: int = Field(2, ge=1, le=5, description="查询跳数，1-5")
 
 
+class RelationCreate(BaseModel):
+    """创建关系请求"""
+    source_id: int = Field(..., alias="sourceId", description="起点实体ID")
+    target_id: int = Field(..., alias="targetId", description="终点实体ID")
+    relation_type: str = Field(..., alias="relationType", description="关系类型")
+    properties: Optional[dict] = Field(None, description="关系属性")
+
+
+def _check_entity_type(entity_type: str) -> None:
+    if entity_type not in ENTITY_TYPES:
+        raise HTTPException(status_code=400, detail=f"不支持的实体类型: {entity_type}")
+
+
 @router.get(
     "/query",
     summary="查询知识图谱",
@@ -30,30 +49,54 @@ async def query_knowledge_graph(
     entity_id: Optional[str] = Query(None, description="实体ID"),
     relation_type: Optional[str] = Query(None, description="关联类型"),
     hop_count: int = Query(2, ge=1, le=5, description="查询跳数"),
-    token: str = Depends(oauth2_scheme)
+    limit: Optional[int] = Query(None, ge=1, le=5000, description="最多返回的实体数"),
+    current_user: User = Depends(get_current_user)
 ):
     """
     查询知识图谱接口
-    
+
     - **entity_type**: 实体类型（case/person/law/location）
-    - **entity_id**: 实体ID（可选）
-    - **relation_type**: 关联类型（可选）
+    - **entity_id**: 实体ID或实体名称
+    - **relation_type**: 关联类型（可选，多个用逗号分隔，只沿这些关系展开）
     - **hop_count**: 查询跳数，1-5跳
-    
-    返回实体及其关联关系，支持可视化展示
+    - **limit**: 最多返回的实体数（默认 KG_MAX_NODES），超出时 truncated 为 true
+
+    在内存邻接表上逐层展开，返回实体及其关联关系（nodes/edges 供可视化展示）
     """
-    # TODO: 实现真实的图谱查询逻辑
+    _check_entity_type(entity_type)
+    if not entity_id:
+        raise HTTPException(status_code=400, detail="请指定实体ID或实体名称")
+    relation_types = [r.strip() for r in relation_type.split(",") if r.strip()] if relation_type else None
+    result = knowledge_graph_service.query(entity_type, entity_id, hop_count, relation_types, limit)
+    if result is None:
+        raise HTTPException(status_code=404, detail="实体不存在")
     return {
         "errorCode": 0,
         "message": "success",
-        "data": {
-            "entity": {
-                "id": entity_id or "default",
-                "name": "实体名称",
-                "type": entity_type
-            },
-            "relations": []
-        }
+        "data": result,
+    }
+
+
+@router.get(
+    "/entities",
+    summary="查找实体",
+    description="按名称关键字查找实体，用于选择查询起点",
+    tags=["知识图谱"]
+)
+async def search_entities(
+    entity_type: Optional[str] = Query(None, description="实体类型"),
+    keyword: str = Query("", description="名称关键字"),
+    limit: int = Query(20, ge=1, le=200, description="返回条数"),
+    current_user: User = Depends(get_current_user)
+):
+    """查找实体接口"""
+    if entity_type:
+        _check_entity_type(entity_type)
+    items = knowledge_graph_service.index.search(entity_type, keyword, limit)
+    return {
+        "errorCode": 0,
+        "message": "success",
+        "data": {"items": [{**item, "id": str(item["id"])} for item in items]},
     }
 
 
@@ -67,29 +110,60 @@ async def create_entity(
     entity_type: str = Query(..., description="实体类型"),
     entity_name: str = Query(..., description="实体名称"),
     properties: Optional[dict] = None,
-    token: str = Depends(oauth2_scheme)
+    current_user: User = Depends(require_admin),
+    db: AsyncSession = Depends(get_db),
 ):
     """
-    创建实体接口
-    
+    创建实体接口（仅管理员）
+
     - **entity_type**: 实体类型
     - **entity_name**: 实体名称
     - **properties**: 实体属性（可选）
-    
-    在知识图谱中创建新实体
+
+    在知识图谱中创建新实体；同类型同名（忽略空白与标点）的实体已存在时返回已有实体
     """
-    # TODO: 实现真实的实体创建逻辑
+    _check_entity_type(entity_type)
+    if not entity_name.strip():
+        raise HTTPException(status_code=400, detail="实体名称不能为空")
+    entity, created = await knowledge_graph_service.create_entity(db, entity_type, entity_name, properties)
     return {
         "errorCode": 0,
-        "message": "实体创建成功",
+        "message": "实体创建成功" if created else "实体已存在",
         "data": {
-            "entity_id": "entity_001",
-            "entity_type": entity_type,
-            "entity_name": entity_name
+            "entity_id": str(entity.id),
+            "entity_type": entity.entity_type,
+            "entity_name": entity.name,
+            "created": created,
         }
     }
 
 
+@router.post(
+    "/relation",
+    summary="创建关系",
+    description="在两个实体之间创建关系",
+    tags=["知识图谱"]
+)
+async def create_relation(
+    body: RelationCreate,
+    current_user: User = Depends(require_admin),
+    db: AsyncSession = Depends(get_db),
+):
+    """创建关系接口（仅管理员）；同一对实体同一类型的关系已存在时返回已有关系"""
+    if body.relation_type not in RELATION_TYPES:
+        raise HTTPException(status_code=400, detail=f"不支持的关系类型: {body.relation_type}")
+    relation, created = await knowledge_graph_service.create_relation(
+        db, body.source_id, body.target_id, body.relation_type, body.properties
+    )
+    if relation is None:
+        raise HTTPException(status_code=404, detail="实体不存在")
+    return {
+        "errorCode": 0,
+        "message": "关系创建成功" if created else "关系已存在",
+        "data": {"relation_id": str(relation.id), "created": created},
+    }
+
+
 @router.get(
     "/relations",
     summary="获取关联关系",
@@ -98,26 +172,75 @@ async def create_entity(
 )
 async def get_relations(
     entity_type: Optional[str] = Query(None, description="实体类型"),
-    token: str = Depends(oauth2_scheme)
+    current_user: User = Depends(get_current_user)
 ):
     """
     获取关联关系接口
-    
+
     - **entity_type**: 实体类型（可选）
-    
-    返回可用的关联关系类型列表
+
+    返回可用的关联关系类型列表（含当前图谱中的关系数）
     """
-    # TODO: 实现真实的关联关系查询逻辑
+    counts = knowledge_graph_service.index.relation_counts()
+    relations = [
+        {
+            "type": relation_type,
+            "name": name,
+            "description": f"{ENTITY_TYPES[source]} → {ENTITY_TYPES[target]}",
+            "sourceType": source,
+            "targetType": target,
+            "count": counts.get(relation_type, 0),
+        }
+        for relation_type, (name, source, target) in RELATION_TYPES.items()
+        if not entity_type or entity_type in (source, target)
+    ]
     return {
         "errorCode": 0,
         "message": "success",
         "data": {
-            "relations": [
-                {
-                    "type": "related_person",
-                    "name": "相关人员",
-                    "description": "与人员相关的关联"
-                }
-            ]
+            "relations": relations
         }
     }
+
+
+@router.get(
+    "/stats",
+    summary="图谱统计",
+    description="内存邻接表的实体数、关系数、增量与重建次数、查询次数，案卷入图队列与延迟",
+    tags=["知识图谱"]
+)
+async def get_graph_stats(current_user: User = Depends(get_current_user)):
+    """图谱统计接口"""
+    return {
+        "errorCode": 0,
+        "message": "success",
+        "data": {
+            **knowledge_graph_service.stats(),
+            "maxNodes": settings.KG_MAX_NODES,
+            "maxEdges": settings.KG_MAX_EDGES,
+            "indexer": graph_indexer.stats(),
+        },
+    }
+
+
+@router.post(
+    "/rebuild",
+    summary="全量重建图谱",
+    description="从全部案卷重新抽取实体与关系（后台执行，进度见 /stats 的 indexer.rebuild）",
+    tags=["知识图谱"]
+)
+async def rebuild_graph(
+    workers: Optional[int] = Query(None, ge=1, le=16, description="并发读取任务数（默认 KG_REBUILD_WORKERS）"),
+    current_user: User = Depends(require_admin),
+):
+    """
+    全量重建接口（仅管理员）
+
+    只补齐与案卷不一致的实体、关系，可在服务运行期间执行；已在重建时返回当前进度
+    """
+    started = graph_indexer.start_rebuild(workers)
+    return {
+        "errorCode": 0,
+        "message": "已开始重建" if started else "重建进行中",
+        "data": {"started": started, **graph_indexer.stats()["rebuild"]},
+    }
@@ -1,11 +1,25 @@
 """
 统计分析相关 API
 """
-from fastapi import APIRouter, Depends, Query
+import os
+import uuid
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel
+from starlette.background import BackgroundTask
 from typing import Optional, List
 from datetime import datetime
+from loguru import logger
+
+from app.core.database import read_router
+from app.core.response import ResponseModel
+from app.services.export_service import (
+    EXPORT_FORMATS,
+    build_case_export_query,
+    export_service,
+    iter_case_rows,
+)
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
@@ -42,31 +56,125 @@ async def get_statistics(
     }
 
 
+def _check_export_format(fmt: str) -> str:
+    fmt = (fmt or "xlsx").lower()
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"不支持的导出格式: {fmt}，可选 xlsx/csv")
+    return fmt
+
+
 @router.get(
     "/statistics/export",
     summary="导出报表",
-    description="导出统计数据报表",
+    description="按筛选条件导出案卷统计报表（XLSX/CSV），服务端游标逐批读取，内存占用恒定",
     tags=["统计分析"]
 )
 async def export_report(
-    date_range: Optional[str] = Query(None, description="日期范围"),
+    date_range: Optional[str] = Query(None, description="日期范围，格式：YYYY-MM-DD,YYYY-MM-DD"),
     case_type: Optional[str] = Query(None, description="案卷类型"),
     department: Optional[str] = Query(None, description="来源部门"),
+    format: str = Query("xlsx", description="导出格式：xlsx/csv"),
     token: str = Depends(oauth2_scheme)
 ):
     """
     导出报表接口
     
-    - **date_range**: 日期范围（可选）
+    - **date_range**: 日期范围（可选，按创建时间筛选）
     - **case_type**: 案卷类型筛选（可选）
     - **department**: 来源部门筛选（可选）
+    - **format**: 导出格式（xlsx/csv）
     
-    返回统计报表文件（Excel/PDF）
+    CSV 边查边输出；XLSX 先写入临时文件再返回。数据量大时建议使用后台导出任务。
     """
-    # TODO: 实现真实的报表导出逻辑
-    from fastapi.responses import Response
-    return Response(
-        content="报表内容",
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": "attachment; filename=statistics.xlsx"}
+    fmt = _check_export_format(format)
+    query = build_case_export_query(date_range, case_type, department)
+    filename = f"statistics_{datetime.now().strftime('%Y%m%d%H%M%S')}.{fmt}"
+
+    if fmt == "csv":
+        async def _stream():
+            session_factory = await read_router.choose(background=True)
+            async with session_factory() as db:
+                async for chunk in export_service.stream_csv(iter_case_rows(db, query)):
+                    yield chunk
+
+        return StreamingResponse(
+            _stream(),
+            media_type=EXPORT_FORMATS[fmt],
+            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        )
+
+    file_path = os.path.join(export_service.export_dir, f"tmp_{uuid.uuid4().hex}.{fmt}")
+    try:
+        session_factory = await read_router.choose(background=True)
+        async with session_factory() as db:
+            await export_service.write_file(db, query, fmt, file_path)
+    except Exception as e:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        logger.error(f"导出报表失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return FileResponse(
+        file_path,
+        media_type=EXPORT_FORMATS[fmt],
+        filename=filename,
+        background=BackgroundTask(os.remove, file_path),
+    )
+
+
+@router.post(
+    "/statistics/export/jobs",
+    summary="创建后台导出任务",
+    description="大批量导出以后台任务运行，完成后通过任务 ID 下载文件",
+    tags=["统计分析"]
+)
+async def create_export_job(
+    date_range: Optional[str] = Query(None, description="日期范围，格式：YYYY-MM-DD,YYYY-MM-DD"),
+    case_type: Optional[str] = Query(None, description="案卷类型"),
+    department: Optional[str] = Query(None, description="来源部门"),
+    format: str = Query("xlsx", description="导出格式：xlsx/csv"),
+    token: str = Depends(oauth2_scheme)
+):
+    """创建后台导出任务，返回任务 ID"""
+    fmt = _check_export_format(format)
+    job = export_service.create_job(fmt, date_range=date_range, case_type=case_type, department=department)
+    return ResponseModel.success(data=job, message="导出任务已创建")
+
+
+@router.get(
+    "/statistics/export/jobs/{job_id}",
+    summary="查询导出任务",
+    description="查询后台导出任务状态，完成后返回下载地址",
+    tags=["统计分析"]
+)
+async def get_export_job(
+    job_id: str,
+    token: str = Depends(oauth2_scheme)
+):
+    """查询导出任务状态"""
+    try:
+        return ResponseModel.success(data=export_service.get_job(job_id))
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.get(
+    "/statistics/export/jobs/{job_id}/download",
+    summary="下载导出文件",
+    description="下载已完成的后台导出任务文件",
+    tags=["统计分析"]
+)
+async def download_export_job(
+    job_id: str,
+    token: str = Depends(oauth2_scheme)
+):
+    """下载导出文件"""
+    try:
+        job = export_service.get_job(job_id)
+        file_path = export_service.get_job_file(job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return FileResponse(
+        file_path,
+        media_type=EXPORT_FORMATS[job["format"]],
+        filename=f"{job_id}.{job['format']}",
     )
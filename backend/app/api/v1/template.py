@@ -3,19 +3,22 @@
 管理文档生成使用的各类公文、报告模板
 模板为 .docx 公文文件，供 AI 生成时参考格式
 """
+import asyncio
 import os
 import uuid
 from pathlib import Path
 
 from fastapi import APIRouter, Depends, HTTPException, Query, Form, File, UploadFile
+from fastapi.responses import Response
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from loguru import logger
 
 from app.core.database import get_db
 from app.core.config import settings
 from app.models.template import DocTemplate
+from app.services.template_registry import template_registry
 from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -54,6 +57,11 @@ class TemplateUpdate(BaseModel):
     status: Optional[int] = Field(None, ge=0, le=1)
 
 
+class TemplateRenderRequest(BaseModel):
+    """基于模板生成文档"""
+    values: Dict[str, Any] = Field(default_factory=dict, description="占位符 {{字段名}} 的取值")
+
+
 def _template_to_response(t: DocTemplate) -> dict:
     return {
         "id": t.id,
@@ -172,6 +180,66 @@ async def get_template(
     }
 
 
+async def _get_parsed_template(template_id: int, db: AsyncSession):
+    """获取已解析模板（按模板ID+版本号缓存，未命中时在线程中解析文件）"""
+    result = await db.execute(select(DocTemplate).where(DocTemplate.id == template_id))
+    t = result.scalar_one_or_none()
+    if not t:
+        raise HTTPException(status_code=404, detail="模板不存在")
+    if not t.file_path:
+        raise HTTPException(status_code=400, detail="模板未上传文件")
+    try:
+        return t, await asyncio.to_thread(template_registry.get, t.id, t.version, t.file_path)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"解析模板失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"模板文件解析失败: {str(e)}")
+
+
+@router.get(
+    "/{template_id}/structure",
+    summary="获取模板结构",
+)
+async def get_template_structure(
+    template_id: int,
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db),
+):
+    """返回模板解析结果：占位符、使用的样式、段落结构"""
+    _, parsed = await _get_parsed_template(template_id, db)
+    return {
+        "errorCode": 0,
+        "message": "success",
+        "data": parsed.to_dict(),
+    }
+
+
+@router.post(
+    "/{template_id}/render",
+    summary="基于模板生成文档",
+)
+async def render_template(
+    template_id: int,
+    body: TemplateRenderRequest,
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db),
+):
+    """复制已解析的模板并填充占位符，返回 docx 文件"""
+    t, parsed = await _get_parsed_template(template_id, db)
+
+    try:
+        docx_data = await asyncio.to_thread(parsed.render, body.values)
+    except Exception as e:
+        logger.error(f"基于模板生成文档失败: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return Response(
+        content=docx_data,
+        media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        headers={"Content-Disposition": f"attachment; filename=template-{t.id}-v{parsed.version}.docx"},
+    )
+
+
 @router.post(
     "",
     summary="新建模板",
@@ -231,6 +299,9 @@ async def update_template_file(
     try:
         file_path = await _save_template_file(file)
         t.file_path = file_path
+        # 文件变更升级版本号，已解析的旧版本缓存失效
+        t.version = (t.version or 1) + 1
+        template_registry.invalidate(template_id)
         await db.flush()
         await db.refresh(t)
         return {
@@ -302,6 +373,7 @@ async def delete_template(
     try:
         await db.delete(t)
         await db.flush()
+        template_registry.invalidate(template_id)
         return {"errorCode": 0, "message": "模板已删除"}
     except Exception as e:
         await db.rollback()
@@ -0,0 +1,67 @@
+"""
+大模型用量统计 API
+按用户、接口、模型、导入任务或日期汇总 tokens 用量，用于定位上游负载来源
+"""
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import get_read_db
+from app.core.response import ResponseModel
+from app.core.security import require_admin
+from app.models.user import User
+from app.services.usage_ledger import ROLLUP_DIMENSIONS, usage_ledger
+
+router = APIRouter()
+
+
+@router.get(
+    "/rollup",
+    summary="用量汇总",
+    description="按用户/接口/模型/导入任务/日期汇总大模型调用次数、失败次数、输入输出 tokens 与平均耗时，按总 tokens 倒序",
+)
+async def get_usage_rollup(
+    group_by: str = Query("endpoint", alias="groupBy", description="汇总维度: user/endpoint/model/importTask/day"),
+    start_date: Optional[str] = Query(None, alias="startDate", description="开始日期，格式 YYYY-MM-DD"),
+    end_date: Optional[str] = Query(None, alias="endDate", description="结束日期，格式 YYYY-MM-DD"),
+    limit: int = Query(50, ge=1, le=500, description="返回条数"),
+    db: AsyncSession = Depends(get_read_db),
+    current_user: User = Depends(require_admin),
+):
+    """
+    查询用量汇总
+
+    台账批量写入，最近 USAGE_FLUSH_INTERVAL 秒内的调用可能尚未计入
+    """
+    if group_by not in ROLLUP_DIMENSIONS:
+        raise HTTPException(status_code=400, detail=f"不支持的汇总维度: {group_by}")
+    try:
+        start_dt = datetime.strptime(start_date, "%Y-%m-%d") if start_date else None
+        end_dt = datetime.strptime(end_date + " 23:59:59", "%Y-%m-%d %H:%M:%S") if end_date else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="日期格式应为 YYYY-MM-DD")
+
+    items = await usage_ledger.rollup(db, group_by, start_dt, end_dt, limit)
+    return ResponseModel.success(data={
+        "groupBy": group_by,
+        "items": items,
+        "totalTokens": sum(item["totalTokens"] for item in items),
+    })
+
+
+@router.get(
+    "/live",
+    summary="实时用量",
+    description="本进程启动以来按接口、模型的累计用量，台账缓冲与写入计数，以及用户当日预算配置",
+)
+async def get_usage_live(current_user: User = Depends(require_admin)):
+    """查询实时用量（不查库）"""
+    return ResponseModel.success(data={
+        **usage_ledger.stats(),
+        "budget": {
+            "dailyTokens": settings.LLM_USER_DAILY_TOKEN_BUDGET,
+            "peakHours": settings.LLM_BUDGET_PEAK_HOURS,
+        },
+    })
@@ -28,11 +28,54 @@ class Settings(BaseSettings):
     MYSQL_PASSWORD: str = "password"
     MYSQL_DATABASE: str = "military_guard"
     
+    # 数据库连接池配置
+    DB_POOL_SIZE: int = 10  # 请求连接池大小
+    DB_MAX_OVERFLOW: int = 20  # 请求连接池最大溢出连接数
+    DB_POOL_TIMEOUT: int = 30  # 获取连接超时时间（秒）
+    DB_POOL_RECYCLE: int = 3600  # 连接回收时间（秒）
+    DB_POOL_PRE_PING: bool = True  # 连接前检查连接是否有效
+    DB_BACKGROUND_POOL_SIZE: int = 5  # 后台任务（导入、导出、流式输出）连接池大小
+    DB_BACKGROUND_MAX_OVERFLOW: int = 5  # 后台任务连接池最大溢出连接数
+    DB_POOL_WAIT_WARN_MS: int = 500  # 获取连接等待超过该值时记录警告（毫秒）
+    
+    # 只读副本配置（未配置 DATABASE_REPLICA_URL 时所有读写走主库）
+    DATABASE_REPLICA_URL: Optional[str] = None
+    DB_REPLICA_POOL_SIZE: int = 10  # 只读副本连接池大小
+    DB_REPLICA_MAX_OVERFLOW: int = 10  # 只读副本连接池最大溢出连接数
+    DB_REPLICA_MAX_LAG_SECONDS: float = 5.0  # 副本延迟超过该值时读请求回退主库
+    DB_REPLICA_LAG_CHECK_SECONDS: float = 5.0  # 副本延迟检测间隔（秒）
+    DB_READ_YOUR_WRITES_SECONDS: float = 10.0  # 写操作后该时间内同一客户端的读请求走主库
+    
     # 文件上传配置
     UPLOAD_DIR: str = "./uploads"
     MAX_UPLOAD_SIZE: int = 524288000  # 500MB
     ALLOWED_EXTENSIONS: str = ".pdf,.doc,.docx,.txt,.jpg,.jpeg,.png"  # 允许的文件扩展名
     
+    # 报表导出配置
+    EXPORT_BATCH_SIZE: int = 1000  # 服务端游标每批拉取行数
+    EXPORT_JOB_TTL: float = 3600.0  # 后台导出任务结束后保留任务与文件的秒数
+    EXPORT_WORKERS: int = 2  # XLSX 写出线程数
+    STREAM_BATCH_SIZE: int = 500  # NDJSON 流式接口每批拉取行数
+    # SSE 流式接口：内容增量按时间或大小窗口合并为一帧，空闲时发送心跳
+    SSE_COALESCE_MS: int = 50  # 合并时间窗口（毫秒），0 表示不合并
+    SSE_COALESCE_BYTES: int = 1024  # 合并内容达到该字节数时立即输出
+    SSE_HEARTBEAT_SECONDS: float = 15.0  # 超过该秒数未输出时发送心跳
+    # 可续传的生成会话：断线重连时按 Last-Event-ID 重放缺失事件，不重新调用模型
+    SSE_SESSION_BUFFER: int = 2048  # 每个会话缓冲的事件数（合并后的帧）
+    SSE_SESSION_TTL: float = 300.0  # 生成结束后会话保留秒数
+    SSE_SESSION_IDLE_SECONDS: float = 120.0  # 无客户端连接超过该秒数时取消生成
+    
+    # 公文组装配置
+    DOCX_EXECUTOR: str = "thread"  # 组装执行器：thread（线程池）/ process（进程池）
+    DOCX_WORKERS: int = 4  # 组装工作线程/进程数
+    DOCX_MAX_PENDING: int = 32  # 排队 + 执行中的组装任务上限
+    DOCX_QUEUE_TIMEOUT: float = 10.0  # 队列已满时等待空位的最长时间（秒）
+    DOCX_BATCH_MAX: int = 200  # 单次批量组装的最大篇数
+    DOCX_TASK_TTL: float = 3600.0  # 组装结果保留秒数（过期后下载链接失效）
+    DOCX_TASK_MAX_BYTES: int = 268435456  # 组装结果占用内存上限 256MB，超出时移除最早的
+    DOCX_BODY_CACHE_SIZE: int = 16  # 已排版正文缓存条数（批量套打时相同正文只排版一次）
+    TEMPLATE_CACHE_SIZE: int = 32  # 已解析模板缓存条数（按模板ID+版本号）
+
     # JWT配置
     # JWT_SECRET_KEY 应从环境变量读取，生产环境必须使用强密钥
     JWT_SECRET_KEY: str = os.getenv("JWT_SECRET_KEY", "dev-jwt-secret-key")
@@ -74,7 +117,64 @@ class Settings(BaseSettings):
     
     # AI 模型配置（通义千问）
     DASHSCOPE_API_KEY: str = os.getenv("DASHSCOPE_API_KEY", "")
+    # 模型后端：dashscope | stub（本地模拟）| record（调用并录制）| replay（回放录制），见 llm_backends
+    LLM_BACKEND: str = "dashscope"
+    LLM_CASSETTE_DIR: str = "data/llm_cassettes"  # 录制目录
+    LLM_REPLAY_FALLBACK: bool = False  # 回放未找到录制时改用本地模拟
+    LLM_STUB_OUTPUT_TOKENS: int = 400  # 模拟输出长度（不超过 max_tokens）
+    LLM_SYNTHETIC_FIRST_TOKEN_MS: float = 0.0  # 模拟首 token 延迟（stub / replay）
+    LLM_SYNTHETIC_TOKENS_PER_SECOND: float = 0.0  # 模拟输出速率，0 表示不限速
+    # 大模型用量台账：每次调用记入内存缓冲，后台批量写入 llm_usage 表
+    USAGE_FLUSH_INTERVAL: float = 5.0  # 写入间隔（秒）
+    USAGE_BATCH_SIZE: int = 200  # 缓冲达到该条数时提前写入
+    USAGE_MAX_PENDING: int = 10000  # 数据库不可用时最多缓冲的条数（超出丢弃最早的）
+    # 用户每日 token 预算，0 表示不限制；高峰时段（如 "9-12,14-18"，为空表示全天）超出后拒绝调用
+    LLM_USER_DAILY_TOKEN_BUDGET: int = 0
+    LLM_BUDGET_PEAK_HOURS: str = ""
     QWEN_MODEL: str = "qwen-plus"  # 可选: qwen-turbo, qwen-plus, qwen-max
+    # 按调用场景选择模型（路由定义见 model_router 模块）：小任务用 qwen-turbo，p95 延迟超出路由目标时降级
+    QWEN_ROUTING_ENABLED: bool = True
+    QWEN_ROUTE_SMALL_TOKENS: int = 2000  # 输入 + 预期输出不超过该值时使用路由允许的最快模型
+    QWEN_ROUTES: str = ""  # JSON，按路由名覆盖默认路由，如 {"section": {"max": "qwen-turbo", "slo": 5}}
+    QWEN_STREAM_WORKERS: int = 16  # 读取流式响应的线程数（同时进行的上游流式调用上限）
+    # 调用弹性控制：AIMD 自适应并发、指数退避重试、熔断
+    QWEN_INITIAL_CONCURRENCY: int = 4
+    QWEN_MIN_CONCURRENCY: int = 1
+    QWEN_MAX_CONCURRENCY: int = 16
+    QWEN_ACQUIRE_TIMEOUT: float = 120.0  # 等待并发名额的最长秒数
+    QWEN_RETRY_ATTEMPTS: int = 3  # 含首次调用
+    QWEN_RETRY_BASE_DELAY: float = 0.5
+    QWEN_RETRY_MAX_DELAY: float = 8.0
+    QWEN_BREAKER_FAILURES: int = 5  # 连续失败次数达到后熔断
+    QWEN_BREAKER_COOLDOWN: float = 30.0  # 熔断冷却秒数
+    # 熔断期间导入的案卷稍后自动重新提取
+    EXTRACT_RETRY_INTERVAL: float = 60.0  # 重新提取仍失败时的等待秒数
+    EXTRACT_RETRY_MAX_ATTEMPTS: int = 5
+    # 提示词输入 token 预算（按汉字约 1 token、英文约 4 字符 1 token 估算）
+    PROMPT_REVIEW_TOKENS: int = 12000  # 内容审查正文
+    PROMPT_EXTRACT_TOKENS: int = 15000  # 案卷字段提取正文
+    PROMPT_RELATED_CASES_TOKENS: int = 800  # 关联案件列表
+    PROMPT_TRANSCRIPT_TOKENS: int = 8000  # 会议录音转写稿（超出时保留首尾）
+    # 长卷宗分段提取：超过单段预算的正文按段落切分，各段并发提取后合并
+    EXTRACT_CHUNK_TOKENS: int = 12000  # 每段 token 预算
+    EXTRACT_CHUNK_CONCURRENCY: int = 8  # 分段提取线程数（所有卷宗共用）
+    # 卷宗封面规则提取：先按“标签：值”和固定小标题提取，字段齐全时不再调用模型
+    RULE_EXTRACT_ENABLED: bool = True
+    RULE_EXTRACT_MIN_CONFIDENCE: float = 0.8  # 规则结果覆盖模型结果所需的置信度
+    # 长公文分段审查：按段落划分窗口，相邻窗口重叠若干段，各窗口并发审查
+    REVIEW_WINDOW_TOKENS: int = 3000  # 每个窗口 token 预算
+    REVIEW_WINDOW_OVERLAP: int = 2  # 相邻窗口重叠的段落数
+    REVIEW_CONCURRENCY: int = 8  # 分段审查线程数（所有请求共用）
+    # 知识图谱：启动时把实体与关系加载为内存邻接表（CSR），多跳查询不访问数据库
+    KG_MAX_NODES: int = 500  # 单次查询最多返回的实体数
+    KG_MAX_EDGES: int = 2000  # 单次查询最多返回的关系数
+    KG_COMPACT_THRESHOLD: int = 20000  # 增量（新增与删除的边）超过 max(该值, 已压缩边数的 1/4) 时重建邻接表
+    # 案卷入图：导入、审核、入库后由后台任务从案卷字段抽取实体与关系，按批写入图谱
+    KG_INDEX_ENABLED: bool = True
+    KG_INDEX_DEBOUNCE: float = 1.0  # 收到第一个案卷后等待该秒数再处理，合并批量导入
+    KG_INDEX_BATCH_SIZE: int = 200  # 每批处理的案卷数
+    KG_INDEX_RETRY_INTERVAL: float = 30.0  # 写入失败后重新入队的等待秒数
+    KG_REBUILD_WORKERS: int = 4  # 全量重建时并发读取案卷的任务数
     
     @property
     def cors_origins_list(self) -> list:
@@ -1,10 +1,25 @@
 """
 数据库连接管理模块
 支持 SQLAlchemy 2.0 异步操作
+
+连接池分为三组：
+- engine：处理普通请求的短事务
+- background_engine：导入、导出、流式输出等长时间占用连接的后台任务
+- replica_engine：只读副本（可选），承接检索、列表、报表等查询流量
+各组互不抢占，长任务不会耗尽请求连接池，查询流量也不与导入写入竞争
 """
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
-from sqlalchemy.orm import DeclarativeBase
-from typing import AsyncGenerator
+import hashlib
+import math
+import re
+import time
+from typing import AsyncGenerator, Awaitable, Callable, Dict, Optional
+
+from fastapi import Request
+from loguru import logger
+from sqlalchemy import event, exc, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.orm import DeclarativeBase, Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from app.core.config import settings
 
@@ -14,56 +29,348 @@ class Base(DeclarativeBase):
     pass
 
 
-# 创建异步数据库引擎
-# 注意：pymysql 不支持异步，需要使用 aiomysql 或 asyncmy
-# 这里使用 asyncmy 作为 MySQL 异步驱动
-database_url = settings.database_url
-if "mysql+pymysql://" in database_url:
-    database_url = database_url.replace("mysql+pymysql://", "mysql+asyncmy://")
-elif "mysql://" in database_url and "mysql+asyncmy://" not in database_url:
-    database_url = database_url.replace("mysql://", "mysql+asyncmy://")
-
-# 确保数据库连接使用 UTF-8 编码
-# 在连接字符串中添加 charset 参数
-if "?" not in database_url:
-    database_url += "?charset=utf8mb4"
-elif "charset=" not in database_url:
-    database_url += "&charset=utf8mb4"
-else:
-    # 如果已有 charset 参数，确保是 utf8mb4
-    import re
-    database_url = re.sub(r'charset=[^&]+', 'charset=utf8mb4', database_url)
-
-engine = create_async_engine(
-    database_url,
-    echo=settings.DEBUG,  # 开发环境打印SQL
-    pool_size=10,  # 连接池大小
-    max_overflow=20,  # 最大溢出连接数
-    pool_pre_ping=True,  # 连接前检查连接是否有效
-    pool_recycle=3600,  # 连接回收时间（秒）
-    future=True,
-    # 设置连接参数确保使用 UTF-8
-    connect_args={
-        "charset": "utf8mb4",
-        "use_unicode": True,
-        "init_command": "SET NAMES utf8mb4 COLLATE utf8mb4_unicode_ci",
-    } if "asyncmy" in database_url else {}
+class PoolMetrics:
+    """连接池获取连接的等待统计"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+
+    def record_wait(self, wait_ms: float) -> None:
+        self.checkouts += 1
+        self.wait_total_ms += wait_ms
+        if wait_ms > self.wait_max_ms:
+            self.wait_max_ms = wait_ms
+        if wait_ms >= settings.DB_POOL_WAIT_WARN_MS:
+            logger.warning(f"[连接池:{self.name}] 获取连接等待 {wait_ms:.0f}ms")
+
+    def reset(self) -> None:
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total_ms = 0.0
+        self.wait_max_ms = 0.0
+
+
+class MeteredQueuePool(AsyncAdaptedQueuePool):
+    """记录获取连接等待时间的异步连接池"""
+
+    metrics: Optional[PoolMetrics] = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            if self.metrics:
+                self.metrics.timeouts += 1
+            raise
+        finally:
+            if self.metrics:
+                self.metrics.record_wait((time.perf_counter() - start) * 1000)
+
+    def recreate(self):
+        # dispose 时会重建连接池，统计对象需要沿用
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+
+def normalize_database_url(url: str) -> str:
+    """
+    规范化数据库连接 URL
+
+    注意：pymysql 不支持异步，需要使用 aiomysql 或 asyncmy
+    这里使用 asyncmy 作为 MySQL 异步驱动，并确保连接使用 UTF-8 编码
+    """
+    if url.startswith("sqlite"):
+        return url
+    if "mysql+pymysql://" in url:
+        url = url.replace("mysql+pymysql://", "mysql+asyncmy://")
+    elif "mysql://" in url and "mysql+asyncmy://" not in url:
+        url = url.replace("mysql://", "mysql+asyncmy://")
+
+    # 在连接字符串中添加 charset 参数
+    if "?" not in url:
+        url += "?charset=utf8mb4"
+    elif "charset=" not in url:
+        url += "&charset=utf8mb4"
+    else:
+        # 如果已有 charset 参数，确保是 utf8mb4
+        url = re.sub(r'charset=[^&]+', 'charset=utf8mb4', url)
+    return url
+
+
+_pool_metrics: Dict[str, PoolMetrics] = {}
+_engines: Dict[str, AsyncEngine] = {}
+
+
+def create_pooled_engine(name: str, url: str, pool_size: int, max_overflow: int) -> AsyncEngine:
+    """
+    创建带连接池统计的异步引擎
+
+    Args:
+        name: 连接池名称（用于指标与日志）
+        url: 数据库连接 URL
+        pool_size: 连接池大小
+        max_overflow: 最大溢出连接数
+    """
+    url = normalize_database_url(url)
+    if url.startswith("sqlite"):
+        # SQLite 仅用于本地测试，使用驱动默认连接池
+        eng = create_async_engine(url, echo=settings.DEBUG, future=True)
+    else:
+        eng = create_async_engine(
+            url,
+            echo=settings.DEBUG,  # 开发环境打印SQL
+            poolclass=MeteredQueuePool,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            future=True,
+            # 设置连接参数确保使用 UTF-8
+            connect_args={
+                "charset": "utf8mb4",
+                "use_unicode": True,
+                "init_command": "SET NAMES utf8mb4 COLLATE utf8mb4_unicode_ci",
+            } if "asyncmy" in url else {}
+        )
+    metrics = PoolMetrics(name)
+    if isinstance(eng.pool, MeteredQueuePool):
+        eng.pool.metrics = metrics
+    _pool_metrics[name] = metrics
+    _engines[name] = eng
+    return eng
+
+
+def _session_factory(bind: AsyncEngine) -> async_sessionmaker:
+    return async_sessionmaker(
+        bind,
+        class_=AsyncSession,
+        expire_on_commit=False,
+        autocommit=False,
+        autoflush=False,
+    )
+
+
+database_url = normalize_database_url(settings.database_url)
+
+# 请求连接池
+engine = create_pooled_engine("default", database_url, settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW)
+
+# 后台任务连接池
+background_engine = create_pooled_engine(
+    "background", database_url, settings.DB_BACKGROUND_POOL_SIZE, settings.DB_BACKGROUND_MAX_OVERFLOW
 )
 
+# 只读副本连接池（可选）
+replica_engine: Optional[AsyncEngine] = None
+if settings.DATABASE_REPLICA_URL:
+    replica_engine = create_pooled_engine(
+        "replica", settings.DATABASE_REPLICA_URL, settings.DB_REPLICA_POOL_SIZE, settings.DB_REPLICA_MAX_OVERFLOW
+    )
+
 # 创建异步会话工厂
-AsyncSessionLocal = async_sessionmaker(
-    engine,
-    class_=AsyncSession,
-    expire_on_commit=False,
-    autocommit=False,
-    autoflush=False,
+AsyncSessionLocal = _session_factory(engine)
+BackgroundSessionLocal = _session_factory(background_engine)
+ReplicaSessionLocal = _session_factory(replica_engine) if replica_engine is not None else None
+
+
+@event.listens_for(Session, "after_flush")
+def _mark_flush_writes(session, flush_context):
+    """记录会话是否发生过写操作（用于读写一致性路由）"""
+    session.info["has_writes"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_dml_writes(orm_execute_state):
+    """session.execute(update/delete/insert) 不经过 flush，单独记录"""
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info["has_writes"] = True
+
+
+async def probe_replica_lag(replica: AsyncEngine) -> float:
+    """
+    查询只读副本的复制延迟（秒）
+
+    MySQL 读取 SHOW REPLICA STATUS（旧版本为 SHOW SLAVE STATUS）；
+    非复制实例（无状态行）及 SQLite 视为无延迟；复制中断返回无穷大
+    """
+    async with replica.connect() as conn:
+        if replica.dialect.name != "mysql":
+            await conn.execute(text("SELECT 1"))
+            return 0.0
+        try:
+            result = await conn.execute(text("SHOW REPLICA STATUS"))
+        except exc.DBAPIError:
+            result = await conn.execute(text("SHOW SLAVE STATUS"))
+        row = result.mappings().first()
+    if row is None:
+        return 0.0
+    lag = row.get("Seconds_Behind_Source", row.get("Seconds_Behind_Master"))
+    return math.inf if lag is None else float(lag)
+
+
+class ReadRouter:
+    """
+    读请求路由
+
+    - 未配置副本：全部走主库
+    - 同一客户端写操作后 sticky_seconds 内：走主库（读己之写）
+    - 副本延迟超过 max_lag_seconds 或不可用：回退主库
+    - 其余：走只读副本
+
+    写入记录保存在进程内存中，多进程部署时各 worker 独立判断
+    """
+
+    def __init__(
+        self,
+        primary: async_sessionmaker,
+        replica: Optional[async_sessionmaker] = None,
+        background: Optional[async_sessionmaker] = None,
+        lag_probe: Optional[Callable[[], Awaitable[float]]] = None,
+        sticky_seconds: float = 10.0,
+        max_lag_seconds: float = 5.0,
+        lag_check_seconds: float = 5.0,
+    ):
+        self.primary = primary
+        self.replica = replica
+        self.background = background or primary
+        self.lag_probe = lag_probe
+        self.sticky_seconds = sticky_seconds
+        self.max_lag_seconds = max_lag_seconds
+        self.lag_check_seconds = lag_check_seconds
+        self._last_writes: Dict[str, float] = {}
+        self._lag = 0.0
+        self._lag_checked_at = 0.0
+        self._counters = {"primary": 0, "replica": 0, "sticky": 0, "lagFallback": 0}
+
+    def mark_write(self, key: Optional[str]) -> None:
+        """记录客户端发生写操作"""
+        if not key or self.replica is None:
+            return
+        now = time.monotonic()
+        self._last_writes[key] = now
+        if len(self._last_writes) > 10000:
+            # 清理过期记录，避免字典无限增长
+            expire = now - self.sticky_seconds
+            self._last_writes = {k: t for k, t in self._last_writes.items() if t > expire}
+
+    def is_sticky(self, key: Optional[str]) -> bool:
+        """客户端是否处于写后读主库窗口内"""
+        if not key:
+            return False
+        last = self._last_writes.get(key)
+        return last is not None and time.monotonic() - last < self.sticky_seconds
+
+    async def replica_lag(self) -> float:
+        """副本延迟（按间隔缓存检测结果；检测失败视为不可用）"""
+        now = time.monotonic()
+        if now - self._lag_checked_at < self.lag_check_seconds:
+            return self._lag
+        self._lag_checked_at = now
+        if self.lag_probe is None:
+            self._lag = 0.0
+            return self._lag
+        try:
+            self._lag = await self.lag_probe()
+        except Exception as e:
+            logger.warning(f"[读写路由] 副本延迟检测失败，回退主库: {str(e)}")
+            self._lag = math.inf
+        return self._lag
+
+    async def choose(self, key: Optional[str] = None, background: bool = False) -> async_sessionmaker:
+        """
+        选择读会话工厂
+
+        Args:
+            key: 客户端标识（用于读己之写）
+            background: 是否为长时间读取（导出、流式输出），回退主库时使用后台连接池
+        """
+        fallback = self.background if background else self.primary
+        if self.replica is None:
+            self._counters["primary"] += 1
+            return fallback
+        if self.is_sticky(key):
+            self._counters["sticky"] += 1
+            return fallback
+        if await self.replica_lag() > self.max_lag_seconds:
+            self._counters["lagFallback"] += 1
+            return fallback
+        self._counters["replica"] += 1
+        return self.replica
+
+    def stats(self) -> dict:
+        """路由统计"""
+        return {
+            "replicaEnabled": self.replica is not None,
+            "replicaLagSeconds": None if math.isinf(self._lag) else self._lag,
+            **self._counters,
+        }
+
+
+read_router = ReadRouter(
+    AsyncSessionLocal,
+    ReplicaSessionLocal,
+    background=BackgroundSessionLocal,
+    lag_probe=(lambda: probe_replica_lag(replica_engine)) if replica_engine is not None else None,
+    sticky_seconds=settings.DB_READ_YOUR_WRITES_SECONDS,
+    max_lag_seconds=settings.DB_REPLICA_MAX_LAG_SECONDS,
+    lag_check_seconds=settings.DB_REPLICA_LAG_CHECK_SECONDS,
 )
 
 
-async def get_db() -> AsyncGenerator[AsyncSession, None]:
+def client_key(request: Request) -> Optional[str]:
+    """读己之写的客户端标识：优先使用访问令牌，其次为客户端地址"""
+    token = request.headers.get("authorization") or request.query_params.get("token")
+    if token:
+        return hashlib.sha1(token.encode("utf-8")).hexdigest()
+    return request.client.host if request.client else None
+
+
+def get_pool_metrics() -> Dict[str, dict]:
+    """
+    获取各连接池的当前状态与等待统计
+
+    Returns:
+        以连接池名称为键的指标字典：size/checkedOut/checkedIn/overflow 为当前状态，
+        waitAvgMs/waitMaxMs/timeouts 为累计获取连接统计
+    """
+    data = {}
+    for name, eng in _engines.items():
+        pool = eng.pool
+        metrics = _pool_metrics[name]
+        item = {"pool": pool.__class__.__name__}
+        if isinstance(pool, AsyncAdaptedQueuePool):
+            item.update({
+                "size": pool.size(),
+                "checkedOut": pool.checkedout(),
+                "checkedIn": pool.checkedin(),
+                # QueuePool 的 overflow 计数从 -pool_size 起算，仅正值表示已用溢出连接
+                "overflow": max(0, pool.overflow()),
+                "maxOverflow": pool._max_overflow,
+            })
+        item.update({
+            "checkouts": metrics.checkouts,
+            "timeouts": metrics.timeouts,
+            "waitAvgMs": round(metrics.wait_total_ms / metrics.checkouts, 2) if metrics.checkouts else 0.0,
+            "waitMaxMs": round(metrics.wait_max_ms, 2),
+        })
+        data[name] = item
+    return data
+
+
+async def get_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
     """
     获取数据库会话的依赖注入函数
     用于 FastAPI 路由中
+
+    会话在首次执行 SQL 时才占用连接，commit/rollback 后归还；
+    需要等待大模型等慢调用时，先 commit 结束事务再调用，避免长时间占用请求连接池
     """
     async with AsyncSessionLocal() as session:
         try:
@@ -73,6 +380,22 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
             await session.rollback()
             raise
         finally:
+            if session.info.get("has_writes"):
+                read_router.mark_write(client_key(request))
+            await session.close()
+
+
+async def get_read_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """
+    获取只读数据库会话的依赖注入函数
+    用于检索、列表、报表等只读路由：优先只读副本，写后窗口内或副本延迟过大时走主库
+    """
+    factory = await read_router.choose(client_key(request))
+    async with factory() as session:
+        try:
+            yield session
+        finally:
+            await session.rollback()
             await session.close()
 
 
@@ -90,4 +413,5 @@ async def close_db() -> None:
     """
     关闭数据库连接
     """
-    await engine.dispose()
+    for eng in _engines.values():
+        await eng.dispose()
@@ -0,0 +1,125 @@
+"""
+增量 JSON 解析
+模型流式输出 JSON 对象时逐片喂入，顶层对象的每个成员在其值闭合时立即解析产出，
+无需等待整个对象输出完毕。对象之前的内容（如 ```json 代码块标记、说明文字）被跳过
+"""
+import json
+from typing import Any, Dict, List, Tuple
+
+# 解析状态
+_SEEK_OBJECT = 0  # 寻找顶层对象的 {
+_EXPECT_KEY = 1  # 等待成员键（或对象结束）
+_IN_KEY = 2  # 读取键字符串
+_EXPECT_COLON = 3  # 等待冒号
+_EXPECT_VALUE = 4  # 等待值开始
+_IN_VALUE = 5  # 读取值
+_AFTER_VALUE = 6  # 值已闭合，等待逗号或对象结束
+_DONE = 7
+
+_WHITESPACE = " \t\r\n"
+
+
+class IncrementalObjectParser:
+    """顶层 JSON 对象的增量解析器"""
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._state = _SEEK_OBJECT
+        self._start = 0  # 当前键或值在 _text 中的起始位置
+        self._key = ""
+        self._depth = 0  # 值内部的括号深度
+        self._in_string = False
+        self._escape = False
+        self.fields: Dict[str, Any] = {}
+
+    @property
+    def done(self) -> bool:
+        """顶层对象是否已闭合"""
+        return self._state == _DONE
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """
+        喂入一段输出
+
+        Returns:
+            本段中闭合的成员 [(键, 值)]；值不是合法 JSON 时跳过该成员
+        """
+        self._text += chunk
+        members: List[Tuple[str, Any]] = []
+        text = self._text
+        pos = self._pos
+        while pos < len(text) and self._state != _DONE:
+            ch = text[pos]
+            state = self._state
+            if state == _SEEK_OBJECT:
+                if ch == "{":
+                    self._state = _EXPECT_KEY
+            elif state == _EXPECT_KEY:
+                if ch == '"':
+                    self._state, self._start = _IN_KEY, pos
+                    self._escape = False
+                elif ch == "}":
+                    self._state = _DONE
+            elif state == _IN_KEY:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._key = json.loads(text[self._start:pos + 1])
+                    self._state = _EXPECT_COLON
+            elif state == _EXPECT_COLON:
+                if ch == ":":
+                    self._state = _EXPECT_VALUE
+            elif state == _EXPECT_VALUE:
+                if ch not in _WHITESPACE:
+                    self._state, self._start = _IN_VALUE, pos
+                    self._depth, self._in_string, self._escape = 0, False, False
+                    continue  # 由 _IN_VALUE 处理该字符
+            elif state == _IN_VALUE:
+                self._scan_value(text, pos, members)
+            elif state == _AFTER_VALUE:
+                if ch == ",":
+                    self._state = _EXPECT_KEY
+                elif ch == "}":
+                    self._state = _DONE
+            pos += 1
+        self._pos = pos
+        return members
+
+    def _scan_value(self, text: str, pos: int, members: List[Tuple[str, Any]]) -> None:
+        ch = text[pos]
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif ch == "\\":
+                self._escape = True
+            elif ch == '"':
+                self._in_string = False
+                if self._depth == 0:
+                    self._close_value(text[self._start:pos + 1], members, _AFTER_VALUE)
+            return
+        if ch == '"':
+            self._in_string = True
+        elif ch in "{[":
+            self._depth += 1
+        elif ch in "}]":
+            if self._depth == 0:
+                # 标量值后直接是对象结束
+                self._close_value(text[self._start:pos], members, _DONE)
+                return
+            self._depth -= 1
+            if self._depth == 0:
+                self._close_value(text[self._start:pos + 1], members, _AFTER_VALUE)
+        elif ch == "," and self._depth == 0:
+            self._close_value(text[self._start:pos], members, _EXPECT_KEY)
+
+    def _close_value(self, raw: str, members: List[Tuple[str, Any]], next_state: int) -> None:
+        self._state = next_state
+        try:
+            value = json.loads(raw)
+        except ValueError:
+            return
+        self.fields[self._key] = value
+        members.append((self._key, value))
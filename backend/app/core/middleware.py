@@ -2,10 +2,11 @@
 安全中间件模块
 符合等保 2.0 规范
 """
+import re
 import time
 import uuid
 from typing import Callable
-from fastapi import Request, Response, status
+from fastapi import HTTPException, Request, Response, status
 from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 from loguru import logger
@@ -13,6 +14,8 @@ from loguru import logger
 from app.core.config import settings
 from app.core.response import ResponseModel
 from app.core.errors import ErrorCode
+from app.core.security import decode_access_token
+from app.core.usage_context import tag_usage
 
 
 class SecurityHeadersMiddleware(BaseHTTPMiddleware):
@@ -217,3 +220,31 @@ class InputSanitizationMiddleware(BaseHTTPMiddleware):
                         )
         
         return await call_next(request)
+
+
+class UsageContextMiddleware(BaseHTTPMiddleware):
+    """
+    用量标签中间件
+    为 /api 请求写入用户与接口标签，请求中的大模型调用按标签记入用量台账；
+    这里只解析 Token 取用户，不做鉴权（鉴权仍由各接口的依赖完成）
+    """
+
+    # 路径中的数字 ID 归一，同一接口的调用汇总到一起
+    ID_SEGMENT = re.compile(r"/\d+(?=/|$)")
+
+    async def dispatch(self, request: Request, call_next: Callable) -> Response:
+        path = request.url.path
+        if not path.startswith("/api/"):
+            return await call_next(request)
+        tags = {"endpoint": f"{request.method} {self.ID_SEGMENT.sub('/{id}', path)}"}
+        authorization = request.headers.get("authorization", "")
+        # EventSource 无法设置请求头，SSE 接口的 Token 放在查询参数中
+        token = authorization[7:] if authorization.lower().startswith("bearer ") else request.query_params.get("token")
+        if token:
+            try:
+                payload = decode_access_token(token)
+                tags.update(user_id=payload.get("user_id"), username=payload.get("sub"))
+            except HTTPException:
+                pass
+        tag_usage(**tags)
+        return await call_next(request)
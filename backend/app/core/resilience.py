@@ -0,0 +1,165 @@
+"""
+上游调用弹性控制
+- AdaptiveLimiter：AIMD 自适应并发（无限流且延迟正常时并发上限 +1/上限，被限流时减半、延迟异常时小幅下调）
+- CircuitBreaker：连续失败达到阈值后熔断，冷却期内直接失败，冷却结束后放行一个探测请求；
+  探测请求未得出结论（排队超时、调用方中途放弃）时归还探测名额，超过冷却时间仍未上报结果的探测视为已放弃
+- backoff_delay：带随机抖动的指数退避
+调用在线程中执行（同步模型调用），以下实现均为线程安全
+"""
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# 熔断器状态
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class AdaptiveLimiter:
+    """AIMD 自适应并发上限"""
+
+    def __init__(
+        self,
+        initial: int,
+        minimum: int,
+        maximum: int,
+        latency_tolerance: float = 2.0,
+    ):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        # 延迟超过基线的倍数视为拥塞
+        self.latency_tolerance = latency_tolerance
+        self._baseline: Optional[float] = None
+        self._inflight = 0
+        self._cond = threading.Condition()
+        self._stats = {"throttled": 0, "congested": 0, "timeouts": 0}
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """
+        获取一个并发名额
+
+        Args:
+            timeout: 最长等待秒数（None 为一直等待）
+
+        Returns:
+            是否获取成功
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._inflight >= int(self.limit):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    return False
+                self._cond.wait(remaining)
+            self._inflight += 1
+            return True
+
+    def release(self, latency: Optional[float] = None, throttled: bool = False) -> None:
+        """
+        归还名额并根据结果调整并发上限
+
+        Args:
+            latency: 本次调用耗时（秒）；调用失败且非限流时传 None，不调整
+            throttled: 是否被上游限流（429）
+        """
+        with self._cond:
+            self._inflight -= 1
+            if throttled:
+                self.limit = max(self.minimum, self.limit / 2)
+                self._stats["throttled"] += 1
+            elif latency is not None:
+                if self._baseline is None:
+                    self._baseline = latency
+                if latency > self._baseline * self.latency_tolerance:
+                    self.limit = max(self.minimum, self.limit * 0.9)
+                    self._stats["congested"] += 1
+                else:
+                    self.limit = min(self.maximum, self.limit + 1 / self.limit)
+                # 基线缓慢跟随（输出长度不同，延迟本身波动较大）
+                self._baseline += (latency - self._baseline) * 0.05
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "limit": round(self.limit, 2),
+                "inflight": self._inflight,
+                "baselineLatency": round(self._baseline, 3) if self._baseline is not None else None,
+                **self._stats,
+            }
+
+
+class CircuitBreaker:
+    """熔断器：连续失败 failure_threshold 次后熔断 cooldown 秒"""
+
+    def __init__(self, failure_threshold: int, cooldown: float):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = STATE_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+        self._stats = {"opened": 0, "rejected": 0, "abandonedProbes": 0}
+
+    def allow(self) -> bool:
+        """是否放行本次调用（熔断冷却结束后只放行一个探测请求）"""
+        with self._lock:
+            if self.state == STATE_CLOSED:
+                return True
+            now = time.monotonic()
+            if self.state == STATE_OPEN and now - self._opened_at >= self.cooldown:
+                self.state = STATE_HALF_OPEN
+                self._probing = False
+            if self.state == STATE_HALF_OPEN and self._probing and now - self._probe_started >= self.cooldown:
+                # 探测请求一直未上报结果（调用方异常退出等），视为已放弃，避免一直停在半开状态
+                self._probing = False
+                self._stats["abandonedProbes"] += 1
+            if self.state == STATE_HALF_OPEN and not self._probing:
+                self._probing = True
+                self._probe_started = now
+                return True
+            self._stats["rejected"] += 1
+            return False
+
+    def retry_after(self) -> float:
+        """距离可以再次探测的秒数"""
+        with self._lock:
+            if self.state != STATE_OPEN:
+                return 0.0
+            return max(0.0, self.cooldown - (time.monotonic() - self._opened_at))
+
+    def release_probe(self) -> None:
+        """放行后未调用上游或未得出结论（排队超时、调用方中途取消）：归还探测名额，不改变熔断状态"""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = STATE_CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == STATE_HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != STATE_OPEN:
+                    self._stats["opened"] += 1
+                self.state = STATE_OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self.state, "consecutiveFailures": self._failures, **self._stats}
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """第 attempt 次重试（从 1 开始）前的等待秒数：指数退避 + 全抖动"""
+    return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
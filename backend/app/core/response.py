@@ -1,12 +1,13 @@
 """
 统一的响应封装工具
-确保所有 API 响应都遵循统一的 JSON 格式
+确保所有 API 响应都遵循统一的 JSON 格式，序列化走 orjson（见 serialization.py）
 """
 from typing import Any, Optional, Dict, List
 from fastapi.responses import JSONResponse
 from fastapi import status
 
 from app.core.errors import ErrorCode
+from app.core.serialization import FastJSONResponse
 
 
 class ResponseModel:
@@ -36,7 +37,7 @@ class ResponseModel:
             "message": message,
             "data": data if data is not None else {}
         }
-        return JSONResponse(
+        return FastJSONResponse(
             content=response_data, 
             status_code=status_code,
             media_type="application/json; charset=utf-8"
@@ -66,7 +67,7 @@ class ResponseModel:
             "message": message,
             "data": data if data is not None else {}
         }
-        return JSONResponse(
+        return FastJSONResponse(
             content=response_data, 
             status_code=status_code,
             media_type="application/json; charset=utf-8"
@@ -86,7 +87,7 @@ class ResponseModel:
         from app.core.errors import AppException, ErrorCode
         
         if isinstance(exc, AppException):
-            return JSONResponse(
+            return FastJSONResponse(
                 content=exc.to_dict(),
                 status_code=exc.status_code,
                 media_type="application/json; charset=utf-8"
@@ -136,7 +137,7 @@ class ResponseModel:
         }
         if meta:
             response_data["meta"] = meta
-        return JSONResponse(
+        return FastJSONResponse(
             content=response_data, 
             status_code=status.HTTP_200_OK,
             media_type="application/json; charset=utf-8"
@@ -0,0 +1,66 @@
+"""
+JSON 序列化工具
+统一使用 orjson 编码 API 响应与 SSE 帧（未安装时回退到标准库 json），
+SSE 帧直接编码为 bytes，避免每个小分片先转 str 再由响应层二次编码
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 依赖缺失时回退
+    orjson = None
+
+
+def _json_default(obj: Any) -> Any:
+    """处理 orjson / json 不能直接序列化的类型"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(data: Any) -> bytes:
+    """将数据编码为 UTF-8 JSON 字节（中文不转义）"""
+    if orjson is not None:
+        return orjson.dumps(data, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        data,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=_json_default,
+    ).encode("utf-8")
+
+
+def loads(data: bytes) -> Any:
+    """解码 JSON 字节"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def sse_frame(data: Any) -> bytes:
+    """编码一条 SSE 消息帧：data: <json>\\n\\n"""
+    return b"data: " + dumps(data) + b"\n\n"
+
+
+# 常用的固定帧预先编码，流式接口直接复用
+SSE_DONE = sse_frame({"done": True})
+
+
+class FastJSONResponse(JSONResponse):
+    """基于 orjson 的 JSON 响应，作为应用默认响应类"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
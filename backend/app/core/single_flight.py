@@ -0,0 +1,167 @@
+"""
+相同请求合并（single-flight）
+同一键的调用正在进行时，后到的相同调用不再重复执行，而是等待并共享第一次调用的结果：
+- SingleFlight：同步调用（在线程中执行的模型调用），线程安全
+- SharedStream：流式调用，上游只调用一次，多个订阅者共享输出；
+  后加入的订阅者先重放已收到的片段，再继续接收新片段
+"""
+import asyncio
+import contextvars
+import hashlib
+import json
+import threading
+from concurrent.futures import Executor
+from typing import Any, AsyncGenerator, Callable, Dict, Iterator, List, Optional, Tuple
+
+
+def request_key(*parts: Any) -> str:
+    """由请求参数（模型、提示词、采样参数等）计算合并键"""
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class _Call:
+    """一次进行中的同步调用"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """同步调用合并：相同键的并发调用只执行一次"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._stats = {"calls": 0, "coalesced": 0}
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        执行调用；相同键的调用进行中时等待其结果
+
+        Args:
+            key: 合并键
+            fn: 实际调用
+
+        Returns:
+            (结果, 是否共享了其他调用的结果)；首个调用抛出的异常同样抛给所有等待者
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._stats["calls"] += 1
+            else:
+                call.waiters += 1
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.event.set()
+        return call.result, False
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"inflight": len(self._calls), **self._stats}
+
+
+class SharedStream:
+    """
+    一次上游流式调用的共享输出
+
+    上游迭代在线程池中执行，片段通过事件循环分发给订阅者；
+    所有订阅者都断开后停止读取上游
+    """
+
+    def __init__(self, on_finish: Optional[Callable[["SharedStream"], None]] = None):
+        self._loop = asyncio.get_running_loop()
+        self._items: List[Any] = []
+        self._event = asyncio.Event()
+        self._cancelled = threading.Event()
+        self._on_finish = on_finish
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+
+    def start(self, executor: Optional[Executor], iterate: Callable[[], Iterator[Any]]) -> None:
+        """在线程池中开始读取上游"""
+        # 复制当前上下文，线程中的调用可读取请求的 contextvars（如用量标签）
+        self._loop.run_in_executor(executor, contextvars.copy_context().run, self._pump, iterate)
+
+    def _pump(self, iterate: Callable[[], Iterator[Any]]) -> None:
+        error: Optional[BaseException] = None
+        try:
+            for item in iterate():
+                if self._cancelled.is_set():
+                    break
+                self._loop.call_soon_threadsafe(self._append, item)
+        except BaseException as e:
+            error = e
+        try:
+            self._loop.call_soon_threadsafe(self._finish, error)
+        except RuntimeError:
+            # 事件循环已关闭（应用退出）
+            pass
+
+    def _notify(self) -> None:
+        event, self._event = self._event, asyncio.Event()
+        event.set()
+
+    def _append(self, item: Any) -> None:
+        self._items.append(item)
+        self._notify()
+
+    def _finish(self, error: Optional[BaseException]) -> None:
+        self.done = True
+        self.error = error
+        self._notify()
+        if self._on_finish:
+            self._on_finish(self)
+
+    def cancel(self) -> None:
+        """停止读取上游（下一个片段到达时生效）"""
+        self._cancelled.set()
+        if self._on_finish:
+            self._on_finish(self)
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    async def subscribe(self) -> AsyncGenerator[Any, None]:
+        """
+        订阅输出：先重放已收到的片段，再等待新片段；上游出错时抛出同一异常
+        """
+        self.subscribers += 1
+        index = 0
+        try:
+            while True:
+                while index < len(self._items):
+                    item = self._items[index]
+                    index += 1
+                    yield item
+                if self.done:
+                    break
+                await self._event.wait()
+            if self.error is not None:
+                raise self.error
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0 and not self.done:
+                self.cancel()
@@ -0,0 +1,194 @@
+"""
+SSE 流式响应
+所有 text/event-stream 接口统一经 sse_response 输出：
+- 合并内容增量：模型逐 token 产出的 {"content": "..."} 帧在时间窗口（SSE_COALESCE_MS）
+  或大小窗口（SSE_COALESCE_BYTES）内合并为一帧，减少小分片写入；
+  除 content 外其余字段相同的相邻帧才合并，其他帧原样按顺序输出
+- 心跳：超过 SSE_HEARTBEAT_SECONDS 未输出时发送注释行，避免代理因长时间无数据断开连接
+- 客户端断开：停止读取上游生成器并关闭它（共享的上游流在最后一个订阅者断开时停止）
+- 背压：只有上一帧被写出后才读取下一帧，客户端读取慢时上游生成器随之暂停
+"""
+import asyncio
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List, Optional
+
+import anyio
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from loguru import logger
+
+from app.core.config import settings
+from app.core.serialization import loads, sse_frame
+
+SSE_MEDIA_TYPE = "text/event-stream"
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "Connection": "keep-alive",
+    "X-Accel-Buffering": "no",
+}
+# 心跳注释行（以冒号开头，EventSource 与前端解析均忽略）
+SSE_HEARTBEAT = b": ping\n\n"
+
+_DATA_PREFIX = b"data: "
+_CONTENT_MARK = b'"content":'
+
+
+def _content_delta(frame: bytes) -> Optional[Dict[str, Any]]:
+    """frame 是单条带字符串 content 的 JSON 帧时返回解码后的数据，否则返回 None"""
+    if not (frame.startswith(_DATA_PREFIX) and frame.endswith(b"\n\n") and _CONTENT_MARK in frame):
+        return None
+    try:
+        data = loads(frame[len(_DATA_PREFIX):-2])
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get("content"), str):
+        return None
+    return data
+
+
+class FrameCoalescer:
+    """合并相邻的内容增量帧"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._head: Optional[Dict[str, Any]] = None  # 待合并的首帧（content 以外的字段）
+        self._parts: List[str] = []
+        self._size = 0
+
+    @property
+    def pending(self) -> bool:
+        return self._head is not None
+
+    def flush(self) -> Optional[bytes]:
+        """输出待合并内容"""
+        if self._head is None:
+            return None
+        frame = sse_frame({**self._head, "content": "".join(self._parts)})
+        self._head, self._parts, self._size = None, [], 0
+        return frame
+
+    def add(self, frame: bytes) -> List[bytes]:
+        """加入一帧，返回需要立即输出的帧"""
+        data = _content_delta(frame)
+        out: List[bytes] = []
+        if data is None:
+            if self.pending:
+                out.append(self.flush())
+            out.append(frame)
+            return out
+        content = data["content"]
+        if self._head is not None and not self._same_fields(data):
+            out.append(self.flush())
+        if self._head is None:
+            self._head = data
+        self._parts.append(content)
+        self._size += len(content.encode("utf-8"))
+        if self._size >= self.max_bytes:
+            out.append(self.flush())
+        return out
+
+    def _same_fields(self, data: Dict[str, Any]) -> bool:
+        head = self._head
+        return head.keys() == data.keys() and all(head[k] == data[k] for k in head if k != "content")
+
+
+async def sse_stream(
+    source: AsyncIterable[bytes],
+    request: Optional[Request] = None,
+    coalesce_ms: Optional[int] = None,
+    coalesce_bytes: Optional[int] = None,
+    heartbeat_seconds: Optional[float] = None,
+) -> AsyncIterator[bytes]:
+    """
+    包装 SSE 帧生成器：合并内容增量、发送心跳、客户端断开时关闭上游
+
+    Args:
+        source: 产出 SSE 帧（bytes）的异步生成器
+        request: 当前请求，空闲期间检查客户端是否已断开
+        coalesce_ms: 内容合并时间窗口（毫秒），0 表示不合并
+        coalesce_bytes: 内容合并大小窗口（字节）
+        heartbeat_seconds: 心跳间隔（秒），0 表示不发送心跳
+
+    Yields:
+        SSE 帧
+    """
+    window = (settings.SSE_COALESCE_MS if coalesce_ms is None else coalesce_ms) / 1000
+    heartbeat = settings.SSE_HEARTBEAT_SECONDS if heartbeat_seconds is None else heartbeat_seconds
+    coalescer = FrameCoalescer(coalesce_bytes or settings.SSE_COALESCE_BYTES)
+    loop = asyncio.get_running_loop()
+    iterator = source.__aiter__()
+    # 任意时刻最多只有一个读取上游的任务：帧写出后才读下一帧
+    next_task: Optional[asyncio.Future] = None
+    last_sent = loop.time()
+    pending_since: Optional[float] = None
+    try:
+        while True:
+            if next_task is None:
+                next_task = asyncio.ensure_future(iterator.__anext__())
+            deadlines = [last_sent + heartbeat] if heartbeat > 0 else []
+            if pending_since is not None:
+                deadlines.append(pending_since + window)
+            timeout = max(0.0, min(deadlines) - loop.time()) if deadlines else None
+            done, _ = await asyncio.wait({next_task}, timeout=timeout)
+
+            if not done:
+                now = loop.time()
+                if pending_since is not None and now >= pending_since + window:
+                    yield coalescer.flush()
+                    pending_since, last_sent = None, now
+                elif heartbeat > 0 and now >= last_sent + heartbeat:
+                    if request is not None and await request.is_disconnected():
+                        logger.info("SSE 客户端已断开，停止生成")
+                        break
+                    yield SSE_HEARTBEAT
+                    last_sent = loop.time()
+                continue
+
+            task, next_task = next_task, None
+            try:
+                frame = task.result()
+            except StopAsyncIteration:
+                break
+            except Exception:
+                # 上游异常前先输出已合并的内容
+                tail = coalescer.flush()
+                if tail:
+                    yield tail
+                raise
+
+            emitted = coalescer.add(frame) if window > 0 else [frame]
+            for out in emitted:
+                yield out
+            if emitted:
+                last_sent = loop.time()
+            if not coalescer.pending:
+                pending_since = None
+            elif pending_since is None:
+                pending_since = loop.time()
+
+        tail = coalescer.flush()
+        if tail:
+            yield tail
+    finally:
+        # 客户端断开时所在任务已被取消，清理上游需屏蔽取消
+        with anyio.CancelScope(shield=True):
+            if next_task is not None:
+                next_task.cancel()
+                try:
+                    await next_task
+                except (asyncio.CancelledError, StopAsyncIteration, Exception):
+                    pass
+            aclose = getattr(iterator, "aclose", None)
+            if aclose is not None:
+                try:
+                    await aclose()
+                except Exception as e:
+                    logger.debug(f"关闭 SSE 上游生成器异常: {e}")
+
+
+def sse_response(source: AsyncIterable[bytes], request: Optional[Request] = None, **options: Any) -> StreamingResponse:
+    """构建 SSE 流式响应（参数同 sse_stream）"""
+    return StreamingResponse(
+        sse_stream(source, request, **options),
+        media_type=SSE_MEDIA_TYPE,
+        headers=SSE_HEADERS,
+    )
@@ -0,0 +1,236 @@
+"""
+可续传的 SSE 生成会话
+生成过程与 HTTP 连接解耦：每次生成创建一个会话，在后台任务中读取上游并把（合并后的）事件
+写入定长环形缓冲区，每个事件带 id（<会话ID>-<序号>）。连接断开后生成继续进行，
+客户端携带 Last-Event-ID 重连时先重放缺失的事件再继续接收新事件，不会重新调用模型。
+
+- 重连方式：原接口重发请求并带 Last-Event-ID 请求头（fetch），
+  或 GET /doc-generate/stream/{session_id}（EventSource 自动重连时浏览器会带上 Last-Event-ID）
+- 缺失的事件已被环形缓冲区覆盖时返回错误事件，客户端需重新生成
+- 无客户端连接超过 SSE_SESSION_IDLE_SECONDS 的进行中会话被取消；结束的会话保留 SSE_SESSION_TTL 秒
+"""
+import asyncio
+import uuid
+from collections import deque
+from typing import AsyncGenerator, AsyncIterable, Callable, Deque, Dict, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from loguru import logger
+
+from app.core.config import settings
+from app.core.serialization import sse_frame
+from app.core.sse import SSE_HEADERS, SSE_MEDIA_TYPE, sse_stream
+
+# 响应头：会话 ID（客户端未收到任何事件就断开时也可用于重连）
+SESSION_HEADER = "X-Stream-Session"
+
+
+def parse_event_id(event_id: Optional[str]) -> Optional[Tuple[str, int]]:
+    """解析事件 id（<会话ID>-<序号>），格式不符时返回 None"""
+    if not event_id:
+        return None
+    session_id, _, seq = event_id.strip().rpartition("-")
+    if not session_id or not seq.isdigit():
+        return None
+    return session_id, int(seq)
+
+
+class StreamSession:
+    """一次生成会话"""
+
+    def __init__(self, session_id: str, owner: str, buffer_size: int):
+        self.id = session_id
+        self.owner = owner
+        self._loop = asyncio.get_running_loop()
+        self._events: Deque[Tuple[int, bytes]] = deque(maxlen=buffer_size)
+        self._next_seq = 1
+        self._changed = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._idle_timer: Optional[asyncio.TimerHandle] = None
+        self.done = False
+        self.subscribers = 0
+        self.finished_at: Optional[float] = None
+
+    def start(self, source: AsyncIterable[bytes]) -> None:
+        """在后台任务中读取上游（内容增量先合并，缓冲区按合并后的事件计数）"""
+        self._task = asyncio.create_task(self._pump(source))
+        # 客户端在开始读取响应前就断开时不会订阅，同样需要超时取消
+        self._arm_idle_timer()
+
+    async def _pump(self, source: AsyncIterable[bytes]) -> None:
+        try:
+            async for frame in sse_stream(source, heartbeat_seconds=0):
+                self._append(frame)
+        except asyncio.CancelledError:
+            self._append(sse_frame({"error": "生成已取消"}))
+        except Exception as e:
+            logger.error(f"SSE 会话 {self.id} 生成异常: {str(e)}")
+            self._append(sse_frame({"error": str(e)}))
+        finally:
+            self.done = True
+            self.finished_at = self._loop.time()
+            self._notify()
+
+    def _notify(self) -> None:
+        event, self._changed = self._changed, asyncio.Event()
+        event.set()
+
+    def _append(self, frame: bytes) -> None:
+        seq = self._next_seq
+        self._next_seq += 1
+        self._events.append((seq, f"id: {self.id}-{seq}\n".encode() + frame))
+        self._notify()
+
+    @property
+    def last_seq(self) -> int:
+        return self._next_seq - 1
+
+    async def subscribe(self, after: int = 0) -> AsyncGenerator[bytes, None]:
+        """
+        订阅事件：先重放序号大于 after 的已缓冲事件，再等待新事件
+
+        Args:
+            after: 客户端已收到的最后一个事件序号（Last-Event-ID 中的序号）
+        """
+        self.subscribers += 1
+        self._cancel_idle_timer()
+        try:
+            position = after + 1
+            while True:
+                if self._events and position < self._events[0][0]:
+                    # 缺失的事件已被覆盖（断线太久或客户端读取太慢）
+                    logger.warning(f"SSE 会话 {self.id} 无法续传：事件 {position} 已被覆盖")
+                    yield sse_frame({"error": "连接中断时间过长，部分内容已丢失，请重新生成", "resumeFailed": True})
+                    return
+                if position <= self.last_seq:
+                    yield self._events[position - self._events[0][0]][1]
+                    position += 1
+                    continue
+                if self.done:
+                    return
+                await self._changed.wait()
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0:
+                self._arm_idle_timer()
+
+    def _arm_idle_timer(self) -> None:
+        if not self.done:
+            self._cancel_idle_timer()
+            self._idle_timer = self._loop.call_later(settings.SSE_SESSION_IDLE_SECONDS, self._abandon)
+
+    def _cancel_idle_timer(self) -> None:
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+
+    def _abandon(self) -> None:
+        """长时间无客户端连接：停止生成，避免为无人接收的内容继续消耗 token"""
+        self._idle_timer = None
+        if self.subscribers == 0 and not self.done and self._task is not None:
+            logger.info(f"SSE 会话 {self.id} 长时间无连接，取消生成")
+            self._task.cancel()
+
+    def cancel(self) -> None:
+        self._cancel_idle_timer()
+        if self._task is not None and not self.done:
+            self._task.cancel()
+
+
+class StreamSessionManager:
+    """生成会话注册表"""
+
+    def __init__(self, buffer_size: Optional[int] = None, ttl: Optional[float] = None):
+        self.buffer_size = buffer_size or settings.SSE_SESSION_BUFFER
+        self.ttl = settings.SSE_SESSION_TTL if ttl is None else ttl
+        self._sessions: Dict[str, StreamSession] = {}
+        self._stats = {"sessions": 0, "resumed": 0, "resumeFailed": 0}
+
+    def _cleanup(self) -> None:
+        """移除结束超过 TTL 且无连接的会话"""
+        now = asyncio.get_running_loop().time()
+        expired = [
+            session_id for session_id, session in self._sessions.items()
+            if session.done and session.subscribers == 0 and now - session.finished_at > self.ttl
+        ]
+        for session_id in expired:
+            del self._sessions[session_id]
+
+    def start(self, owner: str, source: AsyncIterable[bytes]) -> StreamSession:
+        """创建会话并开始生成"""
+        self._cleanup()
+        session = StreamSession(uuid.uuid4().hex, owner, self.buffer_size)
+        self._sessions[session.id] = session
+        self._stats["sessions"] += 1
+        session.start(source)
+        return session
+
+    def resume(self, owner: str, event_id: Optional[str]) -> Optional[Tuple[StreamSession, int]]:
+        """
+        按 Last-Event-ID 查找可续传的会话
+
+        Returns:
+            (会话, 已收到的最后序号)；会话不存在、已过期或不属于当前用户时返回 None
+        """
+        self._cleanup()
+        parsed = parse_event_id(event_id)
+        if parsed is None:
+            return None
+        session = self._sessions.get(parsed[0])
+        if session is None or session.owner != owner:
+            self._stats["resumeFailed"] += 1
+            return None
+        self._stats["resumed"] += 1
+        return session, parsed[1]
+
+    def get(self, owner: str, session_id: str) -> Optional[StreamSession]:
+        session = self._sessions.get(session_id)
+        if session is None or session.owner != owner:
+            return None
+        return session
+
+    def stats(self) -> Dict[str, int]:
+        active = sum(1 for session in self._sessions.values() if not session.done)
+        return {"active": active, "buffered": len(self._sessions), **self._stats}
+
+    def shutdown(self) -> None:
+        """取消所有进行中的会话"""
+        for session in self._sessions.values():
+            session.cancel()
+        self._sessions.clear()
+
+
+def session_response(session: StreamSession, after: int, request: Optional[Request] = None) -> StreamingResponse:
+    """会话订阅的 SSE 响应：连接断开只取消订阅，不影响生成"""
+    return StreamingResponse(
+        sse_stream(session.subscribe(after), request, coalesce_ms=0),
+        media_type=SSE_MEDIA_TYPE,
+        headers={**SSE_HEADERS, SESSION_HEADER: session.id},
+    )
+
+
+def resumable_sse_response(
+    request: Request,
+    owner: str,
+    factory: Callable[[], AsyncIterable[bytes]],
+) -> StreamingResponse:
+    """
+    可续传的 SSE 响应：请求带 Last-Event-ID 且会话仍在时续传，否则调用 factory 开始新的生成
+
+    Args:
+        request: 当前请求
+        owner: 会话所属用户（只能续传自己的会话）
+        factory: 创建上游 SSE 帧生成器
+    """
+    resumed = stream_sessions.resume(owner, request.headers.get("last-event-id"))
+    if resumed is not None:
+        session, after = resumed
+        logger.info(f"SSE 会话 {session.id} 从事件 {after} 续传")
+        return session_response(session, after, request)
+    session = stream_sessions.start(owner, factory())
+    return session_response(session, 0, request)
+
+
+# 创建全局实例
+stream_sessions = StreamSessionManager()
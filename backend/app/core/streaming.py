@@ -0,0 +1,64 @@
+"""
+大结果集流式输出工具
+基于服务端游标（stream_scalars + yield_per）逐批读取 ORM 对象，以 NDJSON 格式边查边返回，
+内存占用只与批大小相关，适用于整类拉取、夜间同步等集成场景
+"""
+from typing import Any, AsyncGenerator, Callable, Dict
+
+from fastapi.responses import StreamingResponse
+from loguru import logger
+from sqlalchemy import Select
+
+from app.core.config import settings
+from app.core.serialization import dumps
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+async def stream_scalars_ndjson(
+    query: Select,
+    serializer: Callable[[Any], Dict[str, Any]],
+    batch_size: int = None,
+) -> AsyncGenerator[bytes, None]:
+    """
+    以 NDJSON 流式输出查询结果
+
+    Args:
+        query: ORM 查询（select(Model)...）
+        serializer: 将 ORM 对象转为字典的函数
+        batch_size: 每批从游标拉取的行数
+
+    Yields:
+        每批一个字节块，每行一个 JSON 对象
+    """
+    from app.core.database import read_router
+
+    batch_size = batch_size or settings.STREAM_BATCH_SIZE
+    # 使用独立会话（只读副本或后台连接池）：长时间流式输出不占用请求连接池
+    session_factory = await read_router.choose(background=True)
+    async with session_factory() as db:
+        try:
+            result = await db.stream_scalars(query.execution_options(yield_per=batch_size))
+            async for partition in result.partitions(batch_size):
+                lines = [dumps(serializer(obj)) for obj in partition]
+                # 身份映射为弱引用，已输出的批次随 partition 释放，内存不随结果集增长
+                yield b"\n".join(lines) + b"\n"
+        except Exception as e:
+            logger.error(f"NDJSON 流式输出异常: {str(e)}")
+            yield dumps({"error": str(e)}) + b"\n"
+
+
+def ndjson_response(
+    query: Select,
+    serializer: Callable[[Any], Dict[str, Any]],
+    batch_size: int = None,
+) -> StreamingResponse:
+    """构建 NDJSON 流式响应"""
+    return StreamingResponse(
+        stream_scalars_ndjson(query, serializer, batch_size),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
@@ -0,0 +1,21 @@
+"""
+大模型用量标签
+请求进入时由 UsageContextMiddleware 写入用户与接口，业务代码可追加导入任务等标签；
+大模型调用按调用时上下文中的标签记入用量台账（usage_ledger）。
+标签存放在 contextvars 中：asyncio 任务与 asyncio.to_thread 会复制上下文，
+run_in_executor 不会，提交到自建线程池时需用 contextvars.copy_context().run 包装
+"""
+from contextvars import ContextVar
+from typing import Any, Dict
+
+_usage_tags: ContextVar[Dict[str, Any]] = ContextVar("usage_tags", default={})
+
+
+def current_usage_tags() -> Dict[str, Any]:
+    """当前上下文的用量标签（user_id、username、endpoint、import_task_id）"""
+    return _usage_tags.get()
+
+
+def tag_usage(**tags: Any) -> None:
+    """为当前上下文追加用量标签（值为 None 的忽略），对之后创建的任务同样生效"""
+    _usage_tags.set({**_usage_tags.get(), **{k: v for k, v in tags.items() if v is not None}})
@@ -10,13 +10,27 @@ from loguru import logger
 import traceback
 
 from app.core.config import settings
+from app.core.database import close_db, get_pool_metrics, read_router
+from app.core.sse_sessions import stream_sessions
+from app.services.official_doc import official_doc_service
+from app.services.case_extraction import case_field_extractor
+from app.services.content_review import content_reviewer
+from app.services.export_service import export_service
+from app.services.extraction_retry import extraction_retry_queue
+from app.services.graph_indexer import graph_indexer
+from app.services.knowledge_graph import knowledge_graph_service
+from app.services.qwen_service import qwen_service
+from app.services.rule_extraction import rule_field_extractor
+from app.services.usage_ledger import usage_ledger
 from app.core.response import ResponseModel
+from app.core.serialization import FastJSONResponse
 from app.core.errors import AppException, ErrorCode
 from app.core.middleware import (
     SecurityHeadersMiddleware,
     AccessLogMiddleware,
     RateLimitMiddleware,
     InputSanitizationMiddleware,
+    UsageContextMiddleware,
 )
 
 
@@ -39,11 +53,33 @@ async def lifespan(app: FastAPI):
             raise  # 生产环境失败则阻止启动
         else:
             logger.warning("⚠️  开发环境：数据库初始化失败，但应用将继续启动")
+
+    # 启动延迟提取队列（恢复 AI 服务不可用期间导入、待重新提取的案卷）
+    await extraction_retry_queue.start()
+    # 启动用量台账批量写入（恢复各用户当日用量）
+    await usage_ledger.start()
+    # 加载知识图谱内存邻接表
+    try:
+        await knowledge_graph_service.load()
+    except Exception as e:
+        logger.warning(f"知识图谱加载失败，图谱查询暂不可用: {e}")
+    # 启动案卷入图队列（导入、审核、入库后增量写入图谱）
+    await graph_indexer.start()
     
     yield
     
     # 关闭时执行（如果需要）
     logger.info("应用正在关闭...")
+    await extraction_retry_queue.stop()
+    await graph_indexer.stop()
+    stream_sessions.shutdown()
+    await usage_ledger.stop()
+    await close_db()
+    official_doc_service.shutdown()
+    case_field_extractor.shutdown()
+    content_reviewer.shutdown()
+    export_service.shutdown()
+    qwen_service.shutdown()
 
 
 # 创建FastAPI应用实例
@@ -72,6 +108,7 @@ app = FastAPI(
     redoc_url="/redoc",
     openapi_url="/openapi.json",
     lifespan=lifespan,
+    default_response_class=FastJSONResponse,
     contact={
         "name": "开发团队",
         "email": "dev@example.com",
@@ -115,6 +152,7 @@ app.add_middleware(
 
 # 添加安全中间件（符合等保 2.0 规范）
 # 顺序很重要：从外到内依次执行
+app.add_middleware(UsageContextMiddleware)  # 大模型用量标签（用户、接口）
 app.add_middleware(InputSanitizationMiddleware)  # 输入清理
 if settings.RATE_LIMIT_ENABLED:
     app.add_middleware(RateLimitMiddleware, calls=settings.RATE_LIMIT_CALLS, period=settings.RATE_LIMIT_PERIOD)  # 速率限制
@@ -144,6 +182,27 @@ async def health_check():
     )
 
 
+@app.get("/health/db-pool")
+async def db_pool_metrics():
+    """数据库连接池指标（已借出、溢出、获取连接等待时间）与读写路由统计"""
+    return ResponseModel.success(data={
+        "pools": get_pool_metrics(),
+        "readRouting": read_router.stats(),
+    })
+
+
+@app.get("/health/llm")
+async def llm_metrics():
+    """大模型调用指标（相同请求合并、各模型 p50/p95 延迟与路由选择、自适应并发、熔断状态、延迟提取队列、可续传生成会话、封面规则提取与用量台账）"""
+    return ResponseModel.success(data={
+        **qwen_service.stats(),
+        "deferredExtraction": extraction_retry_queue.stats(),
+        "streamSessions": stream_sessions.stats(),
+        "ruleExtraction": rule_field_extractor.stats(),
+        "usage": usage_ledger.stats(),
+    })
+
+
 # 全局异常处理器 - 确保所有错误都返回统一的 JSON 格式
 # 注意：异常处理器的顺序很重要，应该从最具体到最通用
 
@@ -9,6 +9,8 @@ from app.models.import_task import ImportTask
 from app.models.doc_generate_task import DocGenerateTask
 from app.models.ocr_task import OcrTask
 from app.models.template import DocTemplate
+from app.models.llm_usage import LlmUsage
+from app.models.knowledge_graph import KgEntity, KgRelation, KgRelationSource
 
 # 导出所有模型
-__all__ = ["Base", "User", "CaseFile", "ImportTask", "DocGenerateTask", "OcrTask", "DocTemplate"]
+__all__ = ["Base", "User", "CaseFile", "ImportTask", "DocGenerateTask", "OcrTask", "DocTemplate", "LlmUsage", "KgEntity", "KgRelation", "KgRelationSource"]
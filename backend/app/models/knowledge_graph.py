@@ -0,0 +1,49 @@
+"""
+知识图谱模型
+"""
+from sqlalchemy import Column, BigInteger, Integer, String, JSON, DateTime, Float, func, Index, UniqueConstraint
+from app.core.database import Base
+
+# SQLite 只有 INTEGER 主键自增（测试与本地开发库）
+_ID = BigInteger().with_variant(Integer, "sqlite")
+
+
+class KgEntity(Base):
+    """知识图谱实体表（案件、人员、法规、地点、单位等）"""
+    __tablename__ = "kg_entities"
+
+    id = Column(_ID, primary_key=True, autoincrement=True, comment="实体ID")
+    entity_type = Column(String(20), nullable=False, index=True, comment="实体类型: case/person/law/location/department/category")
+    entity_key = Column(String(300), nullable=False, unique=True, comment="去重键: 类型 + 归一化名称")
+    name = Column(String(200), nullable=False, index=True, comment="实体名称")
+    properties = Column(JSON, comment="实体属性")
+    case_file_id = Column(BigInteger, index=True, comment="案件实体对应的案卷ID")
+    created_at = Column(DateTime, server_default=func.now(), comment="创建时间")
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), comment="更新时间")
+
+
+class KgRelation(Base):
+    """知识图谱关系表（有向边，同一对实体同一类型只保留一条）"""
+    __tablename__ = "kg_relations"
+
+    id = Column(_ID, primary_key=True, autoincrement=True, comment="关系ID")
+    source_id = Column(BigInteger, nullable=False, comment="起点实体ID")
+    target_id = Column(BigInteger, nullable=False, index=True, comment="终点实体ID")
+    relation_type = Column(String(30), nullable=False, comment="关系类型")
+    weight = Column(Float, default=1.0, comment="权重（如共同涉及的案件数）")
+    properties = Column(JSON, comment="关系属性")
+    case_file_id = Column(BigInteger, index=True, comment="首个来源案卷ID（人工创建为空）")
+    created_at = Column(DateTime, server_default=func.now(), comment="创建时间")
+
+    __table_args__ = (
+        UniqueConstraint("source_id", "target_id", "relation_type", name="uk_kg_relation"),
+        Index("idx_kg_relation_source", "source_id", "relation_type"),
+    )
+
+
+class KgRelationSource(Base):
+    """关系来源表：由案卷抽取的关系与来源案卷的对应（同一关系可由多份案卷得出，全部来源移除后删除关系）"""
+    __tablename__ = "kg_relation_sources"
+
+    relation_id = Column(_ID, primary_key=True, comment="关系ID")
+    case_file_id = Column(BigInteger, primary_key=True, index=True, comment="来源案卷ID")
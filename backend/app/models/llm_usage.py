@@ -0,0 +1,30 @@
+"""
+大模型用量模型
+"""
+from sqlalchemy import Column, BigInteger, String, Integer, Boolean, DateTime, func, Index
+from app.core.database import Base
+
+
+class LlmUsage(Base):
+    """大模型调用用量表（每次上游调用一条，由用量台账批量写入）"""
+    __tablename__ = "llm_usage"
+
+    # SQLite 只有 INTEGER 主键自增（测试与本地开发库）
+    id = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True, comment="记录ID")
+    user_id = Column(BigInteger, index=True, comment="用户ID（后台任务为空）")
+    username = Column(String(50), comment="用户名")
+    endpoint = Column(String(200), index=True, comment="接口：方法 + 路径（路径中的数字 ID 归一为 {id}）")
+    import_task_id = Column(BigInteger, index=True, comment="导入任务ID")
+    route = Column(String(50), comment="模型路由")
+    model = Column(String(50), index=True, comment="模型")
+    stream = Column(Boolean, default=False, comment="是否流式调用")
+    success = Column(Boolean, default=True, comment="是否成功")
+    input_tokens = Column(Integer, default=0, comment="输入 tokens")
+    output_tokens = Column(Integer, default=0, comment="输出 tokens")
+    cached_tokens = Column(Integer, default=0, comment="命中前缀缓存的输入 tokens")
+    latency_ms = Column(Integer, default=0, comment="耗时（毫秒，流式为整个流的耗时）")
+    created_at = Column(DateTime, server_default=func.now(), index=True, comment="调用时间")
+
+    __table_args__ = (
+        Index("idx_llm_usage_user_created", "user_id", "created_at"),
+    )
@@ -0,0 +1,499 @@
+"""
+长卷宗分段提取
+正文超过单段 token 预算时按段落（优先在一级标题处）切分，各段并发调用模型提取字段，
+再按字段类型合并：身份类字段多数表决、叙述类字段按顺序去重拼接、人员信息逐项表决、时间线合并排序。
+总耗时取决于最慢的一段，而不是整卷一次调用。
+调用模型前先按封面标签规则提取（rule_extraction），规则字段齐全时不调用模型
+"""
+import asyncio
+import contextvars
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, AsyncGenerator, Callable, Dict, Iterator, List, Optional, Tuple
+
+from loguru import logger
+
+from app.core.config import settings
+from app.core.single_flight import SharedStream
+from app.models.archive import CaseFile
+from app.services.official_doc.builders.paragraph_classifier import LEVEL_1, classify_paragraph
+from app.services.prompt_registry import estimate_tokens, truncate_to_budget
+from app.services.qwen_service import qwen_service
+from app.services.rule_extraction import CASE_TYPES, RuleExtraction, RuleFieldExtractor, rule_field_extractor
+
+# 身份类字段：各段取值可能不同（简称/全称、笔误），多数表决，票数相同取靠前的段
+VOTED_FIELDS = (
+    "case_name", "title", "case_type", "source_department", "incident_time", "person_name",
+    "charge", "suicide_method", "classification_level1", "classification_level2", "classification_level3",
+)
+
+# 叙述类字段：各段分别描述不同阶段，按段顺序去重后拼接
+NARRATIVE_FIELDS = (
+    "incident_process", "investigation_process_and_conclusion", "cause_and_lesson", "case_filing", "judgment",
+)
+
+# 单次提取返回的字段数（身份类 + 叙述类 + person_info、timeline），用于流式提取的进度
+EXTRACT_FIELD_COUNT = len(VOTED_FIELDS) + len(NARRATIVE_FIELDS) + 2
+
+TIMELINE_TYPE_LABELS = {
+    "incident": "案发",
+    "investigation": "调查",
+    "filing": "立案",
+    "judgment": "判决",
+}
+
+
+def split_into_chunks(text: str, max_tokens: int) -> List[str]:
+    """
+    按段落把正文切分为不超过 token 预算的若干段
+
+    已达到预算一半时遇到一级标题（一、二、……）提前分段，尽量让同一部分落在同一段中；
+    单个段落超出预算时按预算硬切分
+
+    Args:
+        text: 正文
+        max_tokens: 每段 token 预算
+
+    Returns:
+        分段列表（正文未超出预算时只有一段）
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return [text]
+    chunks: List[str] = []
+    current: List[str] = []
+    used = 0
+
+    def _flush() -> None:
+        nonlocal current, used
+        if current:
+            chunks.append("\n".join(current))
+        current, used = [], 0
+
+    for line in text.split("\n"):
+        while estimate_tokens(line) > max_tokens:
+            _flush()
+            head = truncate_to_budget(line, max_tokens)
+            chunks.append(head)
+            line = line[len(head):]
+        cost = estimate_tokens(line) + 1
+        if current and (
+            used + cost > max_tokens
+            or (used >= max_tokens // 2 and classify_paragraph(line.strip())[0] == LEVEL_1)
+        ):
+            _flush()
+        current.append(line)
+        used += cost
+    _flush()
+    return chunks
+
+
+def _vote(values: List[Any]) -> Tuple[Any, List[Any]]:
+    """多数表决，返回 (结果, 去重后的全部候选值)；票数相同取最先出现的值"""
+    candidates = [
+        value.strip() if isinstance(value, str) else value
+        for value in values
+        if value is not None and not isinstance(value, (dict, list))
+    ]
+    candidates = [value for value in candidates if value != ""]
+    if not candidates:
+        return "", []
+    counts = Counter(candidates)
+    best = max(counts.values())
+    winner = next(value for value in candidates if counts[value] == best)
+    return winner, list(dict.fromkeys(candidates))
+
+
+def _merge_incident_time(values: List[Any]) -> Tuple[Any, List[Any]]:
+    """发生时间按日期表决，同一日期中优先取带具体时刻的值；只有日期不同才算冲突"""
+    full = [value.strip() for value in values if isinstance(value, str) and value.strip()]
+    day, days = _vote([value[:10] for value in full])
+    if not day:
+        return "", []
+    same_day = [value for value in full if value.startswith(day)]
+    detailed = [value for value in same_day if len(value) > 10 and not value.endswith("00:00")]
+    return (detailed[0] if detailed else same_day[0]), (list(dict.fromkeys(full)) if len(days) > 1 else [])
+
+
+def _merge_narrative(values: List[Any]) -> str:
+    """按顺序拼接叙述，跳过与已有内容重复或被包含的片段"""
+    merged: List[str] = []
+    for value in values:
+        if not isinstance(value, str) or not value.strip():
+            continue
+        value = value.strip()
+        if any(value in existing for existing in merged):
+            continue
+        merged = [existing for existing in merged if existing not in value]
+        merged.append(value)
+    return "\n".join(merged)
+
+
+def _timeline_timestamp(value: str) -> int:
+    for fmt, length in (("%Y-%m-%d %H:%M", 16), ("%Y-%m-%d", 10)):
+        try:
+            return int(datetime.strptime(value[:length], fmt).timestamp() * 1000)
+        except ValueError:
+            continue
+    return 0
+
+
+def _merge_timeline(parts: List[Any]) -> List[Dict[str, Any]]:
+    """合并各段时间线，按 (时间, 事件) 去重后按时间排序，补齐前端展示所需字段"""
+    merged: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for items in parts:
+        if not isinstance(items, list):
+            continue
+        for item in items:
+            if not isinstance(item, dict) or not (item.get("time") or item.get("event")):
+                continue
+            time_text = str(item.get("time") or "").strip()
+            event = str(item.get("event") or "").strip()
+            key = (time_text, event)
+            if key in merged:
+                if len(item.get("description") or "") > len(merged[key]["description"]):
+                    merged[key]["description"] = item["description"]
+                continue
+            item_type = item.get("type") if item.get("type") in TIMELINE_TYPE_LABELS else "incident"
+            merged[key] = {
+                "time": time_text,
+                "event": event,
+                "type": item_type,
+                "typeLabel": TIMELINE_TYPE_LABELS[item_type],
+                "description": item.get("description") or "",
+                "timestamp": _timeline_timestamp(time_text),
+            }
+    return sorted(merged.values(), key=lambda item: item["timestamp"])
+
+
+def merge_field_sets(parts: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, List[Any]]]:
+    """
+    合并各段提取的字段
+
+    Args:
+        parts: 各段提取结果（按段顺序）
+
+    Returns:
+        (合并后的字段, 冲突字段 -> 各段不同取值)，冲突供人工审核时参考
+    """
+    fields: Dict[str, Any] = {}
+    conflicts: Dict[str, List[Any]] = {}
+
+    for name in VOTED_FIELDS:
+        values = [part.get(name) for part in parts]
+        if name == "incident_time":
+            fields[name], candidates = _merge_incident_time(values)
+        else:
+            fields[name], candidates = _vote(values)
+        if len(candidates) > 1:
+            conflicts[name] = candidates
+
+    for name in NARRATIVE_FIELDS:
+        fields[name] = _merge_narrative([part.get(name) for part in parts])
+
+    person_info: Dict[str, Any] = {}
+    infos = [part.get("person_info") for part in parts if isinstance(part.get("person_info"), dict)]
+    for key in dict.fromkeys(k for info in infos for k in info):
+        person_info[key], candidates = _vote([info.get(key) for info in infos])
+        if len(candidates) > 1:
+            conflicts[f"person_info.{key}"] = candidates
+    fields["person_info"] = person_info
+
+    fields["timeline"] = _merge_timeline([part.get("timeline") for part in parts])
+    return fields, conflicts
+
+
+def fields_from_rules(confident: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    把规则提取的可信字段补齐为与模型提取相同的结构
+
+    卷宗名缺失时按“时间+事发单位-人员类别+姓名+涉案罪名(或自杀方式)”拼接，标题取卷宗名，
+    一级分类取案件类型，时间线只含案发事件
+    """
+    fields: Dict[str, Any] = {name: confident.get(name) or "" for name in VOTED_FIELDS + NARRATIVE_FIELDS}
+    person_info = dict(confident.get("person_info") or {})
+    fields["person_info"] = person_info
+    if not fields["case_name"]:
+        incident = parse_incident_time(fields["incident_time"])
+        department = fields["source_department"]
+        fields["case_name"] = "".join((
+            f"{incident.year}年{incident.month}月" if incident else "",
+            f"{department}-" if department else "",
+            person_info.get("person_category", ""),
+            fields["person_name"],
+            fields["charge"] or fields["suicide_method"],
+        ))
+    fields["title"] = fields["title"] or fields["case_name"]
+    fields["classification_level1"] = fields["case_type"] if fields["case_type"] in CASE_TYPES else None
+    fields["classification_level2"] = fields["classification_level2"] or None
+    fields["classification_level3"] = fields["classification_level3"] or None
+    fields["timeline"] = _merge_timeline([[{
+        "time": fields["incident_time"],
+        "event": "案发",
+        "type": "incident",
+        "description": fields["charge"] or fields["suicide_method"],
+    }]]) if fields["incident_time"] else []
+    return fields
+
+
+def overlay_rule_fields(result: Dict[str, Any], confident: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    用规则提取的可信字段覆盖模型提取结果
+
+    封面标签的值直接取自原文，优先于模型的归纳；身份类字段取值不同时记入 conflicts 供人工审核参考。
+    模型提取失败时 fields 为补齐后的规则字段，其余（success、error、retryable）保持不变，
+    导入时先写入这些字段，模型恢复后再由延迟提取补全
+
+    Args:
+        result: 模型提取结果
+        confident: RuleExtraction.confident()
+
+    Returns:
+        新的结果字典
+    """
+    if not confident:
+        return result
+    if not (result.get("success") and isinstance(result.get("fields"), dict)):
+        return {**result, "fields": fields_from_rules(confident), "source": "rules"}
+    fields = dict(result["fields"])
+    conflicts = dict(result.get("conflicts") or {})
+    for name, value in confident.items():
+        if name == "person_info":
+            info = dict(fields["person_info"]) if isinstance(fields.get("person_info"), dict) else {}
+            for key, rule_value in value.items():
+                if info.get(key) and info[key] != rule_value:
+                    conflicts[f"person_info.{key}"] = [rule_value, info[key]]
+                info[key] = rule_value
+            fields["person_info"] = info
+        elif name == "incident_time":
+            # 同一天时保留更具体的时刻，日期不同才算冲突
+            fields[name], candidates = _merge_incident_time([value, fields.get(name)])
+            if candidates:
+                conflicts[name] = candidates
+        else:
+            if name in VOTED_FIELDS and fields.get(name) and fields[name] != value:
+                conflicts[name] = [value, fields[name]]
+            fields[name] = value
+    merged = {**result, "fields": fields, "ruleFields": sorted(confident)}
+    if conflicts:
+        merged["conflicts"] = conflicts
+    return merged
+
+
+def parse_incident_time(value: Any) -> Optional[datetime]:
+    """将字符串或日期解析为 datetime。"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+    if not value:
+        return None
+    try:
+        # 尝试 YYYY-MM-DD HH:mm 或 YYYY-MM-DD
+        if " " in value:
+            return datetime.strptime(value[:16], "%Y-%m-%d %H:%M")
+        return datetime.strptime(value[:10], "%Y-%m-%d")
+    except Exception:
+        return None
+
+
+def apply_extracted_fields(case_file: CaseFile, fields: dict) -> None:
+    """将 AI 提取的 fields 写入 CaseFile 对象（不提交事务）。"""
+    incident_time = parse_incident_time(fields.get("incident_time"))
+    person_info = fields.get("person_info")
+    if isinstance(person_info, dict):
+        person_info = dict(person_info)
+    else:
+        person_info = {}
+    case_file.case_name = fields.get("case_name") or case_file.case_name
+    case_file.title = fields.get("title") or case_file.title
+    case_file.case_type = fields.get("case_type") or case_file.case_type
+    case_file.source_department = fields.get("source_department") or case_file.source_department
+    if incident_time is not None:
+        case_file.incident_time = incident_time
+    case_file.person_name = fields.get("person_name") or case_file.person_name
+    case_file.person_info = person_info
+    case_file.charge = fields.get("charge") or case_file.charge
+    case_file.suicide_method = fields.get("suicide_method") or case_file.suicide_method
+    case_file.incident_process = fields.get("incident_process") or case_file.incident_process
+    case_file.investigation_process_and_conclusion = (
+        fields.get("investigation_process_and_conclusion") or case_file.investigation_process_and_conclusion
+    )
+    case_file.cause_and_lesson = fields.get("cause_and_lesson") or case_file.cause_and_lesson
+    case_file.case_filing = fields.get("case_filing") or case_file.case_filing
+    case_file.judgment = fields.get("judgment") or case_file.judgment
+    if fields.get("classification_level1") is not None:
+        case_file.classification_level1 = fields.get("classification_level1")
+    if fields.get("classification_level2") is not None:
+        case_file.classification_level2 = fields.get("classification_level2")
+    if fields.get("classification_level3") is not None:
+        case_file.classification_level3 = fields.get("classification_level3")
+    if fields.get("timeline"):
+        case_file.timeline = fields["timeline"]
+
+
+class CaseFieldExtractor:
+    """卷宗字段提取：短文本单次调用，长文本分段并发提取后合并"""
+
+    def __init__(
+        self,
+        extract_fn: Optional[Callable[..., Dict[str, Any]]] = None,
+        chunk_tokens: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        stream_fn: Optional[Callable[[str], Iterator[Dict[str, Any]]]] = None,
+        rules: Optional[RuleFieldExtractor] = None,
+    ):
+        # extract_fn(text, part=None) -> {success, fields | error}，同步函数，在线程中调用
+        self.extract_fn = extract_fn or qwen_service.extract_case_fields
+        # stream_fn(text) 逐个产出 {"field", "value"}，最后产出 {"result"}；未提供时流式提取退化为一次性提取
+        self.stream_fn = stream_fn or (qwen_service.iter_case_fields if extract_fn is None else None)
+        # 调用模型前的封面规则提取；自定义 extract_fn 时默认不启用
+        self.rules = rules or (rule_field_extractor if extract_fn is None else None)
+        self.chunk_tokens = chunk_tokens or settings.EXTRACT_CHUNK_TOKENS
+        self.concurrency = concurrency or settings.EXTRACT_CHUNK_CONCURRENCY
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """获取提取线程池（默认线程池在单核机器上只有 5 个线程，会把并发的分段调用排队）"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="extract")
+        return self._executor
+
+    async def _call(self, *args: Any) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_executor(), contextvars.copy_context().run, self.extract_fn, *args
+        )
+
+    def _match_rules(self, document_text: str) -> Optional[RuleExtraction]:
+        if self.rules is None or not settings.RULE_EXTRACT_ENABLED:
+            return None
+        return self.rules.extract(document_text)
+
+    async def extract(self, document_text: str) -> Dict[str, Any]:
+        """
+        提取卷宗核心字段
+
+        Args:
+            document_text: 卷宗全文
+
+        Returns:
+            与 QwenService.extract_case_fields 相同的结构；分段提取时另含
+            chunks（段数）、failedChunks（失败段序号）、conflicts（冲突字段）；
+            规则字段齐全未调用模型时 source 为 rules，规则字段覆盖模型结果时另含 ruleFields
+        """
+        rules = self._match_rules(document_text)
+        if rules is not None and rules.complete:
+            logger.info("[卷宗提取] 封面规则提取字段齐全，不调用模型")
+            return {"success": True, "fields": fields_from_rules(rules.confident()), "source": "rules"}
+        result = await self._extract_llm(document_text)
+        return overlay_rule_fields(result, rules.confident()) if rules is not None else result
+
+    async def _extract_llm(self, document_text: str) -> Dict[str, Any]:
+        """模型提取：短文本单次调用，长文本分段并发提取后合并"""
+        chunks = split_into_chunks(document_text, self.chunk_tokens)
+        if len(chunks) == 1:
+            result = await self._call(document_text)
+            fields = result.get("fields")
+            if result.get("success") and isinstance(fields, dict) and "timeline" in fields:
+                fields["timeline"] = _merge_timeline([fields["timeline"]])
+            return result
+
+        total = len(chunks)
+
+        async def _extract_chunk(index: int, chunk: str) -> Dict[str, Any]:
+            try:
+                return await self._call(chunk, (index + 1, total))
+            except Exception as e:
+                return {"success": False, "error": str(e)}
+
+        logger.info(f"[卷宗提取] 正文 {len(document_text)} 字，分 {total} 段并发提取")
+        results = await asyncio.gather(*(_extract_chunk(i, chunk) for i, chunk in enumerate(chunks)))
+
+        parts = [r["fields"] for r in results if r.get("success") and isinstance(r.get("fields"), dict)]
+        failed = [i + 1 for i, r in enumerate(results) if not (r.get("success") and isinstance(r.get("fields"), dict))]
+        if not parts:
+            return results[0] if results else {"success": False, "error": "卷宗无可提取内容"}
+        if failed:
+            logger.warning(f"[卷宗提取] 第 {failed} 段提取失败，按其余 {len(parts)} 段合并")
+
+        fields, conflicts = merge_field_sets(parts)
+        return {
+            "success": True,
+            "fields": fields,
+            "chunks": total,
+            "failedChunks": failed,
+            "conflicts": conflicts,
+        }
+
+    async def extract_stream(self, document_text: str) -> AsyncGenerator[Dict[str, Any], None]:
+        """
+        流式提取卷宗核心字段：封面规则提取的字段最先产出；单段卷宗模型输出的每个字段一闭合即产出；
+        多段卷宗需合并各段结果，合并完成后依次产出各字段
+
+        Yields:
+            {"field": 字段名, "value": 值} ...，最后一项为 {"result": 与 extract 相同的结构}
+        """
+        rules = self._match_rules(document_text)
+        if rules is not None and rules.complete:
+            result = {"success": True, "fields": fields_from_rules(rules.confident()), "source": "rules"}
+            for name, value in result["fields"].items():
+                yield {"field": name, "value": value}
+            yield {"result": result}
+            return
+
+        # 规则字段先推送，模型随后产出的同名字段不再重复推送
+        confident = rules.confident() if rules is not None else {}
+        for name, value in confident.items():
+            yield {"field": name, "value": value}
+        stream = self._stream_llm(document_text)
+        try:
+            async for event in stream:
+                if "result" in event:
+                    yield {"result": overlay_rule_fields(event["result"], confident)}
+                elif event["field"] == "person_info" and "person_info" in confident and isinstance(event["value"], dict):
+                    yield {"field": "person_info", "value": {**event["value"], **confident["person_info"]}}
+                elif event["field"] not in confident:
+                    yield event
+        finally:
+            # 调用方停止迭代时立即停止读取模型输出
+            await stream.aclose()
+
+    async def _stream_llm(self, document_text: str) -> AsyncGenerator[Dict[str, Any], None]:
+        """模型流式提取（产出格式同 extract_stream）"""
+        if self.stream_fn is None or len(split_into_chunks(document_text, self.chunk_tokens)) > 1:
+            result = await self._extract_llm(document_text)
+            if result.get("success") and isinstance(result.get("fields"), dict):
+                for name, value in result["fields"].items():
+                    yield {"field": name, "value": value}
+            yield {"result": result}
+            return
+
+        # 模型输出在提取线程中读取，经 SharedStream 转到事件循环；调用方停止迭代时停止读取
+        stream = SharedStream()
+        stream.start(self._get_executor(), lambda: self.stream_fn(document_text))
+        try:
+            async for event in stream.subscribe():
+                if event.get("field") == "timeline":
+                    event = {"field": "timeline", "value": _merge_timeline([event["value"]])}
+                elif "result" in event:
+                    fields = event["result"].get("fields")
+                    if isinstance(fields, dict) and "timeline" in fields:
+                        fields["timeline"] = _merge_timeline([fields["timeline"]])
+                yield event
+        except Exception as e:
+            logger.warning(f"[卷宗提取] 流式提取异常: {e}")
+            yield {"result": {"success": False, "error": str(e), "retryable": True}}
+
+    def shutdown(self) -> None:
+        """关闭提取线程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# 创建全局实例
+case_field_extractor = CaseFieldExtractor()
@@ -0,0 +1,285 @@
+"""
+长公文分段审查
+正文按段落划分为不超过 token 预算的窗口（相邻窗口重叠若干段，避免跨窗口的问题漏审），
+各窗口并发审查；问题按原文位置排序并去重（重叠段落会被相邻两个窗口重复指出），
+流式输出时按原文顺序逐个窗口推送，首个窗口完成即可看到问题
+"""
+import asyncio
+import contextvars
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncGenerator, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from app.core.config import settings
+from app.core.serialization import sse_frame, SSE_DONE
+from app.services.prompt_registry import estimate_tokens
+from app.services.qwen_service import qwen_service
+
+ISSUE_TYPES = ("错别字", "用词不当", "公文规范")
+
+
+class ReviewWindow:
+    """审查窗口：全文中连续的若干段落"""
+
+    def __init__(self, index: int, start: int, end: int, offset: int, text: str, limit: Optional[int] = None):
+        self.index = index  # 窗口序号，从 0 开始
+        self.start = start  # 首段序号（含）
+        self.end = end  # 末段序号（不含）
+        self.offset = offset  # 首段在全文中的字符位置
+        self.text = text  # 送审文本（段首带全文段落编号）
+        self.limit = limit  # 末段结束在全文中的字符位置（不含）
+
+
+def split_into_windows(paragraphs: List[str], max_tokens: int, overlap: int) -> List[ReviewWindow]:
+    """
+    按段落划分审查窗口
+
+    Args:
+        paragraphs: 段落列表
+        max_tokens: 每个窗口 token 预算（单段超出预算时独占一个窗口）
+        overlap: 相邻窗口重叠的段落数
+
+    Returns:
+        窗口列表
+    """
+    offsets: List[int] = []
+    position = 0
+    for paragraph in paragraphs:
+        offsets.append(position)
+        position += len(paragraph) + 1
+    costs = [estimate_tokens(paragraph) + 4 for paragraph in paragraphs]
+
+    windows: List[ReviewWindow] = []
+    start = 0
+    while start < len(paragraphs):
+        end, used = start, 0
+        while end < len(paragraphs) and (end == start or used + costs[end] <= max_tokens):
+            used += costs[end]
+            end += 1
+        text = "\n".join(f"[{i + 1}] {paragraphs[i]}" for i in range(start, end))
+        limit = offsets[end - 1] + len(paragraphs[end - 1])
+        windows.append(ReviewWindow(len(windows), start, end, offsets[start], text, limit))
+        if end >= len(paragraphs):
+            break
+        # 重叠段落不能占满整个窗口，否则无法前进
+        start = max(end - overlap, start + 1)
+    return windows
+
+
+def _issue_position(
+    document_text: str, issue: Dict[str, Any], window: ReviewWindow, cursors: Dict[str, int]
+) -> int:
+    """
+    问题在全文中的字符位置（限窗口范围内）；原文片段找不到时取窗口起始位置
+
+    cursors 记录本窗口内各原文片段下次查找的起点：同一片段被报告多次时依次对应窗口内的各处出现，
+    报告次数多于出现次数时回到首次出现（随后按重复问题去掉）
+    """
+    original = (issue.get("original") or "").strip()
+    if original:
+        found = document_text.find(original, cursors.get(original, window.offset), window.limit)
+        if found < 0:
+            found = document_text.find(original, window.offset, window.limit)
+        if found >= 0:
+            cursors[original] = found + len(original)
+            return found
+    return window.offset
+
+
+def _issue_key(issue: Dict[str, Any]) -> Tuple:
+    """去重键：同一类型、同一原文片段、同一位置视为同一问题"""
+    original = (issue.get("original") or "").strip()
+    if original:
+        return issue.get("type"), original, issue.get("position")
+    return issue.get("type"), issue.get("suggestion"), issue.get("location")
+
+
+def render_issue_markdown(number: int, issue: Dict[str, Any]) -> str:
+    """单条问题的 Markdown，与流式审查的“问题与修改建议”格式一致"""
+    lines = [f"### {number}. {issue.get('type') or '问题'}"]
+    if issue.get("location"):
+        lines.append(f"- **位置**：{issue['location']}")
+    lines.append(f"- **原文**：{issue.get('original') or ''}")
+    lines.append(f"- **建议修改**：{issue.get('suggestion') or ''}")
+    if issue.get("reason"):
+        lines.append(f"- **说明**：{issue['reason']}")
+    return "\n".join(lines) + "\n\n"
+
+
+def summarize_issues(issues: List[Dict[str, Any]], windows: int, failed: List[int]) -> str:
+    """按问题类型汇总的总体评价"""
+    if not issues:
+        summary = f"全文分 {windows} 部分审查，未发现明显问题。"
+    else:
+        counts = Counter(issue.get("type") for issue in issues)
+        detail = "、".join(f"{name} {counts[name]} 处" for name in ISSUE_TYPES if counts.get(name))
+        summary = f"全文分 {windows} 部分审查，共发现 {len(issues)} 处问题" + (f"（{detail}）" if detail else "") + "。"
+    if failed:
+        summary += f"第 {'、'.join(str(i) for i in failed)} 部分审查失败，请稍后重试或人工复核。"
+    return summary
+
+
+class ContentReviewer:
+    """公文审查：短文本单次调用，长文本按窗口并发审查"""
+
+    def __init__(
+        self,
+        review_fn: Optional[Callable[..., Dict[str, Any]]] = None,
+        window_tokens: Optional[int] = None,
+        overlap: Optional[int] = None,
+        concurrency: Optional[int] = None,
+    ):
+        # review_fn(text, part=None) -> {success, issues, summary | error}，同步函数，在线程中调用
+        self.review_fn = review_fn or qwen_service.review_document_content
+        self.window_tokens = window_tokens or settings.REVIEW_WINDOW_TOKENS
+        self.overlap = settings.REVIEW_WINDOW_OVERLAP if overlap is None else overlap
+        self.concurrency = concurrency or settings.REVIEW_CONCURRENCY
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """获取审查线程池"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="review")
+        return self._executor
+
+    async def _call(self, *args: Any) -> Dict[str, Any]:
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                self._get_executor(), contextvars.copy_context().run, self.review_fn, *args
+            )
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    def plan(self, document_text: str) -> List[ReviewWindow]:
+        """划分审查窗口；全文在一个窗口内时返回空列表（按原方式整篇审查）"""
+        if estimate_tokens(document_text) <= self.window_tokens:
+            return []
+        paragraphs = document_text.split("\n")
+        return split_into_windows(paragraphs, self.window_tokens, self.overlap)
+
+    def _collect(
+        self, document_text: str, window: ReviewWindow, result: Dict[str, Any], seen: set
+    ) -> List[Dict[str, Any]]:
+        """整理单个窗口的问题：补全位置、按原文顺序排序、去掉与前面窗口重复的问题"""
+        issues = []
+        cursors: Dict[str, int] = {}
+        for issue in result.get("issues") or []:
+            if not isinstance(issue, dict):
+                continue
+            issue = {**issue, "position": _issue_position(document_text, issue, window, cursors)}
+            key = _issue_key(issue)
+            if key in seen:
+                continue
+            seen.add(key)
+            issues.append(issue)
+        issues.sort(key=lambda item: item["position"])
+        return issues
+
+    async def _run_windows(
+        self, document_text: str, windows: List[ReviewWindow]
+    ) -> AsyncGenerator[Tuple[ReviewWindow, Dict[str, Any]], None]:
+        """并发审查各窗口，按窗口顺序产出结果（前面的窗口完成后立即产出）"""
+        total = len(windows)
+        tasks = [
+            asyncio.ensure_future(self._call(window.text, (window.index + 1, total)))
+            for window in windows
+        ]
+        try:
+            for window, task in zip(windows, tasks):
+                yield window, await task
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def review(self, document_text: str) -> Dict[str, Any]:
+        """
+        审查公文
+
+        Returns:
+            与 QwenService.review_document_content 相同的结构；分段审查时 issues 按原文顺序排列，
+            另含 windows（窗口数）、failedWindows（失败窗口序号）
+        """
+        windows = self.plan(document_text)
+        if not windows:
+            return await self._call(document_text)
+
+        logger.info(f"[内容审查] 正文 {len(document_text)} 字，分 {len(windows)} 部分并发审查")
+        issues: List[Dict[str, Any]] = []
+        failed: List[int] = []
+        seen: set = set()
+        first_error = ""
+        async for window, result in self._run_windows(document_text, windows):
+            if not result.get("success"):
+                failed.append(window.index + 1)
+                first_error = first_error or result.get("error", "")
+                continue
+            issues.extend(self._collect(document_text, window, result, seen))
+        if len(failed) == len(windows):
+            return {"success": False, "error": first_error or "审查服务暂时不可用"}
+        return {
+            "success": True,
+            "issues": issues,
+            "summary": summarize_issues(issues, len(windows), failed),
+            "windows": len(windows),
+            "failedWindows": failed,
+        }
+
+    async def review_stream(self, document_text: str) -> AsyncGenerator[str, None]:
+        """
+        流式审查公文（SSE 格式，Markdown 内容）
+
+        短文本沿用模型逐字流式输出；长文本按原文顺序逐个窗口推送问题，
+        每帧除 content 外另含 window/windows 及本窗口的结构化 issues，最后输出总体评价
+
+        Yields:
+            data: {"content": "...", ...} / data: {"done": true} / data: {"error": "..."}
+        """
+        windows = self.plan(document_text)
+        if not windows:
+            async for chunk in qwen_service.review_document_content_stream(document_text):
+                yield chunk
+            return
+
+        total = len(windows)
+        logger.info(f"[内容审查] 正文 {len(document_text)} 字，分 {total} 部分并发流式审查")
+        yield sse_frame({
+            "content": f"> 全文较长，分 {total} 部分审查，问题按原文顺序陆续列出。\n\n## 问题与修改建议\n\n",
+            "windows": total,
+        })
+        issues: List[Dict[str, Any]] = []
+        failed: List[int] = []
+        seen: set = set()
+        async for window, result in self._run_windows(document_text, windows):
+            if not result.get("success"):
+                failed.append(window.index + 1)
+                logger.warning(f"[内容审查] 第 {window.index + 1}/{total} 部分审查失败: {result.get('error')}")
+                continue
+            window_issues = self._collect(document_text, window, result, seen)
+            content = "".join(
+                render_issue_markdown(len(issues) + i + 1, issue) for i, issue in enumerate(window_issues)
+            )
+            issues.extend(window_issues)
+            yield sse_frame({
+                "content": content,
+                "window": window.index + 1,
+                "windows": total,
+                "issues": window_issues,
+            })
+        if len(failed) == total:
+            yield sse_frame({"error": "审查服务暂时不可用"})
+            return
+        yield sse_frame({"content": f"## 总体评价\n\n{summarize_issues(issues, total, failed)}\n"})
+        yield SSE_DONE
+
+    def shutdown(self) -> None:
+        """关闭审查线程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# 创建全局实例
+content_reviewer = ContentReviewer()
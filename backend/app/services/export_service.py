@@ -0,0 +1,456 @@
+"""
+报表导出服务
+- 通过服务端游标（stream + yield_per）逐批读取案卷，避免一次性加载结果集
+- 支持 CSV 流式输出与常量内存的 XLSX 写出（逐行写入 zip 条目）
+- 大批量导出以后台任务运行，完成后通过任务 ID 下载文件；结束超过 EXPORT_JOB_TTL 的任务及其文件被清理
+- XLSX 按批在线程池中写出（XML 拼接与压缩不阻塞事件循环）
+"""
+import asyncio
+import csv
+import io
+import os
+import re
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, AsyncGenerator, AsyncIterator, BinaryIO, Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import Select, and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.archive import CaseFile
+
+
+# 导出列定义：(表头, 模型列)；不导出 ocr_text 等大字段
+CASE_EXPORT_COLUMNS: List[Tuple[str, Any]] = [
+    ("案卷编号", CaseFile.case_no),
+    ("卷宗名", CaseFile.case_name),
+    ("案卷类型", CaseFile.case_type),
+    ("来源部门", CaseFile.source_department),
+    ("发生时间", CaseFile.incident_time),
+    ("姓名", CaseFile.person_name),
+    ("涉案罪名", CaseFile.charge),
+    ("一级分类", CaseFile.classification_level1),
+    ("二级分类", CaseFile.classification_level2),
+    ("三级分类", CaseFile.classification_level3),
+    ("状态", CaseFile.status),
+    ("创建时间", CaseFile.created_at),
+]
+
+EXPORT_FORMATS = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv; charset=utf-8",
+}
+
+# XML 1.0 不允许的控制字符
+_ILLEGAL_XML_CHARS = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def parse_date_range(date_range: Optional[str]) -> Tuple[Optional[datetime], Optional[datetime]]:
+    """解析 YYYY-MM-DD,YYYY-MM-DD 格式的日期范围，格式不正确的一端忽略。"""
+    if not date_range:
+        return None, None
+    parts = [p.strip() for p in date_range.split(",")]
+    start_dt = end_dt = None
+    try:
+        if parts[0]:
+            start_dt = datetime.strptime(parts[0], "%Y-%m-%d")
+    except ValueError:
+        pass
+    try:
+        if len(parts) > 1 and parts[1]:
+            end_dt = datetime.strptime(parts[1] + " 23:59:59", "%Y-%m-%d %H:%M:%S")
+    except ValueError:
+        pass
+    return start_dt, end_dt
+
+
+def build_case_export_query(
+    date_range: Optional[str] = None,
+    case_type: Optional[str] = None,
+    department: Optional[str] = None,
+) -> Select:
+    """构建案卷导出查询（只选导出列，按 id 顺序输出）。"""
+    conditions = []
+    start_dt, end_dt = parse_date_range(date_range)
+    if start_dt:
+        conditions.append(CaseFile.created_at >= start_dt)
+    if end_dt:
+        conditions.append(CaseFile.created_at <= end_dt)
+    if case_type:
+        conditions.append(CaseFile.case_type == case_type)
+    if department:
+        conditions.append(CaseFile.source_department == department)
+
+    query = select(*[col for _, col in CASE_EXPORT_COLUMNS])
+    if conditions:
+        query = query.where(and_(*conditions))
+    return query.order_by(CaseFile.id.asc())
+
+
+def _format_cell(value: Any) -> Any:
+    """将数据库值转换为可写出的单元格值。"""
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    return value
+
+
+async def iter_case_rows(
+    db: AsyncSession, query: Select, batch_size: Optional[int] = None
+) -> AsyncGenerator[List[Any], None]:
+    """
+    通过服务端游标逐行读取导出数据
+
+    Args:
+        db: 数据库会话
+        query: 导出查询
+        batch_size: 每批从游标拉取的行数
+
+    Yields:
+        单行单元格值列表
+    """
+    batch_size = batch_size or settings.EXPORT_BATCH_SIZE
+    result = await db.stream(query.execution_options(yield_per=batch_size))
+    async for partition in result.partitions(batch_size):
+        for row in partition:
+            yield [_format_cell(v) for v in row]
+
+
+class XlsxStreamWriter:
+    """
+    常量内存 XLSX 写出器
+    工作表 XML 逐行写入 zip 条目，行数据不在内存中累积；单元格使用 inlineStr，无需共享字符串表。
+    """
+
+    def __init__(self, fileobj: BinaryIO, sheet_name: str = "Sheet1"):
+        self._zip = zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_DEFLATED)
+        self._sheet_name = sheet_name
+        self._sheet = self._zip.open("xl/worksheets/sheet1.xml", "w", force_zip64=True)
+        self._row_index = 0
+        self._sheet.write(
+            b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            b"<sheetData>"
+        )
+
+    @staticmethod
+    def _column_letter(index: int) -> str:
+        """0 起始列号转 Excel 列字母。"""
+        letters = ""
+        index += 1
+        while index:
+            index, rem = divmod(index - 1, 26)
+            letters = chr(65 + rem) + letters
+        return letters
+
+    @staticmethod
+    def _escape(text: str) -> str:
+        text = _ILLEGAL_XML_CHARS.sub("", text)
+        return (
+            text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;")
+        )
+
+    def write_row(self, values: Iterable[Any]) -> None:
+        """写入一行。"""
+        self._row_index += 1
+        r = self._row_index
+        cells = []
+        for col, value in enumerate(values):
+            ref = f"{self._column_letter(col)}{r}"
+            if isinstance(value, bool) or value is None:
+                value = "" if value is None else str(value)
+            if isinstance(value, (int, float)):
+                cells.append(f'<c r="{ref}"><v>{value}</v></c>')
+            else:
+                cells.append(
+                    f'<c r="{ref}" t="inlineStr"><is><t xml:space="preserve">{self._escape(str(value))}</t></is></c>'
+                )
+        self._sheet.write(f'<row r="{r}">{"".join(cells)}</row>'.encode("utf-8"))
+
+    def write_rows(self, rows: Iterable[Iterable[Any]]) -> None:
+        """写入多行（在线程池中按批调用）"""
+        for values in rows:
+            self.write_row(values)
+
+    def close(self) -> None:
+        """结束工作表并写入工作簿其余部件。"""
+        self._sheet.write(b"</sheetData></worksheet>")
+        self._sheet.close()
+        sheet_name = self._escape(self._sheet_name)
+        self._zip.writestr(
+            "[Content_Types].xml",
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+            '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+            '<Default Extension="xml" ContentType="application/xml"/>'
+            '<Override PartName="/xl/workbook.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+            '<Override PartName="/xl/worksheets/sheet1.xml" '
+            'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+            "</Types>",
+        )
+        self._zip.writestr(
+            "_rels/.rels",
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+            'Target="xl/workbook.xml"/>'
+            "</Relationships>",
+        )
+        self._zip.writestr(
+            "xl/workbook.xml",
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{sheet_name}" sheetId="1" r:id="rId1"/></sheets>'
+            "</workbook>",
+        )
+        self._zip.writestr(
+            "xl/_rels/workbook.xml.rels",
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+            '<Relationship Id="rId1" '
+            'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+            'Target="worksheets/sheet1.xml"/>'
+            "</Relationships>",
+        )
+        self._zip.close()
+
+    @property
+    def row_count(self) -> int:
+        return self._row_index
+
+
+class ExportService:
+    """案卷报表导出服务"""
+
+    def __init__(self, job_ttl: Optional[float] = None):
+        self.job_ttl = settings.EXPORT_JOB_TTL if job_ttl is None else job_ttl
+        # 后台导出任务（内存登记，文件落盘在 UPLOAD_DIR/exports 下）
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """获取 XLSX 写出线程池"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=settings.EXPORT_WORKERS, thread_name_prefix="export")
+        return self._executor
+
+    def shutdown(self) -> None:
+        """关闭写出线程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    @staticmethod
+    def _remove_file(file_path: str) -> None:
+        try:
+            os.remove(file_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"删除导出文件失败: {file_path}, {e}")
+
+    def _cleanup(self, scan_files: bool = False) -> None:
+        """
+        移除结束超过 TTL 的任务及其文件
+
+        Args:
+            scan_files: 同时删除导出目录中超过 TTL 的遗留文件（服务重启前的任务、中断的同步导出）
+        """
+        now = datetime.now()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job["finished_at"] and (now - job["finished_at"]).total_seconds() > self.job_ttl
+        ]
+        for job_id in expired:
+            self._remove_file(self._jobs.pop(job_id)["file_path"])
+        if not scan_files:
+            return
+        in_use = {job["file_path"] for job in self._jobs.values()}
+        cutoff = time.time() - self.job_ttl
+        with os.scandir(self.export_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.path not in in_use and entry.stat().st_mtime < cutoff:
+                    self._remove_file(entry.path)
+
+    @property
+    def export_dir(self) -> str:
+        path = os.path.join(settings.UPLOAD_DIR, "exports")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    @staticmethod
+    def headers() -> List[str]:
+        return [name for name, _ in CASE_EXPORT_COLUMNS]
+
+    async def stream_csv(self, rows: AsyncIterator[List[Any]]) -> AsyncGenerator[bytes, None]:
+        """
+        流式输出 CSV（UTF-8 BOM，便于 Excel 直接打开）
+
+        Args:
+            rows: 行数据异步迭代器（通常为 iter_case_rows）
+
+        Yields:
+            CSV 字节块，每批一块
+        """
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(self.headers())
+        yield ("\ufeff" + buffer.getvalue()).encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+
+        pending = 0
+        async for row in rows:
+            writer.writerow(row)
+            pending += 1
+            if pending >= settings.EXPORT_BATCH_SIZE:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+                pending = 0
+        if pending:
+            yield buffer.getvalue().encode("utf-8")
+
+    async def write_file(self, db: AsyncSession, query: Select, fmt: str, file_path: str) -> int:
+        """
+        将导出结果写入文件
+
+        Args:
+            db: 数据库会话
+            query: 导出查询
+            fmt: 导出格式 xlsx/csv
+            file_path: 目标文件路径
+
+        Returns:
+            写出的数据行数（不含表头）
+        """
+        stats = {"rows": 0}
+
+        async def _counted_rows():
+            async for row in iter_case_rows(db, query):
+                stats["rows"] += 1
+                yield row
+
+        with open(file_path, "wb") as f:
+            if fmt == "csv":
+                async for chunk in self.stream_csv(_counted_rows()):
+                    f.write(chunk)
+            else:
+                loop = asyncio.get_running_loop()
+                executor = self._get_executor()
+                writer = XlsxStreamWriter(f, sheet_name="案卷统计")
+                batch = [self.headers()]
+                async for row in _counted_rows():
+                    batch.append(row)
+                    if len(batch) >= settings.EXPORT_BATCH_SIZE:
+                        await loop.run_in_executor(executor, writer.write_rows, batch)
+                        batch = []
+                await loop.run_in_executor(executor, writer.write_rows, batch)
+                await loop.run_in_executor(executor, writer.close)
+        return stats["rows"]
+
+    def create_job(
+        self,
+        fmt: str,
+        date_range: Optional[str] = None,
+        case_type: Optional[str] = None,
+        department: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        创建后台导出任务
+
+        Returns:
+            任务信息
+        """
+        self._cleanup(scan_files=True)
+        job_id = f"EXP-{datetime.now().strftime('%Y%m%d')}-{uuid.uuid4().hex[:8].upper()}"
+        file_path = os.path.join(self.export_dir, f"{job_id}.{fmt}")
+        job = {
+            "job_id": job_id,
+            "format": fmt,
+            "status": "running",
+            "rows": 0,
+            "file_path": file_path,
+            "error_message": None,
+            "filters": {"date_range": date_range, "case_type": case_type, "department": department},
+            "created_at": datetime.now(),
+            "finished_at": None,
+        }
+        self._jobs[job_id] = job
+        query = build_case_export_query(date_range, case_type, department)
+        job["_task"] = asyncio.create_task(self._run_job(job, query))
+        return self.get_job(job_id)
+
+    async def _run_job(self, job: Dict[str, Any], query: Select) -> None:
+        """后台执行导出，使用只读副本或后台连接池的独立会话。"""
+        from app.core.database import read_router
+
+        try:
+            session_factory = await read_router.choose(background=True)
+            async with session_factory() as db:
+                job["rows"] = await self.write_file(db, query, job["format"], job["file_path"])
+            job["status"] = "completed"
+            logger.info(f"导出任务完成: {job['job_id']}, 行数={job['rows']}")
+        except Exception as e:
+            job["status"] = "failed"
+            job["error_message"] = str(e)
+            logger.error(f"导出任务失败: {job['job_id']}, {str(e)}")
+            if os.path.exists(job["file_path"]):
+                os.remove(job["file_path"])
+        finally:
+            job["finished_at"] = datetime.now()
+            job.pop("_task", None)
+
+    def get_job(self, job_id: str) -> Dict[str, Any]:
+        """
+        获取任务信息
+
+        Raises:
+            ValueError: 任务不存在或已过期
+        """
+        self._cleanup()
+        job = self._jobs.get(job_id)
+        if not job:
+            raise ValueError(f"导出任务不存在: {job_id}")
+        return {
+            "job_id": job["job_id"],
+            "format": job["format"],
+            "status": job["status"],
+            "rows": job["rows"],
+            "filters": job["filters"],
+            "error_message": job["error_message"],
+            "created_at": job["created_at"].isoformat(),
+            "finished_at": job["finished_at"].isoformat() if job["finished_at"] else None,
+            "download_url": (
+                f"/api/v1/statistics/export/jobs/{job['job_id']}/download"
+                if job["status"] == "completed" else None
+            ),
+        }
+
+    def get_job_file(self, job_id: str) -> str:
+        """
+        获取已完成任务的文件路径
+
+        Raises:
+            ValueError: 任务不存在、已过期或未完成
+        """
+        self._cleanup()
+        job = self._jobs.get(job_id)
+        if not job:
+            raise ValueError(f"导出任务不存在: {job_id}")
+        if job["status"] != "completed" or not os.path.isfile(job["file_path"]):
+            raise ValueError(f"导出任务未完成: {job_id}")
+        return job["file_path"]
+
+
+# 创建全局服务实例
+export_service = ExportService()
@@ -0,0 +1,179 @@
+"""
+案卷字段延迟提取队列
+AI 服务熔断或重试后仍限流时导入的案卷先以文件名入库，并在 meta_data 中标记待重新提取；
+后台任务在熔断恢复后逐个重新提取并回写字段。应用重启后从数据库恢复待提取的案卷。
+人工保存审核或确认入库时清除标记；只处理仍为待审核且带标记的案卷，提取返回后重新读取确认，不覆盖人工修改
+"""
+import asyncio
+from typing import Any, Dict, Optional, Set
+
+from loguru import logger
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.database import BackgroundSessionLocal
+from app.core.usage_context import tag_usage
+from app.models.archive import CaseFile
+from app.services.case_extraction import apply_extracted_fields, case_field_extractor
+from app.services.graph_indexer import graph_indexer
+from app.services.qwen_service import qwen_service
+
+# meta_data 中的提取状态：deferred 待重新提取 / failed 多次重试仍失败
+EXTRACT_STATE_KEY = "ai_extract"
+EXTRACT_ATTEMPTS_KEY = "ai_extract_attempts"
+EXTRACT_ERROR_KEY = "ai_extract_error"
+STATE_DEFERRED = "deferred"
+STATE_FAILED = "failed"
+
+
+def should_defer(result: Dict[str, Any]) -> bool:
+    """提取失败是否属于可稍后重试的情况（熔断、限流、服务端错误、网络异常）"""
+    return not result.get("success") and bool(result.get("retryable"))
+
+
+def mark_deferred(meta_data: Optional[Dict[str, Any]], error: str) -> Dict[str, Any]:
+    """返回标记为待重新提取的 meta_data（新字典，便于 JSON 列检测到变更）"""
+    meta = dict(meta_data or {})
+    meta[EXTRACT_STATE_KEY] = STATE_DEFERRED
+    meta[EXTRACT_ERROR_KEY] = (error or "")[:200]
+    return meta
+
+
+def is_deferred(case_file: Optional[CaseFile]) -> bool:
+    """案卷是否仍待重新提取（待审核且带标记）"""
+    return (
+        case_file is not None and case_file.status == "pending"
+        and (case_file.meta_data or {}).get(EXTRACT_STATE_KEY) == STATE_DEFERRED
+    )
+
+
+def clear_deferred(meta_data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """返回去掉提取状态标记的 meta_data（新字典）"""
+    meta = dict(meta_data or {})
+    for key in (EXTRACT_STATE_KEY, EXTRACT_ATTEMPTS_KEY, EXTRACT_ERROR_KEY):
+        meta.pop(key, None)
+    return meta
+
+
+class DeferredExtractionQueue:
+    """待重新提取案卷的后台队列"""
+
+    def __init__(self, extractor=None, session_factory=None, retry_interval: Optional[float] = None):
+        self.extractor = extractor or case_field_extractor
+        self.session_factory = session_factory or BackgroundSessionLocal
+        self.retry_interval = settings.EXTRACT_RETRY_INTERVAL if retry_interval is None else retry_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._queued: Set[int] = set()
+        self._task: Optional[asyncio.Task] = None
+        self._stats = {"enqueued": 0, "completed": 0, "failed": 0, "retried": 0}
+
+    def enqueue(self, case_file_id: int) -> None:
+        """加入队列（已在队列中的忽略）"""
+        if self._queue is None or case_file_id in self._queued:
+            return
+        self._queued.add(case_file_id)
+        self._queue.put_nowait(case_file_id)
+        self._stats["enqueued"] += 1
+
+    async def start(self) -> None:
+        """启动后台任务并恢复数据库中待重新提取的案卷"""
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+        try:
+            await self._restore()
+        except Exception as e:
+            logger.warning(f"[延迟提取] 恢复待提取案卷失败: {e}")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _restore(self) -> None:
+        async with self.session_factory() as db:
+            rows = await db.execute(
+                select(CaseFile.id, CaseFile.meta_data).where(CaseFile.status == "pending")
+            )
+            for case_file_id, meta in rows.all():
+                if (meta or {}).get(EXTRACT_STATE_KEY) == STATE_DEFERRED:
+                    self.enqueue(case_file_id)
+        if self._queued:
+            logger.info(f"[延迟提取] 恢复 {len(self._queued)} 个待重新提取的案卷")
+
+    async def _run(self) -> None:
+        # 后台重新提取的调用单独记账（标签只作用于本任务）
+        tag_usage(endpoint="background:deferred-extraction")
+        while True:
+            case_file_id = await self._queue.get()
+            try:
+                # 熔断中先等待冷却结束，避免排队的案卷在恢复前全部失败
+                wait = qwen_service.retry_after()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                state = await self.process(case_file_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"[延迟提取] 案卷 {case_file_id} 处理异常: {e}")
+                state = STATE_DEFERRED
+            self._queued.discard(case_file_id)
+            if state == STATE_DEFERRED:
+                self._stats["retried"] += 1
+                asyncio.get_running_loop().call_later(self.retry_interval, self.enqueue, case_file_id)
+
+    async def process(self, case_file_id: int) -> Optional[str]:
+        """
+        重新提取一个案卷
+
+        Returns:
+            None 已完成或无需处理；deferred 仍需稍后重试；failed 超过重试次数
+        """
+        async with self.session_factory() as db:
+            case_file = await db.get(CaseFile, case_file_id)
+            if not is_deferred(case_file):
+                return None
+            text = case_file.ocr_text or ""
+            # 结束读事务归还连接，等待 AI 提取期间不占用连接池
+            await db.commit()
+
+            result = await self.extractor.extract(text)
+            # 提取期间案卷可能已被人工保存审核、确认入库或删除：重新读取，不再待提取时放弃本次结果
+            case_file = await db.get(CaseFile, case_file_id, populate_existing=True)
+            if not is_deferred(case_file):
+                logger.info(f"[延迟提取] 案卷 {case_file_id} 已人工处理，放弃重新提取结果")
+                return None
+            meta = dict(case_file.meta_data or {})
+            if result.get("success") and isinstance(result.get("fields"), dict):
+                apply_extracted_fields(case_file, result["fields"])
+                case_file.meta_data = clear_deferred(meta)
+                await db.commit()
+                graph_indexer.enqueue(case_file_id)
+                self._stats["completed"] += 1
+                logger.info(f"[延迟提取] 案卷 {case_file_id} 重新提取完成")
+                return None
+
+            attempts = meta.get(EXTRACT_ATTEMPTS_KEY, 0) + 1
+            meta[EXTRACT_ATTEMPTS_KEY] = attempts
+            meta[EXTRACT_ERROR_KEY] = (result.get("error") or "")[:200]
+            state = STATE_DEFERRED
+            if not should_defer(result) or attempts >= settings.EXTRACT_RETRY_MAX_ATTEMPTS:
+                state = STATE_FAILED
+                self._stats["failed"] += 1
+            meta[EXTRACT_STATE_KEY] = state
+            case_file.meta_data = meta
+            await db.commit()
+            logger.warning(f"[延迟提取] 案卷 {case_file_id} 第 {attempts} 次重新提取失败: {meta[EXTRACT_ERROR_KEY]}")
+            return state
+
+    def stats(self) -> Dict[str, Any]:
+        return {"queued": len(self._queued), **self._stats}
+
+
+# 创建全局实例
+extraction_retry_queue = DeferredExtractionQueue()
@@ -0,0 +1,567 @@
+"""
+案卷入图
+从案卷字段（姓名、人员基本情况、事发单位、涉案罪名、分类、时间线）抽取实体与关系，写入知识图谱。
+导入、审核、入库、重新提取后把案卷 ID 放入队列，后台任务合并一批后统一写入并同步内存索引，
+图谱在数秒内反映案卷变更；历史案卷通过全量重建（多个任务按 ID 区间并发读取）补齐。
+
+实体按去重键（类型 + 归一化名称）合并；同一关系可由多份案卷得出，来源记录在 kg_relation_sources，
+案卷修改或删除时只移除该案卷的来源，来源全部移除后才删除关系，人工创建的关系不受影响
+"""
+import asyncio
+import re
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from loguru import logger
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.core.config import settings
+from app.core.database import BackgroundSessionLocal
+from app.models.archive import CaseFile
+from app.models.knowledge_graph import KgEntity, KgRelation, KgRelationSource
+from app.services.knowledge_graph import knowledge_graph_service, normalize_entity_key
+
+# 入图用到的案卷字段（不加载正文等大字段）
+CASE_GRAPH_COLUMNS = (
+    CaseFile.id, CaseFile.case_no, CaseFile.case_name, CaseFile.title, CaseFile.status,
+    CaseFile.incident_time, CaseFile.person_name, CaseFile.person_info, CaseFile.source_department,
+    CaseFile.charge, CaseFile.classification_level1, CaseFile.classification_level2,
+    CaseFile.classification_level3, CaseFile.timeline,
+)
+
+# 多名人员、多个罪名的分隔符
+_SPLIT = re.compile(r"[、，,；;/]+")
+# 写入人员实体属性的人员基本情况字段
+_PERSON_FIELDS = ("gender", "ethnicity", "birthplace", "enlistment_time", "position", "person_category")
+# 区分同名人员的字段（依次取第一个有值的）
+_PERSON_QUALIFIERS = ("birthplace", "enlistment_time")
+# 时间线条目中的地点字段
+_TIMELINE_PLACE_KEYS = ("location", "place")
+# IN 列表每批的参数个数
+_CHUNK = 500
+
+# 实体: 去重键 -> (类型, 名称, 属性)；关系: (起点去重键, 终点去重键, 关系类型)
+CaseGraph = Tuple[Dict[str, Tuple[str, str, Optional[Dict[str, Any]]]], Set[Tuple[str, str, str]]]
+
+
+def _chunks(items: Sequence[Any], size: int = _CHUNK) -> Iterable[Sequence[Any]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _split_names(text: Optional[str]) -> List[str]:
+    return [part.strip() for part in _SPLIT.split(text or "") if part.strip()]
+
+
+def case_entity_key(case_file) -> str:
+    """案件实体去重键（按案卷编号，与查询时按编号查找一致）"""
+    return normalize_entity_key("case", case_file.case_no or str(case_file.id))
+
+
+def derive_case_graph(case_file) -> CaseGraph:
+    """
+    从案卷字段抽取实体与关系（纯函数，case_file 可为 ORM 对象或按 CASE_GRAPH_COLUMNS 查询的行）
+
+    - 案件：名称取卷宗名，属性含案卷编号、状态、发生时间
+    - 人员：姓名按顿号等拆分；只有一名人员且有出生地或入伍时间时，去重键附加该字段以区分同名人员，
+      并写入人员基本情况、关联出生地；否则按姓名合并，不写入属性（同名节点可能对应多人）
+    - 单位：事发单位，案件“事发单位”、人员“所属单位”
+    - 罪名：涉案罪名按顿号等拆分
+    - 分类：一至三级分类路径
+    - 地点：时间线条目中的地点
+    """
+    entities: Dict[str, Tuple[str, str, Optional[Dict[str, Any]]]] = {}
+    relations: Set[Tuple[str, str, str]] = set()
+
+    def _entity(
+        entity_type: str, name: Optional[str], properties: Optional[Dict[str, Any]] = None, qualifier: Any = None,
+    ) -> Optional[str]:
+        name = (name or "").strip()[:200]
+        key = normalize_entity_key(entity_type, name)
+        if key == f"{entity_type}:":
+            return None
+        qualifier = normalize_entity_key(entity_type, str(qualifier or "")).split(":", 1)[1]
+        if qualifier:
+            key = f"{key}@{qualifier}"
+        entities.setdefault(key, (entity_type, name, properties))
+        return key
+
+    case_key = case_entity_key(case_file)
+    entities[case_key] = ("case", (case_file.case_name or case_file.title or case_file.case_no or "")[:200], {
+        "caseFileId": case_file.id,
+        "caseNo": case_file.case_no,
+        "status": case_file.status,
+        "incidentTime": case_file.incident_time.strftime("%Y-%m-%d %H:%M") if case_file.incident_time else None,
+    })
+
+    info = case_file.person_info if isinstance(case_file.person_info, dict) else {}
+    names = _split_names(case_file.person_name)
+    single = len(names) == 1
+    qualifier = next((info[k] for k in _PERSON_QUALIFIERS if info.get(k)), None) if single else None
+    properties = {k: info[k] for k in _PERSON_FIELDS if info.get(k)} if qualifier else None
+    persons = [key for key in (_entity("person", name, properties, qualifier) for name in names) if key]
+
+    department = _entity("department", case_file.source_department)
+    if department:
+        relations.add((case_key, department, "occurred_in"))
+    birthplace = _entity("location", info.get("birthplace")) if single else None
+    for person in persons:
+        relations.add((person, case_key, "involved_in"))
+        if department:
+            relations.add((person, department, "member_of"))
+        if birthplace:
+            relations.add((person, birthplace, "native_of"))
+
+    for law in _split_names(case_file.charge):
+        key = _entity("law", law)
+        if key:
+            relations.add((case_key, key, "charged_with"))
+
+    levels = [lv.strip() for lv in (
+        case_file.classification_level1, case_file.classification_level2, case_file.classification_level3,
+    ) if lv and lv.strip()]
+    category = _entity("category", " / ".join(levels)) if levels else None
+    if category:
+        relations.add((case_key, category, "classified_as"))
+
+    for item in case_file.timeline if isinstance(case_file.timeline, list) else ():
+        if not isinstance(item, dict):
+            continue
+        for place_key in _TIMELINE_PLACE_KEYS:
+            key = _entity("location", item.get(place_key) if isinstance(item.get(place_key), str) else None)
+            if key:
+                relations.add((case_key, key, "located_at"))
+    return entities, relations
+
+
+class GraphIndexer:
+    """案卷入图：增量队列 + 批量写入 + 全量重建"""
+
+    def __init__(
+        self,
+        graph_service=None,
+        session_factory=None,
+        debounce: Optional[float] = None,
+        batch_size: Optional[int] = None,
+        retry_interval: Optional[float] = None,
+    ):
+        self.graph_service = graph_service or knowledge_graph_service
+        self.session_factory = session_factory or BackgroundSessionLocal
+        self.debounce = settings.KG_INDEX_DEBOUNCE if debounce is None else debounce
+        self.batch_size = batch_size or settings.KG_INDEX_BATCH_SIZE
+        self.retry_interval = settings.KG_INDEX_RETRY_INTERVAL if retry_interval is None else retry_interval
+        self._queue: Optional[asyncio.Queue] = None
+        # 案卷 ID -> 入队时间（用于统计入图延迟）
+        self._queued: Dict[int, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._rebuild_task: Optional[asyncio.Task] = None
+        # 增量写入与重建共用一个写入者，避免同一实体、关系并发插入
+        self._write_lock = asyncio.Lock()
+        # 写入序号；重建期间记录各案卷最近一次写入的序号，用于丢弃比增量写入更旧的重建快照
+        self._write_seq = 0
+        self._written: Dict[int, int] = {}
+        self._lag_total = 0.0
+        self._lag_count = 0
+        self._stats: Dict[str, Any] = {
+            "enqueued": 0, "indexed": 0, "batches": 0, "failed": 0,
+            "entitiesCreated": 0, "relationsCreated": 0, "relationsRemoved": 0,
+            "lastLagMs": None, "maxLagMs": 0.0,
+        }
+        self._rebuild: Dict[str, Any] = {"running": False}
+
+    # ---------- 增量队列 ----------
+
+    def enqueue(self, case_file_id: Optional[int]) -> None:
+        """案卷新增、修改或删除后加入队列（已在队列中的忽略）"""
+        if self._queue is None or case_file_id is None or case_file_id in self._queued:
+            return
+        self._queued[case_file_id] = time.monotonic()
+        self._queue.put_nowait(case_file_id)
+        self._stats["enqueued"] += 1
+
+    def enqueue_many(self, case_file_ids: Iterable[Optional[int]]) -> None:
+        for case_file_id in case_file_ids:
+            self.enqueue(case_file_id)
+
+    async def start(self) -> None:
+        if self._task is not None or not settings.KG_INDEX_ENABLED:
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        for task in (self._rebuild_task, self._task):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._task = self._rebuild_task = None
+        self._queue = None
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            # 等待片刻合并批量导入、批量确认产生的案卷；积压已满一批时不等待
+            if self.debounce and self._queue.qsize() + 1 < self.batch_size:
+                await asyncio.sleep(self.debounce)
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            enqueued_at = {case_file_id: self._queued.pop(case_file_id) for case_file_id in batch}
+            try:
+                await self.index_cases(batch)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"[案卷入图] {len(batch)} 个案卷写入失败，{self.retry_interval}s 后重试: {e}")
+                self._stats["failed"] += len(batch)
+                asyncio.get_running_loop().call_later(self.retry_interval, self.enqueue_many, batch)
+                continue
+            now = time.monotonic()
+            lags = [now - t for t in enqueued_at.values()]
+            self._lag_total += sum(lags)
+            self._lag_count += len(lags)
+            self._stats["lastLagMs"] = round(max(lags) * 1000, 1)
+            self._stats["maxLagMs"] = max(self._stats["maxLagMs"], self._stats["lastLagMs"])
+
+    async def index_cases(self, case_file_ids: Iterable[int]) -> int:
+        """重新抽取并写入指定案卷（已删除的案卷移除其案件实体与关系来源），返回已删除的案卷数"""
+        ids = sorted(set(case_file_ids))
+        graphs: Dict[int, Optional[CaseGraph]] = {case_file_id: None for case_file_id in ids}
+        async with self.session_factory() as db:
+            for chunk in _chunks(ids):
+                rows = await db.execute(select(*CASE_GRAPH_COLUMNS).where(CaseFile.id.in_(chunk)))
+                for row in rows.all():
+                    graphs[row.id] = derive_case_graph(row)
+        await self._write(graphs)
+        return sum(1 for graph in graphs.values() if graph is None)
+
+    # ---------- 写入 ----------
+
+    async def _write(self, graphs: Dict[int, Optional[CaseGraph]], snapshot: Optional[int] = None) -> None:
+        """
+        写入一批案卷的图谱并在提交后同步内存索引；与人工创建的实体冲突时重试
+
+        snapshot 为重建读取这批案卷前的写入序号，其后已由增量写入的案卷跳过（快照比已写入的内容旧）
+        """
+        async with self._write_lock:
+            if snapshot is not None:
+                graphs = {
+                    case_file_id: graph for case_file_id, graph in graphs.items()
+                    if self._written.get(case_file_id, 0) <= snapshot
+                }
+                if not graphs:
+                    return
+            for attempt in range(3):
+                async with self.session_factory() as db:
+                    try:
+                        changes = await self._apply(db, graphs)
+                        await db.commit()
+                        break
+                    except IntegrityError:
+                        await db.rollback()
+                        if attempt == 2:
+                            raise
+            self._write_seq += 1
+            if self._rebuild.get("running"):
+                self._written.update(dict.fromkeys(graphs, self._write_seq))
+            index = self.graph_service.index
+            for entity in changes["entities"]:
+                index.add_entity(*entity)
+            for edge in changes["removed"]:
+                index.remove_edge(*edge)
+            for edge in changes["added"]:
+                index.add_edge(*edge)
+            for entity_id in changes["deleted"]:
+                index.remove_entity(entity_id)
+            self._stats["indexed"] += len(graphs)
+            self._stats["batches"] += 1
+            self._stats["entitiesCreated"] += changes["created"]
+            self._stats["relationsCreated"] += len(changes["added"])
+            self._stats["relationsRemoved"] += len(changes["removed"])
+
+    async def _apply(self, db, graphs: Dict[int, Optional[CaseGraph]]) -> Dict[str, Any]:
+        changes: Dict[str, Any] = {"entities": [], "added": [], "removed": [], "deleted": [], "created": 0}
+        case_ids = list(graphs)
+
+        # 实体：按去重键批量查询，缺少的批量插入；案件实体随案卷更新名称与属性
+        wanted: Dict[str, Tuple[str, str, Optional[Dict[str, Any]], Optional[int]]] = {}
+        for case_file_id, graph in graphs.items():
+            if graph is None:
+                continue
+            for key, (entity_type, name, properties) in graph[0].items():
+                if entity_type == "case":
+                    wanted[key] = (entity_type, name, properties, case_file_id)
+                else:
+                    wanted.setdefault(key, (entity_type, name, properties, None))
+        ids = await self._upsert_entities(db, wanted, changes)
+
+        # 关系：对比每个案卷当前的来源与本次抽取结果
+        current: Dict[int, Dict[Tuple[int, int, str], int]] = {case_file_id: {} for case_file_id in case_ids}
+        for chunk in _chunks(case_ids):
+            rows = await db.execute(
+                select(
+                    KgRelationSource.case_file_id, KgRelation.id,
+                    KgRelation.source_id, KgRelation.target_id, KgRelation.relation_type,
+                )
+                .join(KgRelation, KgRelation.id == KgRelationSource.relation_id)
+                .where(KgRelationSource.case_file_id.in_(chunk))
+            )
+            for case_file_id, relation_id, source_id, target_id, relation_type in rows.all():
+                current[case_file_id][(source_id, target_id, relation_type)] = relation_id
+        links: List[Tuple[int, Tuple[int, int, str]]] = []
+        unlinks: Dict[int, List[int]] = {}
+        for case_file_id, graph in graphs.items():
+            desired = set() if graph is None else {
+                (ids[source], ids[target], relation_type) for source, target, relation_type in graph[1]
+            }
+            existing = current[case_file_id]
+            links.extend((case_file_id, edge) for edge in desired if edge not in existing)
+            stale = [relation_id for edge, relation_id in existing.items() if edge not in desired]
+            if stale:
+                unlinks[case_file_id] = stale
+
+        relation_ids = await self._upsert_relations(db, links, changes)
+        if links:
+            await db.execute(insert(KgRelationSource), [
+                {"relation_id": relation_ids[edge], "case_file_id": case_file_id} for case_file_id, edge in links
+            ])
+        for case_file_id, stale in unlinks.items():
+            await db.execute(delete(KgRelationSource).where(
+                KgRelationSource.case_file_id == case_file_id, KgRelationSource.relation_id.in_(stale),
+            ))
+
+        # 权重 = 来源案卷数；由案卷得出的关系来源全部移除后删除
+        touched = sorted({relation_ids[edge] for _, edge in links} | {r for stale in unlinks.values() for r in stale})
+        counts: Dict[int, int] = {}
+        for chunk in _chunks(touched):
+            rows = await db.execute(
+                select(KgRelationSource.relation_id, func.count())
+                .where(KgRelationSource.relation_id.in_(chunk))
+                .group_by(KgRelationSource.relation_id)
+            )
+            counts.update(rows.all())
+        orphans = [relation_id for relation_id in touched if relation_id not in counts]
+        for chunk in _chunks(orphans):
+            rows = await db.execute(
+                select(KgRelation.id, KgRelation.source_id, KgRelation.target_id, KgRelation.relation_type)
+                .where(KgRelation.id.in_(chunk), KgRelation.case_file_id.isnot(None))
+            )
+            derived = rows.all()
+            if derived:
+                await db.execute(delete(KgRelation).where(KgRelation.id.in_([row[0] for row in derived])))
+                changes["removed"].extend(tuple(row[1:]) for row in derived)
+        if counts:
+            await db.execute(update(KgRelation), [
+                {"id": relation_id, "weight": float(count)} for relation_id, count in counts.items()
+            ])
+
+        # 已删除的案卷：删除案件实体及与之相连的全部关系
+        deleted = [case_file_id for case_file_id, graph in graphs.items() if graph is None]
+        for chunk in _chunks(deleted):
+            entity_ids = list((await db.execute(
+                select(KgEntity.id).where(KgEntity.entity_type == "case", KgEntity.case_file_id.in_(chunk))
+            )).scalars().all())
+            if not entity_ids:
+                continue
+            rows = (await db.execute(
+                select(KgRelation.id, KgRelation.source_id, KgRelation.target_id, KgRelation.relation_type).where(
+                    KgRelation.source_id.in_(entity_ids) | KgRelation.target_id.in_(entity_ids)
+                )
+            )).all()
+            if rows:
+                relation_list = [row[0] for row in rows]
+                await db.execute(delete(KgRelationSource).where(KgRelationSource.relation_id.in_(relation_list)))
+                await db.execute(delete(KgRelation).where(KgRelation.id.in_(relation_list)))
+            await db.execute(delete(KgEntity).where(KgEntity.id.in_(entity_ids)))
+            changes["deleted"].extend(entity_ids)
+        return changes
+
+    async def _upsert_entities(
+        self, db, wanted: Dict[str, Tuple[str, str, Optional[Dict[str, Any]], Optional[int]]], changes: Dict[str, Any],
+    ) -> Dict[str, int]:
+        """返回 去重键 -> 实体ID"""
+        keys = list(wanted)
+        existing: Dict[str, Tuple[int, str, Any]] = {}
+        for chunk in _chunks(keys):
+            rows = await db.execute(
+                select(KgEntity.entity_key, KgEntity.id, KgEntity.name, KgEntity.properties)
+                .where(KgEntity.entity_key.in_(chunk))
+            )
+            existing.update((key, (entity_id, name, properties)) for key, entity_id, name, properties in rows.all())
+        ids = {key: row[0] for key, row in existing.items()}
+
+        missing = [key for key in keys if key not in existing]
+        if missing:
+            await db.execute(insert(KgEntity), [
+                {
+                    "entity_type": wanted[key][0], "entity_key": key, "name": wanted[key][1],
+                    "properties": wanted[key][2], "case_file_id": wanted[key][3],
+                }
+                for key in missing
+            ])
+            for chunk in _chunks(missing):
+                rows = await db.execute(select(KgEntity.entity_key, KgEntity.id).where(KgEntity.entity_key.in_(chunk)))
+                ids.update(rows.all())
+            changes["created"] += len(missing)
+        renamed = [
+            key for key, (entity_type, name, properties, _) in wanted.items()
+            if entity_type == "case" and key in existing and existing[key][1:] != (name, properties)
+        ]
+        if renamed:
+            await db.execute(update(KgEntity), [
+                {"id": ids[key], "name": wanted[key][1], "properties": wanted[key][2]} for key in renamed
+            ])
+        changes["entities"].extend(
+            (ids[key], wanted[key][0], wanted[key][1], key) for key in missing + renamed
+        )
+        return ids
+
+    async def _upsert_relations(
+        self, db, links: List[Tuple[int, Tuple[int, int, str]]], changes: Dict[str, Any],
+    ) -> Dict[Tuple[int, int, str], int]:
+        """返回 (起点, 终点, 类型) -> 关系ID；不存在的关系以首个来源案卷插入"""
+        first_case: Dict[Tuple[int, int, str], int] = {}
+        for case_file_id, edge in links:
+            first_case.setdefault(edge, case_file_id)
+        relation_ids: Dict[Tuple[int, int, str], int] = {}
+
+        async def _select(sources: List[int]) -> None:
+            for chunk in _chunks(sources):
+                rows = await db.execute(
+                    select(KgRelation.source_id, KgRelation.target_id, KgRelation.relation_type, KgRelation.id)
+                    .where(KgRelation.source_id.in_(chunk))
+                )
+                for source_id, target_id, relation_type, relation_id in rows.all():
+                    if (source_id, target_id, relation_type) in first_case:
+                        relation_ids[(source_id, target_id, relation_type)] = relation_id
+
+        await _select(sorted({edge[0] for edge in first_case}))
+        missing = [edge for edge in first_case if edge not in relation_ids]
+        if missing:
+            await db.execute(insert(KgRelation), [
+                {
+                    "source_id": source_id, "target_id": target_id, "relation_type": relation_type,
+                    "weight": 1.0, "case_file_id": first_case[(source_id, target_id, relation_type)],
+                }
+                for source_id, target_id, relation_type in missing
+            ])
+            await _select(sorted({edge[0] for edge in missing}))
+            changes["added"].extend(missing)
+        return relation_ids
+
+    # ---------- 全量重建 ----------
+
+    async def rebuild(self, workers: Optional[int] = None) -> Dict[str, Any]:
+        """
+        全量重建：按案卷 ID 区间分给多个任务并发读取、抽取，由单个写入者按批写入；
+        写入逻辑与增量相同（只补齐差异），可在服务运行期间执行，完成后重新加载内存索引。
+        读取后又被增量写入的案卷不再用读取时的快照覆盖；重新加载索引时持有写锁，不丢失期间的增量
+        """
+        workers = workers or settings.KG_REBUILD_WORKERS
+        start = time.perf_counter()
+        async with self.session_factory() as db:
+            low, high, total = (await db.execute(
+                select(func.min(CaseFile.id), func.max(CaseFile.id), func.count(CaseFile.id))
+            )).one()
+        progress = self._rebuild = {"running": True, "total": total, "indexed": 0, "workers": workers, "error": None}
+        self._written.clear()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+        seen: Set[int] = set()
+
+        async def _read(part_low: int, part_high: int) -> None:
+            cursor = part_low
+            async with self.session_factory() as db:
+                while cursor <= part_high:
+                    snapshot = self._write_seq
+                    rows = (await db.execute(
+                        select(*CASE_GRAPH_COLUMNS)
+                        .where(CaseFile.id >= cursor, CaseFile.id <= part_high)
+                        .order_by(CaseFile.id)
+                        .limit(self.batch_size)
+                    )).all()
+                    # 结束读事务，等待写入者期间不占用快照
+                    await db.commit()
+                    if not rows:
+                        break
+                    await queue.put((snapshot, {row.id: derive_case_graph(row) for row in rows}))
+                    cursor = rows[-1].id + 1
+
+        async def _produce() -> None:
+            if total:
+                step = (high - low) // workers + 1
+                await asyncio.gather(*(
+                    _read(low + i * step, min(low + (i + 1) * step - 1, high)) for i in range(workers)
+                ))
+            await queue.put(None)
+
+        async def _consume() -> None:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                snapshot, graphs = item
+                await self._write(graphs, snapshot)
+                seen.update(graphs)
+                progress["indexed"] += len(graphs)
+
+        tasks = [asyncio.create_task(_produce()), asyncio.create_task(_consume())]
+        try:
+            await asyncio.gather(*tasks)
+            # 图谱中有、本次未读到的案卷：已删除，或在读取后由增量新增，重新读取确认
+            async with self.session_factory() as db:
+                referenced = set((await db.execute(
+                    select(KgEntity.case_file_id).where(KgEntity.entity_type == "case", KgEntity.case_file_id.isnot(None))
+                )).scalars().all())
+                referenced.update((await db.execute(select(KgRelationSource.case_file_id).distinct())).scalars().all())
+            removed = 0
+            for chunk in _chunks(sorted(referenced - seen), self.batch_size):
+                removed += await self.index_cases(chunk)
+            async with self._write_lock:
+                await self.graph_service.load()
+        except BaseException as e:
+            progress["error"] = str(e) or type(e).__name__
+            raise
+        finally:
+            for task in tasks:
+                task.cancel()
+            progress["running"] = False
+            self._written.clear()
+            progress["elapsedMs"] = round((time.perf_counter() - start) * 1000)
+        progress["removed"] = removed
+        logger.info(
+            f"[案卷入图] 全量重建 {progress['indexed']} 个案卷（{workers} 个读取任务），"
+            f"清理 {removed} 个已删除案卷，耗时 {progress['elapsedMs']}ms"
+        )
+        return dict(progress)
+
+    def start_rebuild(self, workers: Optional[int] = None) -> bool:
+        """后台启动全量重建，已在进行时返回 False"""
+        if self._rebuild_task is not None and not self._rebuild_task.done():
+            return False
+
+        async def _run() -> None:
+            try:
+                await self.rebuild(workers)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("[案卷入图] 全量重建失败")
+
+        self._rebuild_task = asyncio.create_task(_run())
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self._task is not None,
+            "queued": len(self._queued),
+            **self._stats,
+            "avgLagMs": round(self._lag_total / self._lag_count * 1000, 1) if self._lag_count else None,
+            "rebuild": dict(self._rebuild),
+        }
+
+
+# 创建全局实例
+graph_indexer = GraphIndexer()
@@ -0,0 +1,567 @@
+"""
+知识图谱
+实体与关系持久化在 kg_entities / kg_relations 表；启动时加载为内存邻接表（CSR：第 i 个实体的邻居
+连续存放在 neighbors[offsets[i]:offsets[i + 1]]），多跳查询在内存中逐层 BFS，不做递归 SQL 关联。
+
+邻接表按无向存储：每条关系在两端各存一份，标签为 关系类型编码 << 1 | 方向位（1 表示反向），
+查询邻域时双向展开，返回时还原关系方向。新增的边先放入增量表，删除的边记为墓碑，
+二者累计超过阈值时重建 CSR
+"""
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from loguru import logger
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from app.core.config import settings
+from app.core.database import BackgroundSessionLocal
+from app.models.knowledge_graph import KgEntity, KgRelation
+
+# 实体类型 -> 名称
+ENTITY_TYPES: Dict[str, str] = {
+    "case": "案件",
+    "person": "人员",
+    "law": "罪名/法规",
+    "location": "地点",
+    "department": "单位",
+    "category": "案件分类",
+}
+
+# 关系类型 -> (名称, 起点实体类型, 终点实体类型)
+RELATION_TYPES: Dict[str, Tuple[str, str, str]] = {
+    "involved_in": ("涉案", "person", "case"),
+    "member_of": ("所属单位", "person", "department"),
+    "occurred_in": ("事发单位", "case", "department"),
+    "charged_with": ("涉嫌罪名", "case", "law"),
+    "located_at": ("事发地点", "case", "location"),
+    "classified_as": ("案件分类", "case", "category"),
+    "related_case": ("关联案件", "case", "case"),
+    "related_person": ("相关人员", "person", "person"),
+    "native_of": ("籍贯/出生地", "person", "location"),
+}
+
+# 去重键忽略空白、标点与书名号（“《刑法》”与“刑法”视为同一实体）
+_KEY_NOISE = re.compile(r"[\s·•\.,，。、:：;；\"'“”‘’()（）《》<>〈〉\[\]【】\-—]+")
+
+
+def normalize_entity_key(entity_type: str, name: str) -> str:
+    """实体去重键：类型 + 归一化名称（全角转半角、去空白标点、小写）"""
+    text = _KEY_NOISE.sub("", unicodedata.normalize("NFKC", name or "")).lower()
+    return f"{entity_type}:{text}"
+
+
+class GraphIndex:
+    """内存图索引：CSR 邻接表 + 增量表 + 墓碑（线程安全）"""
+
+    def __init__(self, compact_threshold: Optional[int] = None):
+        self.compact_threshold = compact_threshold or settings.KG_COMPACT_THRESHOLD
+        self._lock = threading.RLock()
+        # 实体：稠密下标 <-> 实体 ID
+        self._ids = array("q")
+        self._dense: Dict[int, int] = {}
+        self._types = array("B")
+        self._names: List[str] = []
+        self._keys: Dict[str, int] = {}
+        # 实体类型、关系类型编码
+        self._type_names: List[str] = []
+        self._type_codes: Dict[str, int] = {}
+        self._rel_names: List[str] = []
+        self._rel_codes: Dict[str, int] = {}
+        # CSR（只覆盖上次重建时已有的实体）
+        self._offsets = array("q", [0])
+        self._neighbors = array("q")
+        self._labels = array("l")
+        # 重建后新增的邻接项、删除的邻接项 (u, v, label)
+        self._delta: Dict[int, List[Tuple[int, int]]] = {}
+        self._delta_count = 0
+        self._removed: Set[Tuple[int, int, int]] = set()
+        self._edge_count = 0
+        self._rel_counts: Dict[str, int] = {}
+        self._stats = {"compactions": 0, "queries": 0, "truncated": 0}
+
+    @staticmethod
+    def _intern(names: List[str], codes: Dict[str, int], name: str) -> int:
+        code = codes.get(name)
+        if code is None:
+            code = codes[name] = len(names)
+            names.append(name)
+        return code
+
+    # ---------- 实体 ----------
+
+    def add_entity(self, entity_id: int, entity_type: str, name: str, key: Optional[str] = None) -> None:
+        """加入实体（已存在时更新名称与类型）"""
+        key = key or normalize_entity_key(entity_type, name)
+        with self._lock:
+            code = self._intern(self._type_names, self._type_codes, entity_type)
+            dense = self._dense.get(entity_id)
+            if dense is None:
+                self._dense[entity_id] = len(self._ids)
+                self._ids.append(entity_id)
+                self._types.append(code)
+                self._names.append(name)
+            else:
+                self._types[dense] = code
+                self._names[dense] = name
+            self._keys[key] = entity_id
+
+    def remove_entity(self, entity_id: int) -> None:
+        """删除实体及其所有关系（稠密下标保留到下次重建）"""
+        with self._lock:
+            u = self._dense.get(entity_id)
+            if u is None:
+                return
+            for v, label in list(self._adjacent(u)):
+                if label & 1:
+                    self._remove(v, u, label >> 1)
+                else:
+                    self._remove(u, v, label >> 1)
+            del self._dense[entity_id]
+            for key in [k for k, v in self._keys.items() if v == entity_id]:
+                del self._keys[key]
+            self._maybe_compact()
+
+    def entity_id(self, key: str) -> Optional[int]:
+        """按去重键查找实体 ID"""
+        return self._keys.get(key)
+
+    def resolve(self, entity_type: str, ref: str) -> Optional[int]:
+        """按实体 ID 或名称查找实体（名称按去重键匹配）"""
+        ref = (ref or "").strip()
+        with self._lock:
+            if ref.isdigit():
+                dense = self._dense.get(int(ref))
+                if dense is not None and self._type_names[self._types[dense]] == entity_type:
+                    return int(ref)
+            return self._keys.get(normalize_entity_key(entity_type, ref))
+
+    def entity(self, entity_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            dense = self._dense.get(entity_id)
+            return None if dense is None else self._node(dense)
+
+    def _node(self, dense: int) -> Dict[str, Any]:
+        return {"id": self._ids[dense], "name": self._names[dense], "type": self._type_names[self._types[dense]]}
+
+    def search(self, entity_type: Optional[str], keyword: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """按名称包含关键字查找实体"""
+        keyword = (keyword or "").strip().lower()
+        items: List[Dict[str, Any]] = []
+        with self._lock:
+            code = self._type_codes.get(entity_type) if entity_type else None
+            if entity_type and code is None:
+                return items
+            for entity_id, dense in self._dense.items():
+                if code is not None and self._types[dense] != code:
+                    continue
+                if keyword in self._names[dense].lower():
+                    items.append(self._node(dense))
+                    if len(items) >= limit:
+                        break
+        return items
+
+    # ---------- 关系 ----------
+
+    def _adjacent(self, u: int) -> Iterator[Tuple[int, int]]:
+        """u 的邻接项 (v, label)：CSR 中未删除的 + 增量表"""
+        if u < len(self._offsets) - 1:
+            removed = self._removed
+            for i in range(self._offsets[u], self._offsets[u + 1]):
+                v, label = self._neighbors[i], self._labels[i]
+                if removed and (u, v, label) in removed:
+                    continue
+                yield v, label
+        delta = self._delta.get(u)
+        if delta:
+            yield from delta
+
+    def _degree(self, u: int) -> int:
+        span = self._offsets[u + 1] - self._offsets[u] if u < len(self._offsets) - 1 else 0
+        return span + len(self._delta.get(u) or ())
+
+    def _has(self, u: int, v: int, label: int) -> bool:
+        """边 u -> v 是否存在（从度较小的一端查找，单位等高度数实体不必整段扫描）"""
+        if self._degree(v) < self._degree(u):
+            u, v, label = v, u, label ^ 1
+        return any(w == v and lab == label for w, lab in self._adjacent(u))
+
+    def add_edge(self, source_id: int, target_id: int, relation_type: str) -> bool:
+        """加入关系，端点不存在或关系已存在时返回 False"""
+        with self._lock:
+            u, v = self._dense.get(source_id), self._dense.get(target_id)
+            if u is None or v is None:
+                return False
+            code = self._intern(self._rel_names, self._rel_codes, relation_type)
+            forward, backward = (u, v, code << 1), (v, u, code << 1 | 1)
+            if forward in self._removed:
+                # CSR 中被删除过，撤销墓碑即可
+                self._removed.discard(forward)
+                self._removed.discard(backward)
+            elif self._has(u, v, code << 1):
+                return False
+            else:
+                self._delta.setdefault(u, []).append((v, code << 1))
+                self._delta.setdefault(v, []).append((u, code << 1 | 1))
+                self._delta_count += 1
+            self._edge_count += 1
+            self._rel_counts[relation_type] = self._rel_counts.get(relation_type, 0) + 1
+            self._maybe_compact()
+            return True
+
+    def remove_edge(self, source_id: int, target_id: int, relation_type: str) -> bool:
+        """删除关系，不存在时返回 False"""
+        with self._lock:
+            u, v = self._dense.get(source_id), self._dense.get(target_id)
+            code = self._rel_codes.get(relation_type)
+            if u is None or v is None or code is None:
+                return False
+            removed = self._remove(u, v, code)
+            self._maybe_compact()
+            return removed
+
+    def _remove(self, u: int, v: int, code: int) -> bool:
+        forward, backward = (v, code << 1), (u, code << 1 | 1)
+        delta_u, delta_v = self._delta.get(u), self._delta.get(v)
+        if delta_u and forward in delta_u:
+            delta_u.remove(forward)
+            delta_v.remove(backward)
+            self._delta_count -= 1
+        elif self._has(u, v, code << 1):
+            self._removed.add((u, v, code << 1))
+            self._removed.add((v, u, code << 1 | 1))
+        else:
+            return False
+        self._edge_count -= 1
+        self._rel_counts[self._rel_names[code]] -= 1
+        return True
+
+    def _maybe_compact(self) -> None:
+        pending = self._delta_count + len(self._removed) // 2
+        if pending > max(self.compact_threshold, (len(self._neighbors) // 2) // 4):
+            self.compact()
+
+    def compact(self) -> None:
+        """把增量表与墓碑合并进 CSR"""
+        with self._lock:
+            start = time.perf_counter()
+            offsets, neighbors, labels = array("q", [0]), array("q"), array("l")
+            for u in range(len(self._ids)):
+                for v, label in self._adjacent(u):
+                    neighbors.append(v)
+                    labels.append(label)
+                offsets.append(len(neighbors))
+            self._offsets, self._neighbors, self._labels = offsets, neighbors, labels
+            self._delta, self._delta_count, self._removed = {}, 0, set()
+            self._stats["compactions"] += 1
+            logger.debug(f"[知识图谱] 重建邻接表 {len(self._ids)} 个实体，耗时 {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    def load(
+        self,
+        entities: Iterable[Sequence[Any]],
+        relations: Iterable[Sequence[Any]],
+    ) -> None:
+        """
+        全量构建（计数排序生成 CSR）
+
+        Args:
+            entities: (实体ID, 类型, 名称, 去重键)
+            relations: (起点ID, 终点ID, 关系类型)
+        """
+        fresh = GraphIndex(self.compact_threshold)
+        for entity_id, entity_type, name, key in entities:
+            fresh.add_entity(entity_id, entity_type, name, key)
+        sources, targets, codes = array("q"), array("q"), array("l")
+        degree = [0] * (len(fresh._ids) + 1)
+        for source_id, target_id, relation_type in relations:
+            u, v = fresh._dense.get(source_id), fresh._dense.get(target_id)
+            if u is None or v is None:
+                continue
+            sources.append(u)
+            targets.append(v)
+            codes.append(fresh._intern(fresh._rel_names, fresh._rel_codes, relation_type))
+            fresh._rel_counts[relation_type] = fresh._rel_counts.get(relation_type, 0) + 1
+            degree[u + 1] += 1
+            degree[v + 1] += 1
+        for i in range(1, len(degree)):
+            degree[i] += degree[i - 1]
+        offsets = array("q", degree)
+        cursor = list(degree[:-1])
+        neighbors = array("q", [0]) * degree[-1]
+        labels = array("l", [0]) * degree[-1]
+        for u, v, code in zip(sources, targets, codes):
+            neighbors[cursor[u]], labels[cursor[u]] = v, code << 1
+            cursor[u] += 1
+            neighbors[cursor[v]], labels[cursor[v]] = u, code << 1 | 1
+            cursor[v] += 1
+        fresh._offsets, fresh._neighbors, fresh._labels = offsets, neighbors, labels
+        fresh._edge_count = len(sources)
+        with self._lock:
+            for name in ("_ids", "_dense", "_types", "_names", "_keys", "_type_names", "_type_codes",
+                         "_rel_names", "_rel_codes", "_offsets", "_neighbors", "_labels",
+                         "_delta", "_delta_count", "_removed", "_edge_count", "_rel_counts"):
+                setattr(self, name, getattr(fresh, name))
+
+    # ---------- 查询 ----------
+
+    def neighborhood(
+        self,
+        entity_id: int,
+        hops: int,
+        relation_types: Optional[Iterable[str]] = None,
+        max_nodes: Optional[int] = None,
+        max_edges: Optional[int] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        多跳邻域（逐层 BFS，双向展开）
+
+        Args:
+            entity_id: 起点实体
+            hops: 跳数
+            relation_types: 只沿这些类型的关系展开（为空不限）
+            max_nodes: 最多返回的实体数（含起点）
+            max_edges: 最多返回的关系数
+
+        Returns:
+            {"nodes": [{id, name, type, hop, via}], "edges": [{source, target, type}], "truncated"}；
+            via 为发现该实体时经过的 (上一跳实体ID, 关系类型)；起点不存在时返回 None
+        """
+        max_nodes = max_nodes or settings.KG_MAX_NODES
+        max_edges = max_edges or settings.KG_MAX_EDGES
+        with self._lock:
+            start = self._dense.get(entity_id)
+            if start is None:
+                return None
+            allowed = None
+            if relation_types:
+                allowed = {self._rel_codes[r] for r in relation_types if r in self._rel_codes}
+            depth: Dict[int, int] = {start: 0}
+            via: Dict[int, Tuple[int, int]] = {}
+            edges: List[Tuple[int, int, int]] = []
+            seen: Set[Tuple[int, int, int]] = set()
+            truncated = False
+            frontier = [start]
+            for hop in range(1, hops + 1):
+                next_frontier: List[int] = []
+                for u in frontier:
+                    for v, label in self._adjacent(u):
+                        code = label >> 1
+                        if allowed is not None and code not in allowed:
+                            continue
+                        if v not in depth:
+                            if len(depth) >= max_nodes:
+                                # 达到上限即停止，不再扫描罪名、分类等高度数实体的其余邻居
+                                truncated = True
+                                break
+                            depth[v] = hop
+                            via[v] = (u, code)
+                            next_frontier.append(v)
+                        edge = (v, u, code) if label & 1 else (u, v, code)
+                        if edge in seen:
+                            continue
+                        if len(edges) >= max_edges:
+                            truncated = True
+                            break
+                        seen.add(edge)
+                        edges.append(edge)
+                    if truncated:
+                        break
+                frontier = next_frontier
+                if truncated or not frontier:
+                    break
+            self._stats["queries"] += 1
+            self._stats["truncated"] += 1 if truncated else 0
+            nodes = []
+            for dense, hop in depth.items():
+                node = self._node(dense)
+                node["hop"] = hop
+                if dense in via:
+                    parent, code = via[dense]
+                    node["via"] = (self._ids[parent], self._rel_names[code])
+                nodes.append(node)
+            return {
+                "nodes": nodes,
+                "edges": [
+                    {"source": self._ids[s], "target": self._ids[t], "type": self._rel_names[c]}
+                    for s, t, c in edges
+                ],
+                "truncated": truncated,
+            }
+
+    def relation_counts(self) -> Dict[str, int]:
+        """各关系类型的边数"""
+        with self._lock:
+            return {name: count for name, count in self._rel_counts.items() if count}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "entities": len(self._dense),
+                "relations": self._edge_count,
+                "csrEntries": len(self._neighbors),
+                "deltaRelations": self._delta_count,
+                "removedRelations": len(self._removed) // 2,
+                "memoryBytes": (
+                    self._offsets.itemsize * len(self._offsets)
+                    + self._neighbors.itemsize * len(self._neighbors)
+                    + self._labels.itemsize * len(self._labels)
+                ),
+                **self._stats,
+            }
+
+
+class KnowledgeGraphService:
+    """知识图谱服务：实体与关系写入数据库后同步更新内存索引"""
+
+    def __init__(self, session_factory=None, index: Optional[GraphIndex] = None):
+        self.session_factory = session_factory or BackgroundSessionLocal
+        self.index = index or GraphIndex()
+        self.loaded = False
+
+    async def load(self) -> None:
+        """从数据库全量加载内存索引"""
+        start = time.perf_counter()
+        async with self.session_factory() as db:
+            entities = (await db.execute(
+                select(KgEntity.id, KgEntity.entity_type, KgEntity.name, KgEntity.entity_key)
+            )).all()
+            relations = (await db.execute(
+                select(KgRelation.source_id, KgRelation.target_id, KgRelation.relation_type)
+            )).all()
+        self.index.load(entities, relations)
+        self.loaded = True
+        logger.info(
+            f"[知识图谱] 加载 {len(entities)} 个实体、{len(relations)} 条关系，"
+            f"耗时 {(time.perf_counter() - start) * 1000:.0f}ms"
+        )
+
+    async def create_entity(
+        self,
+        db,
+        entity_type: str,
+        name: str,
+        properties: Optional[Dict[str, Any]] = None,
+        case_file_id: Optional[int] = None,
+    ) -> Tuple[KgEntity, bool]:
+        """
+        创建实体（按去重键，已存在时返回已有实体）
+
+        Returns:
+            (实体, 是否新建)
+        """
+        key = normalize_entity_key(entity_type, name)
+        entity = (await db.execute(select(KgEntity).where(KgEntity.entity_key == key))).scalar_one_or_none()
+        created = entity is None
+        if created:
+            entity = KgEntity(
+                entity_type=entity_type, entity_key=key, name=name.strip(),
+                properties=properties, case_file_id=case_file_id,
+            )
+            db.add(entity)
+            try:
+                await db.commit()
+            except IntegrityError:
+                # 并发创建同一实体
+                await db.rollback()
+                entity = (await db.execute(select(KgEntity).where(KgEntity.entity_key == key))).scalar_one()
+                created = False
+        self.index.add_entity(entity.id, entity.entity_type, entity.name, entity.entity_key)
+        return entity, created
+
+    async def create_relation(
+        self,
+        db,
+        source_id: int,
+        target_id: int,
+        relation_type: str,
+        properties: Optional[Dict[str, Any]] = None,
+        case_file_id: Optional[int] = None,
+    ) -> Tuple[Optional[KgRelation], bool]:
+        """
+        创建关系（同一对实体同一类型已存在时返回已有关系）
+
+        Returns:
+            (关系, 是否新建)；端点实体不存在时返回 (None, False)
+        """
+        if self.index.entity(source_id) is None or self.index.entity(target_id) is None:
+            return None, False
+        query = select(KgRelation).where(
+            KgRelation.source_id == source_id,
+            KgRelation.target_id == target_id,
+            KgRelation.relation_type == relation_type,
+        )
+        relation = (await db.execute(query)).scalar_one_or_none()
+        created = relation is None
+        if created:
+            relation = KgRelation(
+                source_id=source_id, target_id=target_id, relation_type=relation_type,
+                properties=properties, case_file_id=case_file_id,
+            )
+            db.add(relation)
+            try:
+                await db.commit()
+            except IntegrityError:
+                await db.rollback()
+                relation = (await db.execute(query)).scalar_one()
+                created = False
+        self.index.add_edge(source_id, target_id, relation_type)
+        return relation, created
+
+    def query(
+        self,
+        entity_type: str,
+        entity_ref: str,
+        hops: int,
+        relation_types: Optional[List[str]] = None,
+        max_nodes: Optional[int] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        查询实体的多跳关联
+
+        Returns:
+            {"entity", "relations": [{targetEntity, relation, relationName, desc, hop}], "nodes", "edges", "truncated"}；
+            实体不存在时返回 None
+        """
+        entity_id = self.index.resolve(entity_type, entity_ref)
+        if entity_id is None:
+            return None
+        start = time.perf_counter()
+        result = self.index.neighborhood(entity_id, hops, relation_types, max_nodes)
+        if result is None:
+            return None
+        names = {node["id"]: node["name"] for node in result["nodes"]}
+        relations = []
+        for node in result["nodes"]:
+            via = node.pop("via", None)
+            if via is None:
+                continue
+            parent_id, relation_type = via
+            relation_name = RELATION_TYPES.get(relation_type, (relation_type,))[0]
+            desc = relation_name if node["hop"] == 1 else f"{node['hop']} 跳：经「{names[parent_id]}」{relation_name}"
+            relations.append({
+                "targetEntity": {"id": str(node["id"]), "name": node["name"], "type": node["type"]},
+                "relation": relation_type,
+                "relationName": relation_name,
+                "desc": desc,
+                "hop": node["hop"],
+            })
+        entity = self.index.entity(entity_id)
+        return {
+            "entity": {**entity, "id": str(entity["id"])},
+            "relations": relations,
+            "nodes": result["nodes"],
+            "edges": result["edges"],
+            "truncated": result["truncated"],
+            "elapsedMs": round((time.perf_counter() - start) * 1000, 2),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {"loaded": self.loaded, **self.index.stats()}
+
+
+# 创建全局实例
+knowledge_graph_service = KnowledgeGraphService()
@@ -0,0 +1,313 @@
+"""
+大模型后端
+QwenService 通过后端接口调用模型，重试、熔断、自适应并发、相同请求合并与模型路由都在后端之上，
+替换后端即可在无外网环境下压测导入与生成链路：
+- dashscope：调用通义千问（默认，见 qwen_service.DashScopeBackend）
+- stub：本地确定性模拟输出，不需要 API Key
+- record：调用通义千问并把每次成功的结果写入录制目录
+- replay：从录制目录回放，相同的提示词与采样参数得到与录制时相同的输出
+stub 与 replay 可配置首 token 延迟和输出速率（LLM_SYNTHETIC_*），模拟真实模型的耗时
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+from loguru import logger
+
+from app.core.config import settings
+from app.core.serialization import dumps, loads
+from app.services.prompt_registry import estimate_tokens
+
+# 流式输出时每片的字符数（约一个 token）
+STREAM_CHUNK_CHARS = 4
+
+
+class LLMBackendError(Exception):
+    """后端调用失败（流式调用中途抛出）"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class LLMBackend(ABC):
+    """
+    大模型后端接口
+
+    call 返回 {"success": True, "content", "usage"}，失败时返回 {"success": False, "error", "code", "retryable"}；
+    stream 逐片产出增量内容，失败时抛出带 status_code 的异常；传入 usage 字典时，
+    能拿到上游用量的后端在流结束时写入 input_tokens / output_tokens（未写入时由调用方估算）
+    """
+
+    name = "base"
+
+    def ready(self) -> bool:
+        """是否可用（如 API Key 已配置）"""
+        return True
+
+    @abstractmethod
+    def call(
+        self, model: str, messages: List[Dict[str, str]], temperature: float, max_tokens: int
+    ) -> Dict[str, Any]:
+        """非流式调用（子类实现）"""
+        pass
+
+    @abstractmethod
+    def stream(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        usage: Optional[Dict[str, Any]] = None,
+    ) -> Iterator[str]:
+        """流式调用，逐片产出增量内容（子类实现）"""
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.name}
+
+
+class SyntheticLatency:
+    """模拟模型耗时：首 token 延迟 + 按输出速率逐 token 耗时"""
+
+    def __init__(self, first_token_ms: Optional[float] = None, tokens_per_second: Optional[float] = None):
+        self.first_token = (
+            settings.LLM_SYNTHETIC_FIRST_TOKEN_MS if first_token_ms is None else first_token_ms
+        ) / 1000
+        self.tokens_per_second = (
+            settings.LLM_SYNTHETIC_TOKENS_PER_SECOND if tokens_per_second is None else tokens_per_second
+        )
+
+    def wait_first_token(self) -> None:
+        if self.first_token > 0:
+            time.sleep(self.first_token)
+
+    def wait_tokens(self, tokens: int) -> None:
+        if self.tokens_per_second > 0 and tokens > 0:
+            time.sleep(tokens / self.tokens_per_second)
+
+    def replay(self, content: str) -> None:
+        """非流式调用：等待整段输出的耗时"""
+        self.wait_first_token()
+        self.wait_tokens(estimate_tokens(content))
+
+    def stream(self, chunks: List[str]) -> Iterator[str]:
+        """流式调用：首片前等待首 token 延迟，之后每片按其 token 数等待"""
+        self.wait_first_token()
+        for chunk in chunks:
+            self.wait_tokens(estimate_tokens(chunk))
+            yield chunk
+
+
+def _usage(messages: List[Dict[str, str]], content: str) -> Dict[str, int]:
+    input_tokens = sum(estimate_tokens(m["content"]) for m in messages)
+    output_tokens = estimate_tokens(content)
+    return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+
+
+def _split_chunks(content: str) -> List[str]:
+    return [content[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(content), STREAM_CHUNK_CHARS)]
+
+
+def cassette_key(messages: List[Dict[str, str]], temperature: float, max_tokens: int) -> str:
+    """
+    录制键：提示词与采样参数的哈希
+
+    不含模型名：路由按实时延迟选择模型，回放时选中的模型可能与录制时不同
+    """
+    raw = json.dumps([messages, temperature, max_tokens], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class StubBackend(LLMBackend):
+    """
+    本地确定性模拟：相同输入得到相同输出
+
+    系统提示词中给出 JSON 输出格式（如案卷字段提取）时按该格式原样返回，保证下游解析链路可用；
+    其他请求返回由提示词哈希生成的占位文本，长度为 LLM_STUB_OUTPUT_TOKENS（不超过 max_tokens）
+    """
+
+    name = "stub"
+
+    def __init__(self, latency: Optional[SyntheticLatency] = None, output_tokens: Optional[int] = None):
+        self.latency = latency or SyntheticLatency()
+        self.output_tokens = output_tokens or settings.LLM_STUB_OUTPUT_TOKENS
+        self._stats = {"calls": 0, "streams": 0}
+
+    @staticmethod
+    def _schema(messages: List[Dict[str, str]]) -> Optional[str]:
+        """系统提示词中的 JSON 输出格式"""
+        system = next((m["content"] for m in messages if m["role"] == "system"), "")
+        if "JSON" not in system:
+            return None
+        match = re.search(r"\{.*\}", system, re.S)
+        if not match:
+            return None
+        try:
+            return json.dumps(json.loads(match.group(0)), ensure_ascii=False)
+        except ValueError:
+            return None
+
+    def render(self, messages: List[Dict[str, str]], max_tokens: int) -> str:
+        schema = self._schema(messages)
+        if schema is not None:
+            return schema
+        digest = cassette_key(messages, 0, max_tokens)[:8]
+        budget = min(self.output_tokens, max_tokens)
+        paragraphs: List[str] = []
+        used = 0
+        while used < budget:
+            paragraph = f"模拟输出（{digest}）第 {len(paragraphs) + 1} 段：本段内容由本地模拟后端生成，仅用于压测与联调。"
+            paragraphs.append(paragraph)
+            used += estimate_tokens(paragraph)
+        return "\n\n".join(paragraphs)
+
+    def call(self, model, messages, temperature, max_tokens):
+        self._stats["calls"] += 1
+        content = self.render(messages, max_tokens)
+        self.latency.replay(content)
+        return {"success": True, "content": content, "usage": _usage(messages, content)}
+
+    def stream(self, model, messages, temperature, max_tokens, usage=None):
+        self._stats["streams"] += 1
+        yield from self.latency.stream(_split_chunks(self.render(messages, max_tokens)))
+
+    def stats(self):
+        return {"backend": self.name, **self._stats}
+
+
+class CassetteStore:
+    """录制目录：每个请求一个 JSON 文件，文件名为录制键"""
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or settings.LLM_CASSETTE_DIR
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def load(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(key), "rb") as f:
+                return loads(f.read())
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            logger.warning(f"录制文件 {key} 损坏: {e}")
+            return None
+
+    def save(self, key: str, record: Dict[str, Any]) -> None:
+        """写临时文件后替换，并发写同一键时不会留下不完整的文件"""
+        os.makedirs(self.directory, exist_ok=True)
+        tmp = f"{self._path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(dumps(record))
+        os.replace(tmp, self._path(key))
+
+
+class RecordingBackend(LLMBackend):
+    """调用上游后端并录制成功的结果（流式调用完整结束后才写入）"""
+
+    name = "record"
+
+    def __init__(self, inner: LLMBackend, store: Optional[CassetteStore] = None):
+        self.inner = inner
+        self.store = store or CassetteStore()
+        self._stats = {"recorded": 0}
+
+    def ready(self) -> bool:
+        return self.inner.ready()
+
+    def _save(self, model, messages, temperature, max_tokens, **record: Any) -> None:
+        try:
+            self.store.save(cassette_key(messages, temperature, max_tokens), {
+                "model": model,
+                "messages": messages,
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+                "recordedAt": datetime.now().isoformat(timespec="seconds"),
+                **record,
+            })
+            self._stats["recorded"] += 1
+        except OSError as e:
+            logger.warning(f"写入录制文件失败: {e}")
+
+    def call(self, model, messages, temperature, max_tokens):
+        result = self.inner.call(model, messages, temperature, max_tokens)
+        if result.get("success"):
+            self._save(model, messages, temperature, max_tokens, content=result["content"], usage=result.get("usage"))
+        return result
+
+    def stream(self, model, messages, temperature, max_tokens, usage=None):
+        chunks: List[str] = []
+        usage = {} if usage is None else usage
+        for chunk in self.inner.stream(model, messages, temperature, max_tokens, usage=usage):
+            chunks.append(chunk)
+            yield chunk
+        self._save(model, messages, temperature, max_tokens, chunks=chunks, usage=usage or None)
+
+    def stats(self):
+        return {"backend": self.name, "directory": self.store.directory, **self._stats}
+
+
+class ReplayBackend(LLMBackend):
+    """
+    从录制目录回放；未录制的请求返回 404（不重试、不计入熔断），
+    或在 LLM_REPLAY_FALLBACK 开启时交给模拟后端
+    """
+
+    name = "replay"
+
+    def __init__(
+        self,
+        store: Optional[CassetteStore] = None,
+        latency: Optional[SyntheticLatency] = None,
+        fallback: Optional[LLMBackend] = None,
+    ):
+        self.store = store or CassetteStore()
+        self.latency = latency or SyntheticLatency()
+        self.fallback = fallback
+        self._stats = {"hits": 0, "misses": 0}
+
+    def _lookup(self, messages, temperature, max_tokens) -> Optional[Dict[str, Any]]:
+        key = cassette_key(messages, temperature, max_tokens)
+        record = self.store.load(key)
+        self._stats["hits" if record is not None else "misses"] += 1
+        if record is None:
+            logger.warning(f"回放未找到录制 {key[:12]}")
+        return record
+
+    def call(self, model, messages, temperature, max_tokens):
+        record = self._lookup(messages, temperature, max_tokens)
+        if record is None:
+            if self.fallback is not None:
+                return self.fallback.call(model, messages, temperature, max_tokens)
+            return {"success": False, "error": "回放记录不存在", "code": 404, "retryable": False}
+        content = record.get("content")
+        if content is None:
+            content = "".join(record.get("chunks") or [])
+        self.latency.replay(content)
+        return {"success": True, "content": content, "usage": record.get("usage") or _usage(messages, content)}
+
+    def stream(self, model, messages, temperature, max_tokens, usage=None):
+        record = self._lookup(messages, temperature, max_tokens)
+        if record is None:
+            if self.fallback is not None:
+                yield from self.fallback.stream(model, messages, temperature, max_tokens, usage=usage)
+                return
+            raise LLMBackendError("回放记录不存在", 404)
+        chunks = record.get("chunks")
+        if chunks is None:
+            chunks = _split_chunks(record.get("content") or "")
+        yield from self.latency.stream(chunks)
+        if usage is not None and record.get("usage"):
+            usage.update(record["usage"])
+
+    def stats(self):
+        return {"backend": self.name, "directory": self.store.directory, **self._stats}
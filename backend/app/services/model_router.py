@@ -0,0 +1,205 @@
+"""
+按调用场景选择千问模型
+各调用点声明路由名（段落生成、审查、字段提取等），按以下规则在 qwen-turbo / qwen-plus / qwen-max 中选择：
+1. 输入 token 与预期输出 token 之和不超过 QWEN_ROUTE_SMALL_TOKENS 的小任务使用路由允许的最快模型；
+   其余任务使用默认模型（QWEN_MODEL），并限制在路由允许的范围内
+2. 输入超出模型上下文窗口时改用上下文更长的模型
+3. 所选模型近期 p95 延迟超过路由的延迟目标（SLO）时降到更快的模型
+延迟按 路由 + 模型 分别统计（长文档生成不影响段落生成的判断），只取最近 LATENCY_MAX_AGE 秒内的样本：
+降级后不再有新样本，旧样本过期后重新尝试原模型，仍超出 SLO 时再次降级。
+各路由、模型的 p50/p95 延迟记录在 /health/llm 中，用于调整路由阈值
+"""
+import json
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+from app.core.config import settings
+
+# 由快到强排列
+MODEL_TIERS = ["qwen-turbo", "qwen-plus", "qwen-max"]
+
+# 各模型上下文窗口（输入 + 输出 token）
+MODEL_CONTEXT_TOKENS = {
+    "qwen-turbo": 1000000,
+    "qwen-plus": 131072,
+    "qwen-max": 32768,
+}
+
+# 默认路由：min/max 为允许的最快/最强模型，output 为预期输出 token，slo 为延迟目标（秒；
+# 非流式调用按整体耗时，流式调用按首个片段到达时间），model 固定使用某个模型
+DEFAULT_ROUTES: Dict[str, Dict[str, Any]] = {
+    "section": {"min": "qwen-turbo", "max": "qwen-plus", "output": 400, "slo": 8},
+    "document": {"min": "qwen-plus", "max": "qwen-max", "output": 2500, "slo": 60},
+    "document_stream": {"min": "qwen-plus", "max": "qwen-max", "output": 2500, "slo": 5},
+    "story_stream": {"min": "qwen-turbo", "max": "qwen-plus", "output": 1200, "slo": 5},
+    "review": {"min": "qwen-turbo", "max": "qwen-plus", "output": 800, "slo": 30},
+    "review_stream": {"min": "qwen-turbo", "max": "qwen-plus", "output": 800, "slo": 5},
+    "extract": {"min": "qwen-plus", "max": "qwen-plus", "output": 1500, "slo": 60},
+}
+
+# 最近多少次调用参与延迟分位数计算
+LATENCY_WINDOW = 200
+# 延迟样本有效期（秒），过期样本不参与分位数计算
+LATENCY_MAX_AGE = 600
+# 样本数不足时不按 SLO 降级
+MIN_SLO_SAMPLES = 20
+
+
+def _percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class LatencyTracker:
+    """按统计键记录最近调用的延迟（线程安全）"""
+
+    def __init__(
+        self,
+        window: int = LATENCY_WINDOW,
+        max_age: float = LATENCY_MAX_AGE,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.window = window
+        self.max_age = max_age
+        self._clock = clock
+        # 键 -> (记录时间, 延迟)
+        self._samples: Dict[str, Deque[Tuple[float, float]]] = {}
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str, seconds: float) -> None:
+        with self._lock:
+            samples = self._samples.get(key)
+            if samples is None:
+                samples = self._samples[key] = deque(maxlen=self.window)
+            samples.append((self._clock(), seconds))
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+    def _recent(self, key: str) -> List[float]:
+        cutoff = self._clock() - self.max_age
+        return [seconds for at, seconds in self._samples.get(key) or () if at >= cutoff]
+
+    def percentile(self, key: str, q: float) -> Optional[float]:
+        """最近调用延迟的分位数；有效期内样本不足 MIN_SLO_SAMPLES 时返回 None"""
+        with self._lock:
+            samples = self._recent(key)
+        if len(samples) < MIN_SLO_SAMPLES:
+            return None
+        return _percentile(samples, q)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            snapshot = {key: self._recent(key) for key in self._samples}
+            counts = dict(self._counts)
+        return {
+            key: {
+                "count": counts[key],
+                "p50": round(_percentile(samples, 0.5), 3),
+                "p95": round(_percentile(samples, 0.95), 3),
+            }
+            for key, samples in snapshot.items()
+            if samples
+        }
+
+
+def latency_key(model: str, stream: bool = False, route: Optional[str] = None) -> str:
+    """延迟统计键：按路由、模型分别统计，流式调用单独统计首个片段到达时间"""
+    key = f"{route}/{model}" if route else model
+    return f"{key}:first_token" if stream else key
+
+
+class ModelRouter:
+    """模型路由"""
+
+    def __init__(self, routes: Optional[Dict[str, Dict[str, Any]]] = None, tracker: Optional[LatencyTracker] = None):
+        self.routes = routes if routes is not None else self._load_routes()
+        self.tracker = tracker or LatencyTracker()
+        self._chosen: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load_routes() -> Dict[str, Dict[str, Any]]:
+        """默认路由叠加 QWEN_ROUTES（JSON，按路由名覆盖部分或全部参数）"""
+        routes = {name: dict(policy) for name, policy in DEFAULT_ROUTES.items()}
+        if settings.QWEN_ROUTES:
+            try:
+                overrides = json.loads(settings.QWEN_ROUTES)
+                for name, policy in overrides.items():
+                    routes[name] = {**routes.get(name, {}), **policy}
+            except (ValueError, AttributeError) as e:
+                logger.warning(f"QWEN_ROUTES 配置无效，使用默认路由: {e}")
+        return routes
+
+    def _candidates(self, policy: Dict[str, Any]) -> List[str]:
+        """路由允许的模型（由快到强）"""
+        low = MODEL_TIERS.index(policy["min"]) if policy.get("min") in MODEL_TIERS else 0
+        high = MODEL_TIERS.index(policy["max"]) if policy.get("max") in MODEL_TIERS else len(MODEL_TIERS) - 1
+        return MODEL_TIERS[low:high + 1] or MODEL_TIERS
+
+    def choose(self, route: Optional[str], input_tokens: int, max_tokens: int, stream: bool = False) -> str:
+        """
+        选择模型
+
+        Args:
+            route: 路由名；未配置的路由或关闭路由时使用 QWEN_MODEL
+            input_tokens: 预估输入 token
+            max_tokens: 输出 token 上限
+            stream: 是否流式调用（SLO 按首个片段到达时间判断）
+
+        Returns:
+            模型名称
+        """
+        policy = self.routes.get(route) if route else None
+        if not settings.QWEN_ROUTING_ENABLED or policy is None:
+            return settings.QWEN_MODEL
+        if policy.get("model"):
+            return self._count(route, policy["model"])
+
+        candidates = self._candidates(policy)
+        expected_output = min(max_tokens, policy.get("output") or max_tokens)
+        if input_tokens + expected_output <= settings.QWEN_ROUTE_SMALL_TOKENS:
+            index = 0
+        elif settings.QWEN_MODEL in candidates:
+            index = candidates.index(settings.QWEN_MODEL)
+        else:
+            # 默认模型不在允许范围内时取最接近的一端
+            default_tier = MODEL_TIERS.index(settings.QWEN_MODEL) if settings.QWEN_MODEL in MODEL_TIERS else 1
+            index = 0 if default_tier < MODEL_TIERS.index(candidates[0]) else len(candidates) - 1
+
+        # 上下文不够时改用上下文更长的模型（由强到快方向查找）
+        while index > 0 and input_tokens + max_tokens > MODEL_CONTEXT_TOKENS.get(candidates[index], 0):
+            index -= 1
+
+        slo = policy.get("slo")
+        if slo:
+            while index > 0:
+                p95 = self.tracker.percentile(latency_key(candidates[index], stream, route), 0.95)
+                if p95 is None or p95 <= slo:
+                    break
+                index -= 1
+        return self._count(route, candidates[index])
+
+    def _count(self, route: str, model: str) -> str:
+        with self._lock:
+            chosen = self._chosen.setdefault(route, {})
+            chosen[model] = chosen.get(model, 0) + 1
+        return model
+
+    def record(self, model: str, seconds: float, stream: bool = False, route: Optional[str] = None) -> None:
+        """记录一次成功调用的延迟（流式调用为首个片段到达时间）"""
+        self.tracker.record(latency_key(model, stream, route), seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        """各路由、模型的 p50/p95 延迟与各路由的模型选择次数"""
+        with self._lock:
+            chosen = {route: dict(models) for route, models in self._chosen.items()}
+        return {"latency": self.tracker.stats(), "routes": chosen}
+
+
+# 创建全局实例
+model_router = ModelRouter()
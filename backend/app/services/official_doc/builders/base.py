@@ -2,24 +2,90 @@
 公文构建器基类
 依据 GB/T 33476.2-2016 第2部分：显现
 """
+import hashlib
 from abc import ABC, abstractmethod
 from typing import Dict, Any, List, Optional
 from docx import Document
 from docx.shared import Cm, Pt, Mm, RGBColor, Inches
 from docx.oxml.ns import qn
 from docx.oxml import OxmlElement
-from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_LINE_SPACING
 from docx.enum.section import WD_SECTION
-
+from docx.text.paragraph import Paragraph
+
+from app.services.official_doc.builders.paragraph_classifier import (
+    LEVEL_1,
+    LEVEL_2,
+    LEVEL_BODY,
+    LEVEL_OTHER,
+    classify_paragraph,
+)
+from app.services.official_doc.builders.skeleton import docx_skeleton_cache
+from app.services.official_doc.builders.styles import (
+    STYLE_BODY,
+    STYLE_BODY_LEFT,
+    STYLE_HEADING_1,
+    STYLE_HEADING_2,
+    STYLE_RECIPIENT,
+    STYLE_SIGNATURE,
+    STYLE_TITLE,
+    STYLE_VERSION_RECORD,
+    register_styles,
+)
 from app.services.official_doc.formats.gb_t_9704_2012 import GB9704_2012
 
 
 class BaseDocumentBuilder(ABC):
     """公文构建器基类"""
 
+    # 骨架是否包含奇偶页页码（不添加页码的公文类型置为 False）
+    SKELETON_PAGE_NUMBERS = True
+
+    # 正文分段标题字符样式：一级黑体、二级楷体、其他沿用段落的仿宋
+    _TITLE_STYLES = {
+        LEVEL_1: STYLE_HEADING_1,
+        LEVEL_2: STYLE_HEADING_2,
+        LEVEL_OTHER: None,
+    }
+
     def __init__(self):
+        # 页面设置与页码页脚按公文类型缓存，每次只复制骨架
+        self.doc = docx_skeleton_cache.get_document(type(self).__name__, self._build_skeleton)
+        self._page_numbers_added = self.SKELETON_PAGE_NUMBERS
+
+    def _build_skeleton(self) -> Document:
+        """构建公文骨架：页面设置 + 命名样式 + 页码页脚"""
         self.doc = Document()
         self._setup_page()
+        register_styles(self.doc)
+        if self.SKELETON_PAGE_NUMBERS:
+            self._write_page_numbers()
+        return self.doc
+
+    def _append_element(self, element) -> Paragraph:
+        """将缓存的段落片段追加到正文末尾（节属性之前）"""
+        body = self.doc.element.body
+        sect_pr = body.sectPr
+        if sect_pr is not None:
+            sect_pr.addprevious(element)
+        else:
+            body.append(element)
+        return Paragraph(element, self.doc._body)
+
+    def _add_cached_paragraph(self, key: str, factory) -> Paragraph:
+        """
+        添加静态段落：首次调用 factory 构建并缓存，之后直接复制缓存片段
+
+        Args:
+            key: 片段缓存键
+            factory: 构建段落的函数，返回 Paragraph
+        """
+        element = docx_skeleton_cache.get_fragment(key)
+        if element is None:
+            p = factory()
+            docx_skeleton_cache.set_fragment(key, p._p)
+            return p
+        return self._append_element(element)
 
     def _setup_page(self):
         """设置页面格式（GB/T 9704-2012 第6章）"""
@@ -115,8 +181,6 @@ class BaseDocumentBuilder(ABC):
         Returns:
             docx Paragraph 对象
         """
-        from docx.enum.text import WD_LINE_SPACING
-
         p = self.doc.add_paragraph()
         p.alignment = alignment
 
@@ -161,6 +225,40 @@ class BaseDocumentBuilder(ABC):
 
         return p
 
+    def _add_styled_paragraph(
+        self,
+        text: str = "",
+        style: str = STYLE_BODY,
+        char_style: str = None,
+        keep_with_next: bool = False,
+    ) -> Paragraph:
+        """
+        添加引用命名样式的段落（字体、缩进、行距由样式提供，不再逐个 run 设置）
+
+        Args:
+            text: 文本内容
+            style: 段落样式 ID
+            char_style: 字符样式 ID（可选）
+            keep_with_next: 是否与下段同页
+
+        Returns:
+            docx Paragraph 对象
+        """
+        p = self.doc.add_paragraph()
+        p._p.get_or_add_pPr().style = style
+        if keep_with_next:
+            p.paragraph_format.keep_with_next = True
+        if text:
+            self._add_styled_run(p, text, char_style)
+        return p
+
+    def _add_styled_run(self, p: Paragraph, text: str, char_style: str = None):
+        """添加文字，可选引用字符样式"""
+        run = p.add_run(text)
+        if char_style:
+            run._r.get_or_add_rPr().style = char_style
+        return run
+
     def _add_red_header(self, org_name: str = "中国人民解放军XX单位"):
         """
         添加红头（发文机关标志）
@@ -173,9 +271,9 @@ class BaseDocumentBuilder(ABC):
         space_before_mm = GB9704_2012.RED_HEADER_TOP_MARGIN.mm - GB9704_2012.MARGIN_TOP.mm
         space_before_twips = GB9704_2012.mm_to_twips(space_before_mm) if space_before_mm > 0 else 0
 
-        # 红头文字（发文机关标志使用方正小标宋简体）
-        p = self._add_paragraph(
-            text=org_name,
+        # 红头文字（发文机关标志使用方正小标宋简体），格式固定，只替换文字
+        p = self._add_cached_paragraph("red_header", lambda: self._add_paragraph(
+            text=org_name or "发文机关",
             font_name=GB9704_2012.FONT_XIAOBIAOSONG,
             font_size=GB9704_2012.FONT_SIZE_RED_HEADER,
             alignment=GB9704_2012.ALIGN_CENTER,
@@ -183,7 +281,8 @@ class BaseDocumentBuilder(ABC):
             color=GB9704_2012.COLOR_RED,
             space_before_twips=space_before_twips,
             keep_with_next=True,
-        )
+        ))
+        p.runs[0].text = org_name or ""
 
     def _add_doc_number(self, doc_number: str):
         """
@@ -206,6 +305,10 @@ class BaseDocumentBuilder(ABC):
         """添加红色分隔线（GB/T 9704-2012）
         7.1 版头：红色分隔线上边缘至发文字号下边缘 4mm
         """
+        self._add_cached_paragraph("red_line", self._build_red_line)
+
+    def _build_red_line(self) -> Paragraph:
+        """构建红色分隔线段落"""
         p = self.doc.add_paragraph()
         p.alignment = WD_ALIGN_PARAGRAPH.CENTER
         p.paragraph_format.space_before = GB9704_2012.mm_to_twips(4)
@@ -225,6 +328,7 @@ class BaseDocumentBuilder(ABC):
         # 添加空内容
         run = p.add_run()
         run.font.size = Pt(1)
+        return p
 
     def _add_title(self, title: str):
         """
@@ -234,17 +338,7 @@ class BaseDocumentBuilder(ABC):
         Args:
             title: 标题文本
         """
-        self._add_paragraph(
-            text=title,
-            font_name=GB9704_2012.FONT_XIAOBIAOSONG,
-            font_size=GB9704_2012.FONT_SIZE_TITLE,
-            alignment=GB9704_2012.ALIGN_CENTER,
-            bold=True,
-            space_before=GB9704_2012.TITLE_SPACING_AFTER_RED_LINE,
-            line_spacing_fixed=GB9704_2012.LINE_SPACING_FIXED,
-            zero_spacing=True,
-            keep_with_next=True,
-        )
+        self._add_styled_paragraph(title, STYLE_TITLE, keep_with_next=True)
 
     def _add_recipient(self, recipient: str):
         """
@@ -256,16 +350,7 @@ class BaseDocumentBuilder(ABC):
         """
         if not recipient.endswith("：") and not recipient.endswith(":"):
             recipient = recipient + "："
-        self._add_paragraph(
-            text=recipient,
-            font_name=GB9704_2012.FONT_KAITI,
-            font_size=GB9704_2012.FONT_SIZE_RECIPIENT,
-            alignment=GB9704_2012.ALIGN_LEFT,
-            space_before=GB9704_2012.RECIPIENT_SPACING_AFTER_TITLE,
-            line_spacing_fixed=GB9704_2012.LINE_SPACING_FIXED,
-            zero_spacing=True,
-            keep_with_next=True,
-        )
+        self._add_styled_paragraph(recipient, STYLE_RECIPIENT, keep_with_next=True)
 
     def _add_main_body(self, content: str):
         """
@@ -275,109 +360,40 @@ class BaseDocumentBuilder(ABC):
         Args:
             content: 正文内容（按换行符分段）
         """
-        import re
-        from docx.enum.text import WD_LINE_SPACING
+        # 相同正文（如批量套打）直接复制已排版的段落
+        cache_key = "main_body:" + hashlib.sha1(content.encode("utf-8")).hexdigest()
+        cached = docx_skeleton_cache.get_fragments(cache_key)
+        if cached is not None:
+            for element in cached:
+                self._append_element(element)
+            return
 
+        elements = []
         paragraphs = content.split("\n")
+        last_index = len(paragraphs) - 1
         for i, para_text in enumerate(paragraphs):
-            if para_text.strip():
-                is_last = (i == len(paragraphs) - 1)
-
-                # 检查是否包含分段标题，匹配到第一个句号、冒号、分号
-                title_end_pos = -1
-                # 匹配模式
-                level1_pattern = r'^[一二三四五六七八九十]+、'  # 一级标题：一、二、
-                level2_patterns = [r'^（[一二三四五六七八九十]+）', r'^\([一二三四五六七八九十]+\)']  # 二级标题：（一）(二)
-                other_patterns = [r'^\d+[.、]', r'^\d+）']  # 其他：1. 2. 1）
-
-                title_level = 0  # 0=普通正文 1=一级标题 2=二级标题 3=其他标题
-                stripped_text = para_text.strip()
-
-                if re.match(level1_pattern, stripped_text):
-                    title_level = 1
-                else:
-                    for pattern in level2_patterns:
-                        if re.match(pattern, stripped_text):
-                            title_level = 2
-                            break
-                    if title_level == 0:
-                        for pattern in other_patterns:
-                            if re.match(pattern, stripped_text):
-                                title_level = 3
-                                break
-
-                if title_level > 0:
-                    # 找到第一个句号、冒号、分号的位置作为标题结束
-                    for idx, char in enumerate(para_text):
-                        if char in ['。', '：', '；', ':', ';']:
-                            title_end_pos = idx + 1
-                            break
-
-                    # 如果没找到标点，把整个段落都作为标题
-                    if title_end_pos == -1:
-                        title_end_pos = len(para_text)
-
-                    # 分离标题和正文
-                    title_part = para_text[:title_end_pos]
-                    body_part = para_text[title_end_pos:]
-
-                    # 检查标题长度，超过20个字就不处理成标题
-                    if len(title_part.strip()) > 20:
-                        # 超过20个字，当作普通正文处理
-                        self._add_paragraph(
-                            text=para_text,
-                            font_name=GB9704_2012.FONT_FANGSONG,
-                            font_size=GB9704_2012.FONT_SIZE_MAIN_BODY,
-                            alignment=GB9704_2012.ALIGN_JUSTIFY,
-                            first_line_indent=GB9704_2012.FIRST_LINE_INDENT,
-                            line_spacing_fixed=GB9704_2012.LINE_SPACING_FIXED,
-                            zero_spacing=True,
-                            keep_with_next=not is_last,
-                        )
-                    else:
-                        # 根据标题级别选择字体
-                        if title_level == 1:
-                            title_font = GB9704_2012.FONT_HEITI  # 一级标题：黑体
-                            title_bold = False  # 不加粗
-                        elif title_level == 2:
-                            title_font = GB9704_2012.FONT_KAITI  # 二级标题：楷体
-                            title_bold = False
-                        else:
-                            title_font = GB9704_2012.FONT_FANGSONG  # 其他：仿宋
-                            title_bold = False
-
-                        # 创建段落，分别添加标题和正文
-                        p = self.doc.add_paragraph()
-                        p.alignment = GB9704_2012.ALIGN_LEFT
-                        p.paragraph_format.first_line_indent = GB9704_2012.FIRST_LINE_INDENT
-                        p.paragraph_format.line_spacing_rule = WD_LINE_SPACING.EXACTLY
-                        p.paragraph_format.line_spacing = GB9704_2012.LINE_SPACING_FIXED
-                        p.paragraph_format.space_before = 0
-                        p.paragraph_format.space_after = 0
-                        if not is_last:
-                            p.paragraph_format.keep_with_next = True
-
-                        # 标题部分使用对应字体
-                        if title_part:
-                            run = p.add_run(title_part)
-                            self._set_font(run, title_font, GB9704_2012.FONT_SIZE_MAIN_BODY, bold=title_bold)
-
-                        # 正文部分使用仿宋
-                        if body_part.strip():
-                            run = p.add_run(body_part)
-                            self._set_font(run, GB9704_2012.FONT_FANGSONG, GB9704_2012.FONT_SIZE_MAIN_BODY)
-                else:
-                    # 普通正文使用仿宋，段前、段后为0，固定行距28.95磅，首行缩进2字符
-                    self._add_paragraph(
-                        text=para_text,
-                        font_name=GB9704_2012.FONT_FANGSONG,
-                        font_size=GB9704_2012.FONT_SIZE_MAIN_BODY,
-                        alignment=GB9704_2012.ALIGN_JUSTIFY,
-                        first_line_indent=GB9704_2012.FIRST_LINE_INDENT,
-                        line_spacing_fixed=GB9704_2012.LINE_SPACING_FIXED,
-                        zero_spacing=True,
-                        keep_with_next=not is_last,
-                    )
+            if not para_text.strip():
+                continue
+            is_last = (i == last_index)
+
+            # 识别分段标题（标题到第一个句号、冒号、分号为止；超过20个字按普通正文处理）
+            title_level, title_part, body_part = classify_paragraph(para_text)
+
+            if title_level == LEVEL_BODY:
+                # 普通正文：仿宋正文样式（两端对齐，首行缩进2字符，固定行距28.95磅，段前段后为0）
+                p = self._add_styled_paragraph(para_text, STYLE_BODY, keep_with_next=not is_last)
+                elements.append(p._p)
+                continue
+
+            # 分段标题段落左对齐，标题部分引用对应字符样式，正文部分沿用段落的仿宋
+            p = self._add_styled_paragraph(style=STYLE_BODY_LEFT, keep_with_next=not is_last)
+            if title_part:
+                self._add_styled_run(p, title_part, self._TITLE_STYLES[title_level])
+            if body_part.strip():
+                self._add_styled_run(p, body_part)
+            elements.append(p._p)
+
+        docx_skeleton_cache.set_fragments(cache_key, elements)
 
     def _add_attachment(self, attachment: str):
         """
@@ -387,22 +403,14 @@ class BaseDocumentBuilder(ABC):
         Args:
             attachment: 附件说明
         """
-        p = self._add_paragraph(
-            font_name=GB9704_2012.FONT_FANGSONG,
-            font_size=GB9704_2012.FONT_SIZE_MAIN_BODY,
-            alignment=GB9704_2012.ALIGN_LEFT,
-            space_before=GB9704_2012.ATTACHMENT_SPACING_AFTER_BODY,
-            line_spacing_fixed=GB9704_2012.LINE_SPACING_FIXED,
-            zero_spacing=True,
-        )
+        p = self._add_styled_paragraph(style=STYLE_BODY_LEFT)
+        p.paragraph_format.first_line_indent = 0
 
         # "附件："
-        run = p.add_run("附件：")
-        self._set_font(run, GB9704_2012.FONT_FANGSONG, GB9704_2012.FONT_SIZE_MAIN_BODY)
+        self._add_styled_run(p, "附件：")
 
         # 附件内容
-        run = p.add_run(attachment)
-        self._set_font(run, GB9704_2012.FONT_FANGSONG, GB9704_2012.FONT_SIZE_MAIN_BODY)
+        self._add_styled_run(p, attachment)
 
     def _add_sender_and_date(self, sender: str, date: str):
         """
@@ -413,38 +421,22 @@ class BaseDocumentBuilder(ABC):
             sender: 发文机关
             date: 成文日期
         """
-        from docx.enum.text import WD_LINE_SPACING
-
-        # 计算右缩进：4个三号字宽
-        right_indent = Mm(5.54 * 4)  # 每个三号字约 5.54mm
-
-        # 发文机关署名
-        p = self.doc.add_paragraph()
-        p.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-        p.paragraph_format.right_indent = right_indent
+        # 发文机关署名（仿宋署名样式：右空四字）
+        p = self._add_styled_paragraph(sender, STYLE_SIGNATURE, keep_with_next=True)
         p.paragraph_format.space_before = GB9704_2012.mm_to_twips(20.78)  # 2行
-        p.paragraph_format.space_after = 0
-        p.paragraph_format.line_spacing_rule = WD_LINE_SPACING.EXACTLY
-        p.paragraph_format.line_spacing = GB9704_2012.LINE_SPACING_FIXED
-        p.paragraph_format.keep_with_next = True
-
-        run = p.add_run(sender)
-        self._set_font(run, GB9704_2012.FONT_FANGSONG, GB9704_2012.FONT_SIZE_MAIN_BODY)
 
         # 成文日期
-        p = self.doc.add_paragraph()
-        p.alignment = WD_ALIGN_PARAGRAPH.RIGHT
-        p.paragraph_format.right_indent = right_indent
-        p.paragraph_format.space_before = 0
-        p.paragraph_format.space_after = 0
-        p.paragraph_format.line_spacing_rule = WD_LINE_SPACING.EXACTLY
-        p.paragraph_format.line_spacing = GB9704_2012.LINE_SPACING_FIXED
-
-        run = p.add_run(date)
-        self._set_font(run, GB9704_2012.FONT_FANGSONG, GB9704_2012.FONT_SIZE_MAIN_BODY)
+        self._add_styled_paragraph(date, STYLE_SIGNATURE)
 
     def _add_version_separator_line(self, is_first: bool = False, is_last: bool = False):
         """添加版记分隔线（细实线，GB/T 9704-2012）"""
+        self._add_cached_paragraph(
+            f"version_separator_{int(is_first)}{int(is_last)}",
+            lambda: self._build_version_separator_line(is_first, is_last),
+        )
+
+    def _build_version_separator_line(self, is_first: bool, is_last: bool) -> Paragraph:
+        """构建版记分隔线段落"""
         p = self.doc.add_paragraph()
         p.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
 
@@ -473,6 +465,7 @@ class BaseDocumentBuilder(ABC):
         # 添加空内容
         run = p.add_run()
         run.font.size = Pt(1)
+        return p
 
     def _add_copy_recipients(self, copies: List[str]):
         """
@@ -482,29 +475,16 @@ class BaseDocumentBuilder(ABC):
         Args:
             copies: 抄送机关列表
         """
-        from docx.enum.text import WD_LINE_SPACING
-
-        p = self.doc.add_paragraph()
-        p.alignment = WD_ALIGN_PARAGRAPH.LEFT
-
-        # 左缩进 1 字
-        left_indent = GB9704_2012.COPY_RECIPIENT_LEFT_INDENT
-        p.paragraph_format.left_indent = left_indent
-
-        # 设置行距和段间距
-        p.paragraph_format.space_before = 0
-        p.paragraph_format.space_after = 0
-        p.paragraph_format.line_spacing_rule = WD_LINE_SPACING.EXACTLY
-        p.paragraph_format.line_spacing = GB9704_2012.LINE_SPACING_FIXED
+        # 仿宋版记样式，左缩进 1 字
+        p = self._add_styled_paragraph(style=STYLE_VERSION_RECORD)
+        p.paragraph_format.left_indent = GB9704_2012.COPY_RECIPIENT_LEFT_INDENT
 
         # "抄送："
-        run = p.add_run("抄送：")
-        self._set_font(run, GB9704_2012.FONT_FANGSONG, GB9704_2012.FONT_SIZE_FOOTER)
+        self._add_styled_run(p, "抄送：")
 
         # 抄送机关列表
         copy_text = "，".join(copies) + "。"
-        run = p.add_run(copy_text)
-        self._set_font(run, GB9704_2012.FONT_FANGSONG, GB9704_2012.FONT_SIZE_FOOTER)
+        self._add_styled_run(p, copy_text)
 
     def _add_issuer_and_date(self, issuer: str, issue_date: str):
         """
@@ -515,9 +495,7 @@ class BaseDocumentBuilder(ABC):
             issuer: 印发机关
             issue_date: 印发日期
         """
-        from docx.enum.text import WD_LINE_SPACING
-
-        p = self.doc.add_paragraph()
+        p = self._add_styled_paragraph(style=STYLE_VERSION_RECORD)
         p.alignment = WD_ALIGN_PARAGRAPH.JUSTIFY
 
         # 使用制表位实现左右对齐
@@ -532,25 +510,15 @@ class BaseDocumentBuilder(ABC):
         tab_stops.add_tab_stop(effective_width, WD_ALIGN_PARAGRAPH.RIGHT)
 
         # 左空一字 - 印发机关
-        left_indent = GB9704_2012.ISSUER_LEFT_INDENT
-        p.paragraph_format.left_indent = left_indent
-
-        # 设置行距和段间距
-        p.paragraph_format.space_before = 0
-        p.paragraph_format.space_after = 0
-        p.paragraph_format.line_spacing_rule = WD_LINE_SPACING.EXACTLY
-        p.paragraph_format.line_spacing = GB9704_2012.LINE_SPACING_FIXED
+        p.paragraph_format.left_indent = GB9704_2012.ISSUER_LEFT_INDENT
 
-        run = p.add_run(issuer)
-        self._set_font(run, GB9704_2012.FONT_FANGSONG, GB9704_2012.FONT_SIZE_FOOTER)
+        self._add_styled_run(p, issuer)
 
         # 制表符
-        run = p.add_run("\t")
-        self._set_font(run, GB9704_2012.FONT_FANGSONG, GB9704_2012.FONT_SIZE_FOOTER)
+        self._add_styled_run(p, "\t")
 
         # 印发日期
-        run = p.add_run(issue_date)
-        self._set_font(run, GB9704_2012.FONT_FANGSONG, GB9704_2012.FONT_SIZE_FOOTER)
+        self._add_styled_run(p, issue_date)
 
     def _add_version_record(self, copies: List[str] = None, issuer: str = None, issue_date: str = None):
         """
@@ -589,7 +557,16 @@ class BaseDocumentBuilder(ABC):
         - 版心下边缘至页码中心：4.58mm
         - 单页码：右对齐、右缩进 1 字
         - 双页码：左对齐、左缩进 1 字
+
+        页码页脚已包含在骨架缓存中时直接跳过
         """
+        if self._page_numbers_added:
+            return
+        self._write_page_numbers()
+        self._page_numbers_added = True
+
+    def _write_page_numbers(self):
+        """写入奇偶页页码页脚"""
         # 为文档添加不同的页眉页脚（奇数页和偶数页）
         section = self.doc.sections[0]
         section.different_odd_and_even_pages_header_footer = True
@@ -10,6 +10,9 @@ from app.services.official_doc.builders.base import BaseDocumentBuilder
 class MeetingMinutesBuilder(BaseDocumentBuilder):
     """会议纪要构建器"""
 
+    # 会议纪要不加页码
+    SKELETON_PAGE_NUMBERS = False
+
     def build(self, content: Dict[str, Any]) -> Document:
         """
         构建会议纪要
@@ -6,7 +6,7 @@ from typing import Dict, Any
 from docx import Document
 
 from app.services.official_doc.builders.base import BaseDocumentBuilder
-from app.services.official_doc.formats.gb_t_9704_2012 import GB9704_2012
+from app.services.official_doc.builders.styles import STYLE_BODY_LEFT, STYLE_HEADING_1
 
 
 class NoticeDocumentBuilder(BaseDocumentBuilder):
@@ -57,29 +57,12 @@ class NoticeDocumentBuilder(BaseDocumentBuilder):
 
         # 执行要求（可选）
         if content.get("requirements"):
-            self._add_paragraph(
-                "具体要求：",
-                font_name=GB9704_2012.FONT_HEITI,
-                font_size=GB9704_2012.FONT_SIZE_MAIN_BODY,
-                alignment=GB9704_2012.ALIGN_LEFT,
-                first_line_indent=GB9704_2012.FIRST_LINE_INDENT,
-                bold=True,
-                line_spacing_fixed=GB9704_2012.LINE_SPACING_FIXED,
-                zero_spacing=True,
-                keep_with_next=True,
-            )
+            p = self._add_styled_paragraph(style=STYLE_BODY_LEFT, keep_with_next=True)
+            self._add_styled_run(p, "具体要求：", STYLE_HEADING_1).bold = True
             self._add_main_body(content["requirements"])
 
         # 特此通知
-        self._add_paragraph(
-            "特此通知。",
-            font_name=GB9704_2012.FONT_FANGSONG,
-            font_size=GB9704_2012.FONT_SIZE_MAIN_BODY,
-            alignment=GB9704_2012.ALIGN_LEFT,
-            first_line_indent=GB9704_2012.FIRST_LINE_INDENT,
-            line_spacing_fixed=GB9704_2012.LINE_SPACING_FIXED,
-            zero_spacing=True,
-        )
+        self._add_styled_paragraph("特此通知。", STYLE_BODY_LEFT)
 
         # 发文机关署名和成文日期
         sender = content.get("sender", "XX单位")
@@ -0,0 +1,55 @@
+"""
+正文段落分级识别
+GB/T 9704-2012 正文层级编号：一、→（一）→1.→（1）
+
+使用一个预编译的组合正则同时完成层级识别与标题切分：
+层级序号之后、第一个句号/冒号/分号（含）之前的部分为分段标题
+"""
+import re
+from typing import Tuple
+
+# 分段标题最大字数，超过按普通正文处理
+MAX_TITLE_CHARS = 20
+
+# 标题级别
+LEVEL_BODY = 0  # 普通正文
+LEVEL_1 = 1  # 一级标题：一、二、
+LEVEL_2 = 2  # 二级标题：（一）(二)
+LEVEL_OTHER = 3  # 其他：1. 2. 1）
+
+_CN_NUM = "[一二三四五六七八九十]+"
+
+_PARAGRAPH_PATTERN = re.compile(
+    rf"(?:(?P<l1>{_CN_NUM}、)"
+    rf"|(?P<l2>（{_CN_NUM}）|\({_CN_NUM}\))"
+    r"|(?P<l3>\d+[.、]|\d+）))"
+    r"[^。：；:;]*[。：；:;]?"
+)
+
+
+def classify_paragraph(text: str) -> Tuple[int, str, str]:
+    """
+    识别段落层级并切分标题
+
+    Args:
+        text: 段落原文
+
+    Returns:
+        (级别, 标题部分, 正文部分)；普通正文返回 (LEVEL_BODY, "", text)
+    """
+    lead = len(text) - len(text.lstrip())
+    m = _PARAGRAPH_PATTERN.match(text, lead)
+    if m is None:
+        return LEVEL_BODY, "", text
+
+    title_part = text[:m.end()]
+    if len(title_part.strip()) > MAX_TITLE_CHARS:
+        return LEVEL_BODY, "", text
+
+    if m.group("l1"):
+        level = LEVEL_1
+    elif m.group("l2"):
+        level = LEVEL_2
+    else:
+        level = LEVEL_OTHER
+    return level, title_part, text[m.end():]
@@ -6,7 +6,7 @@ from typing import Dict, Any
 from docx import Document
 
 from app.services.official_doc.builders.base import BaseDocumentBuilder
-from app.services.official_doc.formats.gb_t_9704_2012 import GB9704_2012
+from app.services.official_doc.builders.styles import STYLE_BODY_LEFT
 
 
 class ReportDocumentBuilder(BaseDocumentBuilder):
@@ -64,15 +64,7 @@ class ReportDocumentBuilder(BaseDocumentBuilder):
             self._add_main_body(main_body)
 
         # 特此报告
-        self._add_paragraph(
-            "特此报告。",
-            font_name=GB9704_2012.FONT_FANGSONG,
-            font_size=GB9704_2012.FONT_SIZE_MAIN_BODY,
-            alignment=GB9704_2012.ALIGN_LEFT,
-            first_line_indent=GB9704_2012.FIRST_LINE_INDENT,
-            line_spacing_fixed=GB9704_2012.LINE_SPACING_FIXED,
-            zero_spacing=True,
-        )
+        self._add_styled_paragraph("特此报告。", STYLE_BODY_LEFT)
 
         # 发文机关署名和成文日期
         sender = content.get("sender", "XX单位")
@@ -6,6 +6,7 @@ from typing import Dict, Any, List
 from docx import Document
 
 from app.services.official_doc.builders.base import BaseDocumentBuilder
+from app.services.official_doc.builders.styles import STYLE_BODY_LEFT
 
 
 class RequestDocumentBuilder(BaseDocumentBuilder):
@@ -55,15 +56,7 @@ class RequestDocumentBuilder(BaseDocumentBuilder):
             self._add_main_body(content["main_body"])
 
         # 妥否，请批示
-        self._add_paragraph(
-            "妥否，请批示。",
-            font_name=GB9704_2012.FONT_FANGSONG,
-            font_size=GB9704_2012.FONT_SIZE_MAIN_BODY,
-            alignment=GB9704_2012.ALIGN_LEFT,
-            first_line_indent=GB9704_2012.FIRST_LINE_INDENT,
-            line_spacing_fixed=GB9704_2012.LINE_SPACING_FIXED,
-            zero_spacing=True,
-        )
+        self._add_styled_paragraph("妥否，请批示。", STYLE_BODY_LEFT)
 
         # 附件说明（可选）
         if content.get("attachment"):
@@ -90,6 +83,3 @@ class RequestDocumentBuilder(BaseDocumentBuilder):
 
         return self.doc
 
-
-# 导入 GB9704_2012 以避免循环导入问题
-from app.services.official_doc.formats.gb_t_9704_2012 import GB9704_2012
@@ -0,0 +1,101 @@
+"""
+公文骨架缓存
+GB/T 9704-2012 中与内容无关的部分（页面设置、奇偶页页码页脚、红色分隔线、版记分隔线等）
+每种公文只构建一次：整篇骨架缓存为 docx 字节，段落片段缓存为 XML 元素，
+每次组装时从缓存复制，只填充可变内容；
+正文段落按内容缓存（LRU），批量套打时相同正文只排版一次
+"""
+import copy
+import io
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from docx import Document
+from docx.document import Document as DocumentObject
+
+from app.core.config import settings
+
+
+class DocxSkeletonCache:
+    """按公文类型缓存文档骨架与静态段落片段（线程安全）"""
+
+    def __init__(self):
+        self.enabled = True
+        self._skeletons: Dict[str, bytes] = {}
+        self._fragments: Dict[str, object] = {}
+        self._bodies: "OrderedDict[str, List[object]]" = OrderedDict()
+        self.body_cache_size = settings.DOCX_BODY_CACHE_SIZE
+        self._lock = threading.Lock()
+
+    def get_document(self, key: str, factory: Callable[[], DocumentObject]) -> DocumentObject:
+        """
+        获取骨架文档副本
+
+        Args:
+            key: 骨架键（公文类型）
+            factory: 首次构建骨架的函数，返回 Document
+
+        Returns:
+            新的 Document 对象，可直接填充内容
+        """
+        if not self.enabled:
+            return factory()
+        data = self._skeletons.get(key)
+        if data is None:
+            with self._lock:
+                data = self._skeletons.get(key)
+                if data is None:
+                    buffer = io.BytesIO()
+                    factory().save(buffer)
+                    data = buffer.getvalue()
+                    self._skeletons[key] = data
+        return Document(io.BytesIO(data))
+
+    def get_fragment(self, key: str):
+        """获取段落片段副本（未缓存时返回 None）"""
+        if not self.enabled:
+            return None
+        element = self._fragments.get(key)
+        return copy.deepcopy(element) if element is not None else None
+
+    def set_fragment(self, key: str, element) -> None:
+        """缓存段落片段（保存副本，后续修改原元素不影响缓存）"""
+        if self.enabled:
+            self._fragments[key] = copy.deepcopy(element)
+
+    def get_fragments(self, key: str) -> Optional[List[object]]:
+        """获取多段落片段副本（正文缓存，未缓存时返回 None）"""
+        if not self.enabled or self.body_cache_size <= 0:
+            return None
+        with self._lock:
+            elements = self._bodies.get(key)
+            if elements is None:
+                return None
+            self._bodies.move_to_end(key)
+        return [copy.deepcopy(element) for element in elements]
+
+    def set_fragments(self, key: str, elements: List[object]) -> None:
+        """缓存多段落片段，超过容量时淘汰最久未使用的正文"""
+        if not self.enabled or self.body_cache_size <= 0:
+            return
+        copies = [copy.deepcopy(element) for element in elements]
+        with self._lock:
+            self._bodies[key] = copies
+            self._bodies.move_to_end(key)
+            while len(self._bodies) > self.body_cache_size:
+                self._bodies.popitem(last=False)
+
+    def clear(self, key: Optional[str] = None) -> None:
+        """清空缓存（格式常量调整后调用）"""
+        with self._lock:
+            if key is None:
+                self._skeletons.clear()
+                self._fragments.clear()
+                self._bodies.clear()
+            else:
+                self._skeletons.pop(key, None)
+
+
+# 创建全局实例
+docx_skeleton_cache = DocxSkeletonCache()
@@ -1,11 +1,11 @@
 """
 分段内容生成器
 """
-from typing import Dict, Any, AsyncGenerator, List
-import json
+from typing import Dict, Any, AsyncGenerator, List, Optional, Set
 import asyncio
 from loguru import logger
 
+from app.core.serialization import sse_frame
 from app.services.official_doc.structure_config import (
     get_doc_structure,
     get_doc_structure_dict,
@@ -107,12 +107,14 @@ class ContentGenerator:
             context={"previous_sections": previous_sections},
         )
 
-        # 调用 AI 生成
-        result = self.qwen.generate_text(
+        # 调用 AI 生成（同步接口，放到线程中执行，避免阻塞事件循环）
+        result = await asyncio.to_thread(
+            self.qwen.generate_text,
             prompt=prompt,
             system_prompt="你是一位专业的军队保卫部门文书写作助手。",
             temperature=0.7,
             max_tokens=1000,
+            route="section",
         )
 
         if result.get("success"):
@@ -121,6 +123,36 @@ class ContentGenerator:
             logger.warning(f"生成段落 {section.section_id} 失败: {result.get('error')}")
             return ""
 
+    async def generate_all(
+        self, doc_type: str, form_data: Dict[str, Any], skip_sections: Optional[Set[str]] = None
+    ) -> Dict[str, str]:
+        """
+        一次性生成所有段落（非流式，供批量套打复用）
+
+        Args:
+            doc_type: 公文类型
+            form_data: 表单数据（表单中已有的段落直接使用，不再调用 AI）
+            skip_sections: 不需要生成的段落（如每份公文各自指定的主送机关）
+
+        Returns:
+            {section_id: content}
+        """
+        sections = get_doc_structure(doc_type)
+        if not sections:
+            raise ValueError(f"不支持的公文类型: {doc_type}")
+
+        previous_sections: Dict[str, str] = {}
+        for section in sections:
+            if skip_sections and section.section_id in skip_sections:
+                continue
+            previous_sections[section.section_id] = await self.generate_section(
+                doc_type=doc_type,
+                section=section,
+                form_data=form_data,
+                previous_sections=previous_sections,
+            )
+        return previous_sections
+
     async def stream_generate_all(
         self, doc_type: str, form_data: Dict[str, Any]
     ) -> AsyncGenerator[str, None]:
@@ -137,7 +169,7 @@ class ContentGenerator:
         sections = get_doc_structure(doc_type)
         if not sections:
             data = {"error": "不支持的公文类型"}
-            yield "data: " + json.dumps(data, ensure_ascii=False) + "\n\n"
+            yield sse_frame(data)
             return
 
         previous_sections = {}
@@ -152,7 +184,7 @@ class ContentGenerator:
                 "index": idx + 1,
                 "total": total
             }
-            yield "data: " + json.dumps(data, ensure_ascii=False) + "\n\n"
+            yield sse_frame(data)
 
             try:
                 # 生成段落内容（模拟流式，实际是一次性生成后分段发送）
@@ -177,7 +209,7 @@ class ContentGenerator:
                             "section_id": section.section_id,
                             "content": chunk
                         }
-                        yield "data: " + json.dumps(data, ensure_ascii=False) + "\n\n"
+                        yield sse_frame(data)
                         await asyncio.sleep(0.03)
 
                 # 发送段落完成事件
@@ -186,7 +218,7 @@ class ContentGenerator:
                     "section_id": section.section_id,
                     "content": content
                 }
-                yield "data: " + json.dumps(data, ensure_ascii=False) + "\n\n"
+                yield sse_frame(data)
 
             except Exception as e:
                 logger.error(f"生成段落 {section.section_id} 时发生异常: {str(e)}")
@@ -195,14 +227,14 @@ class ContentGenerator:
                     "section_id": section.section_id,
                     "error": str(e)
                 }
-                yield "data: " + json.dumps(data, ensure_ascii=False) + "\n\n"
+                yield sse_frame(data)
 
         # 发送全部完成事件
         data = {
             "type": "all_complete",
             "sections": previous_sections
         }
-        yield "data: " + json.dumps(data, ensure_ascii=False) + "\n\n"
+        yield sse_frame(data)
 
 
 # 创建全局实例
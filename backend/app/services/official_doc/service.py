@@ -1,13 +1,22 @@
 """
 国标公文生成对外服务聚合
 """
-from typing import Dict, Any, AsyncGenerator
+from typing import Dict, Any, AsyncGenerator, List, Optional
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from docx import Document
+import asyncio
 import io
+import re
+import time
 import uuid
+import zipfile
 from datetime import datetime
+from fastapi import status
 from loguru import logger
 
+from app.core.config import settings
+from app.core.errors import AppException, ErrorCode
+from app.core.serialization import dumps
 from app.services.official_doc.content_generator import content_generator
 from app.services.official_doc.structure_config import DocType, get_doc_structure_dict
 from app.services.official_doc.builders.request_builder import RequestDocumentBuilder
@@ -17,20 +26,121 @@ from app.services.official_doc.builders.memo_builder import MemoDocumentBuilder
 from app.services.official_doc.builders.meeting_builder import MeetingMinutesBuilder
 
 
+# Builder 映射
+BUILDERS = {
+    DocType.REQUEST: RequestDocumentBuilder,
+    DocType.REPORT: ReportDocumentBuilder,
+    DocType.NOTICE: NoticeDocumentBuilder,
+    DocType.MEMO: MemoDocumentBuilder,
+    DocType.MEETING_MINUTES: MeetingMinutesBuilder,
+}
+
+
+def render_docx(doc_type: str, content: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    构建并序列化 docx（CPU 密集，可在线程池或进程池中执行）
+
+    Args:
+        doc_type: 公文类型
+        content: 内容字典
+
+    Returns:
+        docx_data 及构建、序列化耗时（毫秒）
+    """
+    BuilderClass = BUILDERS.get(doc_type)
+    if not BuilderClass:
+        raise ValueError(f"不支持的公文类型: {doc_type}")
+
+    start = time.perf_counter()
+    doc = BuilderClass().build(content)
+    built = time.perf_counter()
+
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    saved = time.perf_counter()
+
+    return {
+        "docx_data": buffer.getvalue(),
+        "build_ms": round((built - start) * 1000, 2),
+        "save_ms": round((saved - built) * 1000, 2),
+    }
+
+
+# 套打字段占位符：{{字段名}}
+_MERGE_FIELD_PATTERN = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+# 文件名中不允许出现的字符
+_FILENAME_UNSAFE_PATTERN = re.compile(r'[\\/:*?"<>|\s]+')
+
+
+def merge_content(base: Dict[str, Any], override: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    合并公共内容与单份覆盖字段，并替换文本中的 {{字段名}} 占位符
+
+    Args:
+        base: 公共内容（所有份数共用）
+        override: 单份公文的字段覆盖
+
+    Returns:
+        单份公文的完整内容
+    """
+    merged = {**base, **override}
+
+    def _replace(match: "re.Match") -> str:
+        value = merged.get(match.group(1))
+        return match.group(0) if value is None else str(value)
+
+    return {
+        key: _MERGE_FIELD_PATTERN.sub(_replace, value) if isinstance(value, str) and "{{" in value else value
+        for key, value in merged.items()
+    }
+
+
+class _ZipStreamBuffer:
+    """只追加写入的 ZIP 输出缓冲：zipfile 按不可 seek 流写入，每写完一个文件取走已生成的字节"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
 class OfficialDocService:
     """国标公文生成服务"""
 
-    def __init__(self):
-        # Builder 映射
-        self._builders = {
-            DocType.REQUEST: RequestDocumentBuilder,
-            DocType.REPORT: ReportDocumentBuilder,
-            DocType.NOTICE: NoticeDocumentBuilder,
-            DocType.MEMO: MemoDocumentBuilder,
-            DocType.MEETING_MINUTES: MeetingMinutesBuilder,
-        }
-        # 存储生成的任务（临时，生产环境应使用数据库）
+    def __init__(self, task_ttl: Optional[float] = None, max_task_bytes: Optional[int] = None):
+        self._builders = BUILDERS
+        # 存储生成的任务（临时，生产环境应使用数据库）；按创建顺序排列，超过保留时间或总大小上限时移除最早的
+        self.task_ttl = settings.DOCX_TASK_TTL if task_ttl is None else task_ttl
+        self.max_task_bytes = settings.DOCX_TASK_MAX_BYTES if max_task_bytes is None else max_task_bytes
         self._tasks: Dict[str, Dict[str, Any]] = {}
+        self._task_bytes = 0
+        # 组装执行器（首次使用时创建）与排队名额
+        self._executor: Optional[Executor] = None
+        self._slots = asyncio.Semaphore(settings.DOCX_MAX_PENDING)
+        self._metrics = {
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "pending": 0,
+            "buildMsTotal": 0.0,
+            "saveMsTotal": 0.0,
+            "queueMsTotal": 0.0,
+        }
 
     def get_structure(self, doc_type: str) -> Dict[str, Any]:
         """
@@ -63,9 +173,40 @@ class OfficialDocService:
         async for chunk in content_generator.stream_generate_all(doc_type, form_data):
             yield chunk
 
+    def _cleanup(self) -> None:
+        """移除超过保留时间的组装结果；总大小超过上限时从最早的开始移除（至少保留最新一份）"""
+        now = datetime.now()
+        expired = [
+            task_id for task_id, task in self._tasks.items()
+            if (now - task["created_at"]).total_seconds() > self.task_ttl
+        ]
+        for task_id in expired:
+            self._task_bytes -= len(self._tasks.pop(task_id)["docx_data"])
+        while self._task_bytes > self.max_task_bytes and len(self._tasks) > 1:
+            self._task_bytes -= len(self._tasks.pop(next(iter(self._tasks)))["docx_data"])
+
+    def _store_task(self, doc_type: str, content: Dict[str, Any], docx_data: bytes) -> Dict[str, Any]:
+        """存储组装结果，返回任务信息"""
+        task_id = f"DOC-{datetime.now().strftime('%Y%m%d')}-{uuid.uuid4().hex[:8].upper()}"
+        self._tasks[task_id] = {
+            "task_id": task_id,
+            "doc_type": doc_type,
+            "status": "completed",
+            "content": content,
+            "docx_data": docx_data,
+            "created_at": datetime.now(),
+        }
+        self._task_bytes += len(docx_data)
+        self._cleanup()
+        return {
+            "task_id": task_id,
+            "status": "completed",
+            "docx_url": f"/api/v1/doc-generate/download/{task_id}.docx",
+        }
+
     def assemble_docx(self, doc_type: str, content: Dict[str, Any]) -> Dict[str, Any]:
         """
-        组装 docx
+        组装 docx（同步，在调用线程中执行）
 
         Args:
             doc_type: 公文类型
@@ -74,45 +215,283 @@ class OfficialDocService:
         Returns:
             任务信息
         """
-        task_id = f"DOC-{datetime.now().strftime('%Y%m%d')}-{uuid.uuid4().hex[:8].upper()}"
-
         try:
-            # 获取 builder
-            BuilderClass = self._builders.get(doc_type)
-            if not BuilderClass:
-                raise ValueError(f"不支持的公文类型: {doc_type}")
-
-            # 构建文档
-            builder = BuilderClass()
-            doc = builder.build(content)
-
-            # 保存到内存
-            buffer = io.BytesIO()
-            doc.save(buffer)
-            buffer.seek(0)
-
-            # 存储任务
-            self._tasks[task_id] = {
-                "task_id": task_id,
-                "doc_type": doc_type,
-                "status": "completed",
-                "content": content,
-                "docx_data": buffer.getvalue(),
-                "created_at": datetime.now(),
-            }
-
-            logger.info(f"成功组装 docx: {task_id}")
-
-            return {
-                "task_id": task_id,
-                "status": "completed",
-                "docx_url": f"/api/v1/doc-generate/download/{task_id}.docx",
-            }
+            rendered = render_docx(doc_type, content)
+            result = self._store_task(doc_type, content, rendered["docx_data"])
+            logger.info(f"成功组装 docx: {result['task_id']}")
+            return result
 
         except Exception as e:
             logger.error(f"组装 docx 失败: {str(e)}")
             raise
 
+    def _get_executor(self) -> Executor:
+        """获取组装执行器（线程池或进程池）"""
+        if self._executor is None:
+            if settings.DOCX_EXECUTOR == "process":
+                self._executor = ProcessPoolExecutor(max_workers=settings.DOCX_WORKERS)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=settings.DOCX_WORKERS, thread_name_prefix="docx"
+                )
+        return self._executor
+
+    async def _render_queued(
+        self, doc_type: str, content: Dict[str, Any], wait_timeout: Optional[float]
+    ) -> Dict[str, Any]:
+        """
+        占用排队名额后在执行器中组装
+
+        Args:
+            wait_timeout: 等待名额的最长时间；None 表示一直等待
+        """
+        if doc_type not in self._builders:
+            raise ValueError(f"不支持的公文类型: {doc_type}")
+
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=wait_timeout)
+        except asyncio.TimeoutError:
+            self._metrics["rejected"] += 1
+            raise AppException(
+                message="公文组装任务繁忙，请稍后重试",
+                error_code=ErrorCode.RATE_LIMIT_EXCEEDED,
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            )
+
+        self._metrics["pending"] += 1
+        try:
+            loop = asyncio.get_running_loop()
+            rendered = await loop.run_in_executor(self._get_executor(), render_docx, doc_type, content)
+        except Exception:
+            self._metrics["failed"] += 1
+            raise
+        finally:
+            self._metrics["pending"] -= 1
+            self._slots.release()
+
+        total_ms = round((time.perf_counter() - start) * 1000, 2)
+        rendered["total_ms"] = total_ms
+        rendered["queue_ms"] = round(max(0.0, total_ms - rendered["build_ms"] - rendered["save_ms"]), 2)
+        self._metrics["completed"] += 1
+        self._metrics["buildMsTotal"] += rendered["build_ms"]
+        self._metrics["saveMsTotal"] += rendered["save_ms"]
+        self._metrics["queueMsTotal"] += rendered["queue_ms"]
+        return rendered
+
+    @staticmethod
+    def _timing(rendered: Dict[str, Any]) -> Dict[str, float]:
+        return {
+            "queueMs": rendered["queue_ms"],
+            "buildMs": rendered["build_ms"],
+            "saveMs": rendered["save_ms"],
+            "totalMs": rendered["total_ms"],
+        }
+
+    async def assemble_docx_async(self, doc_type: str, content: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        组装 docx（异步，在工作线程/进程中执行，不阻塞事件循环）
+
+        队列已满时最多等待 DOCX_QUEUE_TIMEOUT 秒，仍无空位则拒绝
+
+        Args:
+            doc_type: 公文类型
+            content: 内容字典
+
+        Returns:
+            任务信息及耗时指标
+        """
+        rendered = await self._render_queued(doc_type, content, settings.DOCX_QUEUE_TIMEOUT)
+        result = self._store_task(doc_type, content, rendered["docx_data"])
+        result["metrics"] = self._timing(rendered)
+        logger.info(f"成功组装 docx: {result['task_id']}, 耗时 {rendered['total_ms']}ms")
+        return result
+
+    async def assemble_batch(self, items: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        批量组装 docx
+
+        同一批次最多同时占用 DOCX_WORKERS 个名额，其余文档依次等待，
+        避免大批量任务挤占单篇组装请求
+
+        Args:
+            items: [{"doc_type": ..., "content": {...}}, ...]
+
+        Returns:
+            每篇的任务信息（失败项含 error）及批次耗时汇总
+        """
+        start = time.perf_counter()
+        batch_slots = asyncio.Semaphore(settings.DOCX_WORKERS)
+
+        async def _one(index: int, item: Dict[str, Any]) -> Dict[str, Any]:
+            async with batch_slots:
+                try:
+                    rendered = await self._render_queued(item["doc_type"], item["content"], None)
+                except Exception as e:
+                    logger.warning(f"批量组装第 {index + 1} 篇失败: {str(e)}")
+                    return {"index": index, "status": "failed", "error": str(e)}
+            result = self._store_task(item["doc_type"], item["content"], rendered["docx_data"])
+            result["index"] = index
+            result["metrics"] = self._timing(rendered)
+            return result
+
+        results = await asyncio.gather(*[_one(i, item) for i, item in enumerate(items)])
+        succeeded = [r for r in results if r["status"] == "completed"]
+        total_ms = (time.perf_counter() - start) * 1000
+
+        def _avg(key: str) -> float:
+            return round(sum(r["metrics"][key] for r in succeeded) / len(succeeded), 2) if succeeded else 0.0
+
+        logger.info(f"批量组装 docx 完成: {len(succeeded)}/{len(items)} 篇, 耗时 {total_ms:.0f}ms")
+        return {
+            "items": results,
+            "metrics": {
+                "total": len(items),
+                "succeeded": len(succeeded),
+                "failed": len(items) - len(succeeded),
+                "totalMs": round(total_ms, 2),
+                "docsPerSecond": round(len(succeeded) / (total_ms / 1000), 2) if total_ms else 0.0,
+                "avgQueueMs": _avg("queueMs"),
+                "avgBuildMs": _avg("buildMs"),
+                "avgSaveMs": _avg("saveMs"),
+            },
+        }
+
+    async def prepare_merge_content(
+        self,
+        doc_type: str,
+        sections: Dict[str, Any],
+        form_data: Dict[str, Any],
+        overrides: List[Dict[str, Any]],
+        generate: bool = True,
+    ) -> Dict[str, Any]:
+        """
+        准备批量套打的公共内容：缺少的段落只调用一次 AI 生成，所有份数共用
+
+        Args:
+            doc_type: 公文类型
+            sections: 已有的分段内容
+            form_data: 表单数据
+            overrides: 每份公文的字段覆盖
+            generate: 是否生成缺少的段落
+
+        Returns:
+            公共内容字典
+        """
+        if doc_type not in self._builders:
+            raise ValueError(f"不支持的公文类型: {doc_type}")
+
+        content = {**form_data, **sections}
+        if generate:
+            # 每份都会覆盖的字段（如主送机关）不需要生成
+            per_item = set.intersection(*(set(o) for o in overrides)) if overrides else set()
+            generated = await content_generator.generate_all(doc_type, content, skip_sections=per_item)
+            content.update({key: value for key, value in generated.items() if value})
+        return content
+
+    async def stream_merge_zip(
+        self,
+        doc_type: str,
+        content: Dict[str, Any],
+        overrides: List[Dict[str, Any]],
+        filename_field: str = "recipient",
+    ) -> AsyncGenerator[bytes, None]:
+        """
+        批量套打：同一份公共内容按覆盖字段组装 N 篇 docx，以 ZIP 流式返回
+
+        骨架与正文排版按内容缓存，每篇只需排版变化的部分；
+        先完成的先写入 ZIP，最后写入 manifest.json（每篇状态与耗时）
+
+        Args:
+            doc_type: 公文类型
+            content: 公共内容（prepare_merge_content 的结果）
+            overrides: 每份公文的字段覆盖
+            filename_field: 用于命名 docx 文件的字段
+
+        Yields:
+            ZIP 字节块
+        """
+        start = time.perf_counter()
+        batch_slots = asyncio.Semaphore(settings.DOCX_WORKERS)
+
+        async def _one(index: int, override: Dict[str, Any]):
+            item_content = merge_content(content, override)
+            async with batch_slots:
+                try:
+                    rendered = await self._render_queued(doc_type, item_content, None)
+                except Exception as e:
+                    logger.warning(f"批量套打第 {index + 1} 份失败: {str(e)}")
+                    return index, override, None, str(e)
+            return index, override, rendered, None
+
+        buffer = _ZipStreamBuffer()
+        archive = zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_STORED)
+        tasks = [asyncio.create_task(_one(i, override)) for i, override in enumerate(overrides)]
+        manifest: List[Optional[Dict[str, Any]]] = [None] * len(overrides)
+        try:
+            for future in asyncio.as_completed(tasks):
+                index, override, rendered, error = await future
+                label = _FILENAME_UNSAFE_PATTERN.sub("_", str(override.get(filename_field) or doc_type))[:40]
+                filename = f"{index + 1:03d}_{label}.docx"
+                if error is not None:
+                    manifest[index] = {"index": index, "file": None, "status": "failed", "error": error}
+                    continue
+                # docx 本身已压缩，ZIP 中直接存储
+                archive.writestr(filename, rendered["docx_data"])
+                manifest[index] = {
+                    "index": index,
+                    "file": filename,
+                    "status": "completed",
+                    "metrics": self._timing(rendered),
+                }
+                yield buffer.drain()
+
+            succeeded = sum(1 for item in manifest if item["status"] == "completed")
+            total_ms = (time.perf_counter() - start) * 1000
+            archive.writestr("manifest.json", dumps({
+                "docType": doc_type,
+                "items": manifest,
+                "metrics": {
+                    "total": len(overrides),
+                    "succeeded": succeeded,
+                    "failed": len(overrides) - succeeded,
+                    "totalMs": round(total_ms, 2),
+                    "docsPerSecond": round(succeeded / (total_ms / 1000), 2) if total_ms else 0.0,
+                },
+            }))
+            archive.close()
+            yield buffer.drain()
+            logger.info(f"批量套打完成: {succeeded}/{len(overrides)} 份, 耗时 {total_ms:.0f}ms")
+        finally:
+            # 客户端断开时取消尚未完成的组装
+            for task in tasks:
+                task.cancel()
+
+    def get_assembly_stats(self) -> Dict[str, Any]:
+        """组装执行器统计"""
+        m = self._metrics
+        completed = m["completed"] or 1
+        return {
+            "executor": settings.DOCX_EXECUTOR,
+            "workers": settings.DOCX_WORKERS,
+            "maxPending": settings.DOCX_MAX_PENDING,
+            "pending": m["pending"],
+            "completed": m["completed"],
+            "failed": m["failed"],
+            "rejected": m["rejected"],
+            "avgQueueMs": round(m["queueMsTotal"] / completed, 2),
+            "avgBuildMs": round(m["buildMsTotal"] / completed, 2),
+            "avgSaveMs": round(m["saveMsTotal"] / completed, 2),
+            "storedTasks": len(self._tasks),
+            "storedBytes": self._task_bytes,
+        }
+
+    def shutdown(self) -> None:
+        """关闭组装执行器"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
     def get_docx(self, task_id: str) -> bytes:
         """
         获取生成的 docx
@@ -123,6 +502,7 @@ class OfficialDocService:
         Returns:
             docx 二进制数据
         """
+        self._cleanup()
         task = self._tasks.get(task_id)
         if not task:
             raise ValueError(f"任务不存在: {task_id}")
@@ -139,6 +519,7 @@ class OfficialDocService:
         Returns:
             任务信息
         """
+        self._cleanup()
         task = self._tasks.get(task_id)
         if not task:
             raise ValueError(f"任务不存在: {task_id}")
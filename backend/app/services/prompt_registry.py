@@ -0,0 +1,355 @@
+"""
+提示词注册表
+长提示词按 名称+版本 注册为预编译模板，渲染结果按参数缓存；
+静态说明放在提示词开头并保持逐字节不变，便于模型服务端复用前缀缓存（DashScope 隐式上下文缓存）；
+提供 token 数估算及按 token 预算截断/压缩超长输入
+"""
+import re
+import threading
+from string import Template
+from typing import Any, Dict, List, Optional, Tuple
+
+# 中日韩字符（含全角标点）：约 1 字 1 token
+_CJK_PATTERN = re.compile(r"[　-〿㐀-䶿一-鿿豈-﫿＀-￯]")
+# 其他字符：约 4 个字符 1 token
+_ASCII_CHARS_PER_TOKEN = 4
+# 参数总长度不超过该值时缓存渲染结果（正文等长参数每次都不同，不缓存）
+_CACHEABLE_PARAM_CHARS = 512
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """
+    估算文本 token 数（不调用分词服务）
+
+    通义千问分词中汉字约 1 字 1 token，英文、数字约 4 字符 1 token
+
+    Args:
+        text: 文本
+
+    Returns:
+        估算的 token 数
+    """
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    other = len(text) - cjk
+    return cjk + (other + _ASCII_CHARS_PER_TOKEN - 1) // _ASCII_CHARS_PER_TOKEN
+
+
+def _prefix_within(text: str, max_tokens: int) -> str:
+    """按 token 预算截取文本开头部分"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    # 先按每字符至少 1/4 token 粗略定位，再逐步收缩到预算内
+    end = min(len(text), max_tokens * _ASCII_CHARS_PER_TOKEN)
+    while end > 0 and estimate_tokens(text[:end]) > max_tokens:
+        over = estimate_tokens(text[:end]) - max_tokens
+        end -= max(1, over)
+    return text[:end]
+
+
+def truncate_to_budget(text: Optional[str], max_tokens: int, keep_tail: bool = False) -> str:
+    """
+    将文本截断到 token 预算内
+
+    Args:
+        text: 原文
+        max_tokens: token 预算
+        keep_tail: 是否保留结尾（会议转写等首尾信息都重要的文本保留头尾，省略中间）
+
+    Returns:
+        截断后的文本；未超出预算时原样返回
+    """
+    if not text or max_tokens <= 0 or estimate_tokens(text) <= max_tokens:
+        return text or ""
+    if not keep_tail:
+        return _prefix_within(text, max_tokens)
+
+    marker_budget = 20
+    half = max(1, (max_tokens - marker_budget) // 2)
+    head = _prefix_within(text, half)
+    tail = _prefix_within(text[::-1], half)[::-1]
+    omitted = len(text) - len(head) - len(tail)
+    return f"{head}\n……（中间省略约 {omitted} 字）……\n{tail}"
+
+
+def compact_related_cases(cases: List[Dict[str, Any]], max_tokens: int) -> List[str]:
+    """
+    将关联案件压缩为单行摘要并控制在 token 预算内
+
+    Args:
+        cases: 关联案件列表（caseNo、caseName/title）
+        max_tokens: token 预算
+
+    Returns:
+        摘要行列表；超出预算的部分合并为一行“等共 N 件”
+    """
+    lines: List[str] = []
+    used = 0
+    for index, case in enumerate(cases):
+        line = f"- {case.get('caseNo', '')}：{case.get('caseName', '') or case.get('title', '')}\n"
+        cost = estimate_tokens(line)
+        if lines and used + cost > max_tokens:
+            lines.append(f"- ……等共 {len(cases)} 件（其余 {len(cases) - index} 件略）\n")
+            break
+        lines.append(line)
+        used += cost
+    return lines
+
+
+class PromptTemplate:
+    """预编译提示词模板（$变量 占位，内容中的 JSON 花括号无需转义）"""
+
+    def __init__(self, name: str, version: str, text: str):
+        self.name = name
+        self.version = version
+        self.text = text
+        self._template = Template(text)
+        self.is_static = not self._template.get_identifiers()
+        self.static_tokens = estimate_tokens(self._template.safe_substitute({}))
+
+    def render(self, **params: Any) -> str:
+        if self.is_static:
+            return self.text
+        return self._template.substitute(params)
+
+
+class PromptRegistry:
+    """按 名称+版本 管理提示词模板，渲染结果按参数缓存"""
+
+    def __init__(self, cache_size: int = 256):
+        self._templates: Dict[str, Dict[str, PromptTemplate]] = {}
+        self._latest: Dict[str, str] = {}
+        self._rendered: Dict[Tuple, str] = {}
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+        self._stats = {"renders": 0, "cacheHits": 0}
+
+    def register(self, name: str, version: str, text: str) -> PromptTemplate:
+        """注册提示词模板；后注册的版本作为默认版本"""
+        template = PromptTemplate(name, version, text)
+        self._templates.setdefault(name, {})[version] = template
+        self._latest[name] = version
+        return template
+
+    def get(self, name: str, version: Optional[str] = None) -> PromptTemplate:
+        versions = self._templates.get(name)
+        if not versions:
+            raise KeyError(f"提示词未注册: {name}")
+        version = version or self._latest[name]
+        if version not in versions:
+            raise KeyError(f"提示词版本不存在: {name}@{version}")
+        return versions[version]
+
+    def render(self, name: str, version: Optional[str] = None, **params: Any) -> str:
+        """
+        渲染提示词（相同参数直接返回缓存结果）
+
+        Args:
+            name: 提示词名称
+            version: 版本（默认最新）
+            params: 模板参数
+        """
+        template = self.get(name, version)
+        if template.is_static:
+            self._stats["cacheHits"] += 1
+            return template.text
+        if sum(len(str(value)) for value in params.values()) > _CACHEABLE_PARAM_CHARS:
+            self._stats["renders"] += 1
+            return template.render(**params)
+        key = (name, template.version, tuple(sorted(params.items())))
+        with self._lock:
+            self._stats["renders"] += 1
+            cached = self._rendered.get(key)
+            if cached is not None:
+                self._stats["cacheHits"] += 1
+                return cached
+        rendered = template.render(**params)
+        with self._lock:
+            if len(self._rendered) >= self._cache_size:
+                self._rendered.clear()
+            self._rendered[key] = rendered
+        return rendered
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "templates": {
+                name: {
+                    "version": self._latest[name],
+                    "staticTokens": self.get(name).static_tokens,
+                }
+                for name in self._templates
+            },
+            **self._stats,
+        }
+
+
+# 创建全局实例
+prompt_registry = PromptRegistry()
+
+
+# ========== 提示词定义 ==========
+
+# 文书生成：静态要求在前（可复用前缀缓存），文书类型等变量放在末尾
+prompt_registry.register("document.system", "v2", """你是一位专业的军事保卫部门文书写作助手。你的任务是帮助用户生成规范的军队机关文书。
+
+要求：
+1. 文档格式要符合军事机关公文规范
+2. 内容要准确、严谨、条理清晰
+3. 语言要正式、规范，符合公文写作要求
+4. 必须严格以用户提供的案件/表单信息为基础生成内容，文书中的时间、人员、单位、经过、调查情况等只能使用用户给出的信息，不得编造或泛化
+5. 使用 Markdown 格式输出文档内容
+6. 直接输出 Markdown 内容，不要使用代码块包裹（不要使用 ```markdown 或 ```html 等）
+7. 使用标准 Markdown 语法：标题用 #，段落用空行分隔，列表用 - 或 1.，加粗用 **，斜体用 *
+
+本次需要生成的文书类型：${doc_type}
+${template_hint}请根据用户提供的信息，生成规范的 Markdown 格式文档内容。""")
+
+prompt_registry.register("document.user_suffix", "v1", """
+请生成完整的文档内容，使用 Markdown 格式，包含适当的标题、段落、列表等格式。
+重要要求：
+1. 直接输出 Markdown 格式的内容，不要使用代码块包裹（不要使用 ```markdown 或 ```html 等）
+2. 使用标准的 Markdown 语法：标题用 #，段落用空行分隔，列表用 - 或 1.，加粗用 **，斜体用 *
+3. 确保格式规范，便于阅读和编辑""")
+
+prompt_registry.register("story.system", "v1", """你是一位擅长写警示小故事的创作者。你的任务是根据用户选择的故事类型和提示，生成一段简短、有生活感的警示小故事。
+
+**核心要求（非常重要）：**
+1. **有生活感**：故事要像身边真实发生的事，细节具体、场景接地气，让人感觉"这事儿可能发生在我身边"
+2. **不爹味、不说教**：不要讲大道理，不要用"我们应该""务必牢记""深刻教训"这类教训式口吻，让故事本身说话
+3. **让人记忆深刻**：通过具体情节、反差、细节让人记住，而不是通过总结道理
+4. **简短精炼**：300-600 字左右，讲清楚一个完整的小故事即可
+5. **不要深刻大道理**：结尾可以有一两句点题，但不要长篇大论谈感想，不要升华成人生哲理
+
+**人物设定（重要，必须遵守）：**
+- 故事主角必须是部队的人：如现役军人、文职人员、职工等，不能是其他职业的普通人
+- 这是给部队用的警示小故事，人物身份、场景、单位都要符合部队环境
+- 人物命名：用"某单位的小张""老王""李干事"等化名，避免真实姓名
+
+**故事结构参考：**
+- 开头：某某的日常/背景
+- 经过：具体发生了什么，细节要真实可感
+- 结果：事情如何收场
+- 结尾：可轻点一句警示，但不要说教
+
+**法律/法规说明（必须体现）：**
+- 必须在故事中明确写出违反了哪条国家法律（如《刑法》第xxx条、某某罪）或部队法规/纪律（如《纪律条令》某某条、涉密规定等）
+- 可以自然融入故事结尾或结果部分，用一两句话点明，便于读者对照学习
+
+**输出格式**：直接输出故事正文，使用 Markdown 格式。可用 ## 标题，段落之间空行。不要用代码块包裹。""")
+
+prompt_registry.register("review.system_json", "v1", """你是一位熟悉政府机关与部队公文写作规范的审稿专家。你的任务是对给定的公文正文进行审查，找出以下三类问题并给出修改意见：
+
+1. **错别字**：明显的错字、别字。
+2. **用词不当**：词语搭配不当、歧义、口语化、不够严谨或正式的表述。
+3. **公文规范**：不符合政府/部队公文写法的表述，例如：语气不够庄重、结构不规范、称谓或结尾用语不当、缺少必要要素等。
+
+请仅根据原文内容进行审查，不要编造原文中不存在的句子。输出必须为合法的 JSON，且不要用 markdown 代码块包裹。
+输出格式如下（不要包含其他说明文字）：
+{
+  "issues": [
+    {
+      "type": "错别字|用词不当|公文规范",
+      "location": "简要位置说明，如：第2段 / 开头部分",
+      "original": "有问题的原文片段（尽量简短）",
+      "suggestion": "修改建议或推荐表述",
+      "reason": "简要说明为何需要修改"
+    }
+  ],
+  "summary": "对整篇文档的总体评价或审查说明（一两句话即可）"
+}
+
+若未发现任何问题，issues 可为空数组 []，summary 中说明“未发现明显问题”或类似表述。""")
+
+prompt_registry.register("review.user_json", "v1", """请对以下公文正文进行审查，找出错别字、用词不当、不符合政府/部队公文写法的地方，并按上述 JSON 格式输出修改意见。
+
+--- 公文正文 ---
+${document_text}
+--- 正文结束 ---""")
+
+prompt_registry.register("review.user_window", "v1", """以下为一篇较长公文的第 ${index}/${total} 部分，段首的 [N] 为该段在全文中的段落编号，location 请写作“第N段”。请仅审查本部分，按上述 JSON 格式输出修改意见；original 须为原文中连续的文字，不含段落编号。
+
+--- 公文正文（第 ${index}/${total} 部分） ---
+${document_text}
+--- 本部分结束 ---""")
+
+prompt_registry.register("review.system_markdown", "v1", """你是一位熟悉政府机关与部队公文写作规范的审稿专家。请对给定的公文正文进行审查，找出以下三类问题并给出修改意见：
+
+1. **错别字**：明显的错字、别字。
+2. **用词不当**：词语搭配不当、歧义、口语化、不够严谨或正式的表述。
+3. **公文规范**：不符合政府/部队公文写法的表述，例如：语气不够庄重、结构不规范、称谓或结尾用语不当等。
+
+请**仅使用 Markdown 格式**输出，不要使用代码块包裹。结构要求如下：
+- 先用二级标题写：## 总体评价，下面一段话概括整篇文档的审查结论。
+- 再用二级标题写：## 问题与修改建议，下面用列表或小标题逐条列出，每条包含：**类型**（错别字/用词不当/公文规范）、**原文**、**建议修改**、**说明**。
+若未发现任何问题，在总体评价中说明“未发现明显问题”即可，可省略“问题与修改建议”部分。
+
+直接输出 Markdown 内容，不要输出 ```markdown 等标记。""")
+
+prompt_registry.register("review.user_markdown", "v1", """请对以下公文正文进行审查，按上述 Markdown 格式输出修改建议。
+
+--- 公文正文 ---
+${document_text}
+--- 正文结束 ---""")
+
+prompt_registry.register("extract.system", "v1", """你是一位熟悉军队保卫部门案卷管理的专家。请从给定的案卷/卷宗正文中，提取以下核心字段，用于后续人工审核和入库。只输出合法 JSON，不要用 markdown 代码块包裹。
+
+输出格式（字段名使用下划线命名，与数据库一致）：
+{
+  "case_name": "卷宗名，格式：时间+事发单位-人员类别+姓名+涉案罪名(或自杀方式、线索)，若原文无则根据内容归纳",
+  "title": "案卷标题或简要概括",
+  "case_type": "案卷类型，如：刑事案件、行政案件、民事案件、其他",
+  "source_department": "来源部门或事发单位，若未提及则空字符串",
+  "incident_time": "发生时间，格式 YYYY-MM-DD HH:mm 或 YYYY-MM-DD，若只有日期无时间则补 00:00",
+  "person_name": "涉案人员姓名",
+  "person_info": {
+    "gender": "性别",
+    "ethnicity": "民族",
+    "birthplace": "出生地",
+    "enlistment_time": "入伍时间，格式 YYYY-MM-DD",
+    "position": "部职别",
+    "person_category": "人员类别：现役军人、退役军人、文职人员、职工、其他"
+  },
+  "charge": "涉案罪名",
+  "suicide_method": "自杀方式或线索（仅当涉及自杀时填写，否则空字符串）",
+  "incident_process": "事发经过，简要概括或原文关键段落",
+  "investigation_process_and_conclusion": "侦查调查过程及结论（过程与结论可合并）",
+  "cause_and_lesson": "原因教训",
+  "case_filing": "立案情况",
+  "judgment": "判决情况",
+  "classification_level1": "一级分类：刑事案件、行政案件、民事案件、其他",
+  "classification_level2": "二级分类，根据一级推断或原文",
+  "classification_level3": "三级分类，若有则填"
+}
+
+要求：
+1. 所有字段均从正文中提取或合理推断，不要编造原文没有的信息；若某字段无法从文中得出，则填空字符串或 null。
+2. 时间格式统一为 YYYY-MM-DD 或 YYYY-MM-DD HH:mm。
+3. person_info 中未提及的子字段可省略或空字符串。
+4. 直接输出上述 JSON，不要包含任何其他说明文字。""")
+
+prompt_registry.register("extract.user", "v1", """请从以下案卷正文中提取核心字段，按上述 JSON 格式输出。
+
+--- 案卷正文 ---
+${document_text}
+--- 正文结束 ---""")
+
+# v2：增加案件时间线，供长卷宗分段提取后合并
+prompt_registry.register("extract.system", "v2", prompt_registry.get("extract.system", "v1").text.replace(
+    '''  "classification_level3": "三级分类，若有则填"
+}''',
+    '''  "classification_level3": "三级分类，若有则填",
+  "timeline": [
+    {"time": "事件时间，格式 YYYY-MM-DD HH:mm 或 YYYY-MM-DD", "event": "事件简述（10 字以内）", "type": "incident（案发）|investigation（调查）|filing（立案）|judgment（判决处理）", "description": "事件说明"}
+  ]
+}''',
+).replace(
+    "4. 直接输出上述 JSON",
+    "4. timeline 按时间先后列出正文中出现的关键事件（发案、报案、立案、调查、处理、判决等），无则为空数组 []。\n5. 直接输出上述 JSON",
+))
+
+prompt_registry.register("extract.user_chunk", "v1", """以下为一份较长案卷正文的第 ${index}/${total} 段。请仅根据本段内容提取核心字段，按上述 JSON 格式输出；本段未出现的信息填空字符串或空数组，不要推测其他段落的内容。
+
+--- 案卷正文（第 ${index}/${total} 段） ---
+${document_text}
+--- 本段结束 ---""")
@@ -3,19 +3,49 @@
 """
 import dashscope
 from dashscope import Generation
-from typing import Optional, Dict, Any, AsyncGenerator
+from typing import Optional, Dict, Any, AsyncGenerator, Iterator, List, Tuple
 from loguru import logger
 import json
-import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 from app.core.config import settings
+from app.core.serialization import sse_frame, SSE_DONE
+from app.core.resilience import AdaptiveLimiter, CircuitBreaker, backoff_delay
+from app.core.json_stream import IncrementalObjectParser
+from app.core.single_flight import SingleFlight, SharedStream, request_key
+from app.services.llm_backends import (
+    CassetteStore,
+    LLMBackend,
+    LLMBackendError,
+    RecordingBackend,
+    ReplayBackend,
+    StubBackend,
+)
+from app.services.model_router import model_router
+from app.services.usage_ledger import UsageLedger, usage_ledger
+from app.services.prompt_registry import (
+    prompt_registry,
+    estimate_tokens,
+    truncate_to_budget,
+    compact_related_cases,
+)
 
 
-class QwenService:
-    """通义千问服务类"""
-    
+# 可重试的上游状态码：限流、服务端错误
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class QwenStreamError(LLMBackendError):
+    """流式调用返回错误状态"""
+
+
+class DashScopeBackend(LLMBackend):
+    """通义千问（dashscope SDK）"""
+
+    name = "dashscope"
+
     def __init__(self):
-        """初始化服务"""
         self._api_key_configured = False
         if settings.DASHSCOPE_API_KEY:
             try:
@@ -25,40 +55,18 @@ class QwenService:
                 logger.warning(f"配置 DASHSCOPE_API_KEY 失败: {str(e)}")
         else:
             logger.warning("DASHSCOPE_API_KEY 未配置，AI 功能将不可用")
-    
-    def generate_text(
-        self,
-        prompt: str,
-        system_prompt: Optional[str] = None,
-        model: Optional[str] = None,
-        temperature: float = 0.7,
-        max_tokens: int = 2000,
-        stream: bool = False
+
+    def ready(self) -> bool:
+        return self._api_key_configured and bool(settings.DASHSCOPE_API_KEY)
+
+    def call(
+        self, model: str, messages: List[Dict[str, str]], temperature: float, max_tokens: int
     ) -> Dict[str, Any]:
-        """
-        生成文本内容
-        
-        Args:
-            prompt: 用户提示词
-            system_prompt: 系统提示词（可选）
-            model: 模型名称（默认使用配置中的模型）
-            temperature: 温度参数，控制随机性（0-1）
-            max_tokens: 最大生成token数
-            stream: 是否流式输出
-        
-        Returns:
-            包含生成结果的字典
-        """
-        if not self._api_key_configured or not settings.DASHSCOPE_API_KEY:
-            raise ValueError("DASHSCOPE_API_KEY 未配置，请检查环境变量配置")
-        
-        model = model or settings.QWEN_MODEL
-        
+        """调用一次上游（非流式）"""
         try:
-            messages = []
-            if system_prompt:
-                messages.append({"role": "system", "content": system_prompt})
-            messages.append({"role": "user", "content": prompt})
+            logger.debug(
+                f"千问调用 model={model}, 预估输入 {sum(estimate_tokens(m['content']) for m in messages)} tokens"
+            )
             
             response = Generation.call(
                 model=model,
@@ -70,29 +78,236 @@ class QwenService:
             
             if response.status_code == 200:
                 content = response.output.choices[0].message.content
+                usage = {
+                    "input_tokens": response.usage.input_tokens,
+                    "output_tokens": response.usage.output_tokens,
+                    "total_tokens": response.usage.total_tokens
+                }
+                # 命中服务端前缀缓存的输入 token 数（支持上下文缓存的模型才返回）
+                details = getattr(response.usage, "prompt_tokens_details", None) or {}
+                if isinstance(details, dict) and details.get("cached_tokens"):
+                    usage["cached_tokens"] = details["cached_tokens"]
                 return {
                     "success": True,
                     "content": content,
-                    "usage": {
-                        "input_tokens": response.usage.input_tokens,
-                        "output_tokens": response.usage.output_tokens,
-                        "total_tokens": response.usage.total_tokens
-                    }
+                    "usage": usage
                 }
             else:
                 logger.error(f"千问模型调用失败: {response.message}")
                 return {
                     "success": False,
                     "error": response.message,
-                    "code": response.status_code
+                    "code": response.status_code,
+                    "retryable": response.status_code in RETRYABLE_STATUS,
                 }
         except Exception as e:
+            # 网络异常、超时等
             logger.error(f"调用千问模型时发生异常: {str(e)}")
             return {
                 "success": False,
-                "error": str(e)
+                "error": str(e),
+                "retryable": True,
             }
+
+    def stream(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        usage: Optional[Dict[str, Any]] = None,
+    ) -> Iterator[str]:
+        """调用一次上游（流式），逐个产出增量内容；每个响应都带累计用量，以最后一个为准"""
+        # stream=True 时返回的是 generator，需要设置 incremental_output=True 获得增量输出
+        responses = Generation.call(
+            model=model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+            incremental_output=True,  # 增量输出，只返回新增内容
+            result_format='message'
+        )
+        for response in responses:
+            if response.status_code != 200:
+                error_msg = getattr(response, 'message', '生成失败')
+                error_code = getattr(response, 'code', '')
+                raise QwenStreamError(
+                    f"{error_msg} (code: {error_code})" if error_code else error_msg, response.status_code
+                )
+            response_usage = getattr(response, 'usage', None)
+            if usage is not None and response_usage:
+                usage["input_tokens"] = getattr(response_usage, 'input_tokens', 0)
+                usage["output_tokens"] = getattr(response_usage, 'output_tokens', 0)
+            choices = getattr(getattr(response, 'output', None), 'choices', None) or []
+            if not choices:
+                continue
+            choice = choices[0]
+            content = ''
+            # 从 message.content 获取内容（增量输出模式）
+            message = choice.get('message') if isinstance(choice, dict) else getattr(choice, 'message', None)
+            if isinstance(message, dict):
+                content = message.get('content', '')
+            elif message is not None:
+                content = getattr(message, 'content', '') or ''
+            if content:
+                yield content
+
+
+def create_backend(name: Optional[str] = None) -> LLMBackend:
+    """
+    按名称创建后端（默认取 LLM_BACKEND）
+
+    Args:
+        name: dashscope | stub | record | replay
+    """
+    name = (name or settings.LLM_BACKEND).lower()
+    if name == "stub":
+        return StubBackend()
+    if name == "replay":
+        return ReplayBackend(CassetteStore(), fallback=StubBackend() if settings.LLM_REPLAY_FALLBACK else None)
+    if name == "record":
+        return RecordingBackend(DashScopeBackend(), CassetteStore())
+    if name != "dashscope":
+        logger.warning(f"未知的 LLM_BACKEND={name}，使用 dashscope")
+    return DashScopeBackend()
+
+
+class QwenService:
+    """通义千问服务类"""
+    
+    def __init__(self, backend: Optional[LLMBackend] = None, ledger: Optional[UsageLedger] = None):
+        """初始化服务"""
+        # 模型后端（默认按 LLM_BACKEND 创建，见 llm_backends）
+        self.backend = backend or create_backend()
+        # 用量台账：每次上游调用按当前上下文的用户、接口记账，并检查用户当日预算
+        self.ledger = ledger or usage_ledger
+        # 相同请求合并：进行中的相同调用（按模型+提示词+采样参数计算的键）只调用一次上游
+        self._flights = SingleFlight()
+        self._streams: Dict[str, SharedStream] = {}
+        self._stream_stats = {"streams": 0, "shared": 0}
+        self._stream_executor: Optional[ThreadPoolExecutor] = None
+        # 按调用场景选择模型并记录各模型延迟
+        self.router = model_router
+        # 弹性控制：自适应并发、熔断（所有调用共用）
+        self._limiter = AdaptiveLimiter(
+            initial=settings.QWEN_INITIAL_CONCURRENCY,
+            minimum=settings.QWEN_MIN_CONCURRENCY,
+            maximum=settings.QWEN_MAX_CONCURRENCY,
+        )
+        self._breaker = CircuitBreaker(
+            failure_threshold=settings.QWEN_BREAKER_FAILURES,
+            cooldown=settings.QWEN_BREAKER_COOLDOWN,
+        )
     
+    def generate_text(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        model: Optional[str] = None,
+        temperature: float = 0.7,
+        max_tokens: int = 2000,
+        stream: bool = False,
+        route: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        生成文本内容
+        
+        Args:
+            prompt: 用户提示词
+            system_prompt: 系统提示词（可选）
+            model: 模型名称（默认按 route 选择，未指定路由时使用配置中的模型）
+            temperature: 温度参数，控制随机性（0-1）
+            max_tokens: 最大生成token数
+            stream: 是否流式输出
+            route: 路由名（见 model_router.DEFAULT_ROUTES）
+        
+        Returns:
+            包含生成结果的字典
+        """
+        if not self.backend.ready():
+            raise ValueError("DASHSCOPE_API_KEY 未配置，请检查环境变量配置")
+        over_budget = self._budget_exceeded_result()
+        if over_budget:
+            return over_budget
+        
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": prompt})
+        model = model or self.router.choose(route, self._input_tokens(messages), max_tokens)
+
+        key = request_key("text", model, messages, temperature, max_tokens)
+        result, shared = self._flights.do(
+            key, lambda: self._call_generation(model, messages, temperature, max_tokens, route)
+        )
+        if shared:
+            logger.debug(f"千问调用与进行中的相同请求合并 model={model}")
+        return dict(result)
+
+    @staticmethod
+    def _input_tokens(messages: List[Dict[str, str]]) -> int:
+        return sum(estimate_tokens(m["content"]) for m in messages)
+
+    def _circuit_open_result(self) -> Dict[str, Any]:
+        return {
+            "success": False,
+            "error": f"AI 服务暂时不可用，请 {int(self._breaker.retry_after()) + 1} 秒后重试",
+            "code": 503,
+            "retryable": True,
+            "circuitOpen": True,
+        }
+
+    def _budget_exceeded_result(self) -> Optional[Dict[str, Any]]:
+        """当前用户超出当日预算时返回失败结果（不重试）"""
+        message = self.ledger.check_budget()
+        if message is None:
+            return None
+        return {"success": False, "error": message, "code": 429, "retryable": False, "budgetExceeded": True}
+
+    def retry_after(self) -> float:
+        """熔断中时距离可以再次调用的秒数，未熔断为 0"""
+        return self._breaker.retry_after()
+
+    def _call_generation(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        route: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        调用上游（非流式）：熔断时直接失败；按自适应并发上限排队；
+        限流、服务端错误和网络异常按指数退避（带抖动）重试；每次上游调用都记入用量台账
+        """
+        result: Dict[str, Any] = {}
+        for attempt in range(1, settings.QWEN_RETRY_ATTEMPTS + 1):
+            if not self._breaker.allow():
+                return self._circuit_open_result()
+            if not self._limiter.acquire(settings.QWEN_ACQUIRE_TIMEOUT):
+                self._breaker.release_probe()
+                return {"success": False, "error": "AI 服务繁忙，请稍后重试", "code": 503, "retryable": True}
+            start = time.monotonic()
+            result = self.backend.call(model, messages, temperature, max_tokens)
+            latency = time.monotonic() - start
+            self._limiter.release(
+                latency if result.get("success") else None,
+                throttled=result.get("code") == 429,
+            )
+            self.ledger.record(model, route, result.get("usage"), latency, bool(result.get("success")))
+            if result.get("success"):
+                self.router.record(model, latency, route=route)
+            if result.get("success") or not result.get("retryable"):
+                self._breaker.record_success()
+                return result
+            self._breaker.record_failure()
+            if attempt < settings.QWEN_RETRY_ATTEMPTS:
+                delay = backoff_delay(attempt, settings.QWEN_RETRY_BASE_DELAY, settings.QWEN_RETRY_MAX_DELAY)
+                logger.warning(f"千问调用失败（{result.get('error')}），{delay:.1f}s 后第 {attempt} 次重试")
+                time.sleep(delay)
+        return result
+
     def generate_document(
         self,
         doc_type: str,
@@ -121,7 +336,8 @@ class QwenService:
             prompt=user_prompt,
             system_prompt=system_prompt,
             temperature=0.7,
-            max_tokens=4000
+            max_tokens=4000,
+            route="document",
         )
         
         return result
@@ -143,83 +359,18 @@ class QwenService:
         Yields:
             SSE格式的数据块
         """
-        if not self._api_key_configured or not settings.DASHSCOPE_API_KEY:
-            yield f"data: {json.dumps({'error': 'DASHSCOPE_API_KEY 未配置'})}\n\n"
+        if not self.backend.ready():
+            yield sse_frame({'error': 'DASHSCOPE_API_KEY 未配置'})
             return
         
-        model = settings.QWEN_MODEL
-        
-        try:
-            # 构建系统提示词
-            system_prompt = self._build_system_prompt(doc_type, template_hint)
-            
-            # 构建用户提示词
-            user_prompt = self._build_user_prompt(doc_type, context)
-            
-            messages = []
-            if system_prompt:
-                messages.append({"role": "system", "content": system_prompt})
-            messages.append({"role": "user", "content": user_prompt})
-            
-            # 调用流式生成API
-            # stream=True 时返回的是 generator，需要设置 incremental_output=True 获得增量输出
-            responses = Generation.call(
-                model=model,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=4000,
-                stream=True,
-                incremental_output=True,  # 增量输出，只返回新增内容
-                result_format='message'
-            )
-            
-            # 遍历流式响应（responses 是一个 generator）
-            for response in responses:
-                # 使用 asyncio.sleep(0) 让出控制权，避免阻塞
-                await asyncio.sleep(0)
-                
-                # 检查响应状态
-                if response.status_code == 200:
-                    # 获取输出内容
-                    if hasattr(response, 'output') and response.output:
-                        if hasattr(response.output, 'choices') and response.output.choices:
-                            choice = response.output.choices[0]
-                            
-                            # 获取增量内容
-                            content = ''
-                            
-                            # 从 message.content 获取内容（增量输出模式）
-                            if hasattr(choice, 'message'):
-                                message = choice.message
-                                if isinstance(message, dict):
-                                    content = message.get('content', '')
-                                elif hasattr(message, 'content'):
-                                    content = message.content
-                            
-                            # 如果 choice 是字典类型
-                            if not content and isinstance(choice, dict):
-                                if 'message' in choice:
-                                    msg = choice['message']
-                                    if isinstance(msg, dict):
-                                        content = msg.get('content', '')
-                            
-                            if content:
-                                # 发送SSE格式的数据
-                                yield f"data: {json.dumps({'content': content})}\n\n"
-                else:
-                    # 处理错误
-                    error_msg = getattr(response, 'message', '生成失败')
-                    error_code = getattr(response, 'code', '')
-                    logger.error(f"千问模型流式调用失败: {error_msg} (code: {error_code})")
-                    yield f"data: {json.dumps({'error': error_msg})}\n\n"
-                    break
-            
-            # 发送完成信号
-            yield f"data: {json.dumps({'done': True})}\n\n"
-            
-        except Exception as e:
-            logger.error(f"流式生成文档时发生异常: {str(e)}")
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+        messages = [
+            {"role": "system", "content": self._build_system_prompt(doc_type, template_hint)},
+            {"role": "user", "content": self._build_user_prompt(doc_type, context)},
+        ]
+        async for chunk in self._stream_chat(
+            messages, temperature=0.7, max_tokens=4000, label="流式生成文档", route="document_stream"
+        ):
+            yield chunk
 
     async def generate_story_stream(
         self,
@@ -232,35 +383,11 @@ class QwenService:
         风格要求：有生活感、不爹味、让人记忆深刻，不需要深刻大道理
         类似：xxx 做了什么被诈骗，或 xx 因为 xx 什么...
         """
-        if not self._api_key_configured or not settings.DASHSCOPE_API_KEY:
-            yield f"data: {json.dumps({'error': 'DASHSCOPE_API_KEY 未配置'})}\n\n"
+        if not self.backend.ready():
+            yield sse_frame({'error': 'DASHSCOPE_API_KEY 未配置'})
             return
 
-        system_prompt = """你是一位擅长写警示小故事的创作者。你的任务是根据用户选择的故事类型和提示，生成一段简短、有生活感的警示小故事。
-
-**核心要求（非常重要）：**
-1. **有生活感**：故事要像身边真实发生的事，细节具体、场景接地气，让人感觉"这事儿可能发生在我身边"
-2. **不爹味、不说教**：不要讲大道理，不要用"我们应该""务必牢记""深刻教训"这类教训式口吻，让故事本身说话
-3. **让人记忆深刻**：通过具体情节、反差、细节让人记住，而不是通过总结道理
-4. **简短精炼**：300-600 字左右，讲清楚一个完整的小故事即可
-5. **不要深刻大道理**：结尾可以有一两句点题，但不要长篇大论谈感想，不要升华成人生哲理
-
-**人物设定（重要，必须遵守）：**
-- 故事主角必须是部队的人：如现役军人、文职人员、职工等，不能是其他职业的普通人
-- 这是给部队用的警示小故事，人物身份、场景、单位都要符合部队环境
-- 人物命名：用"某单位的小张""老王""李干事"等化名，避免真实姓名
-
-**故事结构参考：**
-- 开头：某某的日常/背景
-- 经过：具体发生了什么，细节要真实可感
-- 结果：事情如何收场
-- 结尾：可轻点一句警示，但不要说教
-
-**法律/法规说明（必须体现）：**
-- 必须在故事中明确写出违反了哪条国家法律（如《刑法》第xxx条、某某罪）或部队法规/纪律（如《纪律条令》某某条、涉密规定等）
-- 可以自然融入故事结尾或结果部分，用一两句话点明，便于读者对照学习
-
-**输出格式**：直接输出故事正文，使用 Markdown 格式。可用 ## 标题，段落之间空行。不要用代码块包裹。"""
+        system_prompt = prompt_registry.render("story.system")
 
         keywords = context.get("keywords", "").strip()
         scene_hint = context.get("sceneHint", "").strip()
@@ -273,71 +400,159 @@ class QwenService:
         user_parts.append("请严格遵循「有生活感、不爹味、让人记忆深刻」的要求，直接输出故事内容，使用 Markdown 格式。")
         user_prompt = "".join(user_parts)
 
-        try:
-            messages = []
-            if system_prompt:
-                messages.append({"role": "system", "content": system_prompt})
-            messages.append({"role": "user", "content": user_prompt})
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ]
+        # 温度稍高一点让故事更有变化和生动感
+        async for chunk in self._stream_chat(
+            messages, temperature=0.85, max_tokens=2000, label="警示小故事生成", route="story_stream"
+        ):
+            yield chunk
 
-            responses = Generation.call(
-                model=settings.QWEN_MODEL,
-                messages=messages,
-                temperature=0.85,  # 稍高一点让故事更有变化和生动感
-                max_tokens=2000,
-                stream=True,
-                incremental_output=True,
-                result_format='message'
+    def _iter_stream(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        route: Optional[str] = None,
+    ) -> Iterator[str]:
+        """
+        流式调用上游（阻塞迭代，在线程中执行）：熔断时直接失败，整个流占用一个并发名额；
+        尚未输出任何内容前的可重试错误按指数退避重试；每次上游调用结束（含失败、中途取消）时记入用量台账，
+        后端未返回用量时按输入与已输出内容估算
+        """
+        for attempt in range(1, settings.QWEN_RETRY_ATTEMPTS + 1):
+            if not self._breaker.allow():
+                raise QwenStreamError(self._circuit_open_result()["error"], 503)
+            if not self._limiter.acquire(settings.QWEN_ACQUIRE_TIMEOUT):
+                self._breaker.release_probe()
+                raise QwenStreamError("AI 服务繁忙，请稍后重试", 503)
+            started = completed = False
+            error: Optional[Exception] = None
+            usage: Dict[str, Any] = {}
+            output_tokens = 0
+            start = time.monotonic()
+            try:
+                for content in self.backend.stream(model, messages, temperature, max_tokens, usage=usage):
+                    if not started:
+                        started = True
+                        self.router.record(model, time.monotonic() - start, stream=True, route=route)
+                    output_tokens += estimate_tokens(content)
+                    yield content
+                completed = True
+            except GeneratorExit:
+                # 调用方中途关闭（客户端断开、共享流被取消）：只会发生在已有输出之后，说明上游正常
+                self._breaker.record_success()
+                raise
+            except Exception as e:
+                error = e
+            finally:
+                self._limiter.release(throttled=getattr(error, "status_code", None) == 429)
+                if not usage and (started or completed):
+                    usage = {"input_tokens": self._input_tokens(messages), "output_tokens": output_tokens}
+                self.ledger.record(model, route, usage, time.monotonic() - start, completed, stream=True)
+            if error is None:
+                self._breaker.record_success()
+                return
+            status_code = getattr(error, "status_code", None)
+            retryable = status_code is None or status_code in RETRYABLE_STATUS
+            if retryable:
+                self._breaker.record_failure()
+            else:
+                self._breaker.record_success()
+            if started or not retryable or attempt == settings.QWEN_RETRY_ATTEMPTS:
+                raise error
+            delay = backoff_delay(attempt, settings.QWEN_RETRY_BASE_DELAY, settings.QWEN_RETRY_MAX_DELAY)
+            logger.warning(f"千问流式调用失败（{str(error)}），{delay:.1f}s 后第 {attempt} 次重试")
+            time.sleep(delay)
+
+    def _get_stream_executor(self) -> ThreadPoolExecutor:
+        """获取读取上游流式响应的线程池（流式响应持续时间长，不占用默认线程池）"""
+        if self._stream_executor is None:
+            self._stream_executor = ThreadPoolExecutor(
+                max_workers=settings.QWEN_STREAM_WORKERS, thread_name_prefix="qwen-stream"
             )
+        return self._stream_executor
 
-            for response in responses:
-                await asyncio.sleep(0)
-                if response.status_code == 200:
-                    if hasattr(response, 'output') and response.output:
-                        if hasattr(response.output, 'choices') and response.output.choices:
-                            choice = response.output.choices[0]
-                            content = ''
-                            if hasattr(choice, 'message'):
-                                message = choice.message
-                                if isinstance(message, dict):
-                                    content = message.get('content', '')
-                                elif hasattr(message, 'content'):
-                                    content = message.content
-                            if not content and isinstance(choice, dict):
-                                msg = choice.get('message', {})
-                                content = msg.get('content', '') if isinstance(msg, dict) else ''
-                            if content:
-                                yield f"data: {json.dumps({'content': content})}\n\n"
-                else:
-                    error_msg = getattr(response, 'message', '生成失败')
-                    logger.error(f"警示小故事流式生成失败: {error_msg}")
-                    yield f"data: {json.dumps({'error': error_msg})}\n\n"
-                    return
-
-            yield f"data: {json.dumps({'done': True})}\n\n"
+    def _release_stream(self, key: str, stream: SharedStream) -> None:
+        if self._streams.get(key) is stream:
+            del self._streams[key]
+
+    async def _stream_chat(
+        self,
+        messages: List[Dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        label: str,
+        route: Optional[str] = None,
+    ) -> AsyncGenerator[bytes, None]:
+        """
+        流式调用（SSE 格式）；进行中的相同请求共享同一次上游调用，后加入者先重放已输出的内容
+
+        Yields:
+            data: {"content": "..."} ... data: {"done": true}；失败时 data: {"error": "..."}
+        """
+        over_budget = self._budget_exceeded_result()
+        if over_budget:
+            yield sse_frame({'error': over_budget["error"], 'code': 429, 'budgetExceeded': True})
+            return
+        model = self.router.choose(route, self._input_tokens(messages), max_tokens, stream=True)
+        key = request_key("stream", model, messages, temperature, max_tokens)
+        stream = self._streams.get(key)
+        if stream is None or stream.cancelled:
+            stream = SharedStream(on_finish=lambda finished: self._release_stream(key, finished))
+            self._streams[key] = stream
+            self._stream_stats["streams"] += 1
+            stream.start(
+                self._get_stream_executor(),
+                lambda: (
+                    sse_frame({'content': content})
+                    for content in self._iter_stream(model, messages, temperature, max_tokens, route)
+                ),
+            )
+        else:
+            self._stream_stats["shared"] += 1
+            logger.debug(f"{label}与进行中的相同请求合并，当前订阅 {stream.subscribers + 1} 个")
+        try:
+            async for frame in stream.subscribe():
+                yield frame
+            yield SSE_DONE
+        except QwenStreamError as e:
+            logger.error(f"{label}失败: {str(e)}")
+            yield sse_frame({'error': str(e)})
         except Exception as e:
-            logger.error(f"警示小故事生成异常: {str(e)}")
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+            logger.error(f"{label}异常: {str(e)}")
+            yield sse_frame({'error': str(e)})
+
+    def stats(self) -> Dict[str, Any]:
+        """调用统计：相同请求合并、自适应并发、熔断状态、各模型延迟与路由选择、模型后端"""
+        return {
+            "requests": self._flights.stats(),
+            "models": self.router.stats(),
+            "streams": {"inflight": len(self._streams), **self._stream_stats},
+            "concurrency": self._limiter.stats(),
+            "breaker": self._breaker.stats(),
+            "backend": self.backend.stats(),
+        }
+
+    def shutdown(self) -> None:
+        """关闭流式读取线程池"""
+        for stream in list(self._streams.values()):
+            stream.cancel()
+        if self._stream_executor is not None:
+            self._stream_executor.shutdown(wait=False, cancel_futures=True)
+            self._stream_executor = None
 
     def _build_system_prompt(self, doc_type: str, template_hint: Optional[str] = None) -> str:
         """构建系统提示词"""
-        base_prompt = f"""你是一位专业的军事保卫部门文书写作助手。你的任务是帮助用户生成规范的{doc_type}文档。
-
-要求：
-1. 文档格式要符合军事机关公文规范
-2. 内容要准确、严谨、条理清晰
-3. 语言要正式、规范，符合公文写作要求
-4. 必须严格以用户提供的案件/表单信息为基础生成内容，文书中的时间、人员、单位、经过、调查情况等只能使用用户给出的信息，不得编造或泛化
-5. 使用 Markdown 格式输出文档内容
-6. 直接输出 Markdown 内容，不要使用代码块包裹（不要使用 ```markdown 或 ```html 等）
-7. 使用标准 Markdown 语法：标题用 #，段落用空行分隔，列表用 - 或 1.，加粗用 **，斜体用 *
-
-"""
-        if template_hint:
-            base_prompt += f"模板说明：{template_hint}\n\n"
-        
-        base_prompt += "请根据用户提供的信息，生成规范的 Markdown 格式文档内容。"
-        
-        return base_prompt
+        # 静态要求在前、文书类型在后，不同文书共用相同前缀，便于命中服务端前缀缓存
+        return prompt_registry.render(
+            "document.system",
+            doc_type=doc_type,
+            template_hint=f"模板说明：{template_hint}\n\n" if template_hint else "",
+        )
     
     def _build_user_prompt(self, doc_type: str, context: Dict[str, Any]) -> str:
         """构建用户提示词"""
@@ -372,8 +587,9 @@ class QwenService:
             
             if context.get("relatedCases"):
                 prompt_parts.append("\n参考/关联案件：\n")
-                for case in context["relatedCases"]:
-                    prompt_parts.append(f"- {case.get('caseNo', '')}：{case.get('caseName', '') or case.get('title', '')}\n")
+                prompt_parts.extend(
+                    compact_related_cases(context["relatedCases"], settings.PROMPT_RELATED_CASES_TOKENS)
+                )
             
             prompt_parts.append("\n【生成要求】必须严格以上述案件信息为基础生成本文书。文书中的时间、人员、单位、经过、调查情况等均只能使用上述内容，不得编造或使用泛化表述；若某项未提供则用“待补充”等表述，不要虚构。\n")
         
@@ -427,7 +643,9 @@ class QwenService:
             meeting_transcript = context.get("meetingTranscript") or context.get("meeting_notes") or ""
             if meeting_transcript:
                 prompt_parts.append("会议原始内容：\n")
-                prompt_parts.append(meeting_transcript)
+                prompt_parts.append(
+                    truncate_to_budget(meeting_transcript, settings.PROMPT_TRANSCRIPT_TOKENS, keep_tail=True)
+                )
                 prompt_parts.append("\n\n")
             if context.get("meetingTitle"):
                 prompt_parts.append(f"会议主题：{context.get('meetingTitle')}\n")
@@ -435,62 +653,43 @@ class QwenService:
                 prompt_parts.append(f"会议时间：{context.get('meetingTime')}\n")
             prompt_parts.append("\n【生成要求】请将上述内容整理成标准会议纪要，结构需包含：一、会议基本信息（时间、地点、参会人员、主持等）；二、会议议题与讨论内容；三、议定事项或决议；四、待办与分工（如有）。内容必须严格基于上述原始内容，不得编造；若信息不全可标注“待补充”。\n")
         
-        prompt_parts.append("\n请生成完整的文档内容，使用 Markdown 格式，包含适当的标题、段落、列表等格式。")
-        prompt_parts.append("\n重要要求：")
-        prompt_parts.append("\n1. 直接输出 Markdown 格式的内容，不要使用代码块包裹（不要使用 ```markdown 或 ```html 等）")
-        prompt_parts.append("\n2. 使用标准的 Markdown 语法：标题用 #，段落用空行分隔，列表用 - 或 1.，加粗用 **，斜体用 *")
-        prompt_parts.append("\n3. 确保格式规范，便于阅读和编辑")
+        prompt_parts.append(prompt_registry.render("document.user_suffix"))
         
         return "".join(prompt_parts)
 
-    def review_document_content(self, document_text: str) -> Dict[str, Any]:
+    def review_document_content(
+        self, document_text: str, part: Optional[Tuple[int, int]] = None
+    ) -> Dict[str, Any]:
         """
         对公文内容进行审查：错别字、用词不当、不符合政府/部队公文写法，给出修改意见。
+        长公文的分段并发审查见 content_review 模块。
 
         Args:
             document_text: 从 docx 中提取的全文内容
+            part: 分段审查时的 (部分序号, 总部分数)，从 1 开始，正文段首带全文段落编号
 
         Returns:
             包含 issues 列表和 summary 的字典；若调用失败则返回 success=False 及 error。
         """
-        if not self._api_key_configured or not settings.DASHSCOPE_API_KEY:
+        if not self.backend.ready():
             return {"success": False, "error": "DASHSCOPE_API_KEY 未配置，请检查环境变量配置"}
 
-        system_prompt = """你是一位熟悉政府机关与部队公文写作规范的审稿专家。你的任务是对给定的公文正文进行审查，找出以下三类问题并给出修改意见：
-
-1. **错别字**：明显的错字、别字。
-2. **用词不当**：词语搭配不当、歧义、口语化、不够严谨或正式的表述。
-3. **公文规范**：不符合政府/部队公文写法的表述，例如：语气不够庄重、结构不规范、称谓或结尾用语不当、缺少必要要素等。
-
-请仅根据原文内容进行审查，不要编造原文中不存在的句子。输出必须为合法的 JSON，且不要用 markdown 代码块包裹。
-输出格式如下（不要包含其他说明文字）：
-{
-  "issues": [
-    {
-      "type": "错别字|用词不当|公文规范",
-      "location": "简要位置说明，如：第2段 / 开头部分",
-      "original": "有问题的原文片段（尽量简短）",
-      "suggestion": "修改建议或推荐表述",
-      "reason": "简要说明为何需要修改"
-    }
-  ],
-  "summary": "对整篇文档的总体评价或审查说明（一两句话即可）"
-}
-
-若未发现任何问题，issues 可为空数组 []，summary 中说明“未发现明显问题”或类似表述。"""
-
-        user_prompt = f"""请对以下公文正文进行审查，找出错别字、用词不当、不符合政府/部队公文写法的地方，并按上述 JSON 格式输出修改意见。
-
---- 公文正文 ---
-{document_text[:12000] if len(document_text) > 12000 else document_text}
---- 正文结束 ---"""
+        system_prompt = prompt_registry.render("review.system_json")
+        document_text = truncate_to_budget(document_text, settings.PROMPT_REVIEW_TOKENS)
+        if part:
+            user_prompt = prompt_registry.render(
+                "review.user_window", index=part[0], total=part[1], document_text=document_text
+            )
+        else:
+            user_prompt = prompt_registry.render("review.user_json", document_text=document_text)
 
         try:
             result = self.generate_text(
                 prompt=user_prompt,
                 system_prompt=system_prompt,
                 temperature=0.3,
-                max_tokens=4000
+                max_tokens=4000,
+                route="review",
             )
             if not result.get("success"):
                 return result
@@ -535,128 +734,54 @@ class QwenService:
         Yields:
             SSE 格式的数据块：data: {"content": "..."} 或 data: {"done": true} / data: {"error": "..."}
         """
-        if not self._api_key_configured or not settings.DASHSCOPE_API_KEY:
-            yield f"data: {json.dumps({'error': 'DASHSCOPE_API_KEY 未配置'})}\n\n"
+        if not self.backend.ready():
+            yield sse_frame({'error': 'DASHSCOPE_API_KEY 未配置'})
             return
 
-        system_prompt = """你是一位熟悉政府机关与部队公文写作规范的审稿专家。请对给定的公文正文进行审查，找出以下三类问题并给出修改意见：
-
-1. **错别字**：明显的错字、别字。
-2. **用词不当**：词语搭配不当、歧义、口语化、不够严谨或正式的表述。
-3. **公文规范**：不符合政府/部队公文写法的表述，例如：语气不够庄重、结构不规范、称谓或结尾用语不当等。
-
-请**仅使用 Markdown 格式**输出，不要使用代码块包裹。结构要求如下：
-- 先用二级标题写：## 总体评价，下面一段话概括整篇文档的审查结论。
-- 再用二级标题写：## 问题与修改建议，下面用列表或小标题逐条列出，每条包含：**类型**（错别字/用词不当/公文规范）、**原文**、**建议修改**、**说明**。
-若未发现任何问题，在总体评价中说明“未发现明显问题”即可，可省略“问题与修改建议”部分。
-
-直接输出 Markdown 内容，不要输出 ```markdown 等标记。"""
-
-        user_prompt = f"""请对以下公文正文进行审查，按上述 Markdown 格式输出修改建议。
-
---- 公文正文 ---
-{document_text[:12000] if len(document_text) > 12000 else document_text}
---- 正文结束 ---"""
+        system_prompt = prompt_registry.render("review.system_markdown")
+        user_prompt = prompt_registry.render(
+            "review.user_markdown",
+            document_text=truncate_to_budget(document_text, settings.PROMPT_REVIEW_TOKENS),
+        )
 
-        try:
-            messages = [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ]
-            responses = Generation.call(
-                model=settings.QWEN_MODEL,
-                messages=messages,
-                temperature=0.3,
-                max_tokens=4000,
-                stream=True,
-                incremental_output=True,
-                result_format='message'
-            )
-            for response in responses:
-                await asyncio.sleep(0)
-                if response.status_code == 200 and getattr(response, 'output', None):
-                    choices = getattr(response.output, 'choices', None) or []
-                    if choices:
-                        choice = choices[0]
-                        content = ''
-                        msg = getattr(choice, 'message', None)
-                        if isinstance(msg, dict):
-                            content = msg.get('content', '')
-                        elif hasattr(msg, 'content'):
-                            content = msg.content or ''
-                        if isinstance(choice, dict) and not content:
-                            msg = choice.get('message', {})
-                            content = msg.get('content', '') if isinstance(msg, dict) else ''
-                        if content:
-                            yield f"data: {json.dumps({'content': content})}\n\n"
-                else:
-                    error_msg = getattr(response, 'message', '生成失败')
-                    logger.error(f"内容审查流式调用失败: {error_msg}")
-                    yield f"data: {json.dumps({'error': error_msg})}\n\n"
-                    return
-            yield f"data: {json.dumps({'done': True})}\n\n"
-        except Exception as e:
-            logger.error(f"内容审查流式异常: {str(e)}")
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt},
+        ]
+        async for chunk in self._stream_chat(
+            messages, temperature=0.3, max_tokens=4000, label="内容审查流式", route="review_stream"
+        ):
+            yield chunk
 
-    def extract_case_fields(self, document_text: str) -> Dict[str, Any]:
+    def extract_case_fields(
+        self, document_text: str, part: Optional[Tuple[int, int]] = None
+    ) -> Dict[str, Any]:
         """
         从案卷/卷宗正文中提取核心字段，用于导入待审核模块。
         提取字段与案卷表（CaseFile）对应，便于人工审核后入库。
+        长卷宗的分段提取与合并见 case_extraction 模块。
 
         Args:
             document_text: 从文档中解析出的全文（OCR 或 DOCX 提取）
+            part: 分段提取时的 (段序号, 总段数)，从 1 开始
 
         Returns:
             成功时返回 success=True 及 fields 字典；失败时返回 success=False 及 error。
             fields 包含：case_name, incident_time, person_name, person_info, incident_process,
             investigation_process_and_conclusion, cause_and_lesson, case_filing, judgment,
-            classification_level1, classification_level2, classification_level3 等。
+            classification_level1, classification_level2, classification_level3, timeline 等。
         """
-        if not self._api_key_configured or not settings.DASHSCOPE_API_KEY:
+        if not self.backend.ready():
             return {"success": False, "error": "DASHSCOPE_API_KEY 未配置，请检查环境变量配置"}
 
-        system_prompt = """你是一位熟悉军队保卫部门案卷管理的专家。请从给定的案卷/卷宗正文中，提取以下核心字段，用于后续人工审核和入库。只输出合法 JSON，不要用 markdown 代码块包裹。
-
-输出格式（字段名使用下划线命名，与数据库一致）：
-{
-  "case_name": "卷宗名，格式：时间+事发单位-人员类别+姓名+涉案罪名(或自杀方式、线索)，若原文无则根据内容归纳",
-  "title": "案卷标题或简要概括",
-  "case_type": "案卷类型，如：刑事案件、行政案件、民事案件、其他",
-  "source_department": "来源部门或事发单位，若未提及则空字符串",
-  "incident_time": "发生时间，格式 YYYY-MM-DD HH:mm 或 YYYY-MM-DD，若只有日期无时间则补 00:00",
-  "person_name": "涉案人员姓名",
-  "person_info": {
-    "gender": "性别",
-    "ethnicity": "民族",
-    "birthplace": "出生地",
-    "enlistment_time": "入伍时间，格式 YYYY-MM-DD",
-    "position": "部职别",
-    "person_category": "人员类别：现役军人、退役军人、文职人员、职工、其他"
-  },
-  "charge": "涉案罪名",
-  "suicide_method": "自杀方式或线索（仅当涉及自杀时填写，否则空字符串）",
-  "incident_process": "事发经过，简要概括或原文关键段落",
-  "investigation_process_and_conclusion": "侦查调查过程及结论（过程与结论可合并）",
-  "cause_and_lesson": "原因教训",
-  "case_filing": "立案情况",
-  "judgment": "判决情况",
-  "classification_level1": "一级分类：刑事案件、行政案件、民事案件、其他",
-  "classification_level2": "二级分类，根据一级推断或原文",
-  "classification_level3": "三级分类，若有则填"
-}
-
-要求：
-1. 所有字段均从正文中提取或合理推断，不要编造原文没有的信息；若某字段无法从文中得出，则填空字符串或 null。
-2. 时间格式统一为 YYYY-MM-DD 或 YYYY-MM-DD HH:mm。
-3. person_info 中未提及的子字段可省略或空字符串。
-4. 直接输出上述 JSON，不要包含任何其他说明文字。"""
-
-        user_prompt = f"""请从以下案卷正文中提取核心字段，按上述 JSON 格式输出。
-
---- 案卷正文 ---
-{document_text[:15000] if len(document_text) > 15000 else document_text}
---- 正文结束 ---"""
+        system_prompt = prompt_registry.render("extract.system")
+        document_text = truncate_to_budget(document_text, settings.PROMPT_EXTRACT_TOKENS)
+        if part:
+            user_prompt = prompt_registry.render(
+                "extract.user_chunk", index=part[0], total=part[1], document_text=document_text
+            )
+        else:
+            user_prompt = prompt_registry.render("extract.user", document_text=document_text)
 
         try:
             result = self.generate_text(
@@ -664,6 +789,7 @@ class QwenService:
                 system_prompt=system_prompt,
                 temperature=0.3,
                 max_tokens=4000,
+                route="extract",
             )
             if not result.get("success"):
                 return result
@@ -691,6 +817,55 @@ class QwenService:
             logger.error(f"案卷字段提取异常: {str(e)}")
             return {"success": False, "error": str(e)}
 
+    def iter_case_fields(self, document_text: str) -> Iterator[Dict[str, Any]]:
+        """
+        流式提取案卷字段（阻塞迭代，在线程中执行）：模型逐片输出 JSON，
+        顶层字段的值闭合时立即产出，不必等待整个 JSON 输出完毕
+
+        Yields:
+            {"field": 字段名, "value": 值} ...，最后一项为 {"result": 与 extract_case_fields 相同的结构}
+        """
+        if not self.backend.ready():
+            yield {"result": {"success": False, "error": "DASHSCOPE_API_KEY 未配置，请检查环境变量配置"}}
+            return
+        over_budget = self._budget_exceeded_result()
+        if over_budget:
+            yield {"result": over_budget}
+            return
+
+        messages = [
+            {"role": "system", "content": prompt_registry.render("extract.system")},
+            {"role": "user", "content": prompt_registry.render(
+                "extract.user",
+                document_text=truncate_to_budget(document_text, settings.PROMPT_EXTRACT_TOKENS),
+            )},
+        ]
+        model = self.router.choose("extract", self._input_tokens(messages), 4000, stream=True)
+        parser = IncrementalObjectParser()
+        parts: List[str] = []
+        try:
+            for content in self._iter_stream(model, messages, 0.3, 4000, "extract"):
+                parts.append(content)
+                for name, value in parser.feed(content):
+                    yield {"field": name, "value": value}
+        except Exception as e:
+            status_code = getattr(e, "status_code", None)
+            logger.error(f"案卷字段流式提取异常: {str(e)}")
+            yield {"result": {
+                "success": False,
+                "error": str(e),
+                "code": status_code,
+                "retryable": status_code is None or status_code in RETRYABLE_STATUS,
+            }}
+            return
+
+        if parser.done:
+            yield {"result": {"success": True, "fields": parser.fields}}
+            return
+        raw = "".join(parts)
+        logger.warning(f"案卷字段流式提取返回非 JSON: raw={raw[:200]}")
+        yield {"result": {"success": False, "error": "AI 提取结果解析失败，请重试", "raw": raw[:500]}}
+
 
 # 创建全局服务实例
 qwen_service = QwenService()
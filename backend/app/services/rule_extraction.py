@@ -0,0 +1,256 @@
+"""
+卷宗封面规则提取
+格式固定的卷宗封面以“标签：值”形式列出涉案人员和案件要素（姓名、性别、民族、籍贯、入伍时间、
+案发时间、涉嫌罪名等），正文各部分以固定小标题开头（一、简要案情 …）。
+导入时先用预编译的正则提取这些字段，置信度足够且叙述类字段齐全时不再调用模型；
+否则只把可信的规则结果覆盖到模型结果上（模型不可用时仍可入库这些字段）
+"""
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.official_doc.builders.paragraph_classifier import LEVEL_1, classify_paragraph
+
+# 封面标签只在正文开头这一范围内查找，避免误取叙述中的“姓名：”等
+COVER_CHARS = 3000
+
+CASE_TYPES = ("刑事案件", "行政案件", "民事案件", "其他")
+PERSON_CATEGORIES = ("现役军人", "退役军人", "文职人员", "职工", "其他")
+
+# 封面字段 -> 标签（person_info 子字段以 person_info. 前缀表示；靠前的标签更具体，同一字段优先取）
+COVER_LABELS: Dict[str, Tuple[str, ...]] = {
+    "case_name": ("卷宗名称", "案卷名称", "卷宗名"),
+    "title": ("案卷标题",),
+    "case_type": ("案件类型", "案卷类型", "案件性质"),
+    "source_department": ("事发单位", "来源部门", "所在单位"),
+    "incident_time": ("案发时间", "发案时间", "事发时间", "发生时间"),
+    "person_name": ("涉案人员", "当事人", "姓名"),
+    "person_info.gender": ("性别",),
+    "person_info.ethnicity": ("民族",),
+    "person_info.birthplace": ("出生地", "籍贯"),
+    "person_info.enlistment_time": ("入伍时间", "入伍年月"),
+    "person_info.position": ("部职别", "职务"),
+    "person_info.person_category": ("人员类别",),
+    "charge": ("涉嫌罪名", "涉案罪名", "罪名", "案由"),
+    "suicide_method": ("自杀方式",),
+}
+
+# 叙述类字段 -> 小标题
+SECTION_LABELS: Dict[str, Tuple[str, ...]] = {
+    "incident_process": ("简要案情", "基本案情", "案件经过", "事发经过", "案情摘要"),
+    "investigation_process_and_conclusion": (
+        "侦查调查过程及结论", "调查过程及结论", "侦查调查情况", "调查经过及结论", "调查结论",
+    ),
+    "cause_and_lesson": ("原因教训", "原因及教训", "经验教训", "主要教训"),
+    "case_filing": ("立案情况",),
+    "judgment": ("判决情况", "判决结果", "处理结果", "处理情况"),
+}
+
+# 不调用模型所需的字段（罪名与自杀方式有一即可）
+REQUIRED_FIELDS = (
+    "person_name", "incident_time", "case_type",
+    "incident_process", "investigation_process_and_conclusion", "cause_and_lesson",
+)
+
+_SPACE = r"[ \t　]*"
+# 标签须位于行首或字段分隔符之后，避免把“承办人姓名”“承办人职务”当作“姓名”“职务”
+_FIELD_START = r"(?<![^\s,，;；|｜、.．)）\]】])"
+
+
+def _alternation(labels_by_field: Dict[str, Tuple[str, ...]]) -> Tuple[str, Dict[str, str]]:
+    """构建标签正则（长标签优先，标签字间允许空格，如“姓　名”），返回 (正则, 标签 -> 字段)"""
+    owner = {label: name for name, labels in labels_by_field.items() for label in labels}
+    labels = sorted(owner, key=len, reverse=True)
+    return "|".join(_SPACE.join(map(re.escape, label)) for label in labels), owner
+
+
+_COVER_ALT, _COVER_OWNER = _alternation(COVER_LABELS)
+_COVER_RE = re.compile(rf"{_FIELD_START}(?P<label>{_COVER_ALT}){_SPACE}[:：]")
+_COVER_RANK = {label: labels.index(label) for labels in COVER_LABELS.values() for label in labels}
+# 任意“标签：”（含未收录的“承办人姓名：”等），用于截断前一字段的值
+_ANY_LABEL_RE = re.compile(rf"{_FIELD_START}[\u4e00-\u9fff][^\s:：,，;；|｜]{{0,11}}{_SPACE}[:：]")
+
+_SECTION_ALT, _SECTION_OWNER = _alternation(SECTION_LABELS)
+_SECTION_RE = re.compile(
+    r"^\s*(?P<num>[一二三四五六七八九十]+[、.．]|[（(][一二三四五六七八九十]+[)）]|\d+[、.．])?\s*"
+    rf"(?P<open>[【\[])?(?P<label>{_SECTION_ALT})[】\]]?\s*(?P<colon>[:：])?\s*(?P<rest>.*)$"
+)
+
+_DATE_RE = re.compile(
+    r"(?P<y>\d{4})\s*[年./-]\s*(?P<m>\d{1,2})\s*(?:[月./-]\s*(?P<d>\d{1,2})\s*日?)?"
+    r"(?:\s*(?P<h>\d{1,2})\s*[时点:：]\s*(?P<mi>\d{1,2})?\s*分?)?"
+)
+_NAME_RE = re.compile("^[\u4e00-\u9fff·]{2,6}$")
+_TRAILING = " \t　,，;；。"
+
+
+def _compact(label: str) -> str:
+    return re.sub(r"\s", "", label)
+
+
+def _parse_date(value: str, with_time: bool) -> Tuple[str, float]:
+    """解析中文或数字日期，返回 (YYYY-MM-DD[ HH:mm], 置信度)；只有年月时入伍时间保留年月，案发时间补 01 日并降低置信度"""
+    m = _DATE_RE.search(value)
+    if not m:
+        return "", 0.0
+    year, month = int(m.group("y")), int(m.group("m"))
+    day = int(m.group("d")) if m.group("d") else None
+    try:
+        parsed = datetime(year, month, day or 1)
+    except ValueError:
+        return "", 0.0
+    if day is None:
+        # 入伍时间常只写到月，按原精度保留；案发时间只有年月时交给模型确认
+        return (parsed.strftime("%Y-%m"), 1.0) if not with_time else (parsed.strftime("%Y-%m-%d"), 0.5)
+    text = parsed.strftime("%Y-%m-%d")
+    if with_time and m.group("h"):
+        hour, minute = int(m.group("h")), int(m.group("mi") or 0)
+        if hour < 24 and minute < 60:
+            text += f" {hour:02d}:{minute:02d}"
+    return text, 1.0
+
+
+def _normalize(name: str, raw: str) -> Tuple[str, float]:
+    """按字段校验并规范化标签值，返回 (值, 置信度)；置信度 0 表示丢弃"""
+    value = raw.strip(_TRAILING)
+    if not value:
+        return "", 0.0
+    if name == "incident_time":
+        return _parse_date(value, with_time=True)
+    if name == "person_info.enlistment_time":
+        return _parse_date(value, with_time=False)
+    if name == "person_name":
+        if _NAME_RE.match(value):
+            return value, 1.0
+        return (value, 0.5) if len(value) <= 10 else ("", 0.0)
+    if name == "person_info.gender":
+        return (value[0], 1.0) if value[0] in "男女" and len(value) <= 2 else ("", 0.0)
+    if name == "person_info.ethnicity":
+        if len(value) > 6:
+            return "", 0.0
+        return (value if value.endswith("族") else value + "族"), 1.0
+    if name == "case_type":
+        for case_type in CASE_TYPES[:3]:
+            if value.startswith(case_type[:2]):
+                return case_type, 1.0
+        return value, 0.6
+    if name == "person_info.person_category":
+        return value, (1.0 if value in PERSON_CATEGORIES else 0.6)
+    limit = 100 if name in ("case_name", "title") else 50
+    return (value, 1.0) if len(value) <= limit else ("", 0.0)
+
+
+class RuleExtraction:
+    """一份卷宗的规则提取结果"""
+
+    def __init__(self, fields: Dict[str, Any], confidence: Dict[str, float], min_confidence: float):
+        # fields / confidence 以字段名为键，person_info 子字段为 person_info.<子字段>
+        self.fields = fields
+        self.confidence = confidence
+        self.min_confidence = min_confidence
+
+    def confident(self) -> Dict[str, Any]:
+        """置信度达到阈值的字段（person_info 子字段合并为 person_info 字典）"""
+        result: Dict[str, Any] = {}
+        for name, value in self.fields.items():
+            if self.confidence.get(name, 0.0) < self.min_confidence:
+                continue
+            if name.startswith("person_info."):
+                result.setdefault("person_info", {})[name.split(".", 1)[1]] = value
+            else:
+                result[name] = value
+        return result
+
+    @property
+    def complete(self) -> bool:
+        """规则结果是否足以不调用模型"""
+        confident = self.confident()
+        return all(confident.get(name) for name in REQUIRED_FIELDS) and bool(
+            confident.get("charge") or confident.get("suicide_method")
+        )
+
+
+class RuleFieldExtractor:
+    """卷宗封面与固定小标题的规则提取"""
+
+    def __init__(self, min_confidence: Optional[float] = None):
+        self.min_confidence = settings.RULE_EXTRACT_MIN_CONFIDENCE if min_confidence is None else min_confidence
+        self._stats = {"documents": 0, "matched": 0, "complete": 0}
+
+    def _cover_fields(self, text: str, fields: Dict[str, Any], confidence: Dict[str, float]) -> None:
+        lines = text[:COVER_CHARS].split("\n")
+        # 字段 -> 取值标签的次序；更具体的标签（如“当事人”）可覆盖先出现的“姓名”
+        ranks: Dict[str, int] = {}
+        for index, line in enumerate(lines):
+            stops = sorted(m.start() for m in _ANY_LABEL_RE.finditer(line))
+            for m in _COVER_RE.finditer(line):
+                label = _compact(m.group("label"))
+                name = _COVER_OWNER[label]
+                if ranks.get(name, len(COVER_LABELS[name])) <= _COVER_RANK[label]:
+                    continue
+                end = next((stop for stop in stops if stop >= m.end()), len(line))
+                raw = line[m.end():end]
+                if not raw.strip(_TRAILING) and end == len(line) and index + 1 < len(lines):
+                    # PDF 表格常把值排到下一行
+                    following = lines[index + 1]
+                    if not _ANY_LABEL_RE.search(following):
+                        raw = following
+                value, score = _normalize(name, raw)
+                if score > 0:
+                    fields[name], confidence[name] = value, score
+                    ranks[name] = _COVER_RANK[label]
+
+    def _section_fields(self, text: str, fields: Dict[str, Any], confidence: Dict[str, float]) -> None:
+        current: Optional[str] = None
+        parts: Dict[str, List[str]] = {}
+        for line in text.split("\n"):
+            stripped = line.strip()
+            m = _SECTION_RE.match(stripped) if stripped else None
+            # 标签须带序号、括号或冒号，或独占一行，避免把“原因教训深刻”之类的正文当作标题
+            if m and (m.group("num") or m.group("open") or m.group("colon") or not m.group("rest")):
+                name = _SECTION_OWNER[_compact(m.group("label"))]
+                current = None if name in parts else name
+                if current is not None:
+                    parts[current] = [m.group("rest")] if m.group("rest") else []
+                continue
+            if stripped and classify_paragraph(stripped)[0] == LEVEL_1:
+                current = None
+                continue
+            if current is not None and stripped:
+                parts[current].append(stripped)
+        for name, lines in parts.items():
+            content = "\n".join(lines).strip()
+            if content:
+                fields[name], confidence[name] = content, (1.0 if len(content) >= 10 else 0.5)
+
+    def extract(self, document_text: str) -> RuleExtraction:
+        """
+        提取封面标签字段和固定小标题下的叙述
+
+        Args:
+            document_text: 卷宗全文
+
+        Returns:
+            RuleExtraction（未识别到任何字段时 fields 为空）
+        """
+        fields: Dict[str, Any] = {}
+        confidence: Dict[str, float] = {}
+        text = document_text or ""
+        self._cover_fields(text, fields, confidence)
+        self._section_fields(text, fields, confidence)
+        extraction = RuleExtraction(fields, confidence, self.min_confidence)
+        self._stats["documents"] += 1
+        if extraction.confident():
+            self._stats["matched"] += 1
+        if extraction.complete:
+            self._stats["complete"] += 1
+        return extraction
+
+    def stats(self) -> Dict[str, int]:
+        """已处理卷宗数、识别到可信字段的卷宗数、无需调用模型的卷宗数"""
+        return dict(self._stats)
+
+
+# 创建全局实例
+rule_field_extractor = RuleFieldExtractor()
@@ -0,0 +1,243 @@
+"""
+模板注册表
+每个 DocTemplate 的 .docx 文件只解析一次，解析结果（占位符、样式、段落结构，以及含占位符部件的 XML 树）
+按 (模板ID, 版本号) 缓存在内存中；基于模板生成文档时只复制已解析的 XML 树并填充占位符，
+其余部件原样写回，不再重新读取和解析文件
+"""
+import copy
+import io
+import re
+import threading
+import time
+import zipfile
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+from docx import Document
+from docx.oxml.ns import qn
+from loguru import logger
+from lxml import etree
+
+from app.core.config import settings
+from app.services.official_doc.builders.paragraph_classifier import classify_paragraph
+
+# 模板占位符：{{字段名}}，与批量套打使用相同写法
+PLACEHOLDER_PATTERN = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+# 可能包含占位符的部件：正文、页眉、页脚
+_TEXT_PART_PATTERN = re.compile(r"^word/(document|header\d*|footer\d*)\.xml$")
+
+_W_P = qn("w:p")
+_W_T = qn("w:t")
+
+
+def resolve_template_path(file_path: str) -> Path:
+    """模板文件相对路径（/templates/xxx.docx）转为磁盘路径"""
+    return Path(settings.UPLOAD_DIR) / file_path.lstrip("/")
+
+
+def _iter_paragraph_texts(root) -> Iterator[Tuple[Any, List[Any], str]]:
+    """遍历 XML 中的段落，返回 (段落元素, 文本节点列表, 段落文字)"""
+    for p in root.iter(_W_P):
+        t_nodes = list(p.iter(_W_T))
+        if t_nodes:
+            yield p, t_nodes, "".join(t.text or "" for t in t_nodes)
+
+
+def fill_placeholders(root, values: Dict[str, Any]) -> int:
+    """
+    替换 XML 中的 {{字段名}} 占位符（原地修改）
+
+    占位符可能被 Word 拆分到多个 run 中，替换后的段落文字写入第一个文本节点，
+    保留第一个 run 的格式；未提供值的占位符保持原样
+
+    Args:
+        root: 部件 XML 根元素
+        values: 字段值
+
+    Returns:
+        替换的占位符数量
+    """
+    replaced = 0
+
+    def _replace(match: "re.Match") -> str:
+        nonlocal replaced
+        value = values.get(match.group(1))
+        if value is None:
+            return match.group(0)
+        replaced += 1
+        return str(value)
+
+    for _, t_nodes, text in _iter_paragraph_texts(root):
+        if "{{" not in text:
+            continue
+        new_text = PLACEHOLDER_PATTERN.sub(_replace, text)
+        if new_text == text:
+            continue
+        t_nodes[0].text = new_text
+        t_nodes[0].set(qn("xml:space"), "preserve")
+        for t in t_nodes[1:]:
+            t.text = ""
+    return replaced
+
+
+class ParsedTemplate:
+    """已解析的模板：占位符、样式、段落结构及可复制的部件 XML 树"""
+
+    def __init__(self, template_id: int, version: int, data: bytes):
+        start = time.perf_counter()
+        self.template_id = template_id
+        self.version = version
+        self.placeholders: List[str] = []
+        self.styles: Dict[str, Dict[str, Any]] = {}
+        self.sections: List[Dict[str, Any]] = []
+        self.tables = 0
+        # 原始部件（含压缩方式），渲染时除含占位符的部件外原样写回
+        self._entries: List[Tuple[zipfile.ZipInfo, bytes]] = []
+        # 含占位符的部件：部件名 -> 已解析的 XML 根元素
+        self._parts: Dict[str, Any] = {}
+        self._load_parts(data)
+        self._analyze(data)
+        self.parse_ms = round((time.perf_counter() - start) * 1000, 2)
+
+    def _load_parts(self, data: bytes) -> None:
+        """读取所有部件，解析并保留含占位符的正文/页眉/页脚"""
+        placeholders: Dict[str, None] = {}
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            for info in archive.infolist():
+                raw = archive.read(info)
+                self._entries.append((info, raw))
+                if not _TEXT_PART_PATTERN.match(info.filename) or b"{" not in raw:
+                    continue
+                root = etree.fromstring(raw)
+                found = False
+                for _, _, text in _iter_paragraph_texts(root):
+                    for name in PLACEHOLDER_PATTERN.findall(text):
+                        placeholders.setdefault(name, None)
+                        found = True
+                if found:
+                    self._parts[info.filename] = root
+        self.placeholders = list(placeholders)
+
+    def _analyze(self, data: bytes) -> None:
+        """提取使用到的样式与段落结构"""
+        document = Document(io.BytesIO(data))
+        self.tables = len(document.tables)
+        # 按样式 ID 缓存样式名（p.style 每次都会在样式表中查找）
+        style_names: Dict[Any, Any] = {}
+        for index, p in enumerate(document.paragraphs):
+            text = p.text
+            if not text.strip():
+                continue
+            style_id = p._p.style
+            if style_id not in style_names:
+                style = p.style
+                style_names[style_id] = style.name if style is not None else None
+                if style is not None and style.name not in self.styles:
+                    self.styles[style.name] = {
+                        "font": style.font.name,
+                        "size": style.font.size.pt if style.font.size else None,
+                        "bold": style.font.bold,
+                    }
+            level, _, _ = classify_paragraph(text)
+            self.sections.append({
+                "index": index,
+                "level": level,
+                "style": style_names[style_id],
+                "text": text[:50],
+                "placeholders": PLACEHOLDER_PATTERN.findall(text),
+            })
+
+    def render(self, values: Dict[str, Any]) -> bytes:
+        """
+        复制模板并填充占位符
+
+        Args:
+            values: 占位符取值
+
+        Returns:
+            docx 二进制数据
+        """
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            for info, raw in self._entries:
+                root = self._parts.get(info.filename)
+                if root is not None:
+                    root = copy.deepcopy(root)
+                    fill_placeholders(root, values)
+                    raw = etree.tostring(root, xml_declaration=True, encoding="UTF-8", standalone=True)
+                archive.writestr(info, raw)
+        return buffer.getvalue()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "templateId": self.template_id,
+            "version": self.version,
+            "placeholders": self.placeholders,
+            "styles": self.styles,
+            "sections": self.sections,
+            "tables": self.tables,
+            "parseMs": self.parse_ms,
+        }
+
+
+class TemplateRegistry:
+    """按 (模板ID, 版本号) 缓存已解析模板（LRU，线程安全）"""
+
+    def __init__(self, max_entries: int = settings.TEMPLATE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[int, int], ParsedTemplate]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    def get(self, template_id: int, version: int, file_path: str) -> ParsedTemplate:
+        """
+        获取已解析模板，未缓存时读取并解析文件（阻塞操作，异步代码中请放到线程中调用）
+
+        Args:
+            template_id: 模板ID
+            version: 模板版本号
+            file_path: 模板文件相对路径
+
+        Returns:
+            ParsedTemplate
+        """
+        key = (template_id, version or 1)
+        with self._lock:
+            parsed = self._entries.get(key)
+            if parsed is not None:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return parsed
+            self._stats["misses"] += 1
+
+        path = resolve_template_path(file_path)
+        if not path.is_file():
+            raise FileNotFoundError(f"模板文件不存在: {file_path}")
+        parsed = ParsedTemplate(template_id, key[1], path.read_bytes())
+        logger.info(f"解析模板 {template_id} v{key[1]}: {len(parsed.placeholders)} 个占位符, 耗时 {parsed.parse_ms}ms")
+
+        with self._lock:
+            self._entries[key] = parsed
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return parsed
+
+    def invalidate(self, template_id: int) -> None:
+        """模板文件更新或删除后移除该模板所有版本的缓存"""
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == template_id]
+            for key in keys:
+                del self._entries[key]
+            if keys:
+                self._stats["invalidations"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"size": len(self._entries), "maxEntries": self.max_entries, **self._stats}
+
+
+# 创建全局实例
+template_registry = TemplateRegistry()
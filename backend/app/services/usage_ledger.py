@@ -0,0 +1,319 @@
+"""
+大模型用量台账
+每次上游调用（含失败的调用）按当前上下文的用量标签（用户、接口、导入任务，见 usage_context）
+记录输入/输出 tokens、模型与耗时。调用在线程中执行，记录只写入内存缓冲，
+后台任务按间隔或缓冲条数批量写入 llm_usage 表，数据库不可用时保留在缓冲中下次重试。
+
+同时在内存中累计各用户当日 tokens，用于高峰时段的用户预算（启动时从数据库恢复当日用量；
+多进程部署时每个进程分别计数）
+"""
+import asyncio
+import threading
+from datetime import date, datetime, time as dt_time
+from typing import Any, Dict, List, Optional, Tuple
+
+from loguru import logger
+from sqlalchemy import case, func, insert, select
+
+from app.core.config import settings
+from app.core.database import BackgroundSessionLocal
+from app.core.usage_context import current_usage_tags
+from app.models.llm_usage import LlmUsage
+
+# 汇总维度 -> 分组列
+ROLLUP_DIMENSIONS = {
+    "user": LlmUsage.user_id,
+    "endpoint": LlmUsage.endpoint,
+    "model": LlmUsage.model,
+    "importTask": LlmUsage.import_task_id,
+    "day": func.date(LlmUsage.created_at),
+}
+
+
+def parse_peak_hours(spec: str) -> List[Tuple[int, int]]:
+    """解析高峰时段，如 "9-12,14-18" -> [(9, 12), (14, 18)]（左闭右开，按小时）"""
+    ranges: List[Tuple[int, int]] = []
+    for part in (spec or "").split(","):
+        start, _, end = part.strip().partition("-")
+        if start.strip().isdigit() and end.strip().isdigit():
+            ranges.append((int(start), int(end)))
+    return ranges
+
+
+def in_peak_hours(now: Optional[datetime] = None) -> bool:
+    """当前是否处于高峰时段（未配置时全天视为高峰）"""
+    ranges = parse_peak_hours(settings.LLM_BUDGET_PEAK_HOURS)
+    if not ranges:
+        return True
+    hour = (now or datetime.now()).hour
+    return any(start <= hour < end for start, end in ranges)
+
+
+class UsageLedger:
+    """用量台账：内存缓冲 + 后台批量写入 + 用户当日用量"""
+
+    def __init__(
+        self,
+        session_factory=None,
+        flush_interval: Optional[float] = None,
+        batch_size: Optional[int] = None,
+        max_pending: Optional[int] = None,
+    ):
+        self.session_factory = session_factory or BackgroundSessionLocal
+        self.flush_interval = settings.USAGE_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.batch_size = batch_size or settings.USAGE_BATCH_SIZE
+        self.max_pending = max_pending or settings.USAGE_MAX_PENDING
+        self._lock = threading.Lock()
+        self._pending: List[Dict[str, Any]] = []
+        self._day = date.today()
+        self._user_tokens: Dict[int, int] = {}
+        # 启动以来按接口、模型累计（供指标接口，不查库）
+        self._totals: Dict[str, Dict[str, Dict[str, int]]] = {"endpoint": {}, "model": {}}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # 后台任务中正在进行的写入（取消后台任务时不随之取消，停止时等待其完成）
+        self._flushing: Optional[asyncio.Future] = None
+        self._stats = {"recorded": 0, "written": 0, "dropped": 0, "flushes": 0, "budgetRejected": 0}
+
+    def _roll_day(self) -> None:
+        today = date.today()
+        if today != self._day:
+            self._day, self._user_tokens = today, {}
+
+    def record(
+        self,
+        model: str,
+        route: Optional[str],
+        usage: Optional[Dict[str, Any]],
+        latency: float,
+        success: bool,
+        stream: bool = False,
+        tags: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """
+        记录一次上游调用（线程安全，可在调用线程中直接调用）
+
+        Args:
+            model: 模型
+            route: 模型路由
+            usage: {"input_tokens", "output_tokens", "cached_tokens"}，失败时可为空
+            latency: 耗时（秒）
+            success: 是否成功
+            stream: 是否流式调用
+            tags: 用量标签，默认取当前上下文
+        """
+        tags = current_usage_tags() if tags is None else tags
+        usage = usage or {}
+        input_tokens = int(usage.get("input_tokens") or 0)
+        output_tokens = int(usage.get("output_tokens") or 0)
+        row = {
+            "user_id": tags.get("user_id"),
+            "username": tags.get("username"),
+            "endpoint": tags.get("endpoint"),
+            "import_task_id": tags.get("import_task_id"),
+            "route": route,
+            "model": model,
+            "stream": stream,
+            "success": success,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cached_tokens": int(usage.get("cached_tokens") or 0),
+            "latency_ms": int(latency * 1000),
+            "created_at": datetime.now(),
+        }
+        with self._lock:
+            self._roll_day()
+            if row["user_id"] is not None:
+                self._user_tokens[row["user_id"]] = (
+                    self._user_tokens.get(row["user_id"], 0) + input_tokens + output_tokens
+                )
+            for dimension, key in (("endpoint", row["endpoint"] or "-"), ("model", model)):
+                total = self._totals[dimension].setdefault(
+                    key, {"calls": 0, "failures": 0, "inputTokens": 0, "outputTokens": 0}
+                )
+                total["calls"] += 1
+                total["failures"] += 0 if success else 1
+                total["inputTokens"] += input_tokens
+                total["outputTokens"] += output_tokens
+            self._pending.append(row)
+            self._stats["recorded"] += 1
+            self._trim()
+            full = len(self._pending) >= self.batch_size
+        if full and self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._wake.set)
+            except RuntimeError:
+                pass
+
+    def _trim(self) -> None:
+        """缓冲超出上限时丢弃最早的记录（需持有锁）"""
+        overflow = len(self._pending) - self.max_pending
+        if overflow > 0:
+            del self._pending[:overflow]
+            self._stats["dropped"] += overflow
+
+    def user_tokens_today(self, user_id: int) -> int:
+        with self._lock:
+            self._roll_day()
+            return self._user_tokens.get(user_id, 0)
+
+    def check_budget(self, user_id: Optional[int] = None) -> Optional[str]:
+        """
+        检查用户当日预算
+
+        Args:
+            user_id: 用户 ID，默认取当前上下文
+
+        Returns:
+            超出预算时返回提示信息，否则 None
+        """
+        budget = settings.LLM_USER_DAILY_TOKEN_BUDGET
+        if user_id is None:
+            user_id = current_usage_tags().get("user_id")
+        if budget <= 0 or user_id is None or not in_peak_hours():
+            return None
+        if self.user_tokens_today(user_id) < budget:
+            return None
+        self._stats["budgetRejected"] += 1
+        return f"今日 AI 用量已达上限（{budget} tokens），请在非高峰时段再试"
+
+    async def flush(self) -> int:
+        """把缓冲中的记录批量写入数据库，返回写入条数；失败时放回缓冲"""
+        with self._lock:
+            rows, self._pending = self._pending, []
+        if not rows:
+            return 0
+        try:
+            async with self.session_factory() as session:
+                await session.execute(insert(LlmUsage), rows)
+                await session.commit()
+        except Exception as e:
+            logger.warning(f"[用量台账] 写入 {len(rows)} 条失败，稍后重试: {e}")
+            with self._lock:
+                self._pending = rows + self._pending
+                self._trim()
+            return 0
+        self._stats["written"] += len(rows)
+        self._stats["flushes"] += 1
+        return len(rows)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            self._flushing = asyncio.ensure_future(self.flush())
+            await asyncio.shield(self._flushing)
+
+    async def _restore(self) -> None:
+        """从数据库恢复各用户当日用量"""
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(LlmUsage.user_id, func.sum(LlmUsage.input_tokens + LlmUsage.output_tokens))
+                .where(LlmUsage.created_at >= datetime.combine(date.today(), dt_time.min))
+                .where(LlmUsage.user_id.isnot(None))
+                .group_by(LlmUsage.user_id)
+            )
+            rows = result.all()
+        with self._lock:
+            self._roll_day()
+            for user_id, tokens in rows:
+                self._user_tokens[user_id] = self._user_tokens.get(user_id, 0) + int(tokens or 0)
+
+    async def start(self) -> None:
+        """启动后台写入任务"""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        try:
+            await self._restore()
+        except Exception as e:
+            logger.warning(f"[用量台账] 恢复当日用量失败: {e}")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """停止后台任务并写入剩余记录"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # 已从缓冲取出的记录只在这次写入中，等待其写入（失败时已放回缓冲）
+        if self._flushing is not None:
+            await self._flushing
+            self._flushing = None
+        self._loop = None
+        await self.flush()
+
+    def stats(self) -> Dict[str, Any]:
+        """缓冲与写入计数、启动以来按接口与模型的累计用量"""
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                **self._stats,
+                "byEndpoint": {key: dict(value) for key, value in self._totals["endpoint"].items()},
+                "byModel": {key: dict(value) for key, value in self._totals["model"].items()},
+            }
+
+    @staticmethod
+    async def rollup(
+        db,
+        group_by: str,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        limit: int = 100,
+    ) -> List[Dict[str, Any]]:
+        """
+        按维度汇总用量（按总 tokens 倒序）
+
+        Args:
+            db: 数据库会话
+            group_by: user / endpoint / model / importTask / day
+            start: 开始时间（含）
+            end: 结束时间（含）
+            limit: 返回条数
+        """
+        column = ROLLUP_DIMENSIONS[group_by]
+        total_tokens = func.sum(LlmUsage.input_tokens + LlmUsage.output_tokens)
+        query = select(
+            column.label("key"),
+            func.max(LlmUsage.username).label("username"),
+            func.count(LlmUsage.id).label("calls"),
+            func.sum(case((LlmUsage.success.is_(False), 1), else_=0)).label("failures"),
+            func.sum(LlmUsage.input_tokens).label("input_tokens"),
+            func.sum(LlmUsage.output_tokens).label("output_tokens"),
+            func.sum(LlmUsage.cached_tokens).label("cached_tokens"),
+            total_tokens.label("total_tokens"),
+            func.avg(LlmUsage.latency_ms).label("avg_latency_ms"),
+        ).group_by(column).order_by(total_tokens.desc()).limit(limit)
+        if start is not None:
+            query = query.where(LlmUsage.created_at >= start)
+        if end is not None:
+            query = query.where(LlmUsage.created_at <= end)
+        result = await db.execute(query)
+        items = []
+        for row in result.all():
+            item = {
+                "key": str(row.key) if row.key is not None else None,
+                "calls": row.calls,
+                "failures": int(row.failures or 0),
+                "inputTokens": int(row.input_tokens or 0),
+                "outputTokens": int(row.output_tokens or 0),
+                "cachedTokens": int(row.cached_tokens or 0),
+                "totalTokens": int(row.total_tokens or 0),
+                "avgLatencyMs": round(float(row.avg_latency_ms or 0)),
+            }
+            if group_by == "user":
+                item["username"] = row.username
+            items.append(item)
+        return items
+
+
+# 创建全局实例
+usage_ledger = UsageLedger()
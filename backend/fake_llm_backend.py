@@ -0,0 +1,75 @@
+"""
+测试用模型后端：按预设状态码序列依次返回，记录调用次数与模型
+
+通过 QwenService(backend=FakeBackend(...)) 注入，不需要 API Key，也不替换 dashscope 模块
+"""
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.services.llm_backends import LLMBackend, LLMBackendError
+from app.services.qwen_service import RETRYABLE_STATUS
+
+
+class FakeBackend(LLMBackend):
+    """
+    模拟上游
+
+    Args:
+        content: 非流式调用返回的内容（流式未指定 chunks 时整段输出）
+        chunks: 流式输出的分片
+        statuses: 依次返回的状态码，用完后均为 200
+        delay: 非流式调用耗时（秒）
+        chunk_delay: 流式每片之间的间隔（秒）
+    """
+
+    name = "fake"
+
+    def __init__(
+        self,
+        content: str = "结果",
+        chunks: Optional[Iterable[str]] = None,
+        statuses: Iterable[int] = (),
+        delay: float = 0.0,
+        chunk_delay: float = 0.0,
+    ):
+        self.content = content
+        self.chunks = list(chunks) if chunks is not None else None
+        self.statuses = list(statuses)
+        self.delay = delay
+        self.chunk_delay = chunk_delay
+        self.calls = 0
+        self.models: List[str] = []
+        self._lock = threading.Lock()
+
+    def _begin(self, model: str) -> int:
+        with self._lock:
+            self.calls += 1
+            self.models.append(model)
+            return self.statuses.pop(0) if self.statuses else 200
+
+    def call(self, model, messages, temperature, max_tokens) -> Dict[str, Any]:
+        status = self._begin(model)
+        if self.delay:
+            time.sleep(self.delay)
+        if status != 200:
+            return {
+                "success": False,
+                "error": "Throttling" if status == 429 else "error",
+                "code": status,
+                "retryable": status in RETRYABLE_STATUS,
+            }
+        return {
+            "success": True,
+            "content": self.content,
+            "usage": {"input_tokens": 10, "output_tokens": 2, "total_tokens": 12},
+        }
+
+    def stream(self, model, messages, temperature, max_tokens, usage=None):
+        status = self._begin(model)
+        if status != 200:
+            raise LLMBackendError("Throttling" if status == 429 else "error", status)
+        for chunk in self.chunks if self.chunks is not None else [self.content]:
+            if self.chunk_delay:
+                time.sleep(self.chunk_delay)
+            yield chunk
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+公文组装性能基准：按公文类型统计 assemble_docx 吞吐
+
+对比骨架缓存关闭/开启两种情况（缓存开启时先预热一次），两种情况交替运行 repeat 次取最好成绩
+
+用法（在 backend 目录下）：
+    python scripts/bench_assemble_docx.py [--rounds 50] [--repeat 3] [--body-repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from loguru import logger
+
+from app.services.official_doc import official_doc_service
+from app.services.official_doc.builders.skeleton import docx_skeleton_cache
+from app.services.official_doc.structure_config import DocType
+
+MAIN_BODY = (
+    "我单位在近期工作中发现，战士张某某存在涉嫌盗窃同宿舍战友财物的行为。\n"
+    "一、简要情况\n"
+    "2026年1月24日22时30分许，我连发生一起宿舍财物失窃事件。经初步调查，张某某在案发时间段行为异常。\n"
+    "（一）案发经过：当晚熄灯后，失主发现柜内现金丢失，随即报告连值班员。\n"
+    "（二）初步调查：连队组织人员对宿舍进行了检查，并完成初步询问和证据固定。\n"
+    "1.调取了营区监控录像。\n"
+    "2.对同宿舍人员逐一进行了询问。\n"
+    "二、下一步工作\n"
+    "为依法依规办理此案，现拟对张某某涉嫌盗窃一案立案调查，并加强宿舍财物管理教育。"
+)
+
+
+def build_content(body_repeat: int) -> dict:
+    """构造各类公文通用的测试内容"""
+    body = "\n".join([MAIN_BODY] * body_repeat)
+    return {
+        "org_name": "中国人民解放军XX单位",
+        "title": "关于对张某某涉嫌盗窃一案立案调查的请示",
+        "doc_number": "〔2026〕保字第 001 号",
+        "recipient": "保卫处",
+        "main_body": body,
+        "requirements": "1.各单位要高度重视。\n2.按时上报情况。",
+        "attachment": "《案件线索登记表》",
+        "sender": "XX单位",
+        "date": "2026年1月20日",
+        "copies": ["军务科", "保卫科"],
+        "issuer": "XX单位办公室",
+        "issue_date": "2026年1月20日印发",
+        "meeting_info": "时间：2026年1月20日\n地点：会议室",
+        "topics": "一、研究案件办理事宜",
+        "discussion": body,
+        "decisions": "一、同意立案调查。",
+        "tasks": "1.保卫科负责调查取证。",
+    }
+
+
+def bench_doc_type(doc_type: str, content: dict, rounds: int) -> float:
+    """组装 rounds 篇指定类型公文，返回每秒篇数"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = official_doc_service.assemble_docx(doc_type, content)
+        official_doc_service._tasks.pop(result["task_id"], None)
+    return rounds / (time.perf_counter() - start)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="公文组装性能基准")
+    parser.add_argument("--rounds", type=int, default=50, help="每种公文组装篇数")
+    parser.add_argument("--repeat", type=int, default=3, help="交替重复次数（取最好成绩）")
+    parser.add_argument("--body-repeat", type=int, default=5, help="正文样例重复次数")
+    args = parser.parse_args()
+
+    logger.remove()
+    content = build_content(args.body_repeat)
+    print(f"正文长度 {len(content['main_body'])} 字，每种公文 {args.rounds} 篇")
+    print(f"{'公文类型':<18}{'无缓存(篇/秒)':>14}{'骨架缓存(篇/秒)':>16}{'加速比':>8}")
+
+    for doc_type in DocType:
+        base = cached = 0.0
+        for _ in range(args.repeat):
+            docx_skeleton_cache.enabled = False
+            docx_skeleton_cache.clear()
+            base = max(base, bench_doc_type(doc_type.value, content, args.rounds))
+
+            docx_skeleton_cache.enabled = True
+            bench_doc_type(doc_type.value, content, 1)  # 预热骨架缓存
+            cached = max(cached, bench_doc_type(doc_type.value, content, args.rounds))
+        print(f"{doc_type.value:<18}{base:>14.1f}{cached:>16.1f}{cached / base:>8.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+长公文分段审查基准：用按 token 数计时的模拟模型对比 整篇单次审查 与 分段并发流式审查 的
+首批问题到达时间和总耗时
+
+模拟模型耗时 = 首 token 延迟 + 输入 tokens / 预填充速度 + 输出 tokens / 解码速度，
+输出 token 数按输入的 1/10 估算（问题数量大致与篇幅成正比），单次输出上限 4000
+
+用法（在 backend 目录下）：
+    python scripts/bench_chunked_review.py [--pages 50] [--chars-per-page 600]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from loguru import logger
+
+from app.core.config import settings
+from app.services.content_review import ContentReviewer
+from app.services.prompt_registry import estimate_tokens, truncate_to_budget
+
+TTFT_S = 0.4
+PREFILL_TOKENS_PER_S = 20000
+DECODE_TOKENS_PER_S = 60
+MAX_OUTPUT_TOKENS = 4000
+
+
+def simulated_review(text: str, part=None) -> dict:
+    tokens = estimate_tokens(text)
+    time.sleep(TTFT_S + tokens / PREFILL_TOKENS_PER_S + min(MAX_OUTPUT_TOKENS, tokens // 10) / DECODE_TOKENS_PER_S)
+    return {"success": True, "issues": [{"type": "用词不当", "original": text[4:12], "suggestion": "略"}], "summary": ""}
+
+
+async def first_and_total(reviewer: ContentReviewer, text: str):
+    start = time.perf_counter()
+    first = None
+    async for chunk in reviewer.review_stream(text):
+        if first is None and b'"issues"' in chunk:
+            first = time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="长公文分段审查基准")
+    parser.add_argument("--pages", type=int, default=50, help="公文页数")
+    parser.add_argument("--chars-per-page", type=int, default=600, help="每页字数")
+    args = parser.parse_args()
+
+    logger.remove()
+    paragraph = "各单位要切实提高思想认识，严格落实保密管理各项规定，确保不发生失泄密问题。"
+    per_page = max(1, args.chars_per_page // len(paragraph))
+    text = "\n".join(paragraph for _ in range(args.pages * per_page))
+    tokens = estimate_tokens(text)
+
+    start = time.perf_counter()
+    simulated_review(truncate_to_budget(text, settings.PROMPT_REVIEW_TOKENS))
+    single_s = time.perf_counter() - start
+    coverage = min(1.0, settings.PROMPT_REVIEW_TOKENS / tokens)
+
+    reviewer = ContentReviewer(review_fn=simulated_review)
+    first_s, total_s = asyncio.run(first_and_total(reviewer, text))
+    windows = len(reviewer.plan(text))
+
+    print(f"公文 {args.pages} 页，约 {tokens} tokens")
+    print(f"整篇单次审查（截断到 {settings.PROMPT_REVIEW_TOKENS} tokens，覆盖 {coverage:.0%}）: 结果 {single_s:.2f}s 后一次返回")
+    print(f"分段并发审查 {windows} 部分（并发 {reviewer.concurrency}）: 首批问题 {first_s:.2f}s，全部完成 {total_s:.2f}s")
+    reviewer.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
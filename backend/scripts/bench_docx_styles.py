@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+公文命名样式基准：对比 引用命名样式 与 逐段逐 run 直接写入格式 两种方式的
+文件大小（docx 字节数、document.xml 字节数）与组装耗时
+
+直接格式方式由样式定义展开得到，版面效果与命名样式一致
+
+用法（在 backend 目录下）：
+    python scripts/bench_docx_styles.py [--rounds 20] [--body-repeat 5]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import zipfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from loguru import logger
+
+from app.services.official_doc.builders.styles import STYLE_BODY, STYLE_DEFINITIONS
+from app.services.official_doc.service import BUILDERS
+
+from bench_assemble_docx import build_content
+
+_DEFINITIONS = {definition["id"]: definition for definition in STYLE_DEFINITIONS}
+
+
+def resolve_style(style_id: str) -> dict:
+    """展开样式继承链，得到完整的字体与段落格式"""
+    definition = _DEFINITIONS[style_id]
+    resolved = resolve_style(definition["base"]) if definition.get("base") else {"paragraph": {}}
+    resolved = {**resolved, **{k: v for k, v in definition.items() if k != "paragraph"}}
+    resolved["paragraph"] = {**resolved["paragraph"], **definition.get("paragraph", {})}
+    return resolved
+
+
+class DirectFormattingMixin:
+    """把命名样式展开为段落、run 上的直接格式（旧写法）"""
+
+    def _add_styled_paragraph(self, text="", style=STYLE_BODY, char_style=None, keep_with_next=False):
+        spec = resolve_style(style)
+        p = self.doc.add_paragraph()
+        for attr, value in spec["paragraph"].items():
+            setattr(p.paragraph_format, attr, value)
+        if keep_with_next:
+            p.paragraph_format.keep_with_next = True
+        p.direct_spec = spec
+        if text:
+            self._add_styled_run(p, text, char_style)
+        return p
+
+    def _add_styled_run(self, p, text, char_style=None):
+        spec = p.direct_spec
+        font_name = _DEFINITIONS[char_style]["font"] if char_style else spec["font"]
+        run = p.add_run(text)
+        self._set_font(run, font_name, spec["size"], bold=spec.get("bold", False))
+        return run
+
+
+def render(builder_cls, content: dict) -> bytes:
+    """组装并保存为 docx 字节"""
+    buffer = io.BytesIO()
+    builder_cls().build(content).save(buffer)
+    return buffer.getvalue()
+
+
+def document_xml_size(data: bytes) -> int:
+    """docx 中 word/document.xml 的未压缩字节数"""
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        return archive.getinfo("word/document.xml").file_size
+
+
+def bench(builder_cls, content: dict, rounds: int) -> float:
+    """返回单篇平均组装耗时（毫秒）"""
+    render(builder_cls, content)  # 预热骨架缓存
+    start = time.perf_counter()
+    for _ in range(rounds):
+        render(builder_cls, content)
+    return (time.perf_counter() - start) * 1000 / rounds
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="公文命名样式基准")
+    parser.add_argument("--rounds", type=int, default=20, help="每种公文组装篇数")
+    parser.add_argument("--body-repeat", type=int, default=5, help="正文样例重复次数")
+    args = parser.parse_args()
+
+    logger.remove()
+    content = build_content(args.body_repeat)
+    print(f"正文长度 {len(content['main_body'])} 字，每种公文 {args.rounds} 篇")
+    print(f"{'公文类型':<18}{'document.xml 直接/样式':>24}{'docx 直接/样式':>20}{'耗时 直接/样式(ms)':>22}")
+
+    for doc_type, builder_cls in BUILDERS.items():
+        direct_cls = type(f"Direct{builder_cls.__name__}", (DirectFormattingMixin, builder_cls), {})
+        direct_data = render(direct_cls, content)
+        styled_data = render(builder_cls, content)
+        direct_ms = bench(direct_cls, content, args.rounds)
+        styled_ms = bench(builder_cls, content, args.rounds)
+        print(
+            f"{doc_type.value:<18}"
+            f"{document_xml_size(direct_data):>12}/{document_xml_size(styled_data):<11}"
+            f"{len(direct_data):>10}/{len(styled_data):<9}"
+            f"{direct_ms:>11.1f}/{styled_ms:<8.1f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
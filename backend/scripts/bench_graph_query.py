@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+知识图谱多跳查询压测：按案卷规模生成合成图谱（案件、人员、单位、罪名、分类），
+统计全量加载耗时、邻接表内存、以人员为起点的多跳查询延迟分位与增量加边耗时
+
+用法（在 backend 目录下）：
+    python scripts/bench_graph_query.py [--cases 50000] [--hops 5] [--queries 1000] [--max-nodes 500]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from loguru import logger
+
+from app.services.knowledge_graph import GraphIndex
+
+
+def build(cases: int, seed: int = 1):
+    """每个案件 1-3 名涉案人员、1 个事发单位、1 个罪名、1 个分类；人员属于某个单位，少数人员涉及多个案件"""
+    rng = random.Random(seed)
+    entities, relations = [], []
+    next_id = 1
+
+    def _add(entity_type, name):
+        nonlocal next_id
+        entities.append((next_id, entity_type, name, None))
+        next_id += 1
+        return next_id - 1
+
+    departments = [_add("department", f"单位{i}") for i in range(max(cases // 100, 10))]
+    laws = [_add("law", f"罪名{i}") for i in range(120)]
+    categories = [_add("category", f"分类{i}") for i in range(60)]
+    persons = []
+    for c in range(cases):
+        case = _add("case", f"案件{c}")
+        relations.append((case, rng.choice(departments), "occurred_in"))
+        relations.append((case, rng.choice(laws), "charged_with"))
+        relations.append((case, rng.choice(categories), "classified_as"))
+        for _ in range(rng.randint(1, 3)):
+            if persons and rng.random() < 0.15:
+                person = rng.choice(persons)
+            else:
+                person = _add("person", f"人员{len(persons)}")
+                persons.append(person)
+                relations.append((person, rng.choice(departments), "member_of"))
+            relations.append((person, case, "involved_in"))
+    return entities, relations, persons
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="知识图谱多跳查询压测")
+    parser.add_argument("--cases", type=int, default=50000)
+    parser.add_argument("--hops", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--max-nodes", type=int, default=500)
+    args = parser.parse_args()
+    logger.remove()
+
+    entities, relations, persons = build(args.cases)
+    index = GraphIndex()
+    start = time.perf_counter()
+    index.load(entities, relations)
+    load_time = time.perf_counter() - start
+    stats = index.stats()
+    print(f"图谱 {stats['entities']} 个实体、{stats['relations']} 条关系：加载 {load_time * 1000:.0f}ms，"
+          f"邻接表 {stats['memoryBytes'] / 1024 / 1024:.1f}MB")
+
+    rng = random.Random(2)
+    for relation_types in (None, ["involved_in", "related_person"]):
+        latencies, sizes = [], []
+        for _ in range(args.queries):
+            start = time.perf_counter()
+            result = index.neighborhood(rng.choice(persons), args.hops, relation_types, args.max_nodes)
+            latencies.append(time.perf_counter() - start)
+            sizes.append(len(result["nodes"]))
+        latencies.sort()
+        p95 = latencies[int(len(latencies) * 0.95)]
+        label = "不限关系" if relation_types is None else "仅涉案关系"
+        print(f"{args.hops} 跳（{label}，上限 {args.max_nodes}）{args.queries} 次：p50 {statistics.median(latencies) * 1000:.2f}ms，"
+              f"p95 {p95 * 1000:.2f}ms，平均返回 {statistics.mean(sizes):.0f} 个实体")
+
+    # 增量加边（人员之间的相关关系），含触发的重建
+    start = time.perf_counter()
+    added = sum(index.add_edge(rng.choice(persons), rng.choice(persons), "related_person") for _ in range(20000))
+    elapsed = time.perf_counter() - start
+    print(f"增量加边 {added} 条：{elapsed * 1000:.0f}ms（{elapsed / max(added, 1) * 1e6:.1f}µs/条），"
+          f"重建 {index.stats()['compactions']} 次")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+正文分级识别性能基准：对比旧的逐段多次 re.match + 逐字符扫描 与 预编译组合正则
+
+同时统计 _add_main_body 整体耗时（包含 python-docx 段落生成）
+
+用法（在 backend 目录下）：
+    python scripts/bench_main_body.py [--chars 20000] [--rounds 50]
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from loguru import logger
+
+from app.services.official_doc.builders.notice_builder import NoticeDocumentBuilder
+from app.services.official_doc.builders.paragraph_classifier import classify_paragraph
+from app.services.official_doc.builders.skeleton import docx_skeleton_cache
+
+from bench_assemble_docx import MAIN_BODY
+
+
+def legacy_classify(para_text: str):
+    """旧实现：每段多次编译匹配，命中后逐字符查找标题结束位置"""
+    level1_pattern = r'^[一二三四五六七八九十]+、'
+    level2_patterns = [r'^（[一二三四五六七八九十]+）', r'^\([一二三四五六七八九十]+\)']
+    other_patterns = [r'^\d+[.、]', r'^\d+）']
+
+    title_level = 0
+    stripped_text = para_text.strip()
+    if re.match(level1_pattern, stripped_text):
+        title_level = 1
+    else:
+        for pattern in level2_patterns:
+            if re.match(pattern, stripped_text):
+                title_level = 2
+                break
+        if title_level == 0:
+            for pattern in other_patterns:
+                if re.match(pattern, stripped_text):
+                    title_level = 3
+                    break
+    if title_level == 0:
+        return 0, "", para_text
+
+    title_end_pos = -1
+    for idx, char in enumerate(para_text):
+        if char in ['。', '：', '；', ':', ';']:
+            title_end_pos = idx + 1
+            break
+    if title_end_pos == -1:
+        title_end_pos = len(para_text)
+    title_part = para_text[:title_end_pos]
+    if len(title_part.strip()) > 20:
+        return 0, "", para_text
+    return title_level, title_part, para_text[title_end_pos:]
+
+
+def build_body(chars: int) -> str:
+    """重复样例正文直到达到指定字数"""
+    repeat = chars // len(MAIN_BODY) + 1
+    return "\n".join([MAIN_BODY] * repeat)
+
+
+def bench_classify(func, paragraphs, rounds: int) -> float:
+    """返回 rounds 轮分级识别总耗时（毫秒）"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for para in paragraphs:
+            func(para)
+    return (time.perf_counter() - start) * 1000
+
+
+def bench_main_body(body: str, rounds: int) -> float:
+    """返回单次 _add_main_body 平均耗时（毫秒）"""
+    total = 0.0
+    for _ in range(rounds):
+        builder = NoticeDocumentBuilder()
+        start = time.perf_counter()
+        builder._add_main_body(body)
+        total += time.perf_counter() - start
+    return total * 1000 / rounds
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="正文分级识别性能基准")
+    parser.add_argument("--chars", type=int, default=20000, help="正文字数")
+    parser.add_argument("--rounds", type=int, default=50, help="重复轮数")
+    args = parser.parse_args()
+
+    logger.remove()
+    docx_skeleton_cache.body_cache_size = 0  # 统计完整排版耗时，不使用正文缓存
+    body = build_body(args.chars)
+    paragraphs = [p for p in body.split("\n") if p.strip()]
+
+    # 两种实现结果必须一致
+    for para in paragraphs:
+        assert legacy_classify(para) == classify_paragraph(para), para
+
+    legacy_ms = bench_classify(legacy_classify, paragraphs, args.rounds)
+    compiled_ms = bench_classify(classify_paragraph, paragraphs, args.rounds)
+    print(f"正文 {len(body)} 字，{len(paragraphs)} 段，{args.rounds} 轮")
+    print(f"分级识别  旧实现 {legacy_ms / args.rounds:8.2f} ms/篇  "
+          f"组合正则 {compiled_ms / args.rounds:8.2f} ms/篇  加速比 {legacy_ms / compiled_ms:.2f}x")
+    print(f"_add_main_body 整体 {bench_main_body(body, max(1, args.rounds // 10)):.1f} ms/篇")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+离线压测：用本地模拟后端（或回放录制）驱动 案卷字段提取 与 流式生成，统计吞吐与延迟分位
+
+模型耗时由 LLM_SYNTHETIC_* 参数模拟（首 token 延迟 + 输出速率），重试、熔断、自适应并发、
+模型路由与相同请求合并都按线上路径执行，可在无外网环境下发现吞吐回退
+
+用法（在 backend 目录下）：
+    python scripts/bench_offline_pipeline.py [--requests 32] [--first-token-ms 300] [--tokens-per-second 400]
+    python scripts/bench_offline_pipeline.py --backend replay   # 回放 LLM_CASSETTE_DIR 中的录制
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from loguru import logger
+
+from app.core.config import settings
+from app.services.case_extraction import CaseFieldExtractor
+from app.services.llm_backends import CassetteStore, ReplayBackend, StubBackend, SyntheticLatency
+from app.services.qwen_service import QwenService
+
+
+def _percentiles(samples):
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return statistics.median(ordered), p95
+
+
+async def bench_extract(service: QwenService, count: int):
+    """并发导入 count 份卷宗（正文各不相同，不触发相同请求合并）"""
+    extractor = CaseFieldExtractor(extract_fn=service.extract_case_fields, stream_fn=service.iter_case_fields)
+    latencies = []
+
+    async def _one(index: int):
+        start = time.perf_counter()
+        async for event in extractor.extract_stream(f"卷宗 {index}：当事人于某日在营区外违规使用手机。"):
+            if "result" in event:
+                assert event["result"]["success"], event["result"]
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(_one(i) for i in range(count)))
+    elapsed = time.perf_counter() - start
+    extractor.shutdown()
+    return elapsed, latencies
+
+
+async def bench_stream(service: QwenService, count: int):
+    """并发流式生成 count 篇公文（主题各不相同），统计首帧延迟与总耗时"""
+    first_frames, latencies = [], []
+    total_bytes = 0
+
+    async def _one(index: int):
+        nonlocal total_bytes
+        start = time.perf_counter()
+        first = None
+        context = {"formData": {"subject": f"第 {index} 批次物资采购"}}
+        async for frame in service.generate_document_stream("请示", context):
+            if first is None:
+                first = time.perf_counter() - start
+            total_bytes += len(frame)
+        first_frames.append(first)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(_one(i) for i in range(count)))
+    return time.perf_counter() - start, first_frames, latencies, total_bytes
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="离线压测（模拟后端 / 回放）")
+    parser.add_argument("--backend", choices=("stub", "replay"), default="stub")
+    parser.add_argument("--requests", type=int, default=32, help="每项并发请求数")
+    parser.add_argument("--first-token-ms", type=float, default=300)
+    parser.add_argument("--tokens-per-second", type=float, default=400)
+    parser.add_argument("--output-tokens", type=int, default=200, help="模拟输出长度")
+    args = parser.parse_args()
+
+    logger.remove()
+    latency = SyntheticLatency(args.first_token_ms, args.tokens_per_second)
+    if args.backend == "replay":
+        backend = ReplayBackend(CassetteStore(), latency, fallback=StubBackend(latency, args.output_tokens))
+    else:
+        backend = StubBackend(latency, args.output_tokens)
+    service = QwenService(backend=backend)
+
+    print(f"后端 {args.backend}：首 token {args.first_token_ms:.0f}ms，{args.tokens_per_second:.0f} tokens/s，"
+          f"并发上限 {settings.QWEN_MAX_CONCURRENCY}，流式线程 {settings.QWEN_STREAM_WORKERS}")
+    elapsed, latencies = asyncio.run(bench_extract(service, args.requests))
+    p50, p95 = _percentiles(latencies)
+    print(f"字段提取 {args.requests} 份：{elapsed:.2f}s，{args.requests / elapsed:.1f} 份/s，p50 {p50:.2f}s，p95 {p95:.2f}s")
+
+    elapsed, first_frames, latencies, total_bytes = asyncio.run(bench_stream(service, args.requests))
+    f50, f95 = _percentiles(first_frames)
+    p50, p95 = _percentiles(latencies)
+    print(f"流式生成 {args.requests} 篇：{elapsed:.2f}s，{args.requests / elapsed:.1f} 篇/s，"
+          f"首帧 p50 {f50:.2f}s / p95 {f95:.2f}s，总耗时 p50 {p50:.2f}s / p95 {p95:.2f}s，共 {total_bytes / 1024:.0f}KB")
+    print(f"后端统计: {backend.stats()}")
+    service.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+提示词 token 基准：对比按预算压缩前后各类提示词的输入 token 数（估算值），
+以及不同文书类型系统提示词可复用的公共前缀长度
+
+用法（在 backend 目录下）：
+    python scripts/bench_prompt_tokens.py [--related-cases 200] [--transcript-chars 40000]
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.prompt_registry import estimate_tokens
+from app.services.qwen_service import qwen_service
+
+
+def legacy_user_prompt(doc_type: str, context: dict) -> str:
+    """旧写法：关联案件全部列出、会议转写稿全文嵌入"""
+    parts = [f"请生成一份{doc_type}，具体要求如下：\n"]
+    for case in context.get("relatedCases", []):
+        parts.append(f"- {case.get('caseNo', '')}：{case.get('caseName', '')}\n")
+    parts.append(context.get("meetingTranscript", ""))
+    return "".join(parts)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="提示词 token 基准")
+    parser.add_argument("--related-cases", type=int, default=200, help="关联案件数")
+    parser.add_argument("--transcript-chars", type=int, default=40000, help="会议转写稿字数")
+    args = parser.parse_args()
+
+    cases = [{"caseNo": f"BW-2025-{i:04d}", "caseName": "某单位人员违规使用智能手机泄密案"} for i in range(args.related_cases)]
+    transcript = ("主持人：下面讨论营区安全检查工作，请各单位汇报。" * (args.transcript_chars // 24 + 1))[:args.transcript_chars]
+    scenarios = [
+        ("立案报告", {"caseInfo": {"personName": "张某"}, "relatedCases": cases}),
+        ("会议纪要", {"meetingTranscript": transcript}),
+    ]
+
+    print(f"{'文书类型':<10}{'旧写法 tokens':>16}{'按预算 tokens':>16}")
+    for doc_type, context in scenarios:
+        before = estimate_tokens(legacy_user_prompt(doc_type, context))
+        after = estimate_tokens(qwen_service._build_user_prompt(doc_type, context))
+        print(f"{doc_type:<10}{before:>16}{after:>16}")
+
+    prompts = [qwen_service._build_system_prompt(doc_type) for doc_type in ("立案报告", "通知", "会议纪要")]
+    prefix = os.path.commonprefix(prompts)
+    print(f"系统提示词 {estimate_tokens(prompts[0])} tokens，其中跨文书类型公共前缀 {estimate_tokens(prefix)} tokens")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+序列化性能基准：标准 JSONResponse 与 orjson 响应类对比
+
+- 列表接口：100 条/页，每条带大段 OCR 文本与匹配片段
+- SSE：逐分片编码小消息帧
+
+用法（在 backend 目录下）：
+    python scripts/bench_serialization.py [--pages 200] [--text-size 8000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fastapi.responses import JSONResponse
+
+from app.core.serialization import FastJSONResponse, sse_frame
+
+
+def build_page(page_size: int, text_size: int) -> dict:
+    """构造一页与案卷列表/检索接口结构一致的数据"""
+    base = "经查，该单位保卫科于夜间巡查时发现仓库门锁被撬，现场遗留作案工具若干。"
+    text = (base * (text_size // len(base) + 1))[:text_size]
+    now = datetime.now().isoformat()
+    items = []
+    for i in range(page_size):
+        items.append({
+            "id": i + 1,
+            "caseNo": f"AJ{20260000 + i}",
+            "caseName": f"某单位仓库被盗案（{i}）",
+            "title": "关于某单位仓库被盗案件的调查报告",
+            "caseType": "盗窃案",
+            "sourceDepartment": "保卫处",
+            "incidentTime": now,
+            "personName": "张某",
+            "status": "completed",
+            "createdAt": now,
+            "updatedAt": now,
+            "fileSize": 102400 + i,
+            "fileType": "pdf",
+            "tags": ["盗窃", "仓库", "夜间"],
+            "fragments": [text[:80], text[100:180], text[200:280]],
+            "ocrText": text,
+        })
+    return {
+        "errorCode": 0,
+        "message": "success",
+        "data": items,
+        "page": {"total": 10000, "page": 1, "pageSize": page_size},
+    }
+
+
+def bench(label: str, func, rounds: int) -> float:
+    """执行 rounds 次并返回每秒次数"""
+    func()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    elapsed = time.perf_counter() - start
+    rate = rounds / elapsed
+    print(f"{label:<32} {elapsed * 1000:>9.1f} ms  {rate:>10.1f} 次/秒")
+    return rate
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="序列化性能基准")
+    parser.add_argument("--pages", type=int, default=200, help="列表页序列化次数")
+    parser.add_argument("--page-size", type=int, default=100, help="每页条数")
+    parser.add_argument("--text-size", type=int, default=8000, help="每条 OCR 文本字数")
+    parser.add_argument("--frames", type=int, default=100000, help="SSE 帧编码次数")
+    args = parser.parse_args()
+
+    page = build_page(args.page_size, args.text_size)
+    body_size = len(FastJSONResponse(page).body)
+    print(f"列表页：{args.page_size} 条/页，单条文本 {args.text_size} 字，响应体 {body_size / 1024:.1f} KB")
+
+    base = bench("JSONResponse (json)", lambda: JSONResponse(page).body, args.pages)
+    fast = bench("FastJSONResponse (orjson)", lambda: FastJSONResponse(page).body, args.pages)
+    print(f"列表页加速比: {fast / base:.2f}x\n")
+
+    chunk = {"content": "根据《保卫工作条例》"}
+    print(f"SSE 帧：{args.frames} 个小分片")
+    base = bench(
+        "f-string + json.dumps",
+        lambda: f"data: {json.dumps(chunk)}\n\n".encode("utf-8"),
+        args.frames,
+    )
+    fast = bench("sse_frame (orjson bytes)", lambda: sse_frame(chunk), args.frames)
+    print(f"SSE 帧加速比: {fast / base:.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+测试长卷宗分段提取（切分、并发提取、字段合并与冲突处理）
+"""
+import sys
+import os
+import asyncio
+
+# 添加项目路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+
+from app.services.case_extraction import CaseFieldExtractor, merge_field_sets, split_into_chunks
+from app.services.prompt_registry import estimate_tokens
+
+
+def test_split_into_chunks():
+    """测试按段落切分"""
+    print("=" * 60)
+    print("测试: 卷宗切分")
+    print("=" * 60)
+    assert split_into_chunks("短卷宗", 100) == ["短卷宗"]
+    text = "\n".join(["一、基本情况"] + ["案情描述" * 10] * 20 + ["二、调查情况"] + ["调查经过" * 10] * 30)
+    chunks = split_into_chunks(text, 500)
+    print(f"  {estimate_tokens(text)} tokens -> {len(chunks)} 段")
+    assert all(estimate_tokens(chunk) <= 500 for chunk in chunks)
+    assert "\n".join(chunks) == text
+    # 达到预算一半后在一级标题处分段
+    assert any(chunk.startswith("二、调查情况") for chunk in chunks)
+    # 超长单段硬切分
+    assert len(split_into_chunks("字" * 1000, 300)) == 4
+    print("✓ 卷宗切分测试通过\n")
+
+
+def test_merge_field_sets():
+    """测试字段合并与冲突"""
+    print("=" * 60)
+    print("测试: 字段合并")
+    print("=" * 60)
+    parts = [
+        {"person_name": "张三", "incident_time": "2024-03-01", "incident_process": "3月1日发案。",
+         "person_info": {"gender": "男"}, "timeline": [{"time": "2024-03-01", "event": "发案", "type": "incident"}]},
+        {"person_name": "张三", "incident_time": "2024-03-01 21:30", "judgment": "判处有期徒刑一年。",
+         "incident_process": "3月1日发案。", "timeline": [{"time": "2024-05-10", "event": "判决", "type": "judgment"}]},
+        {"person_name": "张山", "person_info": {"gender": "男", "position": "班长"},
+         "timeline": [{"time": "2024-03-01", "event": "发案", "description": "营区内发案"}]},
+    ]
+    fields, conflicts = merge_field_sets(parts)
+    assert fields["person_name"] == "张三" and conflicts["person_name"] == ["张三", "张山"]
+    assert fields["incident_time"] == "2024-03-01 21:30" and "incident_time" not in conflicts
+    assert fields["incident_process"] == "3月1日发案。"
+    assert fields["judgment"] == "判处有期徒刑一年。"
+    assert fields["person_info"] == {"gender": "男", "position": "班长"}
+    assert [item["event"] for item in fields["timeline"]] == ["发案", "判决"]
+    assert fields["timeline"][0]["description"] == "营区内发案" and fields["timeline"][1]["typeLabel"] == "判决"
+    print("✓ 字段合并测试通过\n")
+
+
+def test_chunked_extract():
+    """测试分段并发提取"""
+    print("=" * 60)
+    print("测试: 分段并发提取")
+    print("=" * 60)
+    calls = []
+
+    def fake_extract(text, part=None):
+        calls.append(part)
+        if part and part[0] == 2:
+            return {"success": False, "error": "超时"}
+        return {"success": True, "fields": {"person_name": "张三", "incident_process": text[:8]}}
+
+    extractor = CaseFieldExtractor(extract_fn=fake_extract, chunk_tokens=200, concurrency=2)
+    result = asyncio.run(extractor.extract("\n".join(f"第{i}页" + "内容" * 40 for i in range(10))))
+    print(f"  分段 {result['chunks']}，失败 {result['failedChunks']}")
+    assert result["success"] and result["chunks"] == len(calls) > 2
+    assert result["failedChunks"] == [2]
+    assert result["fields"]["person_name"] == "张三"
+
+    calls.clear()
+    result = asyncio.run(extractor.extract("短卷宗"))
+    assert calls == [None] and "chunks" not in result
+    print("✓ 分段并发提取测试通过\n")
+
+
+def main():
+    """运行所有测试"""
+    try:
+        test_split_into_chunks()
+        test_merge_field_sets()
+        test_chunked_extract()
+        print("所有测试通过! ✓")
+        return 0
+    except Exception as e:
+        print(f"\n✗ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+测试长公文分段审查（窗口划分与重叠、问题去重排序、按原文顺序流式输出）
+"""
+import sys
+import os
+import json
+import asyncio
+import re
+
+# 添加项目路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+
+from app.services.content_review import ContentReviewer, split_into_windows
+
+
+def test_split_into_windows():
+    """测试窗口划分"""
+    print("=" * 60)
+    print("测试: 审查窗口划分")
+    print("=" * 60)
+    paragraphs = [f"第{i}段" + "内容" * 20 for i in range(30)]
+    windows = split_into_windows(paragraphs, 200, 2)
+    print(f"  30 段 -> {len(windows)} 个窗口")
+    assert windows[0].start == 0 and windows[-1].end == 30
+    for prev, cur in zip(windows, windows[1:]):
+        assert cur.start == prev.end - 2
+    assert windows[1].text.startswith(f"[{windows[1].start + 1}] ")
+    assert windows[1].offset == sum(len(p) + 1 for p in paragraphs[:windows[1].start])
+    assert windows[1].limit == sum(len(p) + 1 for p in paragraphs[:windows[1].end]) - 1
+    # 重叠段数不小于窗口段数时仍能前进
+    assert len(split_into_windows(["长" * 300] * 3, 100, 2)) == 3
+    print("✓ 审查窗口划分测试通过\n")
+
+
+def _fake_review(text, part=None):
+    """每个窗口把含“的的”的段落报告为错别字"""
+    issues = []
+    for line in text.split("\n"):
+        match = re.match(r"\[(\d+)\] (.*)", line)
+        if match and "的的" in match.group(2):
+            issues.append({"type": "错别字", "location": f"第{match.group(1)}段",
+                           "original": match.group(2)[:12], "suggestion": "删去重复的“的”"})
+    if part and part[0] == 2:
+        import time
+        time.sleep(0.05)  # 第二个窗口较慢，输出仍按原文顺序
+    return {"success": True, "issues": list(reversed(issues)), "summary": ""}
+
+
+def _document() -> str:
+    return "\n".join(
+        (f"第{i}段存在的的重复" if i % 7 == 3 else f"第{i}段") + "正文内容" * 15 for i in range(40)
+    )
+
+
+def test_review():
+    """测试分段审查合并"""
+    print("=" * 60)
+    print("测试: 分段审查合并")
+    print("=" * 60)
+    reviewer = ContentReviewer(review_fn=_fake_review, window_tokens=300, overlap=2, concurrency=4)
+    result = asyncio.run(reviewer.review(_document()))
+    positions = [issue["position"] for issue in result["issues"]]
+    print(f"  {result['windows']} 个窗口，{len(result['issues'])} 处问题")
+    assert result["windows"] > 2
+    # 重叠段落中的问题只保留一次，且按原文顺序
+    assert len(result["issues"]) == len([i for i in range(40) if i % 7 == 3])
+    assert positions == sorted(positions)
+    assert "共发现" in result["summary"]
+    print("✓ 分段审查合并测试通过\n")
+
+
+def test_repeated_snippet():
+    """测试同一窗口内多次出现的相同原文片段分别定位，不被当作重复问题去掉"""
+    print("=" * 60)
+    print("测试: 相同片段多次出现")
+    print("=" * 60)
+
+    def review(text, part=None):
+        issues = [
+            {"type": "错别字", "original": "按排", "suggestion": "安排"}
+            for line in text.split("\n") for _ in re.finditer("按排", line)
+        ]
+        return {"success": True, "issues": issues, "summary": ""}
+
+    document = "\n".join(
+        f"第{i}段" + "正文内容" * 15 + ("工作按排" if i % 4 == 1 else "") + ("，另行按排" if i == 5 else "")
+        for i in range(30)
+    )
+    reviewer = ContentReviewer(review_fn=review, window_tokens=300, overlap=2, concurrency=4)
+    result = asyncio.run(reviewer.review(document))
+    positions = [issue["position"] for issue in result["issues"]]
+    expected = [m.start() for m in re.finditer("按排", document)]
+    print(f"  {result['windows']} 个窗口，{len(positions)} 处问题")
+    assert result["windows"] > 2 and positions == expected, (positions, expected)
+    print("✓ 相同片段多次出现测试通过\n")
+
+
+async def _collect_stream(reviewer, text):
+    frames = []
+    async for chunk in reviewer.review_stream(text):
+        frames.append(json.loads(chunk[len("data: "):].strip()))
+    return frames
+
+
+def test_review_stream():
+    """测试按窗口顺序流式输出"""
+    print("=" * 60)
+    print("测试: 分段流式审查")
+    print("=" * 60)
+    reviewer = ContentReviewer(review_fn=_fake_review, window_tokens=300, overlap=2, concurrency=4)
+    frames = asyncio.run(_collect_stream(reviewer, _document()))
+    window_frames = [f for f in frames if "window" in f]
+    assert [f["window"] for f in window_frames] == list(range(1, frames[0]["windows"] + 1))
+    content = "".join(f.get("content", "") for f in frames)
+    assert content.index("## 问题与修改建议") < content.index("### 1. 错别字") < content.index("## 总体评价")
+    assert frames[-1] == {"done": True}
+    print("✓ 分段流式审查测试通过\n")
+
+
+def main():
+    """运行所有测试"""
+    try:
+        test_split_into_windows()
+        test_review()
+        test_repeated_snippet()
+        test_review_stream()
+        print("所有测试通过! ✓")
+        return 0
+    except Exception as e:
+        print(f"\n✗ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
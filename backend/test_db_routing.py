@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+测试读写路由（只读副本、读己之写、副本延迟回退）
+使用两个本地 SQLite 数据库分别模拟主库与只读副本
+"""
+import sys
+import os
+import asyncio
+import tempfile
+import time
+
+# 添加项目路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+
+from sqlalchemy import column, insert, table, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from app.core.database import ReadRouter, probe_replica_lag
+
+
+async def _setup(path: str, value: str):
+    """创建数据库并写入一行标识数据"""
+    eng = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with eng.begin() as conn:
+        await conn.execute(text("CREATE TABLE node (name TEXT)"))
+        await conn.execute(text("INSERT INTO node (name) VALUES (:v)"), {"v": value})
+    return eng, async_sessionmaker(eng, class_=AsyncSession, expire_on_commit=False)
+
+
+async def _read_node(router: ReadRouter, key=None) -> str:
+    factory = await router.choose(key)
+    async with factory() as db:
+        return (await db.execute(text("SELECT name FROM node"))).scalar()
+
+
+async def _run_routing():
+    tmp = tempfile.mkdtemp()
+    primary_eng, primary = await _setup(os.path.join(tmp, "primary.db"), "primary")
+    replica_eng, replica = await _setup(os.path.join(tmp, "replica.db"), "replica")
+    try:
+        # 未配置副本：全部走主库
+        router = ReadRouter(primary)
+        assert await _read_node(router, "u1") == "primary"
+
+        # 副本正常：读请求走副本
+        router = ReadRouter(
+            primary, replica,
+            lag_probe=lambda: probe_replica_lag(replica_eng),
+            sticky_seconds=0.2, lag_check_seconds=0,
+        )
+        assert await _read_node(router, "u1") == "replica"
+
+        # 写后窗口内走主库，其他客户端不受影响；窗口过后回到副本
+        router.mark_write("u1")
+        assert await _read_node(router, "u1") == "primary"
+        assert await _read_node(router, "u2") == "replica"
+        time.sleep(0.25)
+        assert await _read_node(router, "u1") == "replica"
+
+        # 副本延迟超过阈值：回退主库
+        async def lagging():
+            return 30.0
+        router = ReadRouter(primary, replica, lag_probe=lagging, max_lag_seconds=5, lag_check_seconds=0)
+        assert await _read_node(router) == "primary"
+
+        # 延迟检测失败：视为副本不可用
+        async def broken():
+            raise RuntimeError("replica down")
+        router = ReadRouter(primary, replica, lag_probe=broken, lag_check_seconds=0)
+        assert await _read_node(router) == "primary"
+        stats = router.stats()
+        assert stats["lagFallback"] == 1 and stats["replicaLagSeconds"] is None
+
+        # 会话写操作会被记录（只读查询不记录），请求结束后该客户端的读请求走主库
+        router = ReadRouter(primary, replica, lag_probe=lambda: probe_replica_lag(replica_eng), lag_check_seconds=0)
+        async with primary() as db:
+            await db.execute(text("SELECT 1"))
+            assert not db.sync_session.info.get("has_writes")
+            await db.execute(insert(table("node", column("name"))).values(name="u3"))
+            await db.commit()
+            assert db.sync_session.info.get("has_writes")
+            # 与 get_db 相同：会话有写操作时标记该客户端
+            if db.sync_session.info.get("has_writes"):
+                router.mark_write("u3")
+        assert await _read_node(router, "u3") == "primary"
+        assert await _read_node(router, "u2") == "replica"
+    finally:
+        await primary_eng.dispose()
+        await replica_eng.dispose()
+
+
+def test_read_routing():
+    """测试读请求路由"""
+    print("=" * 60)
+    print("测试: 只读副本路由 / 读己之写 / 延迟回退")
+    print("=" * 60)
+    asyncio.run(_run_routing())
+    print("✓ 读写路由测试通过\n")
+
+
+def main():
+    """运行所有测试"""
+    try:
+        test_read_routing()
+        print("所有测试通过! ✓")
+        return 0
+    except Exception as e:
+        print(f"\n✗ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
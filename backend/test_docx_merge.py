@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+测试批量套打（公共内容 + 每份字段覆盖，ZIP 流式输出）
+"""
+import sys
+import os
+import io
+import json
+import asyncio
+import zipfile
+from datetime import timedelta
+
+# 添加项目路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+
+from docx import Document
+
+from app.services.official_doc import official_doc_service
+from app.services.official_doc.service import OfficialDocService, merge_content
+
+
+def test_merge_content():
+    """测试字段覆盖与占位符替换"""
+    print("=" * 60)
+    print("测试: 套打字段合并")
+    print("=" * 60)
+    base = {"recipient": "各单位", "main_body": "请{{recipient}}于{{deadline}}前上报。", "copies": ["保卫科"]}
+    merged = merge_content(base, {"recipient": "一营", "deadline": "1月30日"})
+    assert merged["recipient"] == "一营"
+    assert merged["main_body"] == "请一营于1月30日前上报。"
+    assert merged["copies"] == ["保卫科"]
+
+    # 未提供的占位符保持原样
+    merged = merge_content(base, {"recipient": "二营"})
+    assert merged["main_body"] == "请二营于{{deadline}}前上报。"
+    print("✓ 字段合并测试通过\n")
+
+
+async def _collect_zip(content, overrides) -> bytes:
+    data = b""
+    async for chunk in official_doc_service.stream_merge_zip("notice", content, overrides):
+        data += chunk
+    return data
+
+
+def test_stream_merge_zip():
+    """测试批量套打 ZIP 输出"""
+    print("=" * 60)
+    print("测试: 批量套打 ZIP")
+    print("=" * 60)
+    content = {
+        "title": "关于开展安全检查的通知",
+        "main_body": "一、检查范围：营区各部位。\n二、检查要求：按时完成。",
+        "sender": "XX单位",
+        "date": "2026年1月20日",
+    }
+    overrides = [{"recipient": f"第{i}营"} for i in range(1, 6)]
+    data = asyncio.run(_collect_zip(content, overrides))
+
+    archive = zipfile.ZipFile(io.BytesIO(data))
+    names = archive.namelist()
+    print(f"  ZIP 文件: {names}")
+    assert len(names) == len(overrides) + 1 and names[-1] == "manifest.json"
+
+    manifest = json.loads(archive.read("manifest.json"))
+    assert manifest["metrics"]["succeeded"] == len(overrides)
+    for item in manifest["items"]:
+        doc = Document(io.BytesIO(archive.read(item["file"])))
+        texts = [p.text for p in doc.paragraphs]
+        assert f"第{item['index'] + 1}营：" in texts
+        assert "二、检查要求：按时完成。" in texts
+    print("✓ 批量套打测试通过\n")
+
+
+def test_task_eviction():
+    """测试组装结果超过保留时间或总大小上限时被移除"""
+    print("=" * 50)
+    print("测试组装结果淘汰")
+    print("=" * 50)
+    service = OfficialDocService(task_ttl=60, max_task_bytes=250)
+    try:
+        ids = [service._store_task("notice", {}, b"x" * 100)["task_id"] for _ in range(3)]
+        # 总大小 300 超过上限，移除最早的一份
+        assert list(service._tasks) == ids[1:] and service._task_bytes == 200
+        try:
+            service.get_docx(ids[0])
+            assert False, "已淘汰的任务应不存在"
+        except ValueError:
+            pass
+        assert service.get_docx(ids[2]) == b"x" * 100
+
+        # 单份超过上限时只保留最新一份
+        big = service._store_task("notice", {}, b"y" * 300)["task_id"]
+        assert list(service._tasks) == [big] and service._task_bytes == 300
+
+        # 超过保留时间后移除
+        service._tasks[big]["created_at"] -= timedelta(seconds=61)
+        try:
+            service.get_task(big)
+            assert False, "过期的任务应不存在"
+        except ValueError:
+            pass
+        assert not service._tasks and service._task_bytes == 0
+        assert service.get_assembly_stats()["storedTasks"] == 0
+    finally:
+        service.shutdown()
+    print("✓ 组装结果淘汰测试通过\n")
+
+
+def main():
+    """运行所有测试"""
+    try:
+        test_merge_content()
+        test_stream_merge_zip()
+        test_task_eviction()
+        print("所有测试通过! ✓")
+        return 0
+    except Exception as e:
+        print(f"\n✗ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
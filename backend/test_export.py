@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+测试报表导出模块（XLSX 流式写出、日期范围解析、线程池写出与任务清理）
+"""
+import sys
+import os
+import io
+import asyncio
+import tempfile
+import zipfile
+from datetime import datetime, timedelta
+
+# 添加项目路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from app.core.config import settings
+from app.models.archive import CaseFile
+from app.services.export_service import ExportService, XlsxStreamWriter, build_case_export_query, parse_date_range
+
+
+def test_parse_date_range():
+    """测试日期范围解析"""
+    print("=" * 60)
+    print("测试 1: 日期范围解析")
+    print("=" * 60)
+
+    start, end = parse_date_range("2026-01-01,2026-03-31")
+    assert start.strftime("%Y-%m-%d %H:%M:%S") == "2026-01-01 00:00:00"
+    assert end.strftime("%Y-%m-%d %H:%M:%S") == "2026-03-31 23:59:59"
+
+    start, end = parse_date_range("bad,2026-03-31")
+    assert start is None and end is not None
+
+    assert parse_date_range(None) == (None, None)
+    print("✓ 日期范围解析测试通过\n")
+
+
+def test_xlsx_stream_writer():
+    """测试 XLSX 流式写出"""
+    print("=" * 60)
+    print("测试 2: XLSX 流式写出")
+    print("=" * 60)
+
+    buffer = io.BytesIO()
+    writer = XlsxStreamWriter(buffer, sheet_name="案卷统计")
+    writer.write_row(["案卷编号", "卷宗名", "数量"])
+    for i in range(30):
+        writer.write_row([f"CF{i:04d}", f"案<{i}>&\x01", i])
+    writer.close()
+
+    assert writer.row_count == 31
+    with zipfile.ZipFile(io.BytesIO(buffer.getvalue())) as zf:
+        names = zf.namelist()
+        for part in ["[Content_Types].xml", "xl/workbook.xml", "xl/worksheets/sheet1.xml"]:
+            assert part in names, part
+        sheet = zf.read("xl/worksheets/sheet1.xml").decode("utf-8")
+    assert "案&lt;0&gt;&amp;" in sheet
+    assert "\x01" not in sheet
+    assert '<c r="AA1"' not in sheet
+    assert '<c r="C31"><v>29</v></c>' in sheet
+    assert XlsxStreamWriter._column_letter(26) == "AA"
+    print(f"文件大小: {len(buffer.getvalue())} bytes")
+    print("✓ XLSX 流式写出测试通过\n")
+
+
+async def _write_xlsx(service, file_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(os.path.dirname(file_path), 'export.db')}")
+    try:
+        async with engine.begin() as conn:
+            await conn.run_sync(CaseFile.__table__.create)
+            await conn.execute(insert(CaseFile), [
+                {"id": i, "case_no": f"CF{i:04d}", "case_name": f"案卷{i}", "status": "completed"}
+                for i in range(1, 26)
+            ])
+        factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+        async with factory() as db:
+            return await service.write_file(db, build_case_export_query(None, None, None), "xlsx", file_path)
+    finally:
+        await engine.dispose()
+
+
+def test_export_service():
+    """测试 XLSX 在线程池中按批写出，结束超过 TTL 的任务及遗留文件被清理"""
+    print("=" * 60)
+    print("测试 3: 线程池写出与任务清理")
+    print("=" * 60)
+
+    original = settings.UPLOAD_DIR, settings.EXPORT_BATCH_SIZE
+    settings.UPLOAD_DIR, settings.EXPORT_BATCH_SIZE = tempfile.mkdtemp(), 10
+    service = ExportService(job_ttl=60)
+    try:
+        file_path = os.path.join(service.export_dir, "EXP-TEST.xlsx")
+        assert asyncio.run(_write_xlsx(service, file_path)) == 25
+        with zipfile.ZipFile(file_path) as zf:
+            sheet = zf.read("xl/worksheets/sheet1.xml").decode("utf-8")
+        assert sheet.count("<row ") == 26 and "CF0025" in sheet
+
+        old = datetime.now() - timedelta(seconds=120)
+        service._jobs = {
+            job_id: {
+                "job_id": job_id, "format": "xlsx", "status": "completed", "rows": 25, "filters": {},
+                "file_path": path, "error_message": None, "created_at": old, "finished_at": finished_at,
+            }
+            for job_id, path, finished_at in [
+                ("EXP-OLD", file_path, old),
+                ("EXP-NEW", os.path.join(service.export_dir, "EXP-NEW.xlsx"), datetime.now()),
+            ]
+        }
+        open(service._jobs["EXP-NEW"]["file_path"], "wb").close()
+        leftover = os.path.join(service.export_dir, "tmp_leftover.csv")
+        open(leftover, "wb").close()
+        os.utime(leftover, (old.timestamp(), old.timestamp()))
+
+        assert service.get_job("EXP-NEW")["status"] == "completed"
+        assert "EXP-OLD" not in service._jobs and not os.path.exists(file_path)
+        try:
+            service.get_job_file("EXP-OLD")
+            raise AssertionError("过期任务应不存在")
+        except ValueError:
+            pass
+        # 创建任务时同时清理导出目录中的遗留文件，保留未过期任务的文件
+        service._cleanup(scan_files=True)
+        assert not os.path.exists(leftover) and os.path.exists(service._jobs["EXP-NEW"]["file_path"])
+    finally:
+        service.shutdown()
+        settings.UPLOAD_DIR, settings.EXPORT_BATCH_SIZE = original
+    print("✓ 线程池写出与任务清理测试通过\n")
+
+
+def main():
+    """运行所有测试"""
+    try:
+        test_parse_date_range()
+        test_xlsx_stream_writer()
+        test_export_service()
+        print("所有测试通过! ✓")
+        return 0
+    except Exception as e:
+        print(f"\n✗ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+测试案卷入图（实体关系抽取、按去重键合并、关系来源计数、删除与全量重建）
+"""
+import sys
+import os
+import asyncio
+import tempfile
+from datetime import datetime
+
+# 添加项目路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from app.models.archive import CaseFile
+from app.models.knowledge_graph import KgEntity, KgRelation, KgRelationSource
+from app.services.graph_indexer import GraphIndexer, derive_case_graph
+from app.services.knowledge_graph import KnowledgeGraphService
+
+
+def _case(case_id, case_no, person_name, charge, **fields):
+    return CaseFile(
+        id=case_id, case_no=case_no, case_name=fields.pop("case_name", f"{case_no}案"),
+        person_name=person_name, charge=charge, source_department=fields.pop("source_department", "某部一连"),
+        status=fields.pop("status", "pending"), incident_time=datetime(2020, 5, 1), **fields,
+    )
+
+
+def _named_edges(graph):
+    entities, relations = graph
+    return {(entities[s][1], entities[t][1], r) for s, t, r in relations}
+
+
+def test_derive():
+    """测试从案卷字段抽取实体与关系"""
+    print("=" * 60)
+    print("测试: 实体关系抽取")
+    print("=" * 60)
+    case = _case(
+        1, "AJ001", "张三", "盗窃罪、《诈骗罪》",
+        person_info={"gender": "男", "birthplace": "湖南长沙", "position": "战士"},
+        classification_level1="刑事案件", classification_level2="侵财类",
+        timeline=[{"time": "2020-05-01", "event": "发案", "location": "营区仓库"}, "无效条目"],
+    )
+    entities, relations = graph = derive_case_graph(case)
+    assert _named_edges(graph) == {
+        ("张三", "AJ001案", "involved_in"), ("张三", "某部一连", "member_of"), ("张三", "湖南长沙", "native_of"),
+        ("AJ001案", "某部一连", "occurred_in"), ("AJ001案", "盗窃罪", "charged_with"),
+        ("AJ001案", "《诈骗罪》", "charged_with"), ("AJ001案", "刑事案件 / 侵财类", "classified_as"),
+        ("AJ001案", "营区仓库", "located_at"),
+    }
+    assert entities["person:张三@湖南长沙"][2] == {"gender": "男", "birthplace": "湖南长沙", "position": "战士"}
+    assert entities["case:aj001"][2]["caseFileId"] == 1
+
+    # 多名人员时不确定人员基本情况属于谁，不写入属性与出生地
+    multi = derive_case_graph(_case(2, "AJ002", "李四、王五", "", person_info={"birthplace": "北京"}))
+    assert ("李四", "AJ002案", "involved_in") in _named_edges(multi)
+    assert not any(r == "native_of" for _, _, r in multi[1]) and multi[0]["person:李四"][2] is None
+    assert not any(e[0] == "law" for e in multi[0].values())
+
+    # 同名人员按出生地、入伍时间区分；无法区分时按姓名合并且不写入属性
+    other = derive_case_graph(_case(3, "AJ003", "张三", "", person_info={"enlistment_time": "2018-09"}))
+    bare = derive_case_graph(_case(4, "AJ004", "张三", "", person_info={"gender": "男"}))
+    assert "person:张三@201809" in other[0] and "person:张三@湖南长沙" not in other[0]
+    assert bare[0]["person:张三"][2] is None
+    print(f"✓ 抽取 {len(entities)} 个实体、{len(relations)} 条关系；多名人员不关联出生地，同名人员按出生地区分")
+    print()
+
+
+async def _setup():
+    tmp = tempfile.mkdtemp()
+    engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp, 'graph.db')}")
+    async with engine.begin() as conn:
+        for model in (CaseFile, KgEntity, KgRelation, KgRelationSource):
+            await conn.run_sync(model.__table__.create)
+    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    service = KnowledgeGraphService(session_factory=factory)
+    indexer = GraphIndexer(graph_service=service, session_factory=factory, debounce=0.05, batch_size=50)
+    return engine, factory, service, indexer
+
+
+async def _db_edges(factory):
+    async with factory() as db:
+        names = dict((await db.execute(select(KgEntity.id, KgEntity.name))).all())
+        rows = (await db.execute(
+            select(KgRelation.source_id, KgRelation.target_id, KgRelation.relation_type, KgRelation.weight)
+        )).all()
+    return {(names[s], names[t], r): w for s, t, r, w in rows}
+
+
+def _index_edges(service, name):
+    result = service.query("person", name, 1)
+    names = {node["id"]: node["name"] for node in result["nodes"]}
+    return {(names[e["source"]], names[e["target"]], e["type"]) for e in result["edges"]}
+
+
+async def _run_incremental():
+    engine, factory, service, indexer = await _setup()
+    try:
+        async with factory() as db:
+            db.add_all([
+                _case(1, "AJ001", "张三", "盗窃罪"),
+                _case(2, "AJ002", "张 三、李四", "盗窃罪"),
+                _case(3, "AJ003", "王五", "诈骗罪", source_department="某部二连"),
+            ])
+            await db.commit()
+        await service.load()
+        # 人工创建的关系不受案卷入图影响
+        async with factory() as db:
+            await indexer.index_cases([1])
+            zhang = service.index.resolve("person", "张三")
+            law = service.index.resolve("law", "盗窃罪")
+            await service.create_relation(db, zhang, law, "related_person")
+
+        await indexer.start()
+        indexer.enqueue_many([2, 3, 3])
+        for _ in range(100):
+            if indexer.stats()["queued"] == 0 and indexer.stats()["indexed"] >= 3:
+                break
+            await asyncio.sleep(0.02)
+        edges = await _db_edges(factory)
+        stats = indexer.stats()
+        assert stats["enqueued"] == 2 and stats["lastLagMs"] is not None
+        # “张三”“张 三”合并为同一人员；两案均得出的关系权重为 2
+        assert edges[("张三", "某部一连", "member_of")] == 2.0
+        assert edges[("张三", "AJ002案", "involved_in")] == 1.0
+        assert ("张三", "盗窃罪", "related_person") in edges
+        assert _index_edges(service, "张三") == {e for e in edges if "张三" in e[:2]}
+
+        # 修改罪名：只移除该案卷得出的旧关系；删除案卷：移除案件实体，共享关系权重减 1
+        async with factory() as db:
+            case = await db.get(CaseFile, 3)
+            case.charge = "盗窃罪"
+            await db.execute(delete(CaseFile).where(CaseFile.id == 2))
+            await db.commit()
+        await indexer.index_cases([2, 3])
+        edges = await _db_edges(factory)
+        assert ("AJ003案", "诈骗罪", "charged_with") not in edges and ("AJ003案", "盗窃罪", "charged_with") in edges
+        assert not any("AJ002案" in e[:2] for e in edges)
+        assert edges[("张三", "某部一连", "member_of")] == 1.0 and ("李四", "某部一连", "member_of") not in edges
+        assert ("张三", "盗窃罪", "related_person") in edges
+        assert service.index.resolve("case", "AJ002") is None
+        assert _index_edges(service, "张三") == {e for e in edges if "张三" in e[:2]}
+        await indexer.stop()
+    finally:
+        await engine.dispose()
+    return stats, edges
+
+
+def test_incremental():
+    """测试增量入图：去重合并、来源计数、修改与删除"""
+    print("=" * 60)
+    print("测试: 增量入图")
+    print("=" * 60)
+    stats, edges = asyncio.run(_run_incremental())
+    print(f"✓ 队列去重后入图 {stats['indexed']} 个案卷，入图延迟 {stats['lastLagMs']}ms；"
+          f"修改、删除后剩余 {len(edges)} 条关系，人工关系保留")
+    print()
+
+
+async def _run_rebuild():
+    engine, factory, service, indexer = await _setup()
+    try:
+        async with factory() as db:
+            db.add_all([
+                _case(i, f"AJ{i:03d}", f"人员{i % 7}", "盗窃罪" if i % 2 else "诈骗罪", source_department=f"单位{i % 3}")
+                for i in range(1, 41)
+            ])
+            await db.commit()
+        await indexer.index_cases(range(1, 21))
+        # 重建前：部分案卷已删除、部分从未入图
+        async with factory() as db:
+            await db.execute(delete(CaseFile).where(CaseFile.id.in_([3, 4, 5])))
+            await db.commit()
+        progress = await indexer.rebuild(workers=3)
+        edges = await _db_edges(factory)
+        async with factory() as db:
+            cases = (await db.execute(select(CaseFile))).scalars().all()
+        expected = set().union(*(_named_edges(derive_case_graph(c)) for c in cases))
+        assert set(edges) == expected
+        assert edges[("人员1", "单位1", "member_of")] == sum(1 for c in cases if c.id % 7 == 1 and c.id % 3 == 1)
+        assert service.stats()["relations"] == len(expected) and service.index.resolve("case", "AJ003") is None
+        # 再次重建不产生变更
+        before = indexer.stats()["relationsCreated"]
+        await indexer.rebuild(workers=2)
+        assert indexer.stats()["relationsCreated"] == before and set(await _db_edges(factory)) == expected
+
+        # 重建读取后案卷被修改、新增并由增量入图：不被旧快照覆盖，新增案卷不被当作已删除
+        write = indexer._write
+
+        async def _write_during_rebuild(graphs, snapshot=None):
+            if snapshot is not None and 1 in graphs:
+                async with factory() as db:
+                    (await db.get(CaseFile, 1)).charge = "贪污罪"
+                    db.add(_case(41, "AJ041", "人员41", "受贿罪"))
+                    await db.commit()
+                await indexer.index_cases([1, 41])
+            await write(graphs, snapshot)
+
+        indexer._write = _write_during_rebuild
+        await indexer.rebuild(workers=1)
+        edges = await _db_edges(factory)
+        assert ("AJ001案", "贪污罪", "charged_with") in edges and ("AJ001案", "盗窃罪", "charged_with") not in edges
+        assert ("AJ041案", "受贿罪", "charged_with") in edges
+        assert service.index.resolve("case", "AJ041") is not None and service.stats()["relations"] == len(edges)
+    finally:
+        await engine.dispose()
+    return progress, len(expected)
+
+
+def test_rebuild():
+    """测试全量重建：多个任务并发读取，结果与按现存案卷抽取一致，清理已删除案卷"""
+    print("=" * 60)
+    print("测试: 全量重建")
+    print("=" * 60)
+    progress, relations = asyncio.run(_run_rebuild())
+    assert progress["indexed"] == 37 and progress["removed"] == 3 and not progress["running"]
+    print(f"✓ 重建 {progress['indexed']} 个案卷、{relations} 条关系，清理 {progress['removed']} 个已删除案卷；重复重建无变更")
+    print()
+
+
+def main():
+    """主测试函数"""
+    print("\n" + "=" * 60)
+    print("案卷入图测试")
+    print("=" * 60 + "\n")
+    try:
+        test_derive()
+        test_incremental()
+        test_rebuild()
+        print("=" * 60)
+        print("✅ 所有测试通过！")
+        print("=" * 60)
+    except Exception as e:
+        print(f"\n❌ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+测试知识图谱（内存邻接表、增量更新、多跳查询、实体去重与持久化）
+"""
+import sys
+import os
+import asyncio
+import random
+import tempfile
+
+# 添加项目路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from app.models.knowledge_graph import KgEntity, KgRelation
+from app.services.knowledge_graph import GraphIndex, KnowledgeGraphService, normalize_entity_key
+
+# 人员 1-2 涉案 案件 3，人员 1、4 属于单位 5，人员 4 涉案 案件 6，案件 6 涉嫌罪名 7
+ENTITIES = [
+    (1, "person", "张三", None), (2, "person", "李四", None), (3, "case", "2020年盗窃案", None),
+    (4, "person", "王五", None), (5, "department", "某部一连", None), (6, "case", "2021年诈骗案", None),
+    (7, "law", "诈骗罪", None),
+]
+RELATIONS = [
+    (1, 3, "involved_in"), (2, 3, "involved_in"), (1, 5, "member_of"), (4, 5, "member_of"),
+    (4, 6, "involved_in"), (6, 7, "charged_with"),
+]
+
+
+def _hops(result):
+    return {node["id"]: node["hop"] for node in result["nodes"]}
+
+
+def test_neighborhood():
+    """测试多跳查询：按跳数展开、关系类型过滤、返回数量上限"""
+    print("=" * 60)
+    print("测试: 多跳查询")
+    print("=" * 60)
+    index = GraphIndex()
+    index.load(ENTITIES, RELATIONS)
+    assert _hops(index.neighborhood(1, 1)) == {1: 0, 3: 1, 5: 1}
+    result = index.neighborhood(1, 4)
+    assert _hops(result) == {1: 0, 3: 1, 5: 1, 2: 2, 4: 2, 6: 3, 7: 4}
+    # 反向展开后仍按原方向返回关系
+    assert {"source": 4, "target": 5, "type": "member_of"} in result["edges"]
+    assert not result["truncated"] and len(result["edges"]) == len(RELATIONS)
+
+    only_cases = index.neighborhood(1, 5, relation_types=["involved_in"])
+    assert _hops(only_cases) == {1: 0, 3: 1, 2: 2}
+    capped = index.neighborhood(1, 5, max_nodes=3)
+    assert len(capped["nodes"]) == 3 and capped["truncated"]
+    assert index.neighborhood(99, 2) is None
+    print(f"✓ 4 跳展开 {len(result['nodes'])} 个实体、{len(result['edges'])} 条关系；关系过滤与数量上限生效")
+    print()
+
+
+def test_incremental_updates():
+    """测试增量加边、删边与重建：结果与全量构建一致"""
+    print("=" * 60)
+    print("测试: 增量更新")
+    print("=" * 60)
+    rng = random.Random(7)
+    entities = [(i, "person" if i % 3 else "case", f"实体{i}", None) for i in range(1, 201)]
+    edges = {(rng.randint(1, 200), rng.randint(1, 200), rng.choice(["involved_in", "related_person"])) for _ in range(600)}
+    edges = [e for e in edges if e[0] != e[1]]
+    base, extra = edges[:300], edges[300:]
+
+    index = GraphIndex(compact_threshold=50)
+    index.load(entities, base)
+    for edge in extra:
+        assert index.add_edge(*edge)
+        assert not index.add_edge(*edge), "重复的关系应忽略"
+    removed = rng.sample(edges, 80)
+    for edge in removed:
+        assert index.remove_edge(*edge)
+    assert not index.remove_edge(*removed[0])
+    assert index.add_edge(*removed[0])
+    expected = [e for e in edges if e not in removed[1:]]
+
+    fresh = GraphIndex()
+    fresh.load(entities, expected)
+    for start in (1, 2, 50, 199):
+        got, want = index.neighborhood(start, 3, max_nodes=1000), fresh.neighborhood(start, 3, max_nodes=1000)
+        assert _hops(got) == _hops(want)
+        assert sorted(map(str, got["edges"])) == sorted(map(str, want["edges"]))
+    stats = index.stats()
+    assert stats["relations"] == len(expected) and stats["compactions"] > 0
+    index.compact()
+    assert index.stats()["deltaRelations"] == 0 and index.stats()["removedRelations"] == 0
+
+    index.remove_entity(1)
+    assert index.neighborhood(1, 2) is None and index.stats()["entities"] == 199
+    assert all(1 not in (e["source"], e["target"]) for e in index.neighborhood(2, 3, max_nodes=1000)["edges"])
+    print(f"✓ 新增 {len(extra)} 条、删除 {len(removed) - 1} 条后与全量构建一致，重建 {stats['compactions']} 次")
+    print()
+
+
+def test_entity_key():
+    """测试实体去重键：忽略空白、标点、书名号与全半角"""
+    print("=" * 60)
+    print("测试: 实体去重键")
+    print("=" * 60)
+    assert normalize_entity_key("person", " 张 三 ") == normalize_entity_key("person", "张三")
+    assert normalize_entity_key("law", "《刑法》") == normalize_entity_key("law", "刑法")
+    assert normalize_entity_key("department", "某部１连") == normalize_entity_key("department", "某部1连")
+    assert normalize_entity_key("person", "张三") != normalize_entity_key("case", "张三")
+    print("✓ 同类型同名实体去重，不同类型不合并")
+    print()
+
+
+async def _run_service():
+    tmp = tempfile.mkdtemp()
+    engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp, 'kg.db')}")
+    async with engine.begin() as conn:
+        await conn.run_sync(KgEntity.__table__.create)
+        await conn.run_sync(KgRelation.__table__.create)
+    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    service = KnowledgeGraphService(session_factory=factory)
+    try:
+        async with factory() as db:
+            person, created = await service.create_entity(db, "person", "张三")
+            same, created_again = await service.create_entity(db, "person", "张 三")
+            assert created and not created_again and same.id == person.id
+            case, _ = await service.create_entity(db, "case", "2020年盗窃案", {"caseNo": "AJ1"})
+            law, _ = await service.create_entity(db, "law", "盗窃罪")
+            assert (await service.create_relation(db, person.id, case.id, "involved_in"))[1]
+            assert not (await service.create_relation(db, person.id, case.id, "involved_in"))[1]
+            assert (await service.create_relation(db, case.id, law.id, "charged_with"))[1]
+            assert (await service.create_relation(db, person.id, 999, "involved_in"))[0] is None
+
+        live = service.query("person", "张三", 2)
+        # 重新加载后结果一致
+        reloaded = KnowledgeGraphService(session_factory=factory)
+        await reloaded.load()
+        again = reloaded.query("person", str(person.id), 2)
+    finally:
+        await engine.dispose()
+    return live, again
+
+
+def test_service():
+    """测试实体与关系写入数据库并同步内存索引，重新加载后查询结果一致"""
+    print("=" * 60)
+    print("测试: 持久化与查询")
+    print("=" * 60)
+    live, again = asyncio.run(_run_service())
+    assert live["entity"]["name"] == "张三"
+    assert [(r["targetEntity"]["name"], r["hop"]) for r in live["relations"]] == [("2020年盗窃案", 1), ("盗窃罪", 2)]
+    assert live["relations"][1]["desc"] == "2 跳：经「2020年盗窃案」涉嫌罪名"
+    assert _hops(again) == _hops(live) and again["edges"] == live["edges"]
+    print(f"✓ 同名实体去重；查询返回 {len(live['relations'])} 个关联实体（{live['elapsedMs']}ms），重新加载后一致")
+    print()
+
+
+def main():
+    """主测试函数"""
+    print("\n" + "=" * 60)
+    print("知识图谱测试")
+    print("=" * 60 + "\n")
+    try:
+        test_neighborhood()
+        test_incremental_updates()
+        test_entity_key()
+        test_service()
+        print("=" * 60)
+        print("✅ 所有测试通过！")
+        print("=" * 60)
+    except Exception as e:
+        print(f"\n❌ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+测试模型后端（本地模拟、录制与回放、模拟耗时）
+"""
+import sys
+import os
+import asyncio
+import json
+import tempfile
+import time
+
+# 添加项目路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+
+from app.services.llm_backends import (
+    CassetteStore,
+    RecordingBackend,
+    ReplayBackend,
+    StubBackend,
+    SyntheticLatency,
+    cassette_key,
+)
+from app.services.qwen_service import QwenService, create_backend
+
+MESSAGES = [{"role": "system", "content": "你是公文写作助手。"}, {"role": "user", "content": "写一份工作总结"}]
+
+
+def _collect(service, messages):
+    """读取 _stream_chat 的全部内容"""
+    async def _run():
+        parts = []
+        async for frame in service._stream_chat(messages, 0.7, 500, "测试生成"):
+            data = json.loads(frame[6:])
+            if "error" in data:
+                raise RuntimeError(data["error"])
+            parts.append(data.get("content", ""))
+        return "".join(parts)
+    return asyncio.run(_run())
+
+
+def test_stub_backend():
+    """测试本地模拟后端：输出确定，JSON 格式的提示词按格式返回，提取链路无需 API Key"""
+    print("=" * 60)
+    print("测试: 本地模拟后端")
+    print("=" * 60)
+    stub = StubBackend(SyntheticLatency(0, 0), output_tokens=100)
+    first = stub.call("qwen-plus", MESSAGES, 0.7, 500)
+    assert first == stub.call("qwen-turbo", MESSAGES, 0.7, 500) and first["success"]
+    assert first["content"] != stub.call("qwen-plus", MESSAGES[:1], 0.7, 500)["content"]
+    assert "".join(stub.stream("qwen-plus", MESSAGES, 0.7, 500)) == first["content"]
+    assert first["usage"]["output_tokens"] >= 100
+
+    service = QwenService(backend=stub)
+    try:
+        result = service.extract_case_fields("卷宗正文")
+        assert result["success"] and "person_info" in result["fields"] and "timeline" in result["fields"], result
+        events = list(service.iter_case_fields("卷宗正文"))
+        assert events[-1]["result"]["success"] and len(events) > 10
+        assert service.stats()["backend"]["backend"] == "stub"
+    finally:
+        service.shutdown()
+    assert create_backend("stub").name == "stub"
+    print(f"✓ 输出确定（{first['usage']['output_tokens']} tokens），字段提取按 JSON 格式返回 {len(result['fields'])} 个字段")
+    print()
+
+
+def test_synthetic_latency():
+    """测试模拟耗时：首 token 延迟 + 按输出速率逐片等待"""
+    print("=" * 60)
+    print("测试: 模拟耗时")
+    print("=" * 60)
+    stub = StubBackend(SyntheticLatency(first_token_ms=50, tokens_per_second=2000), output_tokens=200)
+    start = time.perf_counter()
+    stream = stub.stream("qwen-plus", MESSAGES, 0.7, 500)
+    next(stream)
+    first = time.perf_counter() - start
+    tokens = 1 + sum(1 for _ in stream)
+    total = time.perf_counter() - start
+    assert 0.05 <= first < 0.1, first
+    assert total >= 0.05 + 200 / 2000 * 0.9, total
+    print(f"✓ 首片 {first * 1000:.0f}ms，{tokens} 片共 {total * 1000:.0f}ms")
+    print()
+
+
+def test_record_replay():
+    """测试录制后回放得到相同输出；未录制的请求不重试、不触发熔断"""
+    print("=" * 60)
+    print("测试: 录制与回放")
+    print("=" * 60)
+    with tempfile.TemporaryDirectory() as directory:
+        store = CassetteStore(directory)
+        recorder = RecordingBackend(StubBackend(SyntheticLatency(0, 0), output_tokens=80), store)
+        service = QwenService(backend=recorder)
+        try:
+            recorded_text = service.generate_text("写一份请示", system_prompt="你是公文写作助手。")["content"]
+            recorded_stream = _collect(service, MESSAGES)
+        finally:
+            service.shutdown()
+        assert len(os.listdir(directory)) == 2 and recorder.stats()["recorded"] == 2
+
+        replayer = ReplayBackend(store, SyntheticLatency(0, 0))
+        service = QwenService(backend=replayer)
+        try:
+            replayed = service.generate_text("写一份请示", system_prompt="你是公文写作助手。")
+            assert replayed["success"] and replayed["content"] == recorded_text
+            assert _collect(service, MESSAGES) == recorded_stream
+            record = store.load(cassette_key(MESSAGES, 0.7, 500))
+            assert record["chunks"] and record["messages"] == MESSAGES
+
+            missing = service.generate_text("未录制的请求")
+            assert not missing["success"] and missing["code"] == 404 and not missing["retryable"]
+            try:
+                _collect(service, [{"role": "user", "content": "未录制的流式请求"}])
+                raise AssertionError("未录制的流式请求应失败")
+            except RuntimeError as e:
+                assert "回放记录不存在" in str(e)
+            assert replayer.stats()["hits"] == 2 and replayer.stats()["misses"] == 2
+            assert service.stats()["breaker"]["state"] == "closed"
+        finally:
+            service.shutdown()
+
+        fallback = ReplayBackend(store, SyntheticLatency(0, 0), fallback=StubBackend(SyntheticLatency(0, 0)))
+        assert fallback.call("qwen-plus", [{"role": "user", "content": "x"}], 0.7, 100)["success"]
+    print("✓ 回放内容与录制一致；未录制请求返回 404 且不熔断；开启回退时改用模拟输出")
+    print()
+
+
+def main():
+    """主测试函数"""
+    print("\n" + "=" * 60)
+    print("模型后端测试")
+    print("=" * 60 + "\n")
+    try:
+        test_stub_backend()
+        test_synthetic_latency()
+        test_record_replay()
+        print("=" * 60)
+        print("✅ 所有测试通过！")
+        print("=" * 60)
+    except Exception as e:
+        print(f"\n❌ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+测试按调用场景选择模型（按长度选择、SLO 降级、路由配置覆盖）与各模型延迟统计
+"""
+import sys
+import os
+import asyncio
+from contextlib import contextmanager
+
+# 添加项目路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+
+from app.core.config import settings
+from app.services.model_router import ModelRouter, LatencyTracker, DEFAULT_ROUTES, latency_key
+from app.services.qwen_service import QwenService
+from fake_llm_backend import FakeBackend
+
+
+@contextmanager
+def _settings(**overrides):
+    """临时修改配置，结束后恢复"""
+    original = {name: getattr(settings, name) for name in overrides}
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+    try:
+        yield
+    finally:
+        for name, value in original.items():
+            setattr(settings, name, value)
+
+
+def test_length_aware_routing():
+    """测试小任务使用最快模型，其余使用默认模型并限制在路由范围内"""
+    print("=" * 60)
+    print("测试: 按长度选择模型")
+    print("=" * 60)
+    router = ModelRouter(routes=DEFAULT_ROUTES)
+    with _settings(QWEN_MODEL="qwen-plus", QWEN_ROUTING_ENABLED=True, QWEN_ROUTE_SMALL_TOKENS=2000):
+        # 段落生成：预期输出 400，输入 800 → 小任务
+        assert router.choose("section", 800, 1000) == "qwen-turbo"
+        assert router.choose("section", 3000, 1000) == "qwen-plus"
+        # 审查短片段走 turbo，长文走默认模型
+        assert router.choose("review", 500, 4000) == "qwen-turbo"
+        assert router.choose("review", 3000, 4000) == "qwen-plus"
+        # 字段提取固定在 qwen-plus
+        assert router.choose("extract", 100, 4000) == "qwen-plus"
+        # 公文生成最低 qwen-plus，默认模型为 qwen-max 时使用 qwen-max
+        assert router.choose("document", 100, 4000) == "qwen-plus"
+        with _settings(QWEN_MODEL="qwen-max"):
+            assert router.choose("document", 3000, 4000) == "qwen-max"
+            # 超出 qwen-max 上下文时改用上下文更长的模型
+            assert router.choose("document", 40000, 4000) == "qwen-plus"
+            # 默认模型超出路由上限时取上限
+            assert router.choose("section", 3000, 1000) == "qwen-plus"
+        # 未配置的路由、关闭路由时使用 QWEN_MODEL
+        assert router.choose(None, 100, 100) == "qwen-plus"
+        assert router.choose("unknown", 100, 100) == "qwen-plus"
+        with _settings(QWEN_ROUTING_ENABLED=False):
+            assert router.choose("section", 100, 100) == "qwen-plus"
+    print(f"✓ 选择次数: {router.stats()['routes']}")
+    print()
+
+
+def test_slo_downgrade():
+    """测试所选模型 p95 延迟超过路由 SLO 时降到更快的模型，样本过期后恢复原模型"""
+    print("=" * 60)
+    print("测试: SLO 降级")
+    print("=" * 60)
+    now = [0.0]
+    tracker = LatencyTracker(max_age=60, clock=lambda: now[0])
+    router = ModelRouter(routes={
+        "review": {"min": "qwen-turbo", "max": "qwen-max", "slo": 10},
+        "document": {"min": "qwen-turbo", "max": "qwen-max", "slo": 120},
+    }, tracker=tracker)
+    with _settings(QWEN_MODEL="qwen-max", QWEN_ROUTING_ENABLED=True, QWEN_ROUTE_SMALL_TOKENS=100):
+        # 其他路由的长耗时调用不影响本路由
+        for _ in range(30):
+            router.record("qwen-max", 60.0, route="document")
+        assert router.choose("review", 3000, 2000) == "qwen-max"
+        assert router.choose("document", 3000, 2000) == "qwen-max"
+        # 样本不足时不降级
+        for _ in range(5):
+            router.record("qwen-max", 30.0, route="review")
+        assert router.choose("review", 3000, 2000) == "qwen-max"
+        for _ in range(30):
+            router.record("qwen-max", 30.0, route="review")
+            router.record("qwen-plus", 12.0, route="review")
+            router.record("qwen-turbo", 3.0, route="review")
+        assert router.choose("review", 3000, 2000) == "qwen-turbo"
+        # 流式调用按首个片段到达时间判断，与整体耗时分开统计
+        assert router.choose("review", 3000, 2000, stream=True) == "qwen-max"
+        stats = tracker.stats()
+        # 样本过期后重新尝试原模型
+        now[0] = 61.0
+        assert router.choose("review", 3000, 2000) == "qwen-max"
+
+    assert stats["review/qwen-max"]["p95"] == 30.0 and stats["review/qwen-turbo"]["p50"] == 3.0
+    assert stats["document/qwen-max"]["p95"] == 60.0
+    assert latency_key("qwen-max", stream=True, route="review") not in stats
+    print(f"✓ p95 超出 SLO 依次降级，样本过期后恢复: {stats}")
+    print()
+
+
+def test_routes_override():
+    """测试 QWEN_ROUTES 按路由名覆盖默认配置"""
+    print("=" * 60)
+    print("测试: 路由配置覆盖")
+    print("=" * 60)
+    with _settings(QWEN_ROUTES='{"section": {"model": "qwen-max"}, "summary": {"max": "qwen-turbo"}}'):
+        router = ModelRouter()
+        assert router.routes["section"]["model"] == "qwen-max"
+        assert router.routes["review"] == DEFAULT_ROUTES["review"]
+        assert router.choose("section", 10, 10) == "qwen-max"
+        assert router.choose("summary", 5000, 2000) == "qwen-turbo"
+    with _settings(QWEN_ROUTES="not json"):
+        assert ModelRouter().routes == DEFAULT_ROUTES
+    print("✓ 覆盖部分路由，无效配置回退默认路由")
+    print()
+
+
+def test_service_routing():
+    """测试服务按路由选择模型并记录延迟"""
+    print("=" * 60)
+    print("测试: 服务调用路由")
+    print("=" * 60)
+    backend = FakeBackend(content="内容")
+    service = QwenService(backend=backend)
+    service.router = ModelRouter(routes=DEFAULT_ROUTES)
+    try:
+        with _settings(QWEN_MODEL="qwen-plus", QWEN_ROUTING_ENABLED=True, QWEN_ROUTE_SMALL_TOKENS=2000):
+            assert service.generate_text("写一个标题", max_tokens=100, route="section")["success"]
+            assert service.generate_text("写一个标题", max_tokens=100, route="section", model="qwen-max")["success"]
+            assert service.generate_text("写一个标题", max_tokens=100)["success"]
+
+            async def _stream():
+                return [frame async for frame in service.review_document_content_stream("短文")]
+            frames = asyncio.run(_stream())
+            assert frames[-1] == b'data: {"done":true}\n\n', frames
+        assert backend.models == ["qwen-turbo", "qwen-max", "qwen-plus", "qwen-turbo"], backend.models
+        models = service.stats()["models"]
+        assert models["latency"]["section/qwen-turbo"]["count"] == 1
+        assert models["latency"][latency_key("qwen-turbo", stream=True, route="review_stream")]["count"] == 1
+        assert models["routes"] == {"section": {"qwen-turbo": 1}, "review_stream": {"qwen-turbo": 1}}
+        print(f"✓ 调用模型: {backend.models}，统计: {models}")
+    finally:
+        service.shutdown()
+    print()
+
+
+def main():
+    """主测试函数"""
+    print("\n" + "=" * 60)
+    print("模型路由测试")
+    print("=" * 60 + "\n")
+    try:
+        test_length_aware_routing()
+        test_slo_downgrade()
+        test_routes_override()
+        test_service_routing()
+        print("=" * 60)
+        print("✅ 所有测试通过！")
+        print("=" * 60)
+    except Exception as e:
+        print(f"\n❌ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
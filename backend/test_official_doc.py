@@ -175,6 +175,24 @@ def test_memo_builder():
     print("✓ 函 builder 测试通过\n")
 
 
+def test_red_header_without_org_name():
+    """测试发文机关为空（None）时红头留空，不影响生成"""
+    print("=" * 60)
+    print("测试 7: 发文机关为空")
+    print("=" * 60)
+
+    content = {"title": "关于协助调取监控录像的函", "main_body": "正文。", "sender": "XX单位", "date": "2026年4月21日"}
+    named = NoticeDocumentBuilder().build({**content, "org_name": "某部保卫处"})
+    index = next(i for i, p in enumerate(named.paragraphs) if p.text == "某部保卫处")
+    for org_name in (None, ""):
+        doc = NoticeDocumentBuilder().build({**content, "org_name": org_name})
+        assert doc.paragraphs[index].text == "", doc.paragraphs[index].text
+    # 红头段落格式缓存后再次生成仍替换为本次的发文机关
+    again = NoticeDocumentBuilder().build({**content, "org_name": "某部保卫处"})
+    assert again.paragraphs[index].text == "某部保卫处"
+    print("✓ org_name 为 None 或空字符串时红头留空\n")
+
+
 def main():
     """运行所有测试"""
     print("\n" + "=" * 60)
@@ -189,6 +207,7 @@ def main():
         test_report_builder()
         test_notice_builder()
         test_memo_builder()
+        test_red_header_without_org_name()
 
         print("=" * 60)
         print("  所有测试通过! ✓")
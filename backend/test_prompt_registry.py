@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+测试提示词注册表（版本化模板、token 估算、按预算截断与压缩）
+"""
+import sys
+import os
+
+# 添加项目路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+
+from app.services.prompt_registry import (
+    PromptRegistry,
+    estimate_tokens,
+    truncate_to_budget,
+    compact_related_cases,
+)
+from app.services.qwen_service import qwen_service
+
+
+def test_prompt_registry():
+    """测试模板注册、版本选择与渲染缓存"""
+    print("=" * 60)
+    print("测试: 提示词注册表")
+    print("=" * 60)
+    registry = PromptRegistry()
+    registry.register("demo", "v1", "生成{$doc_type}：{\"k\": 1}")
+    registry.register("demo", "v2", "请生成${doc_type}")
+    assert registry.render("demo", doc_type="通知") == "请生成通知"
+    assert registry.render("demo", version="v1", doc_type="通知") == "生成{通知}：{\"k\": 1}"
+    registry.render("demo", doc_type="通知")
+    assert registry.stats()["cacheHits"] == 1
+    print("✓ 提示词注册表测试通过\n")
+
+
+def test_token_budget():
+    """测试 token 估算与截断"""
+    print("=" * 60)
+    print("测试: token 预算")
+    print("=" * 60)
+    assert estimate_tokens("保卫部门") == 4
+    assert estimate_tokens("abcdefgh") == 2
+    assert truncate_to_budget("短文本", 100) == "短文本"
+
+    transcript = "开头" + "讨论" * 5000 + "结尾"
+    compacted = truncate_to_budget(transcript, 200, keep_tail=True)
+    print(f"  转写稿 {estimate_tokens(transcript)} -> {estimate_tokens(compacted)} tokens")
+    assert estimate_tokens(compacted) <= 200
+    assert compacted.startswith("开头") and compacted.endswith("结尾") and "中间省略" in compacted
+
+    cases = [{"caseNo": f"A{i}", "caseName": "某单位人员违规使用手机案"} for i in range(100)]
+    lines = compact_related_cases(cases, 100)
+    assert len(lines) < len(cases) and "等共 100 件" in lines[-1]
+    print("✓ token 预算测试通过\n")
+
+
+def test_system_prompt_prefix():
+    """不同文书类型的系统提示词共用相同前缀"""
+    print("=" * 60)
+    print("测试: 系统提示词前缀")
+    print("=" * 60)
+    a = qwen_service._build_system_prompt("立案报告")
+    b = qwen_service._build_system_prompt("会议纪要", "按模板格式")
+    prefix = os.path.commonprefix([a, b])
+    print(f"  公共前缀 {estimate_tokens(prefix)} tokens")
+    assert "立案报告" not in prefix and "要求：" in prefix
+    print("✓ 系统提示词前缀测试通过\n")
+
+
+def main():
+    """运行所有测试"""
+    try:
+        test_prompt_registry()
+        test_token_budget()
+        test_system_prompt_prefix()
+        print("所有测试通过! ✓")
+        return 0
+    except Exception as e:
+        print(f"\n✗ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
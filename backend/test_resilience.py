@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+测试上游调用弹性控制（自适应并发、熔断、退避重试）与延迟提取队列
+"""
+import sys
+import os
+import asyncio
+import tempfile
+from contextlib import contextmanager
+
+# 添加项目路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from app.core.config import settings
+from app.core.resilience import AdaptiveLimiter, CircuitBreaker, backoff_delay, STATE_CLOSED, STATE_OPEN
+from app.models.archive import CaseFile
+from app.services.qwen_service import QwenService, QwenStreamError
+from app.services.extraction_retry import (
+    DeferredExtractionQueue,
+    EXTRACT_ATTEMPTS_KEY,
+    EXTRACT_STATE_KEY,
+    STATE_DEFERRED,
+    STATE_FAILED,
+    mark_deferred,
+    should_defer,
+)
+from fake_llm_backend import FakeBackend
+
+
+@contextmanager
+def _service(statuses, **overrides):
+    """使用模拟上游的服务实例（按 statuses 依次返回），结束后恢复配置"""
+    names = ["QWEN_RETRY_BASE_DELAY", "QWEN_RETRY_MAX_DELAY", *overrides]
+    original = {name: getattr(settings, name) for name in names}
+    settings.QWEN_RETRY_BASE_DELAY = 0.001
+    settings.QWEN_RETRY_MAX_DELAY = 0.001
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+    service = QwenService(backend=FakeBackend(statuses=statuses))
+    try:
+        yield service
+    finally:
+        service.shutdown()
+        for name, value in original.items():
+            setattr(settings, name, value)
+
+
+def test_adaptive_limiter():
+    """测试 AIMD：正常时缓慢增加，限流时减半，延迟异常时小幅下调"""
+    print("=" * 60)
+    print("测试: 自适应并发")
+    print("=" * 60)
+    limiter = AdaptiveLimiter(initial=4, minimum=1, maximum=8)
+    for _ in range(20):
+        assert limiter.acquire(0)
+        limiter.release(latency=1.0)
+    grown = limiter.limit
+    assert 4 < grown <= 8, grown
+
+    assert limiter.acquire(0)
+    limiter.release(throttled=True)
+    assert abs(limiter.limit - grown / 2) < 1e-9
+
+    before = limiter.limit
+    assert limiter.acquire(0)
+    limiter.release(latency=10.0)
+    assert limiter.limit < before and limiter.stats()["congested"] == 1
+
+    # 名额用尽时超时返回 False
+    small = AdaptiveLimiter(initial=1, minimum=1, maximum=1)
+    assert small.acquire(0)
+    assert not small.acquire(0.01)
+    small.release()
+    assert small.acquire(0)
+    print(f"✓ 上限 4 → {grown:.2f} → 限流减半 → 延迟异常下调，stats={limiter.stats()}")
+    print()
+
+
+def test_circuit_breaker():
+    """测试熔断：连续失败后拒绝，冷却后放行一个探测请求"""
+    print("=" * 60)
+    print("测试: 熔断器")
+    print("=" * 60)
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=0.05)
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == STATE_OPEN and not breaker.allow()
+    assert breaker.retry_after() > 0
+
+    asyncio.run(asyncio.sleep(0.06))
+    assert breaker.allow(), "冷却结束后应放行探测请求"
+    assert not breaker.allow(), "探测进行中不应放行其他请求"
+    breaker.record_failure()
+    assert breaker.state == STATE_OPEN, "探测失败应重新熔断"
+
+    asyncio.run(asyncio.sleep(0.06))
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == STATE_CLOSED and breaker.allow()
+
+    # 探测未得出结论时归还名额；一直未上报结果的探测在冷却时间后视为已放弃
+    for _ in range(3):
+        breaker.record_failure()
+    asyncio.run(asyncio.sleep(0.06))
+    assert breaker.allow() and not breaker.allow()
+    breaker.release_probe()
+    assert breaker.allow(), "归还后应放行下一个探测请求"
+    assert not breaker.allow()
+    asyncio.run(asyncio.sleep(0.06))
+    assert breaker.allow() and breaker.stats()["abandonedProbes"] == 1
+    breaker.record_success()
+
+    delays = [backoff_delay(attempt, 0.5, 2.0) for attempt in range(1, 6) for _ in range(20)]
+    assert all(0 <= d <= 2.0 for d in delays)
+    print(f"✓ 熔断 → 半开探测失败 → 再次熔断 → 探测成功恢复，stats={breaker.stats()}")
+    print()
+
+
+def test_retry_and_breaker_in_service():
+    """测试服务调用：限流后重试成功；持续失败触发熔断后直接返回"""
+    print("=" * 60)
+    print("测试: 调用重试与熔断")
+    print("=" * 60)
+    with _service([429, 503, 200]) as service:
+        result = service.generate_text("你好")
+        assert result["success"] and service.backend.calls == 3, (result, service.backend.calls)
+        assert service.stats()["concurrency"]["throttled"] == 1
+        print(f"✓ 429、503 后第 3 次成功，上游调用 {service.backend.calls} 次")
+
+    with _service([400]) as service:
+        result = service.generate_text("你好")
+        assert not result["success"] and not result["retryable"] and service.backend.calls == 1
+        print("✓ 400 不重试")
+
+    with _service([500] * 10, QWEN_RETRY_ATTEMPTS=2, QWEN_BREAKER_FAILURES=4, QWEN_BREAKER_COOLDOWN=60.0) as service:
+        first = service.generate_text("一")
+        second = service.generate_text("二")
+        assert not first["success"] and not second["success"]
+        assert service.backend.calls == 4
+        third = service.generate_text("三")
+        assert third.get("circuitOpen") and service.backend.calls == 4, third
+        assert should_defer(third) and service.retry_after() > 0
+        print(f"✓ 连续 4 次失败后熔断，后续调用直接返回: {third['error']}")
+    print()
+
+
+def _half_open(service):
+    """让服务的熔断器进入冷却已结束、等待探测的状态"""
+    service._breaker = CircuitBreaker(failure_threshold=1, cooldown=0.01)
+    service._breaker.record_failure()
+    asyncio.run(asyncio.sleep(0.02))
+
+
+def test_probe_release_in_service():
+    """测试探测请求排队超时或流被中途关闭后熔断器不会一直停在半开状态"""
+    print("=" * 60)
+    print("测试: 探测请求未得出结论")
+    print("=" * 60)
+    with _service([], QWEN_ACQUIRE_TIMEOUT=0.01) as service:
+        # 探测请求排队超时：归还探测名额，下一次调用重新探测并恢复
+        _half_open(service)
+        service._limiter = AdaptiveLimiter(initial=1, minimum=1, maximum=1)
+        assert service._limiter.acquire(0)
+        busy = service.generate_text("一")
+        assert not busy["success"] and busy["code"] == 503 and service.backend.calls == 0
+        service._limiter.release()
+        assert service.generate_text("二")["success"]
+        assert service._breaker.state == STATE_CLOSED
+        print("✓ 排队超时后下一次调用重新探测，探测成功后恢复")
+
+        # 流式探测排队超时
+        _half_open(service)
+        assert service._limiter.acquire(0)
+        stream = service._iter_stream(settings.QWEN_MODEL, [{"role": "user", "content": "三"}], 0.7, 100)
+        try:
+            next(stream)
+            raise AssertionError("名额用尽时应排队超时")
+        except QwenStreamError as e:
+            assert e.status_code == 503
+        service._limiter.release()
+        assert service._breaker.allow()
+        service._breaker.release_probe()
+
+        # 流式探测被调用方中途关闭（客户端断开、共享流取消）：已有输出，视为上游正常
+        service.backend.chunks = ["第一段", "第二段"]
+        stream = service._iter_stream(settings.QWEN_MODEL, [{"role": "user", "content": "四"}], 0.7, 100)
+        assert next(stream) == "第一段"
+        stream.close()
+        assert service._breaker.state == STATE_CLOSED and service._breaker.allow()
+        assert service._limiter.stats()["inflight"] == 0
+        print("✓ 流式排队超时归还探测名额；中途关闭的探测流恢复熔断器")
+    print()
+
+
+class FakeExtractor:
+    """模拟字段提取：按预设结果依次返回"""
+
+    def __init__(self, results):
+        self.results = list(results)
+
+    async def extract(self, text):
+        return self.results.pop(0)
+
+
+async def _run_deferred_queue():
+    tmp = tempfile.mkdtemp()
+    engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp, 'cases.db')}")
+    async with engine.begin() as conn:
+        await conn.run_sync(CaseFile.__table__.create)
+    factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    try:
+        async with factory() as db:
+            db.add(CaseFile(
+                id=1, case_no="AJ1", case_name="导入文件", ocr_text="案卷正文", status="pending",
+                meta_data=mark_deferred({"original_filename": "a.docx"}, "AI 服务暂时不可用"),
+            ))
+            await db.commit()
+
+        unavailable = {"success": False, "error": "熔断", "retryable": True, "circuitOpen": True}
+        fields = {"case_name": "2020年某单位案件", "person_name": "张三"}
+        queue = DeferredExtractionQueue(
+            extractor=FakeExtractor([unavailable, {"success": True, "fields": fields}]),
+            session_factory=factory,
+        )
+        assert await queue.process(1) == STATE_DEFERRED
+        async with factory() as db:
+            meta = (await db.get(CaseFile, 1)).meta_data
+            assert meta[EXTRACT_STATE_KEY] == STATE_DEFERRED and meta[EXTRACT_ATTEMPTS_KEY] == 1
+
+        assert await queue.process(1) is None
+        async with factory() as db:
+            case_file = await db.get(CaseFile, 1)
+            assert case_file.case_name == "2020年某单位案件" and case_file.person_name == "张三"
+            assert EXTRACT_STATE_KEY not in case_file.meta_data
+            assert case_file.meta_data["original_filename"] == "a.docx"
+        # 已完成的案卷再次处理时忽略
+        assert await queue.process(1) is None
+
+        # 不可重试的错误直接标记失败
+        async with factory() as db:
+            db.add(CaseFile(
+                id=2, case_no="AJ2", case_name="导入文件2", ocr_text="正文", status="pending",
+                meta_data=mark_deferred({}, "熔断"),
+            ))
+            await db.commit()
+        queue.extractor = FakeExtractor([{"success": False, "error": "内容无法解析"}])
+        assert await queue.process(2) == STATE_FAILED
+
+        # 启动时从数据库恢复待提取的案卷
+        async with factory() as db:
+            db.add(CaseFile(
+                id=3, case_no="AJ3", case_name="导入文件3", ocr_text="正文", status="pending",
+                meta_data=mark_deferred({}, "熔断"),
+            ))
+            await db.commit()
+        queue.extractor = FakeExtractor([{"success": True, "fields": {"person_name": "李四"}}])
+        await queue.start()
+        for _ in range(100):
+            if queue.stats()["completed"] == 2:
+                break
+            await asyncio.sleep(0.01)
+        await queue.stop()
+        assert queue.stats()["completed"] == 2, queue.stats()
+        async with factory() as db:
+            assert (await db.get(CaseFile, 3)).person_name == "李四"
+
+        # 已入库的案卷即使仍带标记也不提取；提取期间被人工确认入库时不覆盖人工修改
+        async with factory() as db:
+            db.add_all([
+                CaseFile(id=4, case_no="AJ4", case_name="导入文件4", ocr_text="正文", status="completed",
+                         meta_data=mark_deferred({}, "熔断")),
+                CaseFile(id=5, case_no="AJ5", case_name="导入文件5", ocr_text="正文", status="pending",
+                         meta_data=mark_deferred({}, "熔断")),
+            ])
+            await db.commit()
+
+        class ReviewedDuringExtract(FakeExtractor):
+            async def extract(self, text):
+                async with factory() as db:
+                    case_file = await db.get(CaseFile, 5)
+                    case_file.case_name, case_file.status = "人工审核名称", "completed"
+                    await db.commit()
+                return await super().extract(text)
+
+        queue.extractor = ReviewedDuringExtract([{"success": True, "fields": {"case_name": "模型结果"}}])
+        assert await queue.process(4) is None and len(queue.extractor.results) == 1
+        assert await queue.process(5) is None and not queue.extractor.results
+        async with factory() as db:
+            assert (await db.get(CaseFile, 5)).case_name == "人工审核名称"
+        return queue.stats()
+    finally:
+        await engine.dispose()
+
+
+def test_deferred_extraction_queue():
+    """测试延迟提取：熔断期间导入的案卷在恢复后重新提取并回写字段"""
+    print("=" * 60)
+    print("测试: 延迟提取队列")
+    print("=" * 60)
+    stats = asyncio.run(_run_deferred_queue())
+    print(f"✓ 暂缓 → 重新提取回写；不可重试错误标记失败；启动时恢复待提取案卷；已人工处理的案卷不覆盖，stats={stats}")
+    print()
+
+
+def main():
+    """主测试函数"""
+    print("\n" + "=" * 60)
+    print("上游调用弹性控制测试")
+    print("=" * 60 + "\n")
+    try:
+        test_adaptive_limiter()
+        test_circuit_breaker()
+        test_retry_and_breaker_in_service()
+        test_probe_release_in_service()
+        test_deferred_extraction_queue()
+        print("=" * 60)
+        print("✅ 所有测试通过！")
+        print("=" * 60)
+    except Exception as e:
+        print(f"\n❌ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
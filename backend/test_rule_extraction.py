@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+测试卷宗封面规则提取（标签字段、固定小标题、置信度、跳过模型调用、与模型结果合并）
+"""
+import sys
+import os
+import asyncio
+
+# 添加项目路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+
+from app.services.case_extraction import CaseFieldExtractor
+from app.services.rule_extraction import RuleFieldExtractor
+
+COVER = """案件卷宗
+姓　　名：张三        性别：男      民族：汉
+籍贯：河北保定
+入伍时间：2019年9月   部职别：某部一连战士
+人员类别：现役军人
+事发单位：某部一连
+案件类型：刑事
+案发时间：2021年3月15日21时30分
+涉嫌罪名：盗窃罪
+"""
+
+SECTIONS = """一、简要案情
+2021年3月15日晚，张三趁值班空隙进入连队库房盗取物资。
+次日清点时被发现。
+二、侦查调查过程及结论
+保卫部门调取监控并询问相关人员，张三如实供述，认定盗窃事实成立。
+三、原因教训：日常管理松懈，库房钥匙管理存在漏洞，教育引导不到位。
+四、处理结果
+移送军事检察院审查起诉。
+"""
+
+
+def test_cover_fields():
+    """测试封面标签字段：同行多标签、字间空格、中文日期、值规范化"""
+    print("=" * 60)
+    print("测试: 封面标签提取")
+    print("=" * 60)
+    extraction = RuleFieldExtractor().extract(COVER)
+    confident = extraction.confident()
+    assert confident["person_name"] == "张三"
+    assert confident["person_info"] == {
+        "gender": "男",
+        "ethnicity": "汉族",
+        "birthplace": "河北保定",
+        "enlistment_time": "2019-09",
+        "position": "某部一连战士",
+        "person_category": "现役军人",
+    }, confident["person_info"]
+    assert confident["incident_time"] == "2021-03-15 21:30"
+    assert confident["case_type"] == "刑事案件" and confident["charge"] == "盗窃罪"
+    assert confident["source_department"] == "某部一连"
+    assert not extraction.complete, "缺少叙述类字段时仍需调用模型"
+
+    # PDF 表格：值排在下一行；只有年月的案发时间置信度不足
+    pdf = RuleFieldExtractor().extract("姓名：\n李四\n案发时间：2020年5月\n")
+    assert pdf.confident() == {"person_name": "李四"} and pdf.fields["incident_time"] == "2020-05-01"
+    # 封面范围外的标签与不合法的值不提取
+    noise = RuleFieldExtractor().extract("正文" * 2000 + "\n姓名：王五\n性别：未知\n")
+    assert noise.fields == {}
+    # “承办人姓名”“承办人职务”不是涉案人员字段，且截断前一字段的值
+    staff = RuleFieldExtractor().extract("承办人姓名：王五\n承办人职务：科长\n姓名：张三    承办人姓名：王五\n")
+    assert staff.fields == {"person_name": "张三"} and staff.confidence["person_name"] == 1.0, staff.fields
+    # 更具体的标签优先于先出现的“姓名”
+    party = RuleFieldExtractor().extract("姓名：王五\n当事人：张三\n涉嫌罪名：盗窃罪  罪名：诈骗罪\n")
+    assert party.fields == {"person_name": "张三", "charge": "盗窃罪"}, party.fields
+    print(f"✓ 提取 {len(extraction.fields)} 个封面字段；下一行取值、低置信度、封面范围外标签与复合标签处理正确")
+    print()
+
+
+def test_section_fields():
+    """测试固定小标题下的叙述"""
+    print("=" * 60)
+    print("测试: 小标题叙述提取")
+    print("=" * 60)
+    extraction = RuleFieldExtractor().extract(COVER + SECTIONS + "五、其他\n原因教训深刻，须引以为戒。\n")
+    confident = extraction.confident()
+    assert confident["incident_process"].startswith("2021年3月15日晚") and "次日清点" in confident["incident_process"]
+    assert confident["investigation_process_and_conclusion"].endswith("认定盗窃事实成立。")
+    assert confident["cause_and_lesson"] == "日常管理松懈，库房钥匙管理存在漏洞，教育引导不到位。"
+    # 其他一级标题结束上一部分；正文中的“原因教训深刻”不是标题
+    assert confident["judgment"] == "移送军事检察院审查起诉。"
+    assert extraction.complete
+    print("✓ 简要案情、侦查调查、原因教训、处理结果按小标题切分")
+    print()
+
+
+def test_skip_llm():
+    """测试规则字段齐全时不调用模型，不齐全时覆盖模型结果，模型失败时保留规则字段"""
+    print("=" * 60)
+    print("测试: 规则提取与模型提取的衔接")
+    print("=" * 60)
+    calls = []
+    model_result = {"success": True, "fields": {
+        "case_name": "2021年3月某部一连-战士张三盗窃案",
+        "person_name": "张三",
+        "charge": "盗窃",
+        "incident_time": "2021-03-15",
+        "person_info": {"gender": "男", "position": "战士"},
+        "incident_process": "张三盗窃库房物资。",
+    }}
+
+    def _extract(text, part=None):
+        calls.append(text)
+        return dict(model_result)
+
+    extractor = CaseFieldExtractor(extract_fn=_extract, rules=RuleFieldExtractor())
+    try:
+        result = asyncio.run(extractor.extract(COVER + SECTIONS))
+        assert result["source"] == "rules" and not calls
+        fields = result["fields"]
+        assert fields["case_name"] == "2021年3月某部一连-现役军人张三盗窃罪" and fields["title"] == fields["case_name"]
+        assert fields["classification_level1"] == "刑事案件" and fields["timeline"][0]["typeLabel"] == "案发"
+        print(f"✓ 字段齐全时不调用模型：{fields['case_name']}")
+
+        result = asyncio.run(extractor.extract(COVER + "正文叙述……"))
+        assert len(calls) == 1 and result["success"]
+        fields = result["fields"]
+        assert fields["charge"] == "盗窃罪" and fields["case_name"] == model_result["fields"]["case_name"]
+        assert fields["incident_time"] == "2021-03-15 21:30", "同一天取更具体的时刻"
+        assert fields["person_info"]["position"] == "某部一连战士" and fields["person_info"]["ethnicity"] == "汉族"
+        assert fields["incident_process"] == "张三盗窃库房物资。"
+        assert result["conflicts"] == {
+            "charge": ["盗窃罪", "盗窃"],
+            "person_info.position": ["某部一连战士", "战士"],
+        }, result["conflicts"]
+        print("✓ 叙述不齐全时调用模型，封面字段覆盖模型结果，取值不同记入 conflicts")
+
+        model_result = {"success": False, "error": "熔断", "retryable": True}
+        result = asyncio.run(extractor.extract(COVER))
+        assert not result["success"] and result["retryable"]
+        assert result["fields"]["person_name"] == "张三" and result["fields"]["case_type"] == "刑事案件"
+        print("✓ 模型不可用时返回规则字段并保留可重试标记")
+
+        async def _stream():
+            return [event async for event in extractor.extract_stream(COVER + SECTIONS)]
+
+        events = asyncio.run(_stream())
+        assert len(calls) == 2 and events[-1]["result"]["source"] == "rules"
+        assert {e["field"] for e in events[:-1]} >= {"person_name", "incident_process", "timeline"}
+        print("✓ 流式提取字段齐全时同样不调用模型")
+    finally:
+        extractor.shutdown()
+    print()
+
+
+def main():
+    """主测试函数"""
+    print("\n" + "=" * 60)
+    print("卷宗封面规则提取测试")
+    print("=" * 60 + "\n")
+    try:
+        test_cover_fields()
+        test_section_fields()
+        test_skip_llm()
+        print("=" * 60)
+        print("✅ 所有测试通过！")
+        print("=" * 60)
+    except Exception as e:
+        print(f"\n❌ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+测试相同请求合并（同步调用 single-flight、流式调用共享上游并向多个订阅者分发）
+"""
+import sys
+import os
+import json
+import time
+import asyncio
+import threading
+from contextlib import contextmanager
+
+# 添加项目路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+
+from app.core.single_flight import SingleFlight
+from app.services.qwen_service import QwenService
+from fake_llm_backend import FakeBackend
+
+
+@contextmanager
+def _service():
+    """使用模拟上游的服务实例：非流式调用耗时 0.1s，流式逐片输出"""
+    backend = FakeBackend(delay=0.1, chunks=["第一段", "第二段", "第三段", "第四段"], chunk_delay=0.05)
+    service = QwenService(backend=backend)
+    try:
+        yield service
+    finally:
+        service.shutdown()
+
+
+def test_single_flight():
+    """测试同步调用合并"""
+    print("=" * 60)
+    print("测试: 同步调用合并")
+    print("=" * 60)
+    flights = SingleFlight()
+    calls = []
+
+    def _work():
+        calls.append(1)
+        time.sleep(0.1)
+        return {"value": 1}
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flights.do("k", _work))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1 and len(results) == 5
+    assert sorted(shared for _, shared in results) == [False, True, True, True, True]
+    assert flights.stats() == {"inflight": 0, "calls": 1, "coalesced": 4}
+
+    # 调用结束后相同请求重新执行
+    flights.do("k", _work)
+    assert len(calls) == 2
+
+    with _service() as service:
+        threads = [threading.Thread(target=service.generate_text, args=("同一提示词",)) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert service.backend.calls == 1
+        print(f"  统计: {service.stats()}")
+    print("✓ 同步调用合并测试通过\n")
+
+
+async def _collect(service, delay=0.0):
+    await asyncio.sleep(delay)
+    frames = []
+    async for chunk in service.generate_story_stream("电信诈骗", {"keywords": "刷单"}):
+        frames.append(json.loads(chunk[len(b"data: "):]))
+    return frames
+
+
+async def _fan_out(service):
+    # 第三个订阅者在上游输出中途加入
+    return await asyncio.gather(_collect(service), _collect(service), _collect(service, delay=0.08))
+
+
+async def _disconnect(service):
+    stream = service.generate_story_stream("电信诈骗", {"keywords": "刷单"})
+    await stream.__anext__()
+    await stream.aclose()
+    await asyncio.sleep(0.3)
+
+
+def test_shared_stream():
+    """测试流式调用共享上游"""
+    print("=" * 60)
+    print("测试: 流式调用共享")
+    print("=" * 60)
+    with _service() as service:
+        results = asyncio.run(_fan_out(service))
+        contents = ["".join(f.get("content", "") for f in frames) for frames in results]
+        print(f"  上游调用 {service.backend.calls} 次，订阅者收到: {contents}")
+        assert service.backend.calls == 1
+        assert contents == ["第一段第二段第三段第四段"] * 3
+        assert all(frames[-1] == {"done": True} for frames in results)
+        assert service.stats()["streams"] == {"inflight": 0, "streams": 1, "shared": 2}
+
+        # 所有订阅者断开后不再保留该流
+        asyncio.run(_disconnect(service))
+        assert service.stats()["streams"]["inflight"] == 0
+    print("✓ 流式调用共享测试通过\n")
+
+
+def main():
+    """运行所有测试"""
+    try:
+        test_single_flight()
+        test_shared_stream()
+        print("所有测试通过! ✓")
+        return 0
+    except Exception as e:
+        print(f"\n✗ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
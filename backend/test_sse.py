@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+测试 SSE 流式响应（内容增量合并、心跳、客户端断开时关闭上游、背压）
+"""
+import sys
+import os
+import asyncio
+import json
+
+# 添加项目路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+
+from app.core.serialization import sse_frame, SSE_DONE
+from app.core.sse import FrameCoalescer, SSE_HEARTBEAT, sse_stream
+
+
+def _decode(frames):
+    """解析输出帧（忽略心跳）"""
+    return [json.loads(f[len(b"data: "):-2]) for f in frames if f != SSE_HEARTBEAT]
+
+
+async def _collect(source, **options):
+    return [frame async for frame in sse_stream(source, **options)]
+
+
+def test_coalescer():
+    """测试相邻内容帧合并，其他帧原样按顺序输出"""
+    print("=" * 60)
+    print("测试: 内容帧合并")
+    print("=" * 60)
+    coalescer = FrameCoalescer(max_bytes=1024)
+    out = []
+    for piece in ["一", "二", "三"]:
+        out += coalescer.add(sse_frame({"content": piece}))
+    assert out == [] and coalescer.pending
+    # 字段不同的内容帧不合并
+    out += coalescer.add(sse_frame({"type": "content", "section_id": "title", "content": "标"}))
+    out += coalescer.add(sse_frame({"type": "content", "section_id": "title", "content": "题"}))
+    out += coalescer.add(sse_frame({"type": "content", "section_id": "body", "content": "正文"}))
+    # 非内容帧先输出待合并内容
+    out += coalescer.add(SSE_DONE)
+    assert _decode(out) == [
+        {"content": "一二三"},
+        {"type": "content", "section_id": "title", "content": "标题"},
+        {"type": "content", "section_id": "body", "content": "正文"},
+        {"done": True},
+    ], _decode(out)
+
+    # 达到大小窗口立即输出
+    small = FrameCoalescer(max_bytes=9)
+    emitted = small.add(sse_frame({"content": "甲乙"})) + small.add(sse_frame({"content": "丙"}))
+    assert _decode(emitted) == [{"content": "甲乙丙"}] and not small.pending
+    print("✓ 相同字段的相邻内容帧合并，字段不同或非内容帧时先输出已合并内容")
+    print()
+
+
+def test_stream_coalescing_and_heartbeat():
+    """测试逐 token 输出合并为少量帧，上游停顿时发送心跳"""
+    print("=" * 60)
+    print("测试: 流式合并与心跳")
+    print("=" * 60)
+
+    async def _tokens():
+        for i in range(200):
+            yield sse_frame({"content": "字"})
+            if i % 50 == 49:
+                await asyncio.sleep(0.02)
+        yield SSE_DONE
+
+    frames = asyncio.run(_collect(_tokens(), coalesce_ms=50, coalesce_bytes=1024, heartbeat_seconds=10))
+    data = _decode(frames)
+    assert "".join(d.get("content", "") for d in data) == "字" * 200
+    assert data[-1] == {"done": True} and len(frames) < 10, len(frames)
+    print(f"✓ 200 个 token 帧合并为 {len(frames)} 帧")
+
+    async def _slow():
+        yield sse_frame({"content": "开始"})
+        await asyncio.sleep(0.25)
+        yield sse_frame({"content": "结束"})
+        yield SSE_DONE
+
+    frames = asyncio.run(_collect(_slow(), coalesce_ms=20, heartbeat_seconds=0.1))
+    heartbeats = frames.count(SSE_HEARTBEAT)
+    # 时间窗口到期后先输出“开始”，停顿期间发送心跳
+    assert _decode(frames[:1]) == [{"content": "开始"}]
+    assert heartbeats >= 1, frames
+    assert _decode(frames)[-2:] == [{"content": "结束"}, {"done": True}]
+    print(f"✓ 时间窗口到期输出，上游停顿 0.25s 期间发送 {heartbeats} 次心跳")
+    print()
+
+
+class FakeRequest:
+    """模拟请求：disconnected 置位后视为客户端断开"""
+
+    def __init__(self):
+        self.disconnected = False
+
+    async def is_disconnected(self):
+        return self.disconnected
+
+
+def test_disconnect_closes_upstream():
+    """测试客户端断开（或停止读取）时关闭上游生成器"""
+    print("=" * 60)
+    print("测试: 客户端断开")
+    print("=" * 60)
+    state = {"closed": 0, "produced": 0}
+
+    async def _upstream():
+        try:
+            while True:
+                state["produced"] += 1
+                yield sse_frame({"content": "x"})
+                await asyncio.sleep(0.01)
+        finally:
+            state["closed"] += 1
+
+    async def _consumer_stops():
+        stream = sse_stream(_upstream(), coalesce_ms=0, heartbeat_seconds=10)
+        async for _ in stream:
+            if state["produced"] >= 5:
+                break
+        await stream.aclose()
+
+    asyncio.run(_consumer_stops())
+    assert state["closed"] == 1
+    print("✓ 下游停止读取后上游生成器被关闭")
+
+    async def _idle_upstream():
+        try:
+            yield sse_frame({"content": "开始"})
+            await asyncio.sleep(10)
+            yield SSE_DONE
+        finally:
+            state["closed"] += 1
+
+    async def _disconnect():
+        request = FakeRequest()
+        frames = []
+
+        async def _drop():
+            await asyncio.sleep(0.1)
+            request.disconnected = True
+
+        asyncio.ensure_future(_drop())
+        async for frame in sse_stream(_idle_upstream(), request, coalesce_ms=0, heartbeat_seconds=0.05):
+            frames.append(frame)
+        return frames
+
+    frames = asyncio.run(asyncio.wait_for(_disconnect(), timeout=2))
+    assert state["closed"] == 2 and _decode(frames) == [{"content": "开始"}]
+    print("✓ 上游空闲期间检测到客户端断开，停止输出并取消上游")
+
+    async def _cancelled():
+        # 模拟 Starlette 在客户端断开时取消输出任务
+        task = asyncio.ensure_future(_collect(_idle_upstream(), heartbeat_seconds=10))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(_cancelled())
+    assert state["closed"] == 3
+    print("✓ 输出任务被取消时上游同样被关闭")
+    print()
+
+
+def test_backpressure():
+    """测试下游读取慢时上游不会提前读取"""
+    print("=" * 60)
+    print("测试: 背压")
+    print("=" * 60)
+    state = {"produced": 0}
+
+    async def _upstream():
+        for _ in range(100):
+            state["produced"] += 1
+            yield SSE_DONE
+
+    async def _slow_consumer():
+        stream = sse_stream(_upstream(), heartbeat_seconds=10)
+        consumed = 0
+        async for _ in stream:
+            consumed += 1
+            await asyncio.sleep(0.001)
+            # 上游最多只比下游多读一帧
+            assert state["produced"] <= consumed + 1, (state["produced"], consumed)
+        return consumed
+
+    assert asyncio.run(_slow_consumer()) == 100
+    print("✓ 上游读取进度始终不超过下游一帧")
+    print()
+
+
+def main():
+    """主测试函数"""
+    print("\n" + "=" * 60)
+    print("SSE 流式响应测试")
+    print("=" * 60 + "\n")
+    try:
+        test_coalescer()
+        test_stream_coalescing_and_heartbeat()
+        test_disconnect_closes_upstream()
+        test_backpressure()
+        print("=" * 60)
+        print("✅ 所有测试通过！")
+        print("=" * 60)
+    except Exception as e:
+        print(f"\n❌ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+测试可续传的 SSE 生成会话（环形缓冲、Last-Event-ID 重放、断线后继续生成、无连接超时取消）
+"""
+import sys
+import os
+import asyncio
+import json
+
+# 添加项目路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.serialization import sse_frame, SSE_DONE
+from app.core.sse_sessions import (
+    SESSION_HEADER,
+    StreamSessionManager,
+    parse_event_id,
+    resumable_sse_response,
+    stream_sessions,
+)
+
+
+def _events(frames):
+    """解析事件：[(id, data)]"""
+    events = []
+    for frame in frames:
+        event_id, data = None, None
+        for line in frame.decode().strip().split("\n"):
+            if line.startswith("id: "):
+                event_id = line[4:]
+            elif line.startswith("data: "):
+                data = json.loads(line[6:])
+        if data is not None:
+            events.append((event_id, data))
+    return events
+
+
+async def _sections(count, delay=0.01):
+    """模拟生成：各段之间有停顿（每段一个非合并帧）"""
+    for i in range(count):
+        yield sse_frame({"type": "section_complete", "index": i})
+        await asyncio.sleep(delay)
+    yield SSE_DONE
+
+
+def test_parse_event_id():
+    print("=" * 60)
+    print("测试: 事件 id 解析")
+    print("=" * 60)
+    assert parse_event_id("abc123-17") == ("abc123", 17)
+    assert parse_event_id(" abc-0 ") == ("abc", 0)
+    assert parse_event_id("abc") is None and parse_event_id("-3") is None and parse_event_id(None) is None
+    print("✓ <会话ID>-<序号>")
+    print()
+
+
+def test_resume_after_disconnect():
+    """测试断线期间生成继续，重连后先重放缺失事件再接收新事件"""
+    print("=" * 60)
+    print("测试: 断线续传")
+    print("=" * 60)
+
+    async def _run():
+        manager = StreamSessionManager(buffer_size=100, ttl=60)
+        session = manager.start("u1", _sections(10))
+        first = []
+        async for frame in session.subscribe(0):
+            first.append(frame)
+            if len(first) == 3:
+                break
+        last_id = _events(first)[-1][0]
+        # 断线期间继续生成
+        await asyncio.sleep(0.05)
+        assert session.subscribers == 0 and session.last_seq > 3
+
+        assert manager.resume("u2", last_id) is None, "不能续传其他用户的会话"
+        resumed_session, after = manager.resume("u1", last_id)
+        assert resumed_session is session and after == 3
+        rest = [frame async for frame in session.subscribe(after)]
+        return first, rest, manager.stats()
+
+    first, rest, stats = asyncio.run(_run())
+    data = [d for _, d in _events(first + rest)]
+    assert [d["index"] for d in data[:-1]] == list(range(10)) and data[-1] == {"done": True}, data
+    ids = [event_id for event_id, _ in _events(first + rest)]
+    assert [parse_event_id(i)[1] for i in ids] == list(range(1, 12))
+    assert stats["resumed"] == 1 and stats["resumeFailed"] == 1
+    print(f"✓ 首次连接收到 3 个事件，续传补齐其余 {len(rest)} 个，事件不重复不缺失，stats={stats}")
+    print()
+
+
+def test_ring_buffer_overflow():
+    """测试缺失事件已被环形缓冲区覆盖时返回错误"""
+    print("=" * 60)
+    print("测试: 缓冲区覆盖")
+    print("=" * 60)
+
+    async def _run():
+        manager = StreamSessionManager(buffer_size=5, ttl=60)
+        session = manager.start("u1", _sections(20, delay=0))
+        while not session.done:
+            await asyncio.sleep(0.01)
+        return [frame async for frame in session.subscribe(2)], [frame async for frame in session.subscribe(17)]
+
+    lost, tail = asyncio.run(_run())
+    assert _events(lost)[0][1].get("resumeFailed") and len(lost) == 1
+    assert [d for _, d in _events(tail)] == [
+        {"type": "section_complete", "index": 17},
+        {"type": "section_complete", "index": 18},
+        {"type": "section_complete", "index": 19},
+        {"done": True},
+    ]
+    print("✓ 缺失事件已被覆盖时返回 resumeFailed，缓冲区内的事件正常重放")
+    print()
+
+
+def test_idle_session_cancelled():
+    """测试无客户端连接超时后取消生成"""
+    print("=" * 60)
+    print("测试: 无连接超时取消")
+    print("=" * 60)
+    state = {"closed": False}
+
+    async def _endless():
+        try:
+            while True:
+                yield sse_frame({"type": "tick"})
+                await asyncio.sleep(0.01)
+        finally:
+            state["closed"] = True
+
+    async def _run():
+        original = settings.SSE_SESSION_IDLE_SECONDS
+        settings.SSE_SESSION_IDLE_SECONDS = 0.05
+        try:
+            manager = StreamSessionManager(buffer_size=100, ttl=60)
+            session = manager.start("u1", _endless())
+            async for _ in session.subscribe(0):
+                break
+            await asyncio.sleep(0.2)
+            assert session.done and state["closed"] and manager.stats()["active"] == 0
+
+            # 客户端在读取响应前就断开（从未订阅）
+            state["closed"] = False
+            unread = manager.start("u1", _endless())
+            await asyncio.sleep(0.2)
+            return unread, manager.stats()
+        finally:
+            settings.SSE_SESSION_IDLE_SECONDS = original
+
+    session, stats = asyncio.run(_run())
+    assert session.done and state["closed"] and stats["active"] == 0
+    print("✓ 无连接超过空闲时间后取消生成并关闭上游；从未订阅的会话同样取消")
+    print()
+
+
+def test_http_resume():
+    """测试接口：带 Last-Event-ID 重发请求时续传，不重新调用上游"""
+    print("=" * 60)
+    print("测试: 接口续传")
+    print("=" * 60)
+    app = FastAPI()
+    calls = {"count": 0}
+
+    def _factory():
+        calls["count"] += 1
+        return _sections(5)
+
+    @app.post("/generate")
+    async def generate(request: Request):
+        return resumable_sse_response(request, "u1", _factory)
+
+    with TestClient(app) as client:
+        first = client.post("/generate")
+        session_id = first.headers[SESSION_HEADER]
+        events = _events([part.encode() + b"\n\n" for part in first.text.split("\n\n") if part])
+        assert len(events) == 6 and calls["count"] == 1
+
+        resumed = client.post("/generate", headers={"Last-Event-ID": f"{session_id}-2"})
+        resumed_events = _events([part.encode() + b"\n\n" for part in resumed.text.split("\n\n") if part])
+        assert resumed.headers[SESSION_HEADER] == session_id and calls["count"] == 1
+        assert [e[0] for e in resumed_events] == [f"{session_id}-{i}" for i in range(3, 7)]
+
+        # 未知会话按新请求处理
+        fresh = client.post("/generate", headers={"Last-Event-ID": "unknown-3"})
+        assert fresh.headers[SESSION_HEADER] != session_id and calls["count"] == 2
+    stream_sessions.shutdown()
+    print(f"✓ 续传返回事件 3~6，上游只调用 {calls['count'] - 1} 次；未知会话重新生成")
+    print()
+
+
+def main():
+    """主测试函数"""
+    print("\n" + "=" * 60)
+    print("可续传 SSE 会话测试")
+    print("=" * 60 + "\n")
+    try:
+        test_parse_event_id()
+        test_resume_after_disconnect()
+        test_ring_buffer_overflow()
+        test_idle_session_cancelled()
+        test_http_resume()
+        print("=" * 60)
+        print("✅ 所有测试通过！")
+        print("=" * 60)
+    except Exception as e:
+        print(f"\n❌ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
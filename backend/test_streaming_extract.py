@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+测试流式字段提取（增量 JSON 解析、字段闭合即产出、导入分析阶段逐字段推送）
+"""
+import sys
+import os
+import asyncio
+import json
+import random
+import time
+
+# 添加项目路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+
+from app.core.config import settings
+from app.core.json_stream import IncrementalObjectParser
+from app.services.case_extraction import CaseFieldExtractor
+from app.services.qwen_service import QwenService
+from fake_llm_backend import FakeBackend
+
+SAMPLE = {
+    "case_name": "2021年3月某部-战士张三-盗窃案",
+    "incident_time": "2021-03-15 21:30",
+    "person_name": "张三",
+    "person_info": {"gender": "男", "birthplace": "河北\"保定\"", "note": "含 {括号} 与 [方括号]"},
+    "incident_process": "当晚张三趁值班空隙……\n次日被发现。",
+    "classification_level1": None,
+    "count": 3,
+    "ratio": -1.5e2,
+    "flag": True,
+    "timeline": [
+        {"time": "2021-03-15", "event": "案发", "type": "incident", "description": "盗窃"},
+        {"time": "2021-03-20", "event": "立案", "type": "filing", "description": ""},
+    ],
+    "judgment": "判处有期徒刑一年",
+}
+
+
+def _chunks(text, rng):
+    """按随机长度切分，模拟模型逐 token 输出"""
+    pos = 0
+    while pos < len(text):
+        size = rng.randint(1, 6)
+        yield text[pos:pos + size]
+        pos += size
+
+
+def test_incremental_parser():
+    """测试任意切分下解析结果与 json.loads 一致，字段按闭合顺序产出"""
+    print("=" * 60)
+    print("测试: 增量 JSON 解析")
+    print("=" * 60)
+    rng = random.Random(7)
+    for text in (
+        json.dumps(SAMPLE, ensure_ascii=False),
+        "```json\n" + json.dumps(SAMPLE, ensure_ascii=False, indent=2) + "\n```",
+        "以下是提取结果：" + json.dumps(SAMPLE),
+    ):
+        for _ in range(20):
+            parser = IncrementalObjectParser()
+            members = []
+            for chunk in _chunks(text, rng):
+                members.extend(parser.feed(chunk))
+            assert parser.done
+            assert dict(members) == SAMPLE and parser.fields == SAMPLE
+            assert [name for name, _ in members] == list(SAMPLE)
+
+    # 字符串值在右引号处立即产出，不等后面的逗号
+    parser = IncrementalObjectParser()
+    assert parser.feed('{"case_name": "张三案') == []
+    assert parser.feed('"') == [("case_name", "张三案")]
+    # 数字要等到逗号或右括号才能确定结束
+    assert parser.feed(', "count": 12') == []
+    assert parser.feed("}") == [("count", 12)] and parser.done
+    # 未闭合的对象不标记完成
+    partial = IncrementalObjectParser()
+    partial.feed('{"a": 1, "b": [1, 2')
+    assert not partial.done and partial.fields == {"a": 1}
+    print("✓ 随机切分 60 次结果与 json.loads 一致；字符串值闭合即产出")
+    print()
+
+
+def test_extract_stream():
+    """测试流式提取：首个字段远早于整体完成，结果与一次性提取一致"""
+    print("=" * 60)
+    print("测试: 流式提取")
+    print("=" * 60)
+    original = (settings.QWEN_RETRY_ATTEMPTS, settings.QWEN_RETRY_BASE_DELAY)
+    settings.QWEN_RETRY_ATTEMPTS, settings.QWEN_RETRY_BASE_DELAY = 1, 0.001
+    backend = FakeBackend(chunk_delay=0.002)
+    service = QwenService(backend=backend)
+    extractor = CaseFieldExtractor(extract_fn=service.extract_case_fields, stream_fn=service.iter_case_fields)
+
+    async def _run(text):
+        start = time.perf_counter()
+        events, first = [], None
+        async for event in extractor.extract_stream(text):
+            if "field" in event and first is None:
+                first = time.perf_counter() - start
+            events.append(event)
+        return events, first, time.perf_counter() - start
+
+    try:
+        text = "```json\n" + json.dumps(SAMPLE, ensure_ascii=False) + "\n```"
+        backend.chunks = list(_chunks(text, random.Random(1)))
+        events, first, total = asyncio.run(_run("卷宗正文"))
+        fields = [e for e in events if "field" in e]
+        result = events[-1]["result"]
+        assert result["success"] and [e["field"] for e in fields] == list(SAMPLE)
+        assert result["fields"]["case_name"] == SAMPLE["case_name"]
+        # 时间线按导入格式补齐
+        timeline = dict((e["field"], e["value"]) for e in fields)["timeline"]
+        assert timeline[0]["typeLabel"] == "案发" and result["fields"]["timeline"] == timeline
+        assert first < total / 5, (first, total)
+        print(f"✓ 首个字段 {first * 1000:.0f}ms 到达，整体 {total * 1000:.0f}ms")
+
+        # 输出不是合法 JSON
+        backend.chunks = ["无法提取"]
+        events, _, _ = asyncio.run(_run("卷宗正文"))
+        assert events == [events[-1]] and not events[-1]["result"]["success"]
+
+        # 上游限流：失败结果可重试（导入时标记为稍后重新提取）
+        backend.statuses = [429]
+        events, _, _ = asyncio.run(_run("卷宗正文"))
+        assert events[-1]["result"]["retryable"] and events[-1]["result"]["code"] == 429
+        print("✓ 非 JSON 输出返回解析失败；限流返回可重试错误")
+    finally:
+        extractor.shutdown()
+        service.shutdown()
+        settings.QWEN_RETRY_ATTEMPTS, settings.QWEN_RETRY_BASE_DELAY = original
+    print()
+
+
+def test_extract_stream_fallback():
+    """测试未提供流式函数或多段卷宗时退化为一次性提取后逐字段产出"""
+    print("=" * 60)
+    print("测试: 一次性提取回退")
+    print("=" * 60)
+    extractor = CaseFieldExtractor(extract_fn=lambda text, part=None: {"success": True, "fields": {"a": 1, "b": 2}})
+
+    async def _run():
+        return [event async for event in extractor.extract_stream("正文")]
+
+    try:
+        events = asyncio.run(_run())
+    finally:
+        extractor.shutdown()
+    assert events[:2] == [{"field": "a", "value": 1}, {"field": "b", "value": 2}]
+    assert events[-1]["result"]["success"]
+    print("✓ 一次性提取结果按字段依次产出")
+    print()
+
+
+def main():
+    """主测试函数"""
+    print("\n" + "=" * 60)
+    print("流式字段提取测试")
+    print("=" * 60 + "\n")
+    try:
+        test_incremental_parser()
+        test_extract_stream()
+        test_extract_stream_fallback()
+        print("=" * 60)
+        print("✅ 所有测试通过！")
+        print("=" * 60)
+    except Exception as e:
+        print(f"\n❌ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+测试模板注册表（解析一次、按模板ID+版本号缓存、占位符填充、失效）
+"""
+import sys
+import os
+import io
+import tempfile
+
+# 添加项目路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+
+from docx import Document
+
+from app.core.config import settings
+from app.services.template_registry import TemplateRegistry
+
+
+def _write_template(upload_dir: str, name: str) -> str:
+    """生成一个含占位符的模板文件，返回相对路径"""
+    doc = Document()
+    doc.add_paragraph("{{recipient}}：")
+    p = doc.add_paragraph("一、关于")
+    # 占位符被拆分到多个 run 中
+    p.add_run("{{sub")
+    p.add_run("ject}}的通知。")
+    table = doc.add_table(rows=1, cols=1)
+    table.cell(0, 0).text = "日期：{{date}}"
+    doc.sections[0].footer.paragraphs[0].text = "{{recipient}}"
+    os.makedirs(os.path.join(upload_dir, "templates"), exist_ok=True)
+    doc.save(os.path.join(upload_dir, "templates", name))
+    return f"/templates/{name}"
+
+
+def test_template_registry():
+    """测试模板解析与渲染"""
+    print("=" * 60)
+    print("测试: 模板注册表")
+    print("=" * 60)
+    original_upload_dir = settings.UPLOAD_DIR
+    settings.UPLOAD_DIR = tempfile.mkdtemp()
+    try:
+        file_path = _write_template(settings.UPLOAD_DIR, "notice.docx")
+        registry = TemplateRegistry(max_entries=2)
+
+        parsed = registry.get(1, 1, file_path)
+        print(f"  占位符: {parsed.placeholders}, 解析耗时 {parsed.parse_ms}ms")
+        assert parsed.placeholders == ["recipient", "subject", "date"]
+        assert parsed.sections[1]["level"] == 1
+
+        # 同一版本只解析一次
+        assert registry.get(1, 1, file_path) is parsed
+        assert registry.stats()["hits"] == 1 and registry.stats()["misses"] == 1
+
+        doc = Document(io.BytesIO(parsed.render({"recipient": "一营", "subject": "安全检查", "date": "1月1日"})))
+        assert [p.text for p in doc.paragraphs[:2]] == ["一营：", "一、关于安全检查的通知。"]
+        assert doc.tables[0].cell(0, 0).text == "日期：1月1日"
+        assert doc.sections[0].footer.paragraphs[0].text == "一营"
+
+        # 渲染不修改缓存的模板结构；未提供的占位符保持原样
+        doc = Document(io.BytesIO(parsed.render({"recipient": "二营"})))
+        assert [p.text for p in doc.paragraphs[:2]] == ["二营：", "一、关于{{subject}}的通知。"]
+
+        # 新版本重新解析；失效后移除该模板所有版本
+        assert registry.get(1, 2, file_path) is not parsed
+        registry.invalidate(1)
+        assert registry.stats()["size"] == 0
+    finally:
+        settings.UPLOAD_DIR = original_upload_dir
+    print("✓ 模板注册表测试通过\n")
+
+
+def main():
+    """运行所有测试"""
+    try:
+        test_template_registry()
+        print("所有测试通过! ✓")
+        return 0
+    except Exception as e:
+        print(f"\n✗ 测试失败: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
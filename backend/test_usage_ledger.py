@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+测试大模型用量台账（批量写入、用量标签、用户预算、汇总查询）
+"""
+import sys
+import os
+import asyncio
+import json
+import tempfile
+
+# 添加项目路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__)))
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from app.core.config import settings
+from app.core.usage_context import current_usage_tags, tag_usage
+from app.models.llm_usage import LlmUsage
+from app.services.llm_backends import StubBackend, SyntheticLatency
+from app.services.qwen_service import QwenService
+from app.services.usage_ledger import UsageLedger, in_peak_hours, parse_peak_hours
+
+
+async def _session_factory():
+    tmp = tempfile.mkdtemp()
+    engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp, 'usage.db')}")
+    async with engine.begin() as conn:
+        await conn.run_sync(LlmUsage.__table__.create)
+    return engine, async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+async def _count(factory) -> int:
+    async with factory() as db:
+        return (await db.execute(select(func.count(LlmUsage.id)))).scalar()
+
+
+async def _run_batching():
+    engine, factory = await _session_factory()
+    ledger = UsageLedger(session_factory=factory, flush_interval=60, batch_size=5)
+    await ledger.start()
+    try:
+        usage = {"input_tokens": 100, "output_tokens": 20}
+        for _ in range(4):
+            ledger.record("qwen-turbo", "extract", usage, 0.2, True, tags={"user_id": 1})
+        await asyncio.sleep(0.05)
+        assert await _count(factory) == 0, "未达到批量条数前不应写入"
+        ledger.record("qwen-turbo", "extract", usage, 0.2, True, tags={"user_id": 1})
+        for _ in range(50):
+            await asyncio.sleep(0.02)
+            if await _count(factory) == 5:
+                break
+        assert await _count(factory) == 5, "达到批量条数后应提前写入"
+        ledger.record("qwen-plus", "document", None, 1.5, False, tags={"user_id": 2})
+    finally:
+        await ledger.stop()
+    assert await _count(factory) == 6, "停止时应写入剩余记录"
+    stats = ledger.stats()
+    assert stats["written"] == 6 and stats["pending"] == 0
+    assert stats["byModel"]["qwen-plus"]["failures"] == 1
+
+    # 重启后从数据库恢复用户当日用量
+    restored = UsageLedger(session_factory=factory)
+    await restored.start()
+    await restored.stop()
+    assert restored.user_tokens_today(1) == 600 and restored.user_tokens_today(2) == 0
+    await engine.dispose()
+    return stats
+
+
+def test_batching():
+    """测试缓冲达到批量条数时提前写入、停止时写入剩余记录、重启后恢复当日用量"""
+    print("=" * 60)
+    print("测试: 批量写入")
+    print("=" * 60)
+    stats = asyncio.run(_run_batching())
+    print(f"✓ 第 5 条触发写入，停止时写入剩余 1 条，共 {stats['flushes']} 次写入；重启后恢复用户当日 600 tokens")
+    print()
+
+
+class _SlowSession:
+    """每条语句延迟执行的会话，用于在写入进行中停止台账"""
+
+    def __init__(self, session):
+        self.session = session
+
+    async def __aenter__(self):
+        await self.session.__aenter__()
+        return self
+
+    async def __aexit__(self, *args):
+        return await self.session.__aexit__(*args)
+
+    async def execute(self, *args):
+        await asyncio.sleep(0.1)
+        return await self.session.execute(*args)
+
+    async def commit(self):
+        await self.session.commit()
+
+
+async def _run_stop_during_flush():
+    engine, factory = await _session_factory()
+    ledger = UsageLedger(session_factory=lambda: _SlowSession(factory()), flush_interval=60, batch_size=1)
+    await ledger.start()
+    ledger.record("qwen-turbo", "extract", {"input_tokens": 10}, 0.1, True, tags={})
+    await asyncio.sleep(0.02)
+    await ledger.stop()
+    count = await _count(factory)
+    await engine.dispose()
+    return count, ledger.stats()
+
+
+def test_stop_during_flush():
+    """测试后台写入进行中停止时，已取出的记录仍被写入"""
+    print("=" * 60)
+    print("测试: 写入中停止")
+    print("=" * 60)
+    count, stats = asyncio.run(_run_stop_during_flush())
+    assert count == 1 and stats["written"] == 1 and stats["pending"] == 0, (count, stats)
+    print("✓ 停止时等待进行中的写入完成，记录未丢失")
+    print()
+
+
+async def _run_flush_failure():
+    class BrokenSession:
+        async def __aenter__(self):
+            raise ConnectionError("数据库不可用")
+
+        async def __aexit__(self, *args):
+            return False
+
+    ledger = UsageLedger(session_factory=BrokenSession, max_pending=3)
+    for i in range(5):
+        ledger.record("qwen-plus", None, {"input_tokens": i}, 0.1, True, tags={})
+    assert await ledger.flush() == 0
+    return ledger.stats()
+
+
+def test_flush_failure():
+    """测试数据库不可用时记录保留在缓冲中，超出上限丢弃最早的"""
+    print("=" * 60)
+    print("测试: 写入失败保留缓冲")
+    print("=" * 60)
+    stats = asyncio.run(_run_flush_failure())
+    assert stats["pending"] == 3 and stats["dropped"] == 2, stats
+    print(f"✓ 写入失败后缓冲 {stats['pending']} 条，丢弃最早 {stats['dropped']} 条")
+    print()
+
+
+def test_usage_tags():
+    """测试用量标签在任务与 copy_context 包装的线程中可见，且不泄漏到外层上下文"""
+    print("=" * 60)
+    print("测试: 用量标签")
+    print("=" * 60)
+    import contextvars
+    from concurrent.futures import ThreadPoolExecutor
+
+    executor = ThreadPoolExecutor(max_workers=1)
+
+    async def _handler():
+        tag_usage(user_id=7, endpoint="POST /api/v1/case-file/import", username=None)
+        tag_usage(import_task_id=3)
+        loop = asyncio.get_running_loop()
+        bare = await loop.run_in_executor(executor, current_usage_tags)
+        wrapped = await loop.run_in_executor(executor, contextvars.copy_context().run, current_usage_tags)
+        in_task = await asyncio.create_task(asyncio.sleep(0, result=current_usage_tags()))
+        return bare, wrapped, in_task
+
+    async def _main():
+        result = await asyncio.create_task(_handler())
+        return result, current_usage_tags()
+
+    (bare, wrapped, in_task), outer = asyncio.run(_main())
+    executor.shutdown()
+    assert wrapped == in_task == {"user_id": 7, "endpoint": "POST /api/v1/case-file/import", "import_task_id": 3}
+    assert bare == {} and outer == {}
+    print(f"✓ 线程中读到标签 {wrapped}；未复制上下文的线程与外层上下文不可见")
+    print()
+
+
+def test_budget():
+    """测试用户当日预算：高峰时段超出后拒绝调用，非高峰时段放行"""
+    print("=" * 60)
+    print("测试: 用户预算")
+    print("=" * 60)
+    saved = (settings.LLM_USER_DAILY_TOKEN_BUDGET, settings.LLM_BUDGET_PEAK_HOURS)
+    ledger = UsageLedger(flush_interval=60)
+    service = QwenService(backend=StubBackend(SyntheticLatency(0, 0), output_tokens=50), ledger=ledger)
+    try:
+        settings.LLM_USER_DAILY_TOKEN_BUDGET = 200
+        settings.LLM_BUDGET_PEAK_HOURS = ""
+
+        async def _as_user():
+            tag_usage(user_id=9, username="tester", endpoint="POST /api/v1/doc-generate/generate")
+            first = await asyncio.to_thread(service.generate_text, "写一份请示" * 40)
+            second = await asyncio.to_thread(service.generate_text, "写一份总结")
+            frames = [frame async for frame in service._stream_chat(
+                [{"role": "user", "content": "写一个故事"}], 0.7, 500, "测试"
+            )]
+            events = await asyncio.to_thread(lambda: list(service.iter_case_fields("卷宗正文")))
+            return first, second, frames, events
+
+        first, second, frames, events = asyncio.run(_as_user())
+        assert first["success"] and ledger.user_tokens_today(9) >= 200, ledger.user_tokens_today(9)
+        assert not second["success"] and second["budgetExceeded"] and not second["retryable"]
+        assert json.loads(frames[0][6:])["budgetExceeded"] and len(frames) == 1
+        assert events[0]["result"]["budgetExceeded"]
+        # 其他用户与后台任务（无用户标签）不受影响
+        assert service.generate_text("写一份总结")["success"]
+
+        assert parse_peak_hours("9-12, 14-18,x") == [(9, 12), (14, 18)]
+        settings.LLM_BUDGET_PEAK_HOURS = "9-12"
+        from datetime import datetime
+        assert in_peak_hours(datetime(2024, 1, 1, 10)) and not in_peak_hours(datetime(2024, 1, 1, 13))
+        rejected = ledger.stats()["budgetRejected"]
+    finally:
+        settings.LLM_USER_DAILY_TOKEN_BUDGET, settings.LLM_BUDGET_PEAK_HOURS = saved
+        service.shutdown()
+    print(f"✓ 用户 9 当日 {ledger.user_tokens_today(9)} tokens 超出预算 200，非流式、流式、字段提取共拒绝 {rejected} 次")
+    print()
+
+
+async def _run_service_rollup():
+    engine, factory = await _session_factory()
+    ledger = UsageLedger(session_factory=factory, flush_interval=60)
+    service = QwenService(backend=StubBackend(SyntheticLatency(0, 0), output_tokens=60), ledger=ledger)
+    try:
+        async def _request(user_id, endpoint, prompt):
+            tag_usage(user_id=user_id, username=f"user{user_id}", endpoint=endpoint)
+            if endpoint.startswith("POST /api/v1/doc-generate/stream"):
+                return [frame async for frame in service._stream_chat(
+                    [{"role": "user", "content": prompt}], 0.7, 500, "测试", route="document_stream"
+                )]
+            return await asyncio.to_thread(service.generate_text, prompt, route="document")
+
+        await asyncio.gather(
+            asyncio.create_task(_request(1, "POST /api/v1/doc-generate/generate", "请示一")),
+            asyncio.create_task(_request(1, "POST /api/v1/doc-generate/stream", "故事一")),
+            asyncio.create_task(_request(2, "POST /api/v1/doc-generate/stream", "故事二")),
+        )
+        await ledger.flush()
+        async with factory() as db:
+            by_user = {row["key"]: row for row in await ledger.rollup(db, "user")}
+            by_endpoint = {row["key"]: row for row in await ledger.rollup(db, "endpoint")}
+            by_day = await ledger.rollup(db, "day")
+            rows = (await db.execute(select(LlmUsage))).scalars().all()
+    finally:
+        service.shutdown()
+        await engine.dispose()
+    return by_user, by_endpoint, by_day, rows
+
+
+def test_service_rollup():
+    """测试 QwenService 的非流式与流式调用按上下文标签记账，并按维度汇总"""
+    print("=" * 60)
+    print("测试: 调用记账与汇总")
+    print("=" * 60)
+    by_user, by_endpoint, by_day, rows = asyncio.run(_run_service_rollup())
+    assert len(rows) == 3 and all(row.output_tokens > 0 and row.input_tokens > 0 for row in rows)
+    assert sum(row.stream for row in rows) == 2
+    assert by_user["1"]["calls"] == 2 and by_user["1"]["username"] == "user1" and by_user["2"]["calls"] == 1
+    assert by_endpoint["POST /api/v1/doc-generate/stream"]["calls"] == 2
+    assert by_day[0]["calls"] == 3 and by_day[0]["failures"] == 0
+    assert by_day[0]["totalTokens"] == sum(row.input_tokens + row.output_tokens for row in rows)
+    print(f"✓ 3 次调用（2 次流式）按用户、接口汇总，共 {by_day[0]['totalTokens']} tokens")
+    print()
+
+
+def main():
+    """主测试函数"""
+    print("\n" + "=" * 60)
+    print("用量台账测试")
+    print("=" * 60 + "\n")
+    try:
+        test_batching()
+        test_stop_during_flush()
+        test_flush_failure()
+        test_usage_tags()
+        test_budget()
+        test_service_rollup()
+        print("=" * 60)
+        print("✅ 所有测试通过！")
+        print("=" * 60)
+    except Exception as e:
+        print(f"\n❌ 测试失败: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()